@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark: llegada masiva de pacientes al líder (POST /api/cluster/create-visit
+con cientos de peticiones a la vez), creando cada visita en su propio commit
+y su propio mensaje de replicación (ADMISSION_BATCH_SIZE=1, como antes) vs la
+cola de admisión de admission.py con distintos tamaños de lote y ventanas.
+
+Uso:
+    python scripts/bench_admission_surge.py [--visitas 500] [--clientes 500] [--nodo-ms 5]
+
+El líder es la app real servida con werkzeug sobre una BD en WAL, con el log
+de replicación activo y quorum 1; los 3 nodos destino son servidores HTTP
+falsos que responden en --nodo-ms y cuentan las entradas que reciben.
+"""
+
+import argparse
+import json
+import logging
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from werkzeug.serving import make_server
+
+from bench_common import bench_app
+
+import models
+from admission import admission
+from config import Config
+from db_utils import init_read_engine
+from models import db, Sala, Doctor, Cama, Paciente, TrabajadorSocial, EntradaReplicacion, VisitaEmergencia
+from replication import replicator
+from replication_log import replication_log as log
+from routes.cluster_api import cluster_api_bp
+
+
+def nodo_falso(node_id, demora, recibidos):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            cuerpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            recibidos[node_id] += 1
+            time.sleep(demora)
+            if 'entries' in cuerpo:
+                payload = {'results': [{'seq': e['seq'], 'status': 'applied', 'success': True}
+                                       for e in cuerpo['entries']]}
+            else:
+                payload = {'success': True}
+            payload = json.dumps(payload).encode()
+            self.send_response(200 if 'entries' in cuerpo else 201)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return (node_id, f'http://127.0.0.1:{server.server_address[1]}')
+
+
+class Lider:
+    """Bully mínimo: este nodo es el líder"""
+
+    def get_current_leader(self):
+        return Config.NODE_ID
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visitas', type=int, default=500)
+    parser.add_argument('--clientes', type=int, default=500)
+    parser.add_argument('--nodo-ms', type=int, default=5)
+    args = parser.parse_args()
+    for nombre in ('werkzeug', 'routes.cluster_api', 'admission', 'replication', 'replication_log'):
+        logging.getLogger(nombre).setLevel(logging.CRITICAL)  # los 500 se cuentan en la tabla
+
+    recibidos = Counter()
+    nodos = [nodo_falso(node_id, args.nodo_ms / 1000, recibidos) for node_id in (2, 3, 4)]
+    models.otros_nodos = lambda bully: nodos
+    Config.REPLICATION_QUORUM = 1
+
+    with bench_app() as app:
+        init_read_engine(app)
+        db.session.add(Sala(id_sala=1, numero=1, ip_address='localhost', puerto=5555))
+        db.session.add_all([Doctor(id_doctor=i, nombre=f'Dr. {i}', especialidad='General', id_sala=1)
+                            for i in range(1, args.visitas + 1)])
+        db.session.add_all([Cama(id_cama=i, numero=i, id_sala=1) for i in range(1, args.visitas + 1)])
+        db.session.add(Paciente(id_paciente=1, nombre='Paciente', curp='XEXX010101HNEXXXA4'))
+        db.session.add(TrabajadorSocial(id_trabajador=1, nombre='Trabajador', id_sala=1))
+        db.session.commit()
+        app.register_blueprint(cluster_api_bp)
+        log.start(app, Lider())
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        server.daemon_threads = True
+        server.socket.listen(args.clientes)  # que la oleada no desborde el backlog de 128 de werkzeug
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/api/cluster/create-visit'
+
+        def crear(i, barrera):
+            barrera.wait()
+            inicio = time.perf_counter()
+            r = requests.post(url, json={'id_paciente': 1, 'id_doctor': i, 'id_cama': i, 'id_trabajador': 1,
+                                         'id_sala': 1, 'sintomas': 'Benchmark'}, timeout=60)
+            return r.status_code, time.perf_counter() - inicio
+
+        def correr(tamano, ventana):
+            db.session.execute(db.delete(VisitaEmergencia))
+            db.session.execute(db.update(Doctor).values(disponible=True))
+            db.session.execute(db.update(Cama).values(ocupada=False, id_paciente=None))
+            db.session.commit()
+            time.sleep(0.5)  # que los seguidores falsos confirmen la limpieza
+            Config.ADMISSION_BATCH_SIZE, Config.ADMISSION_BATCH_WINDOW = tamano, ventana
+            admission.reset()
+            recibidos.clear()
+            seq_inicial = log.ultimo_seq()
+            barrera = threading.Barrier(args.clientes)
+
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(args.clientes) as pool:
+                resultados = list(pool.map(lambda i: crear(i, barrera), range(1, args.visitas + 1)))
+            total = time.perf_counter() - inicio
+            time.sleep(0.5)  # que terminen de llegar los mensajes a los seguidores
+
+            latencias = sorted(t for _, t in resultados)
+            metricas = admission.metrics()
+            return {'total_s': total, 'ops_s': args.visitas / total,
+                    'p50_ms': statistics.median(latencias) * 1e3,
+                    'p99_ms': latencias[int(len(latencias) * 0.99) - 1] * 1e3,
+                    'codigos': dict(Counter(status for status, _ in resultados)),
+                    'entradas': EntradaReplicacion.query.filter(EntradaReplicacion.seq > seq_inicial).count(),
+                    'posts': sum(recibidos.values()) // len(nodos),
+                    'lotes': metricas['batches'], 'lote_max': metricas['max_batch']}
+
+        escenarios = {'sin lotes (1)': (1, 0), 'lotes de 32, ventana 0': (32, 0),
+                      'lotes de 128, ventana 0': (128, 0), 'lotes de 128, ventana 5 ms': (128, 0.005)}
+        print(f'\n{args.visitas} admisiones simultáneas ({args.clientes} clientes), 3 nodos de {args.nodo_ms} ms, '
+              f'quorum 1')
+        print(f"{'':28}{'visitas/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'lotes':>7}{'máx':>6}"
+              f"{'entradas log':>14}{'POST/nodo':>11}  códigos")
+        for nombre, (tamano, ventana) in escenarios.items():
+            r = correr(tamano, ventana)
+            print(f"{nombre:28}{r['ops_s']:>10,.0f}{r['p50_ms']:>9,.0f}{r['p99_ms']:>9,.0f}{r['lotes']:>7}"
+                  f"{r['lote_max']:>6}{r['entradas']:>14}{r['posts']:>11}  {r['codigos']}")
+
+        log.stop()
+        replicator.stop()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
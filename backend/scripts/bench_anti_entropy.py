@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes y tiempo para encontrar y reparar unas pocas visitas
+distintas entre un seguidor y el líder, bajando la tabla completa del líder
+vs una ronda de anti-entropía con árboles de Merkle (anti_entropy.py).
+
+Uso:
+    python scripts/bench_anti_entropy.py [--visitas 20000] [--distintas 20]
+
+El líder es la app real servida con werkzeug sobre su propia BD; el
+seguidor es otra app en el mismo proceso con las mismas visitas salvo
+--distintas que el líder cerró sin que el seguidor se enterara.
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+from werkzeug.serving import make_server
+
+from bench_common import bench_app
+
+import models
+import routes.cluster_api
+from anti_entropy import AntiEntropy, HOJAS, anti_entropy, filas_locales
+from config import Config
+from models import db, Sala, Doctor, Cama, Paciente, TrabajadorSocial, VisitaEmergencia
+from routes.cluster_api import cluster_api_bp
+
+
+INICIO = datetime.utcnow().replace(microsecond=0) - timedelta(days=10)
+
+
+class Lider:
+    def get_current_leader(self):
+        return 2
+
+
+def poblar(visitas):
+    db.session.add(Sala(id_sala=1, numero=1, ip_address='localhost', puerto=5555))
+    db.session.add_all([Doctor(id_doctor=i, nombre=f'Dr. {i}', especialidad='General', id_sala=1)
+                        for i in range(1, 51)])
+    db.session.add_all([Cama(id_cama=i, numero=i, id_sala=1) for i in range(1, 51)])
+    db.session.add(Paciente(id_paciente=1, nombre='Paciente', curp='XEXX010101HNEXXXA4'))
+    db.session.add(TrabajadorSocial(id_trabajador=1, nombre='Trabajador', id_sala=1))
+    db.session.execute(VisitaEmergencia.__table__.insert(), [
+        {'folio': f'1+{i % 50 + 1}+1+{i:06d}', 'id_paciente': 1, 'id_doctor': i % 50 + 1, 'id_cama': i % 50 + 1,
+         'id_trabajador': 1, 'id_sala': 1, 'sintomas': 'Benchmark', 'estado': 'activa',
+         'timestamp': INICIO + timedelta(seconds=i)} for i in range(visitas)])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visitas', type=int, default=20000)
+    parser.add_argument('--distintas', type=int, default=20)
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    logging.getLogger('anti_entropy').setLevel(logging.ERROR)
+    Config.ANTI_ENTROPY_BUDGET_KB = 1 << 20
+
+    # Los endpoints del líder usan su propia instancia: en un nodo real es el singleton
+    routes.cluster_api.anti_entropy = AntiEntropy()
+
+    with bench_app() as lider:
+        poblar(args.visitas)
+        paso = max(1, args.visitas // args.distintas)
+        for visita in VisitaEmergencia.query.filter(VisitaEmergencia.id_visita % paso == 0).limit(args.distintas):
+            visita.estado, visita.diagnostico, visita.fecha_cierre = 'completada', 'Alta', datetime.utcnow()
+        db.session.commit()
+        lider.register_blueprint(cluster_api_bp)
+        server = make_server('127.0.0.1', 0, lider, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}'
+        models.get_leader_flask_url = lambda bully: (2, url)
+        requests.get(f'{url}/api/cluster/anti-entropy/roots', timeout=60)  # árbol del líder construido
+
+        with bench_app():
+            poblar(args.visitas)
+
+            # Tabla completa: todas las cubetas y comparar fila por fila
+            inicio = time.perf_counter()
+            r = requests.post(f'{url}/api/cluster/anti-entropy/rows',
+                              json={'table': 'visitas', 'buckets': list(range(HOJAS))}, timeout=60)
+            remotas = {f['folio']: f for f in r.json()['rows']}
+            locales = filas_locales('visitas')
+            distintas = sum(remotas.get(folio) != fila for folio, fila in locales.items())
+            completa = {'json': len(json.dumps(r.json(), separators=(',', ':'))),
+                        'ms': (time.perf_counter() - inicio) * 1000, 'distintas': distintas}
+
+            # Merkle: árbol local ya construido (se mantiene con los commits)
+            anti_entropy.raices()
+            anti_entropy.bully_manager = Lider()
+            inicio = time.perf_counter()
+            ronda = anti_entropy.sincronizar()
+            merkle = {'json': ronda['bytes'], 'ms': (time.perf_counter() - inicio) * 1000,
+                      'distintas': ronda['tables']['visitas']['differing_buckets']}
+
+            print(f'\n{args.visitas} visitas, {args.distintas} distintas en el seguidor')
+            print(f"{'':<22}{'KB (JSON)':>12}{'ms':>10}{'distintas':>12}")
+            print(f"{'tabla completa':<22}{completa['json'] / 1024:>12,.1f}{completa['ms']:>10.1f}"
+                  f"{completa['distintas']:>12} filas")
+            print(f"{'Merkle (1 ronda)':<22}{merkle['json'] / 1024:>12,.1f}{merkle['ms']:>10.1f}"
+                  f"{merkle['distintas']:>12} cubetas")
+            raices = requests.get(f'{url}/api/cluster/anti-entropy/roots', timeout=60).json()['roots']
+            print(f"  filas copiadas del líder: {anti_entropy.metrics()['rows_pulled']}; "
+                  f"raíces iguales tras la ronda: {anti_entropy.raices() == raices}")
+
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
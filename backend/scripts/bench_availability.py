@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark: asignación de doctor/cama con consultas a SQLite vs índice en memoria.
+
+Uso:
+    python scripts/bench_availability.py [--salas 4] [--doctores 200] [--camas 300] [--n 2000]
+
+Mide tres operaciones por ambos caminos:
+    - pick:     elegir un doctor y una cama libres de una sala
+    - count:    contar doctores y camas libres de una sala
+    - allocate: pick + marcar ocupados + commit + liberar + commit (ciclo completo)
+"""
+
+import argparse
+import random
+
+from bench_common import bench_app, measure, print_comparison
+
+from availability import availability
+from models import db, Sala, Doctor, Cama
+
+ESPECIALIDADES = ['Cardiología', 'Pediatría', 'Traumatología', 'Medicina General', 'Neurología']
+
+
+def seed(salas, doctores, camas):
+    """Carga salas, doctores y camas; ~30% de los recursos quedan ocupados."""
+    rnd = random.Random(42)
+    db.session.add_all([Sala(id_sala=s, numero=s) for s in range(1, salas + 1)])
+    db.session.add_all([
+        Doctor(nombre=f'Doctor {i}', especialidad=rnd.choice(ESPECIALIDADES),
+               id_sala=rnd.randint(1, salas), disponible=rnd.random() > 0.3)
+        for i in range(doctores)
+    ])
+    db.session.add_all([
+        Cama(numero=i, id_sala=rnd.randint(1, salas), ocupada=rnd.random() < 0.3)
+        for i in range(camas)
+    ])
+    db.session.commit()
+    availability.load()
+
+
+def pick_query(id_sala):
+    doctor = Doctor.query.filter_by(id_sala=id_sala, disponible=True, activo=True).first()
+    cama = Cama.query.filter_by(id_sala=id_sala, ocupada=False).first()
+    return doctor, cama
+
+
+def pick_index(id_sala):
+    return availability.pick_doctor(id_sala), availability.pick_cama(id_sala)
+
+
+def count_query(id_sala):
+    return (Doctor.query.filter_by(id_sala=id_sala, disponible=True, activo=True).count(),
+            Cama.query.filter_by(id_sala=id_sala, ocupada=False).count())
+
+
+def count_index(id_sala):
+    return availability.count_doctores(id_sala), availability.count_camas(id_sala)
+
+
+def allocate(picker, id_sala):
+    """Ciclo completo: elegir, re-leer por id, ocupar, confirmar, liberar, confirmar."""
+    libre_doctor, libre_cama = picker(id_sala)
+    doctor = db.session.get(Doctor, libre_doctor.id_doctor)
+    cama = db.session.get(Cama, libre_cama.id_cama)
+    doctor.disponible = False
+    cama.ocupada = True
+    db.session.commit()
+    doctor.disponible = True
+    cama.ocupada = False
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--salas', type=int, default=4)
+    parser.add_argument('--doctores', type=int, default=200)
+    parser.add_argument('--camas', type=int, default=300)
+    parser.add_argument('--n', type=int, default=2000, help='iteraciones por medición')
+    args = parser.parse_args()
+
+    with bench_app():
+        seed(args.salas, args.doctores, args.camas)
+        salas = [random.randint(1, args.salas) for _ in range(args.n)]
+        it = iter(salas * 3)
+
+        print(f'{args.salas} salas, {args.doctores} doctores, {args.camas} camas, {args.n} iteraciones')
+
+        # expire_all() entre iteraciones para que el camino ORM no dependa del identity map
+        print_comparison('pick (doctor + cama libres)', {
+            'query SQLite': measure(lambda: (pick_query(next(it)), db.session.expire_all()), args.n),
+            'índice en memoria': measure(lambda: pick_index(next(it)), args.n),
+        })
+
+        it = iter(salas * 2)
+        print_comparison('count (doctores + camas libres)', {
+            'query SQLite': measure(lambda: count_query(next(it)), args.n),
+            'índice en memoria': measure(lambda: count_index(next(it)), args.n),
+        })
+
+        n = max(args.n // 10, 1)
+        it = iter(salas * 2)
+        print_comparison('allocate (pick + commit + liberar + commit)', {
+            'query SQLite': measure(lambda: allocate(pick_query, next(it)), n),
+            'índice en memoria': measure(lambda: allocate(pick_index, next(it)), n),
+        })
+
+
+if __name__ == '__main__':
+    main()
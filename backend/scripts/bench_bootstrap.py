@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tiempo de arranque de un nodo nuevo desde un snapshot del líder
+(bootstrap.py) para una BD del tamaño pedido.
+
+Uso:
+    python scripts/bench_bootstrap.py [--mb 1024] [--chunk-kb 4096] [--parallel 4]
+
+El líder es la app real servida con werkzeug sobre su propia BD, poblada
+con visitas hasta --mb megabytes; el nodo nuevo es otra app en el mismo
+proceso con la BD vacía. Se reporta la generación del snapshot en el
+líder, la descarga verificada, la restauración y el total en MB/s.
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.serving import make_server
+
+from bench_common import bench_app
+
+from auth import init_default_users
+from bootstrap import bootstrap
+from config import Config
+from models import db, EntradaReplicacion, Sala, Paciente, VisitaEmergencia
+from routes.cluster_api import cluster_api_bp
+
+LOTE = 20000
+
+
+def poblar(mb):
+    """Visitas (con síntomas de 400 bytes) y su entrada del log hasta que la BD pese `mb` MB"""
+    db.session.add(Sala(id_sala=2, numero=2, ip_address='localhost', puerto=5556))
+    db.session.add(Paciente(id_paciente=1, nombre='Paciente', curp='XEXX010101HNEXXXA4'))
+    db.session.commit()
+    init_default_users()
+    ruta = os.path.abspath(db.engine.url.database)
+    inicio = datetime.utcnow() - timedelta(days=1)
+    i = 0
+    while os.path.getsize(ruta) < mb * 2**20:
+        db.session.execute(VisitaEmergencia.__table__.insert(), [
+            {'folio': f'2+1+1+{n:08d}', 'id_paciente': 1, 'id_doctor': 1, 'id_cama': 1, 'id_trabajador': 1,
+             'id_sala': 2, 'sintomas': f'{n:08d}' * 50, 'estado': 'activa', 'timestamp': inicio}
+            for n in range(i, i + LOTE)])
+        db.session.execute(EntradaReplicacion.__table__.insert(), [
+            {'seq': n + 1, 'tipo': 'visita_creada', 'datos': '{}', 'id_origen': 2, 'id_lider': 2, 'timestamp': inicio}
+            for n in range(i, i + LOTE)])
+        db.session.commit()
+        i += LOTE
+    db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+    return i, os.path.getsize(ruta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mb', type=int, default=1024)
+    parser.add_argument('--chunk-kb', type=int, default=Config.BOOTSTRAP_CHUNK_KB)
+    parser.add_argument('--parallel', type=int, default=Config.BOOTSTRAP_PARALLEL)
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    Config.BOOTSTRAP_CHUNK_KB, Config.BOOTSTRAP_PARALLEL = args.chunk_kb, args.parallel
+
+    with bench_app() as lider:
+        inicio = time.perf_counter()
+        visitas, tamano = poblar(args.mb)
+        print(f'BD del líder: {tamano / 2**20:,.0f} MB, {visitas:,} visitas '
+              f'(poblada en {time.perf_counter() - inicio:.0f}s)')
+        lider.register_blueprint(cluster_api_bp)
+        server = make_server('127.0.0.1', 0, lider, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}'
+
+        with bench_app() as nuevo:
+            init_default_users()
+            resumen = bootstrap(nuevo, 2, url)
+            copiadas = VisitaEmergencia.query.count()
+
+        server.shutdown()
+
+    print(f"\nbootstrap de {resumen['size'] / 2**20:,.0f} MB en {resumen['chunks']} trozos de "
+          f"{args.chunk_kb} KB ({args.parallel} en paralelo)")
+    print(f"{'descarga (snapshot incl.)':<28}{resumen['download_s']:>10.2f} s")
+    print(f"{'  snapshot en el líder':<28}{resumen['snapshot_s']:>10.2f} s")
+    print(f"{'restauración':<28}{resumen['restore_s']:>10.2f} s")
+    print(f"{'total':<28}{resumen['total_s']:>10.2f} s{resumen['mb_s']:>10.1f} MB/s")
+    print(f"  visitas copiadas: {copiadas:,}; log hasta el seq {resumen['seq']:,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latencia de una llamada inter-nodo (replicar una visita a 3
+nodos) con 1 y 3 nodos colgados, sin vs con circuit breakers.
+
+Uso:
+    python scripts/bench_circuit_breakers.py [--latencia-ms 10] [--iteraciones 20]
+
+    - secuencial:        requests.post(timeout=3) nodo por nodo (implementación anterior)
+    - scatter-gather:    en paralelo, sin breakers (cada llamada espera el plazo)
+    - con breakers:      tras BREAKER_FAILURE_THRESHOLD fallas los nodos colgados
+                         se omiten al instante
+"""
+
+import argparse
+import json
+import logging
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from bench_common import measure, print_comparison
+
+from cluster_client import breakers, scatter_gather
+from config import Config
+
+TIMEOUT = 3.0
+VISITA = {'folio': '1+1+1+001', 'id_paciente': 1, 'id_doctor': 1, 'id_cama': 1, 'id_trabajador': 1,
+          'id_sala': 1, 'sintomas': 'Fiebre', 'estado': 'activa'}
+
+
+def nodo_vivo(latencia):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            time.sleep(latencia)
+            payload = json.dumps({'success': True}).encode()
+            self.send_response(201)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def nodo_colgado():
+    """Socket que escucha pero nunca acepta: conecta y luego no llega respuesta"""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(64)
+    nodo_colgado.sockets.append(sock)
+    return f'http://127.0.0.1:{sock.getsockname()[1]}'
+
+
+nodo_colgado.sockets = []
+
+
+def secuencial(nodos):
+    for _, url in nodos:
+        try:
+            requests.post(f'{url}/api/cluster/replicate-visit', json=VISITA, timeout=TIMEOUT)
+        except requests.exceptions.RequestException:
+            pass
+
+
+def paralelo(nodos):
+    scatter_gather(nodos, '/api/cluster/replicate-visit', deadline=TIMEOUT, method='POST', json=VISITA)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latencia-ms', type=float, default=10)
+    parser.add_argument('--iteraciones', type=int, default=20)
+    args = parser.parse_args()
+    logging.getLogger('cluster_client').setLevel(logging.ERROR)
+
+    vivos = [nodo_vivo(args.latencia_ms / 1000) for _ in range(3)]
+    colgados = [nodo_colgado() for _ in range(3)]
+
+    for n_colgados in (1, 3):
+        nodos = list(enumerate(colgados[:n_colgados] + vivos[:3 - n_colgados], start=2))
+        pocas = max(2, args.iteraciones // 10)  # las variantes sin breaker tardan segundos por llamada
+
+        Config.BREAKER_FAILURE_THRESHOLD = 10 ** 9  # nunca abre
+        sin_breaker = measure(lambda: paralelo(nodos), pocas)
+
+        Config.BREAKER_FAILURE_THRESHOLD = 3
+        Config.BREAKER_RESET_TIMEOUT = 3600
+        breakers.reset()
+        for _ in range(3):
+            paralelo(nodos)  # abre los circuitos de los colgados
+        con_breaker = measure(lambda: paralelo(nodos), args.iteraciones)
+
+        print_comparison(f'replicar a 3 nodos, {n_colgados} colgados (latencia {args.latencia_ms:g} ms)', {
+            'secuencial (timeout=3)': measure(lambda: secuencial(nodos), pocas),
+            'scatter-gather': sin_breaker,
+            'con breakers (abiertos)': con_breaker,
+        })
+        breakers.reset()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: "cardiólogos libres en todo el cluster" y "camas libres por sala",
+trayendo las listas completas vs con la consulta resuelta en cada nodo
+(POST /api/cluster/query).
+
+Uso:
+    python scripts/bench_cluster_query.py [--doctores 2000] [--camas 2000] [--iteraciones 20]
+
+Un servidor HTTP real (werkzeug, con hilos) sirve la API inter-nodos de una
+sala y se consulta como si fueran 3 nodos remotos.
+"""
+
+import argparse
+import logging
+import threading
+
+from werkzeug.serving import make_server
+
+from bench_common import bench_app, measure, print_comparison
+
+import cluster_client
+from cluster_client import scatter_gather
+from cluster_query import parse_spec, to_json
+from models import db, Sala, Doctor, Cama
+from routes.cluster_api import cluster_api_bp
+
+ESPECIALIDADES = ('Cardiología', 'Pediatría', 'Medicina General', 'Traumatología', 'Neurología')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--doctores', type=int, default=2000)
+    parser.add_argument('--camas', type=int, default=2000)
+    parser.add_argument('--iteraciones', type=int, default=20)
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    with bench_app() as app:
+        db.session.add(Sala(id_sala=1, numero=1, ip_address='localhost', puerto=5555))
+        db.session.add_all([Doctor(id_doctor=i + 1, nombre=f'Dr. Doctor Número {i}', id_sala=1,
+                                   especialidad=ESPECIALIDADES[i % len(ESPECIALIDADES)], disponible=i % 4 == 0)
+                            for i in range(args.doctores)])
+        db.session.add_all([Cama(id_cama=i + 1, numero=i + 1, id_sala=1, ocupada=i % 5 != 0)
+                            for i in range(args.camas)])
+        db.session.commit()
+        app.register_blueprint(cluster_api_bp)
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        nodos = [(node_id, f'http://127.0.0.1:{server.server_port}') for node_id in (2, 3, 4)]
+
+        recibidos = []
+        session, _ = cluster_client._cliente()
+        # Bytes en el cable (comprimidos si el nodo aplicó gzip)
+        session.hooks['response'].append(lambda r, *a, **k: recibidos.append(int(r.headers.get('Content-Length', 0))))
+
+        def completo_cardiologos():
+            filas = [d for r in scatter_gather(nodos, '/api/cluster/doctors', deadline=30) for d in r.data['doctors']
+                     if d['especialidad'] == 'Cardiología' and d['disponible']]
+            assert filas
+
+        cardiologos = to_json(parse_spec({'resource': 'doctors',
+                                          'where': {'especialidad': 'Cardiología', 'disponible': True},
+                                          'fields': ['id_doctor', 'nombre', 'id_sala']}))
+
+        def pushdown_cardiologos():
+            assert all(r.data['rows'] for r in scatter_gather(nodos, '/api/cluster/query', deadline=30,
+                                                              method='POST', json=cardiologos))
+
+        def completo_camas():
+            por_sala = {}
+            for r in scatter_gather(nodos, '/api/cluster/beds', params={'ocupada': 'false'}, deadline=30):
+                por_sala[r.node_id] = len(r.data['beds'])
+            assert por_sala
+
+        camas = to_json(parse_spec({'resource': 'beds', 'where': {'ocupada': False}, 'group_by': ['id_sala']}))
+
+        def pushdown_camas():
+            assert all(r.data['rows'] for r in scatter_gather(nodos, '/api/cluster/query', deadline=30,
+                                                              method='POST', json=camas))
+
+        for titulo, variantes in (
+                (f'cardiólogos libres, 3 nodos x {args.doctores} doctores', {
+                    'lista completa + filtro local': completo_cardiologos,
+                    'pushdown': pushdown_cardiologos}),
+                (f'camas libres por sala, 3 nodos x {args.camas} camas', {
+                    '/beds?ocupada=false + conteo': completo_camas,
+                    'pushdown (group_by)': pushdown_camas})):
+            resultados, bytes_ = {}, {}
+            for nombre, fn in variantes.items():
+                recibidos.clear()
+                fn()
+                bytes_[nombre] = sum(recibidos)
+                resultados[nombre] = measure(fn, args.iteraciones)
+            print_comparison(titulo, resultados)
+            print('bytes por consulta: ' + ' / '.join(f'{n} {b:,}' for n, b in bytes_.items()))
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes y CPU por ronda de agregación del cluster, endpoints
+separados vs /api/cluster/snapshot con ETag.
+
+Uso:
+    python scripts/bench_cluster_snapshot.py [--doctores 40] [--camas 200] [--rondas 50]
+
+Un servidor HTTP real (werkzeug, con hilos) sirve la API inter-nodos de una
+sala y se consulta como si fueran 3 nodos remotos. Por ronda:
+    - separados:          /doctors, /beds, /stats y /social-workers por nodo
+    - snapshot (cambia):  un /snapshot por nodo; antes de cada ronda cambia un
+                          doctor, así que siempre se transfiere completo
+    - snapshot (igual):   un /snapshot condicional por nodo sin cambios (304)
+CPU es tiempo de proceso (cliente + servidor, que corren en el mismo proceso).
+"""
+
+import argparse
+import logging
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from bench_common import bench_app
+
+import cluster_client
+from cluster_client import scatter_gather
+from models import db, Sala, Doctor, Cama, TrabajadorSocial
+from routes.cluster_api import cluster_api_bp
+
+ENDPOINTS = ('/api/cluster/doctors', '/api/cluster/beds', '/api/cluster/stats', '/api/cluster/social-workers')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--doctores', type=int, default=40)
+    parser.add_argument('--camas', type=int, default=200)
+    parser.add_argument('--rondas', type=int, default=50)
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    with bench_app() as app:
+        db.session.add(Sala(id_sala=1, numero=1, ip_address='localhost', puerto=5555))
+        db.session.add_all([Doctor(id_doctor=i + 1, nombre=f'Dr. Doctor Número {i}', especialidad='Medicina General',
+                                   id_sala=1) for i in range(args.doctores)])
+        db.session.add_all([Cama(id_cama=i + 1, numero=i + 1, id_sala=1, ocupada=i % 3 == 0)
+                            for i in range(args.camas)])
+        db.session.add_all([TrabajadorSocial(id_trabajador=i + 1, nombre=f'Trabajador {i}', id_sala=1)
+                            for i in range(5)])
+        db.session.commit()
+        app.register_blueprint(cluster_api_bp)
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        nodos = [(node_id, f'http://127.0.0.1:{server.server_port}') for node_id in (2, 3, 4)]
+
+        recibidos = []
+        session, _ = cluster_client._cliente()
+        session.hooks['response'].append(lambda r, *a, **k: recibidos.append(len(r.content)))
+
+        def separados():
+            for path in ENDPOINTS:
+                assert all(r.ok for r in scatter_gather(nodos, path))
+
+        def snapshot():
+            assert all(r.ok for r in scatter_gather(nodos, '/api/cluster/snapshot', conditional=True))
+
+        def cambiar(i):
+            doctor = db.session.get(Doctor, 1)
+            doctor.disponible = i % 2 == 0
+            db.session.commit()
+
+        def ronda(fn, antes=None):
+            bytes_, cpu, wall = 0, 0.0, 0.0
+            for i in range(args.rondas):
+                if antes:
+                    antes(i)
+                recibidos.clear()
+                c0, w0 = time.process_time(), time.perf_counter()
+                fn()
+                cpu += time.process_time() - c0
+                wall += time.perf_counter() - w0
+                bytes_ += sum(recibidos)
+            return bytes_ / args.rondas, cpu / args.rondas * 1000, wall / args.rondas * 1000
+
+        snapshot()  # primera ronda: guarda los ETag
+        resultados = {
+            'separados (4 GET/nodo)': ronda(separados),
+            'snapshot (con cambios)': ronda(snapshot, antes=cambiar),
+            'snapshot (sin cambios)': ronda(snapshot),
+        }
+        server.shutdown()
+
+    print(f'\n3 nodos, {args.doctores} doctores y {args.camas} camas por nodo, {args.rondas} rondas')
+    print(f"{'':<26}{'bytes/ronda':>14}{'CPU ms/ronda':>14}{'ms/ronda':>10}")
+    for nombre, (bytes_, cpu, wall) in resultados.items():
+        print(f'{nombre:<26}{bytes_:>14,.0f}{cpu:>14.2f}{wall:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
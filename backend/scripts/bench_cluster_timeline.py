@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark: primera página del feed "últimas visitas" de todo el cluster,
+pidiendo K a cada nodo y ordenando vs merge de K vías con páginas perezosas
+(cluster_timeline.get_cluster_timeline).
+
+Uso:
+    python scripts/bench_cluster_timeline.py [--nodos 8] [--visitas 10000] [--k 50] [--iteraciones 20]
+
+Cada nodo es un servidor HTTP que sirve /api/cluster/visits paginado por
+cursor desde una lista en memoria. Dos repartos:
+    - intercalado: las visitas recientes están repartidas entre las salas
+    - sesgado:     una sola sala tiene todas las visitas recientes
+"""
+
+import argparse
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bench_common import bench_app, measure, print_comparison
+
+import cluster_timeline
+from cluster_client import scatter_gather
+from cluster_timeline import get_cluster_timeline
+from models import VISITAS_ORDEN
+from pagination import decode_cursor, encode_cursor
+
+INICIO = datetime(2024, 1, 1)
+
+
+def nodo(id_sala, minutos, servidas):
+    filas = [{'id_visita': i, 'folio': f'{id_sala}+{i}', 'id_paciente': i, 'paciente_nombre': f'Paciente {i}',
+              'id_doctor': 1, 'doctor_nombre': 'Dr. Doctor', 'id_cama': 1, 'cama_numero': 1, 'id_sala': id_sala,
+              'sintomas': 'Dolor abdominal', 'diagnostico': None, 'estado': 'activa',
+              'timestamp': (INICIO + timedelta(minutes=m)).isoformat(), 'fecha_cierre': None}
+             for i, m in enumerate(sorted(minutos), start=1)]
+    filas.reverse()  # más recientes primero
+    llaves = [(datetime.fromisoformat(f['timestamp']), f['id_visita']) for f in filas]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            args = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+            limit = int(args.get('limit', 50))
+            inicio = 0
+            if 'cursor' in args:
+                cursor = tuple(decode_cursor(args['cursor'], VISITAS_ORDEN))
+                inicio = next((i for i, llave in enumerate(llaves) if llave < cursor), len(filas))
+            pagina = filas[inicio:inicio + limit]
+            siguiente = None
+            if inicio + limit < len(filas):
+                siguiente = encode_cursor((pagina[-1]['timestamp'], pagina[-1]['id_visita']))
+            servidas.append(len(pagina))
+            payload = json.dumps({'node_id': id_sala, 'count': len(pagina), 'next_cursor': siguiente,
+                                  'visits': pagina}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return id_sala, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodos', type=int, default=8)
+    parser.add_argument('--visitas', type=int, default=10000)
+    parser.add_argument('--k', type=int, default=50)
+    parser.add_argument('--iteraciones', type=int, default=20)
+    args = parser.parse_args()
+
+    repartos = {
+        'intercalado': lambda sala: [i * args.nodos + sala for i in range(args.visitas)],
+        'sesgado': lambda sala: [i + (10 ** 7 if sala == 2 else 0) for i in range(args.visitas)],
+    }
+
+    with bench_app():
+        for reparto, minutos in repartos.items():
+            servidas = []
+            nodos = [nodo(sala, minutos(sala), servidas) for sala in range(2, args.nodos + 2)]
+            cluster_timeline.otros_nodos = lambda bully: nodos
+
+            def ingenuo():
+                filas = [v for r in scatter_gather(nodos, '/api/cluster/visits', params={'limit': args.k})
+                         for v in r.data['visits']]
+                filas.sort(key=lambda f: (f['timestamp'], f['id_sala'], f['id_visita']), reverse=True)
+                return filas[:args.k]
+
+            def merge():
+                return list(get_cluster_timeline(None, limit=args.k))
+
+            assert ingenuo() == [{k: v for k, v in f.items() if k != 'source'} for f in merge()]
+            filas = {}
+            for nombre, fn in (('K por nodo + sort', ingenuo), ('merge de K vías', merge)):
+                servidas.clear()
+                fn()
+                filas[nombre] = sum(servidas)
+            print_comparison(f'{reparto}: {args.nodos} nodos x {args.visitas} visitas, K={args.k}', {
+                'K por nodo + sort': measure(ingenuo, args.iteraciones),
+                'merge de K vías': measure(merge, args.iteraciones),
+            })
+            print('filas transferidas: ' + ' / '.join(f'{n} {c:,}' for n, c in filas.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: codificación de las respuestas inter-nodos con 10k filas, JSON
+normal vs columnar (codec.COLUMNAR) con y sin gzip.
+
+Uso:
+    python scripts/bench_codec.py [--filas 10000] [--mbps 100] [--iteraciones 10]
+
+Dos partes:
+    1. En proceso, payloads con la forma de /api/cluster/beds y /visits:
+       bytes, ms de encode (+gzip) y de decode (+gunzip), y el total
+       encode + transferencia (a --mbps) + decode.
+    2. Extremo a extremo: un servidor HTTP real (werkzeug) sirve
+       /api/cluster/beds con --filas camas; se compara un GET de sólo JSON
+       (como antes) contra scatter_gather, que negocia columnar + gzip.
+"""
+
+import argparse
+import gzip
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import requests
+from werkzeug.serving import make_server
+
+from bench_common import bench_app, measure, print_comparison
+
+import codec
+from cluster_client import scatter_gather
+from models import db, Sala, Cama
+from routes.cluster_api import cluster_api_bp
+
+ESTADOS = ('activa', 'completada', 'cancelada')
+
+
+def payload_camas(n):
+    return {'node_id': 1, 'count': n, 'beds': [{
+        'id_cama': i, 'numero': i, 'ocupada': i % 3 == 0, 'id_sala': 1,
+        'id_paciente': i if i % 3 == 0 else None,
+        'paciente_nombre': f'Paciente Número {i}' if i % 3 == 0 else None
+    } for i in range(1, n + 1)]}
+
+
+def payload_visitas(n):
+    inicio = datetime(2024, 1, 1)
+    return {'node_id': 1, 'count': n, 'next_cursor': None, 'visits': [{
+        'id_visita': i, 'folio': f'{i % 500}+{i % 40}+1+{i:03d}', 'id_paciente': i % 500,
+        'paciente_nombre': f'Paciente Número {i % 500}', 'id_doctor': i % 40,
+        'doctor_nombre': f'Dr. Doctor Número {i % 40}', 'id_cama': i % 200, 'cama_numero': i % 200,
+        'id_sala': 1, 'sintomas': 'Dolor abdominal agudo con fiebre', 'diagnostico': None,
+        'estado': ESTADOS[i % 3], 'timestamp': (inicio + timedelta(minutes=i)).isoformat(),
+        'fecha_cierre': None
+    } for i in range(1, n + 1)]}
+
+
+def variantes():
+    """(nombre, columnar, gzip)"""
+    return [('JSON', False, False), ('JSON + gzip', False, True),
+            ('columnar', True, False), ('columnar + gzip', True, True)]
+
+
+def en_proceso(nombre, payload, args):
+    print(f'\n{nombre}: {len(next(v for v in payload.values() if isinstance(v, list))):,} filas')
+    print(f"{'':<18}{'bytes':>12}{'encode ms':>11}{'decode ms':>11}{'total ms':>10}")
+    for variante, columnar, comprimir in variantes():
+        content_type = codec.COLUMNAR if columnar else 'application/json'
+
+        def codificar():
+            body = codec.encode(payload, columnar)
+            return gzip.compress(body, compresslevel=codec.GZIP_LEVEL) if comprimir else body
+
+        body = codificar()
+
+        def decodificar():
+            codec.decode(gzip.decompress(body) if comprimir else body, content_type)
+
+        enc = measure(codificar, args.iteraciones)['us_op'] / 1000
+        dec = measure(decodificar, args.iteraciones)['us_op'] / 1000
+        transferencia = len(body) * 8 / (args.mbps * 1e6) * 1000
+        print(f'{variante:<18}{len(body):>12,}{enc:>11.2f}{dec:>11.2f}{enc + transferencia + dec:>10.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, default=10000)
+    parser.add_argument('--mbps', type=float, default=100)
+    parser.add_argument('--iteraciones', type=int, default=10)
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    print(f'total = encode + transferencia a {args.mbps:g} Mbps + decode')
+    en_proceso('camas', payload_camas(args.filas), args)
+    en_proceso('visitas', payload_visitas(args.filas), args)
+
+    with bench_app() as app:
+        db.session.add(Sala(id_sala=1, numero=1, ip_address='localhost', puerto=5555))
+        db.session.add_all([Cama(id_cama=i, numero=i, id_sala=1, ocupada=i % 3 == 0)
+                            for i in range(1, args.filas + 1)])
+        db.session.commit()
+        app.register_blueprint(cluster_api_bp)
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}'
+        sesion = requests.Session()
+        recibidos = {}
+
+        def solo_json():
+            r = sesion.get(f'{url}/api/cluster/beds', headers={'Accept': 'application/json',
+                                                               'Accept-Encoding': 'identity'})
+            recibidos['JSON'] = len(r.content)
+            assert len(r.json()['beds']) == args.filas
+
+        def negociado():
+            respuesta, = scatter_gather([(2, url)], '/api/cluster/beds', deadline=30)
+            assert len(respuesta.data['beds']) == args.filas
+
+        cabeceras = {'Accept': codec.ACCEPT, 'Accept-Encoding': 'gzip'}
+        recibidos['columnar + gzip'] = len(requests.get(f'{url}/api/cluster/beds', headers=cabeceras,
+                                                        stream=True).raw.read())
+        print_comparison(f'GET /api/cluster/beds por HTTP ({args.filas:,} camas, loopback)', {
+            'JSON (como antes)': measure(solo_json, args.iteraciones),
+            'columnar + gzip': measure(negociado, args.iteraciones),
+        })
+        print(f"bytes en el cable: JSON {recibidos['JSON']:,} / "
+              f"columnar + gzip {recibidos['columnar + gzip']:,}")
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Utilidades compartidas por los scripts de benchmark (scripts/bench_*.py).
+
+Crean una app Flask mínima sobre una BD SQLite temporal (igual que las
+pruebas) y miden operaciones con time.perf_counter.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Agregar el directorio src al path para importar módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('NODE_ID', '1')
+
+from flask import Flask  # noqa: E402
+
+from config import Config  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from models import db  # noqa: E402
+
+
+@contextmanager
+def bench_app(path=None):
+    """
+    App Flask con contexto activo sobre una BD nueva (temporal si no se da path).
+
+    Yields:
+        Flask: aplicación con el esquema creado y migrado
+    """
+    tmpdir = None
+    if path is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmpdir.name, 'bench.db')
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+
+    try:
+        with app.app_context():
+            db.create_all()
+            run_migrations(db.engine)
+            yield app
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+
+def measure(fn, iterations):
+    """
+    Ejecuta fn() `iterations` veces.
+
+    Returns:
+        dict: total_s, ops_s y us_op (microsegundos por operación)
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    total = time.perf_counter() - start
+    return {
+        'total_s': total,
+        'ops_s': iterations / total if total else float('inf'),
+        'us_op': total / iterations * 1e6
+    }
+
+
+def print_comparison(title, results):
+    """Imprime una tabla {nombre: resultado de measure()} con el speedup frente a la primera fila."""
+    print(f'\n{title}')
+    print(f"{'':<28}{'ops/s':>14}{'us/op':>12}{'speedup':>10}")
+    base = next(iter(results.values()))['us_op']
+    for name, r in results.items():
+        print(f"{name:<28}{r['ops_s']:>14,.0f}{r['us_op']:>12.1f}{base / r['us_op']:>9.1f}x")
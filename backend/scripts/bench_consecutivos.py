@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: visitas/segundo con creadores concurrentes según el tamaño de bloque
+de consecutivos.
+
+Uso:
+    python scripts/bench_consecutivos.py [--hilos 1 4 8] [--bloques 1 10 50] [--visitas 200] [--por-commit 1]
+
+Con bloque = 1 cada visita hace su propio UPDATE + SELECT sobre la fila
+(sala, día) de CONSECUTIVOS, igual que el antiguo get_next_consecutivo();
+con bloques mayores sólo una de cada N visitas toca esa fila.
+Cada hilo crea `--visitas` visitas con el ORM, con un commit cada
+`--por-commit` visitas (con 1, el fsync del commit domina el tiempo).
+"""
+
+import argparse
+import threading
+import time
+
+from bench_common import bench_app
+
+from consecutivos import allocator
+from models import db, VisitaEmergencia
+
+
+def seed():
+    conn = db.session.connection()
+    conn.exec_driver_sql("INSERT INTO SALAS (id_sala, numero) VALUES (1, 1)")
+    conn.exec_driver_sql("INSERT INTO DOCTORES (id_doctor, nombre, id_sala) VALUES (1, 'Doctor', 1)")
+    conn.exec_driver_sql("INSERT INTO CAMAS (id_cama, numero, id_sala) VALUES (1, 1, 1)")
+    conn.exec_driver_sql("INSERT INTO PACIENTES (id_paciente, nombre, activo) VALUES (1, 'Paciente', 1)")
+    conn.exec_driver_sql("INSERT INTO TRABAJADORES_SOCIALES (id_trabajador, nombre, id_sala) VALUES (1, 'TS', 1)")
+    db.session.commit()
+
+
+def creador(app, n, por_commit, errores):
+    with app.app_context():
+        try:
+            for i in range(1, n + 1):
+                db.session.add(VisitaEmergencia(id_paciente=1, id_doctor=1, id_cama=1, id_trabajador=1,
+                                                id_sala=1, sintomas='Bench', estado='activa'))
+                db.session.flush()
+                if i % por_commit == 0 or i == n:
+                    db.session.commit()
+        except Exception as e:
+            errores.append(e)
+            db.session.rollback()
+        finally:
+            db.session.remove()
+
+
+def run(app, hilos, visitas, por_commit):
+    errores = []
+    threads = [threading.Thread(target=creador, args=(app, visitas, por_commit, errores)) for _ in range(hilos)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    folios = [f for (f,) in db.session.query(VisitaEmergencia.folio)]
+    assert len(folios) == len(set(folios)), 'folios duplicados'
+    return hilos * visitas / elapsed, errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hilos', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--bloques', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--visitas', type=int, default=200, help='visitas por hilo')
+    parser.add_argument('--por-commit', type=int, default=1, help='visitas por transacción')
+    args = parser.parse_args()
+
+    print(f"{'hilos':>6}{'bloque':>8}{'visitas/s':>12}{'reservas':>10}{'errores':>9}")
+    for hilos in args.hilos:
+        for bloque in args.bloques:
+            with bench_app() as app:
+                seed()
+                allocator.block_size = bloque
+                allocator.reset()
+                reservas = allocator.reservas
+                rate, errores = run(app, hilos, args.visitas, args.por_commit)
+                print(f'{hilos:>6}{bloque:>8}{rate:>12,.0f}{allocator.reservas - reservas:>10}{len(errores):>9}')
+
+
+if __name__ == '__main__':
+    main()
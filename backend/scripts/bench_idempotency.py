@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark: costo de contestar un reintento de POST /api/cluster/replicate-visit
+cuando la visita ya existe, detectándolo por folio (tabla caliente + archivo)
+vs con la llave de idempotencia (LRU en memoria o tabla IDEMPOTENCIA).
+
+Uso:
+    python scripts/bench_idempotency.py [--visitas 100000] [--reintentos 5000]
+"""
+
+import argparse
+import logging
+import random
+from datetime import datetime, timedelta
+
+from bench_common import bench_app, measure, print_comparison
+
+from idempotency import idempotency
+from models import db, Sala, Doctor, Cama, Paciente, TrabajadorSocial, ClaveIdempotencia, VisitaEmergencia
+from routes.cluster_api import cluster_api_bp
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visitas', type=int, default=100000)
+    parser.add_argument('--reintentos', type=int, default=5000)
+    args = parser.parse_args()
+    logging.getLogger('routes.cluster_api').setLevel(logging.ERROR)
+
+    with bench_app() as app:
+        db.session.add(Sala(id_sala=1, numero=1, ip_address='localhost', puerto=5555))
+        db.session.add(Doctor(id_doctor=1, nombre='Dr. 1', especialidad='General', id_sala=1))
+        db.session.add(Cama(id_cama=1, numero=1, id_sala=1))
+        db.session.add(Paciente(id_paciente=1, nombre='Paciente', curp='XEXX010101HNEXXXA4'))
+        db.session.add(TrabajadorSocial(id_trabajador=1, nombre='Trabajador', id_sala=1))
+        inicio = datetime.utcnow() - timedelta(days=1)
+        db.session.execute(VisitaEmergencia.__table__.insert(), [
+            {'folio': f'1+1+1+{i:06d}', 'id_paciente': 1, 'id_doctor': 1, 'id_cama': 1, 'id_trabajador': 1,
+             'id_sala': 1, 'sintomas': 'Benchmark', 'estado': 'activa', 'timestamp': inicio}
+            for i in range(args.visitas)])
+        db.session.execute(ClaveIdempotencia.__table__.insert(), [
+            {'llave': f'replicate-visit:1+1+1+{i:06d}', 'endpoint': 'replicate-visit', 'status': 201,
+             'respuesta': '{"success": true}', 'creado': datetime.utcnow()} for i in range(args.visitas)])
+        db.session.commit()
+        app.register_blueprint(cluster_api_bp)
+        client = app.test_client()
+
+        folios = [f'1+1+1+{random.randrange(args.visitas):06d}' for _ in range(args.reintentos)]
+        con_llave = [{'folio': f, 'idempotency_key': f'replicate-visit:{f}'} for f in folios]
+
+        def correr(cuerpos):
+            pendientes = iter(cuerpos)
+            return measure(lambda: client.post('/api/cluster/replicate-visit', json=next(pendientes)), len(cuerpos))
+
+        resultados = {'por folio (sin llave)': correr([{'folio': f} for f in folios])}
+        idempotency.reset()
+        resultados['llave (tabla, LRU frío)'] = correr(con_llave)
+        resultados['llave (LRU en memoria)'] = correr(con_llave)
+
+        print_comparison(f'Reintentos de replicate-visit ({args.visitas:,} visitas)', resultados)
+        print(f"  {idempotency.metrics()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latencia por página de visitas, OFFSET vs keyset, según la profundidad.
+
+Uso:
+    python scripts/bench_pagination.py [--visitas 1000000] [--limit 50] [--paginas 1 100 1000 10000]
+
+Para cada profundidad (número de página) mide:
+    - OFFSET: get_visitas_resumen-like con ORDER BY ... LIMIT n OFFSET k
+      (SQLite recorre y descarta las k filas anteriores: costo O(k))
+    - keyset: get_visitas_page() con el cursor de la página anterior
+      (búsqueda por rango en el índice: costo constante)
+El cursor de cada profundidad se obtiene una sola vez antes de medir.
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from bench_common import bench_app, measure, print_comparison
+
+from models import db, VISITAS_ORDEN, get_visitas_page, visitas_resumen_query
+from pagination import encode_cursor
+
+LOTE = 50000
+
+
+def seed(n_visitas):
+    """Carga masiva con executemany: 4 salas, 50 doctores, 100 camas, 10k pacientes."""
+    rnd = random.Random(42)
+    conn = db.session.connection()
+    conn.exec_driver_sql('INSERT INTO SALAS (id_sala, numero) VALUES (?, ?)', [(s, s) for s in range(1, 5)])
+    conn.exec_driver_sql('INSERT INTO DOCTORES (id_doctor, nombre, id_sala) VALUES (?, ?, ?)',
+                         [(i, f'Doctor {i}', i % 4 + 1) for i in range(1, 51)])
+    conn.exec_driver_sql('INSERT INTO CAMAS (id_cama, numero, id_sala) VALUES (?, ?, ?)',
+                         [(i, i, i % 4 + 1) for i in range(1, 101)])
+    conn.exec_driver_sql('INSERT INTO PACIENTES (id_paciente, nombre, activo) VALUES (?, ?, 1)',
+                         [(i, f'Paciente {i}') for i in range(1, 10001)])
+    conn.exec_driver_sql("INSERT INTO TRABAJADORES_SOCIALES (id_trabajador, nombre, id_sala) VALUES (1, 'TS', 1)")
+    base = datetime(2020, 1, 1)
+    for inicio in range(1, n_visitas + 1, LOTE):
+        filas = []
+        for i in range(inicio, min(inicio + LOTE, n_visitas + 1)):
+            cama = rnd.randint(1, 100)
+            filas.append((f'B+{i:08d}', rnd.randint(1, 10000), rnd.randint(1, 50), cama, cama % 4 + 1,
+                          'Síntomas', 'activa' if rnd.random() < 0.05 else 'completada',
+                          # mismo formato que guarda el ORM (DateTime de SQLite, con microsegundos)
+                          (base + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S.%f')))
+        conn.exec_driver_sql(
+            'INSERT INTO VISITAS_EMERGENCIA (folio, id_paciente, id_doctor, id_cama, id_trabajador, id_sala, '
+            'sintomas, estado, timestamp) VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)', filas)
+    db.session.commit()
+
+
+def offset_page(pagina, limit):
+    stmt = (visitas_resumen_query()
+            .order_by(*[c.desc() for c in VISITAS_ORDEN])
+            .limit(limit).offset((pagina - 1) * limit))
+    return db.session.execute(stmt).all()
+
+
+def cursor_for(pagina, limit):
+    """Cursor que apunta al inicio de la página dada (None para la primera)"""
+    if pagina == 1:
+        return None
+    stmt = (db.select(*VISITAS_ORDEN)
+            .order_by(*[c.desc() for c in VISITAS_ORDEN])
+            .limit(1).offset((pagina - 1) * limit - 1))
+    return encode_cursor(db.session.execute(stmt).one())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visitas', type=int, default=1000000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--paginas', type=int, nargs='+', default=[1, 100, 1000, 10000])
+    parser.add_argument('--iteraciones', type=int, default=20)
+    args = parser.parse_args()
+
+    with bench_app():
+        seed(args.visitas)
+        for pagina in args.paginas:
+            if (pagina - 1) * args.limit >= args.visitas:
+                continue
+            cursor = cursor_for(pagina, args.limit)
+            assert ([r.id_visita for r in offset_page(pagina, args.limit)] ==
+                    [v.id_visita for v in get_visitas_page(cursor=cursor, limit=args.limit)])
+            print_comparison(f'{args.visitas:,} visitas - página {pagina:,} ({args.limit} filas)', {
+                'OFFSET': measure(lambda: offset_page(pagina, args.limit), args.iteraciones),
+                'keyset': measure(lambda: get_visitas_page(cursor=cursor, limit=args.limit), args.iteraciones),
+            })
+
+
+if __name__ == '__main__':
+    main()
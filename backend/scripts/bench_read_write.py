@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput mixto de lecturas y escrituras con una sola sesión/engine
+vs engines separados (escritura WAL + pool de solo lectura).
+
+Uso:
+    python scripts/bench_read_write.py [--visitas 200000] [--lectores 4] [--segundos 10]
+
+Durante --segundos corren a la vez:
+    - N hilos lectores: métricas del dashboard, una página de visitas y un
+      reporte agregado por sala/estado (recorre el índice completo);
+    - 1 hilo escritor: crea visitas con el ORM, una transacción por visita.
+
+Configuraciones:
+    - compartido: journal por defecto (rollback), lectores y escritor en el
+      engine de Flask-SQLAlchemy (comportamiento anterior);
+    - separado: init_read_engine() (WAL) y lectores dentro de read_session().
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from bench_common import bench_app
+from generate_dataset import Dataset, load
+
+from db_utils import init_read_engine, read_session
+from models import db, VisitaEmergencia, get_metricas_dashboard, get_visitas_page
+
+REPORTE = db.text('SELECT id_sala, estado, count(*) FROM VISITAS_EMERGENCIA GROUP BY id_sala, estado')
+
+
+def leer(app):
+    with app.app_context(), read_session():
+        get_metricas_dashboard()
+        get_visitas_page(limit=50)
+        db.session.execute(REPORTE).all()
+
+
+def escribir(app, n, n_pacientes):
+    with app.app_context():
+        db.session.add(VisitaEmergencia(
+            folio=f'BENCH+{n}', id_paciente=n % n_pacientes + 1, id_doctor=1, id_cama=1, id_trabajador=1,
+            id_sala=1, sintomas='Fiebre', estado='completada'))
+        db.session.commit()
+
+
+def correr(app, lectores, segundos, n_pacientes):
+    """Returns: dict con lecturas/s, escrituras/s, latencias de escritura y errores"""
+    fin = time.perf_counter() + segundos
+    lecturas, latencias, errores = [0] * lectores, [], []
+
+    def lector(i):
+        while time.perf_counter() < fin:
+            try:
+                leer(app)
+                lecturas[i] += 1
+            except Exception as e:  # "database is locked" al chocar con el escritor
+                errores.append(e)
+
+    def escritor():
+        n = 0
+        while time.perf_counter() < fin:
+            n += 1
+            inicio = time.perf_counter()
+            try:
+                escribir(app, n, n_pacientes)
+                latencias.append(time.perf_counter() - inicio)
+            except Exception as e:
+                errores.append(e)
+                with app.app_context():
+                    db.session.rollback()
+
+    hilos = [threading.Thread(target=lector, args=(i,)) for i in range(lectores)]
+    hilos.append(threading.Thread(target=escritor))
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    latencias.sort()
+    return {
+        'lecturas_s': sum(lecturas) / segundos,
+        'escrituras_s': len(latencias) / segundos,
+        'p50_ms': statistics.median(latencias) * 1000 if latencias else float('nan'),
+        'p99_ms': latencias[int(len(latencias) * 0.99)] * 1000 if latencias else float('nan'),
+        'errores': len(errores),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visitas', type=int, default=200000)
+    parser.add_argument('--lectores', type=int, default=4)
+    parser.add_argument('--segundos', type=float, default=10)
+    args = parser.parse_args()
+
+    n_pacientes = max(args.visitas // 4, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, 'base.db')
+        print(f'Generando {args.visitas:,} visitas...')
+        load(base, Dataset(42, 4, 12, 30, 3, n_pacientes, args.visitas, 2, datetime.utcnow()), log=lambda *_: None)
+
+        resultados = {}
+        for nombre in ('compartido', 'separado'):
+            path = os.path.join(tmp, f'{nombre}.db')
+            shutil.copyfile(base, path)
+            with bench_app(path) as app:
+                if nombre == 'separado':
+                    db.engine.dispose()
+                    lectura = init_read_engine(app)
+                resultados[nombre] = correr(app, args.lectores, args.segundos, n_pacientes)
+                if nombre == 'separado':
+                    lectura.dispose()
+
+    print(f'\n{args.lectores} lectores + 1 escritor, {args.segundos:g}s, {args.visitas:,} visitas')
+    print(f"{'':<14}{'lecturas/s':>12}{'escrituras/s':>14}{'escr. p50 ms':>14}{'escr. p99 ms':>14}{'errores':>9}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:<14}{r['lecturas_s']:>12,.1f}{r['escrituras_s']:>14,.1f}"
+              f"{r['p50_ms']:>14.1f}{r['p99_ms']:>14.1f}{r['errores']:>9}")
+
+
+if __name__ == '__main__':
+    main()
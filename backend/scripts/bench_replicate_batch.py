@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: entradas del log por segundo que aplica un seguidor recibiéndolas
+una por una (POST /api/cluster/replication/apply, una transacción cada una)
+vs en lotes (POST /api/cluster/replicate-batch, una transacción por lote).
+
+Uso:
+    python scripts/bench_replicate_batch.py [--entradas 2000] [--lote 100]
+
+Cada entrada crea una visita nueva y ocupa un doctor y una cama, como las
+que publica el líder al crear visitas.
+"""
+
+import argparse
+import logging
+import time
+from datetime import datetime
+
+from bench_common import bench_app, print_comparison
+
+from models import db, Sala, Doctor, Cama, Paciente, TrabajadorSocial, EntradaReplicacion, VisitaEmergencia
+from routes.cluster_api import cluster_api_bp
+
+
+def entrada(seq):
+    recurso = seq % 50 + 1
+    return {'seq': seq, 'tipo': 'visita_creada', 'id_origen': 2, 'id_lider': 2,
+            'timestamp': datetime.utcnow().isoformat(),
+            'datos': {'visitas': [{'folio': f'B+{seq}', 'id_paciente': 1, 'id_doctor': recurso, 'id_cama': recurso,
+                                   'id_trabajador': 1, 'id_sala': 1, 'sintomas': 'Benchmark', 'diagnostico': None,
+                                   'estado': 'activa', 'timestamp': '2024-05-01T08:00:00', 'fecha_cierre': None}],
+                      'doctores': [{'id_doctor': recurso, 'disponible': False, 'activo': True}],
+                      'camas': [{'id_cama': recurso, 'ocupada': True, 'id_paciente': 1}]}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entradas', type=int, default=2000)
+    parser.add_argument('--lote', type=int, default=100)
+    args = parser.parse_args()
+    logging.getLogger('routes.cluster_api').setLevel(logging.ERROR)
+
+    with bench_app() as app:
+        db.session.add(Sala(id_sala=1, numero=1, ip_address='localhost', puerto=5555))
+        db.session.add_all([Doctor(id_doctor=i, nombre=f'Dr. {i}', especialidad='General', id_sala=1)
+                            for i in range(1, 51)])
+        db.session.add_all([Cama(id_cama=i, numero=i, id_sala=1) for i in range(1, 51)])
+        db.session.add(Paciente(id_paciente=1, nombre='Paciente', curp='XEXX010101HNEXXXA4'))
+        db.session.add(TrabajadorSocial(id_trabajador=1, nombre='Trabajador', id_sala=1))
+        db.session.commit()
+        app.register_blueprint(cluster_api_bp)
+        client = app.test_client()
+        entradas = [entrada(seq) for seq in range(1, args.entradas + 1)]
+
+        def limpiar():
+            db.session.query(VisitaEmergencia).delete()
+            db.session.query(EntradaReplicacion).delete()
+            db.session.commit()
+
+        def correr(enviar):
+            limpiar()
+            inicio = time.perf_counter()
+            enviar()
+            total = time.perf_counter() - inicio
+            assert EntradaReplicacion.query.count() == args.entradas
+            return {'total_s': total, 'ops_s': args.entradas / total, 'us_op': total / args.entradas * 1e6}
+
+        def una_por_una():
+            for e in entradas:
+                assert client.post('/api/cluster/replication/apply', json=e).status_code == 200
+
+        def en_lotes():
+            for i in range(0, len(entradas), args.lote):
+                r = client.post('/api/cluster/replicate-batch', json={'entries': entradas[i:i + args.lote]})
+                assert r.status_code == 200 and all(x['success'] for x in r.json['results'])
+
+        resultados = {'una por una': correr(una_por_una), f'lotes de {args.lote}': correr(en_lotes)}
+        print_comparison(f'{args.entradas} entradas aplicadas en un seguidor', resultados)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: visitas por segundo que acepta el líder (POST /api/cluster/create-visit)
+con un nodo lento en el cluster, replicando como antes (POST a todos los
+nodos dentro de visit_creation_lock) vs con las colas de replication.py
+esperando quorum 1 y sin esperar (quorum 0).
+
+Uso:
+    python scripts/bench_replication.py [--visitas 120] [--clientes 8] [--lento-ms 300]
+
+El líder es la app real servida con werkzeug; los 3 nodos destino son
+servidores HTTP falsos (dos responden en ~5 ms y uno en --lento-ms).
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from werkzeug.serving import make_server
+
+from bench_common import bench_app, print_comparison
+
+import models
+from cluster_client import scatter_gather
+from config import Config
+from models import db, Sala, Doctor, Cama, Paciente, TrabajadorSocial
+import replication_log
+from replication import Envio, replicator
+from replication_log import replication_log as log
+from routes.cluster_api import cluster_api_bp
+
+
+def nodo_falso(node_id, demora):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            time.sleep(demora)
+            payload = json.dumps({'success': True}).encode()
+            self.send_response(201)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return (node_id, f'http://127.0.0.1:{server.server_address[1]}')
+
+
+class Lider:
+    """Bully mínimo: este nodo es el líder"""
+
+    def get_current_leader(self):
+        return Config.NODE_ID
+
+
+class ReplicacionSincrona:
+    """Lo que hacía el líder antes: POST a todos los nodos y esperar, con el lock tomado"""
+
+    def __init__(self, nodos):
+        self.nodos = nodos
+
+    def submit(self, bully_manager, path, payload, exclude=(), al_confirmar=None):
+        envio = Envio(0, path, payload, [node_id for node_id, _ in self.nodos])
+        for respuesta in scatter_gather(self.nodos, path, deadline=3, method='POST', json=payload):
+            envio._resolver(respuesta.node_id, respuesta.ok)
+        return envio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visitas', type=int, default=120)
+    parser.add_argument('--clientes', type=int, default=8)
+    parser.add_argument('--lento-ms', type=int, default=300)
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    logging.getLogger('routes.cluster_api').setLevel(logging.ERROR)
+
+    nodos = [nodo_falso(2, 0.005), nodo_falso(3, 0.005), nodo_falso(4, args.lento_ms / 1000)]
+    models.otros_nodos = lambda bully: nodos
+
+    with bench_app() as app:
+        db.session.add(Sala(id_sala=1, numero=1, ip_address='localhost', puerto=5555))
+        db.session.add_all([Doctor(id_doctor=i, nombre=f'Dr. {i}', especialidad='General', id_sala=1)
+                            for i in range(1, args.visitas + 1)])
+        db.session.add_all([Cama(id_cama=i, numero=i, id_sala=1) for i in range(1, args.visitas + 1)])
+        db.session.add(Paciente(id_paciente=1, nombre='Paciente', curp='XEXX010101HNEXXXA4'))
+        db.session.add(TrabajadorSocial(id_trabajador=1, nombre='Trabajador', id_sala=1))
+        db.session.commit()
+        app.register_blueprint(cluster_api_bp)
+        log.start(app, Lider())
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/api/cluster/create-visit'
+
+        def crear(i):
+            r = requests.post(url, json={'id_paciente': 1, 'id_doctor': i, 'id_cama': i, 'id_trabajador': 1,
+                                         'id_sala': 1, 'sintomas': 'Benchmark'}, timeout=30)
+            assert r.status_code == 201, r.text
+
+        def correr(quorum):
+            db.session.execute(db.update(Doctor).values(disponible=True))
+            db.session.execute(db.update(Cama).values(ocupada=False, id_paciente=None))
+            db.session.commit()
+            Config.REPLICATION_QUORUM = quorum
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(args.clientes) as pool:
+                list(pool.map(crear, range(1, args.visitas + 1)))
+            total = time.perf_counter() - inicio
+            return {'total_s': total, 'ops_s': args.visitas / total, 'us_op': total / args.visitas * 1e6}
+
+        resultados = {}
+        replication_log.replicator = ReplicacionSincrona(nodos)
+        resultados['síncrono en el lock'] = correr(quorum=len(nodos))
+        replication_log.replicator = replicator
+        resultados['asíncrono, quorum 1'] = correr(quorum=1)
+        resultados['asíncrono, quorum 0'] = correr(quorum=0)
+
+        print_comparison(f'{args.visitas} visitas, {args.clientes} clientes, un nodo de {args.lento_ms} ms',
+                         resultados)
+        # Lo que quedó en cola para el nodo lento
+        time.sleep(0.1)
+        for m in replicator.metrics():
+            print(f"  nodo {m['node_id']}: acked={m['acked']} queued={m['queued']} "
+                  f"in_flight={m['in_flight']} last_ack_ms={m['last_ack_ms']}")
+        log.stop()
+        replicator.stop()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: get_all_cluster_doctors / get_all_cluster_beds con 3 nodos
+remotos, fan-out HTTP en cada consulta vs caché de recursos.
+
+Uso:
+    python scripts/bench_resource_cache.py [--latencia-ms 5] [--iteraciones 200]
+
+Los nodos remotos son servidores HTTP locales que responden el snapshot de
+su sala (/api/cluster/resources) tras --latencia-ms.
+    - fan-out: fresh=True, consulta a los 3 nodos en paralelo (como antes)
+    - caché:   réplicas vigentes, sólo se lee la sala local de SQLite
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_common import bench_app, measure, print_comparison
+
+import models
+from config import Config
+from models import db, Sala, Doctor, Cama, get_all_cluster_beds, get_all_cluster_doctors
+from resource_cache import resource_cache
+
+DOCTORES_POR_SALA = 12
+CAMAS_POR_SALA = 30
+
+
+def snapshot(node_id):
+    return {
+        'node_id': node_id, 'epoch': f'e{node_id}', 'version': 1,
+        'doctors': [{'id_doctor': node_id * 100 + i, 'nombre': f'Dr. {i}', 'especialidad': 'General',
+                     'disponible': i % 3 != 0, 'activo': True, 'id_sala': node_id}
+                    for i in range(DOCTORES_POR_SALA)],
+        'beds': [{'id_cama': node_id * 100 + i, 'numero': i + 1, 'ocupada': i % 4 == 0, 'id_sala': node_id,
+                  'id_paciente': None, 'paciente_nombre': None} for i in range(CAMAS_POR_SALA)]
+    }
+
+
+def nodo(node_id, latencia):
+    payload = json.dumps(snapshot(node_id)).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latencia)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class Bully:
+    cluster_nodes = {node_id: ('127.0.0.1', 0, 0) for node_id in range(1, 5)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latencia-ms', type=float, default=5)
+    parser.add_argument('--iteraciones', type=int, default=200)
+    args = parser.parse_args()
+    logging.getLogger('cluster_client').setLevel(logging.ERROR)
+
+    urls = {node_id: nodo(node_id, args.latencia_ms / 1000) for node_id in range(2, 5)}
+    models.get_node_flask_url = lambda node_id, host='localhost': urls[node_id]
+    Config.RESOURCE_DIGEST_INTERVAL = 0
+    bully = Bully()
+
+    with bench_app() as app:
+        db.session.add(Sala(id_sala=1, numero=1, ip_address='localhost', puerto=5555))
+        db.session.add_all([Doctor(id_doctor=i + 1, nombre=f'Dr. {i}', especialidad='General', id_sala=1)
+                            for i in range(DOCTORES_POR_SALA)])
+        db.session.add_all([Cama(id_cama=i + 1, numero=i + 1, id_sala=1) for i in range(CAMAS_POR_SALA)])
+        db.session.commit()
+
+        resource_cache.start(app, bully)
+        try:
+            total = len(get_all_cluster_doctors(bully, fresh=True))
+            assert len(get_all_cluster_doctors(bully)) == total == 4 * DOCTORES_POR_SALA
+
+            def consulta(fresh):
+                get_all_cluster_doctors(bully, fresh=fresh)
+                get_all_cluster_beds(bully, ocupada=False, fresh=fresh)
+
+            print_comparison(f'doctores + camas libres, 3 nodos remotos (latencia {args.latencia_ms:g} ms)', {
+                'fan-out (fresh=True)': measure(lambda: consulta(True), args.iteraciones),
+                'caché de recursos': measure(lambda: consulta(False), args.iteraciones),
+            })
+            metricas = resource_cache.metrics()
+            print(f"\nhits={metricas['hits']} misses={metricas['misses']} hit_rate={metricas['hit_rate']}")
+        finally:
+            resource_cache.stop()
+
+
+if __name__ == '__main__':
+    main()
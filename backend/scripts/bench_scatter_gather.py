@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latencia de una consulta a todo el cluster (doctores de 3 nodos
+remotos) con 0, 1 y 3 nodos muertos, secuencial vs scatter-gather.
+
+Uso:
+    python scripts/bench_scatter_gather.py [--latencia-ms 20] [--iteraciones 5]
+
+Los nodos vivos son servidores HTTP locales que responden tras
+--latencia-ms; los muertos aceptan la conexión TCP pero nunca responden
+(nodo colgado o red que descarta paquetes), el peor caso para un timeout.
+    - secuencial:     requests.get(timeout=2) nodo por nodo (implementación anterior)
+    - scatter-gather: cluster_client.scatter_gather(deadline=2) y con un plazo
+                      más corto (0.5 s), que acota la espera por nodos caídos
+"""
+
+import argparse
+import json
+import logging
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from bench_common import measure, print_comparison
+
+from cluster_client import scatter_gather
+
+TIMEOUT = 2.0
+DOCTORES = {'doctors': [{'id_doctor': i, 'nombre': f'Dr. {i}', 'disponible': True} for i in range(12)]}
+
+
+def nodo_vivo(latencia):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latencia)
+            payload = json.dumps(DOCTORES).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def nodo_muerto():
+    """Socket que escucha pero nunca acepta: conecta y luego no llega respuesta"""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(64)
+    nodo_muerto.sockets.append(sock)
+    return f'http://127.0.0.1:{sock.getsockname()[1]}'
+
+
+nodo_muerto.sockets = []
+
+
+def secuencial(nodos):
+    doctores = []
+    for node_id, url in nodos:
+        try:
+            response = requests.get(f'{url}/api/cluster/doctors', timeout=TIMEOUT)
+            if response.ok:
+                doctores.extend(response.json()['doctors'])
+        except requests.exceptions.RequestException:
+            pass
+    return doctores
+
+
+def paralelo(nodos, deadline=TIMEOUT):
+    doctores = []
+    for respuesta in scatter_gather(nodos, '/api/cluster/doctors', deadline=deadline):
+        if respuesta.ok:
+            doctores.extend(respuesta.data['doctors'])
+    return doctores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latencia-ms', type=float, default=20)
+    parser.add_argument('--iteraciones', type=int, default=5)
+    args = parser.parse_args()
+    logging.getLogger('cluster_client').setLevel(logging.ERROR)
+
+    vivos = [nodo_vivo(args.latencia_ms / 1000) for _ in range(3)]
+    muertos = [nodo_muerto() for _ in range(3)]
+
+    for n_muertos in (0, 1, 3):
+        urls = muertos[:n_muertos] + vivos[:3 - n_muertos]
+        nodos = list(enumerate(urls, start=2))
+        assert len(secuencial(nodos)) == len(paralelo(nodos)) == 12 * (3 - n_muertos)
+        print_comparison(f'3 nodos remotos, {n_muertos} muertos (latencia {args.latencia_ms:g} ms)', {
+            'secuencial (timeout=2)': measure(lambda: secuencial(nodos), args.iteraciones),
+            'scatter-gather (plazo 2)': measure(lambda: paralelo(nodos), args.iteraciones),
+            'scatter-gather (plazo 0.5)': measure(lambda: paralelo(nodos, 0.5), args.iteraciones),
+        })
+
+
+if __name__ == '__main__':
+    main()
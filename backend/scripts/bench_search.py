@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latencia de búsqueda de pacientes y visitas, LIKE/escaneo vs FTS5.
+
+Uso:
+    python scripts/bench_search.py [--pacientes 100000] [--visitas 200000]
+
+Compara, para varios textos típicos (nombre parcial, apellido con acento,
+prefijo de CURP, prefijo de folio):
+    - pacientes: Paciente.nombre LIKE '%x%' (escaneo completo) vs buscar_pacientes()
+    - visitas:   cargar y filtrar en Python como la pantalla Textual anterior
+                 vs buscar_visitas()
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from bench_common import bench_app, measure, print_comparison
+
+from migrations import rebuild_search_index
+from models import db, Paciente, get_visitas_resumen
+from search import buscar_pacientes, buscar_visitas
+
+NOMBRES = ['José', 'María', 'Juan', 'Ana', 'Luis', 'Sofía', 'Carlos', 'Lucía', 'Jorge', 'Verónica',
+           'Andrés', 'Mónica', 'Raúl', 'Inés', 'Héctor', 'Begoña', 'Ángel', 'Ramón', 'Óscar', 'Noemí']
+APELLIDOS = ['Hernández', 'García', 'Martínez', 'López', 'González', 'Pérez', 'Rodríguez', 'Sánchez',
+             'Ramírez', 'Cruz', 'Gómez', 'Flores', 'Morales', 'Vázquez', 'Jiménez', 'Reyes', 'Díaz',
+             'Torres', 'Gutiérrez', 'Ruiz', 'Mendoza', 'Aguilar', 'Ortiz', 'Castillo', 'Núñez']
+SINTOMAS = ['Dolor torácico', 'Fiebre alta', 'Dificultad respiratoria', 'Fractura de muñeca',
+            'Cefalea intensa', 'Dolor abdominal', 'Mareo y náuseas', 'Herida cortante']
+
+
+def seed(n_pacientes, n_visitas):
+    rnd = random.Random(42)
+    conn = db.session.connection()
+    conn.exec_driver_sql('INSERT INTO SALAS (id_sala, numero) VALUES (1, 1)')
+    conn.exec_driver_sql('INSERT INTO DOCTORES (id_doctor, nombre, id_sala) VALUES (?, ?, 1)',
+                         [(i, f'Dr. {rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}') for i in range(1, 31)])
+    conn.exec_driver_sql('INSERT INTO CAMAS (id_cama, numero, id_sala) VALUES (?, ?, 1)',
+                         [(i, i) for i in range(1, 51)])
+    conn.exec_driver_sql("INSERT INTO TRABAJADORES_SOCIALES (id_trabajador, nombre, id_sala) VALUES (1, 'TS', 1)")
+    conn.exec_driver_sql(
+        'INSERT INTO PACIENTES (id_paciente, nombre, curp, activo) VALUES (?, ?, ?, 1)',
+        [(i, f'{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}', f'CURP{i:014d}')
+         for i in range(1, n_pacientes + 1)])
+    base = datetime(2024, 1, 1)
+    conn.exec_driver_sql(
+        'INSERT INTO VISITAS_EMERGENCIA (folio, id_paciente, id_doctor, id_cama, id_trabajador, id_sala, '
+        'sintomas, estado, timestamp) VALUES (?, ?, ?, ?, 1, 1, ?, ?, ?)',
+        [(f'{i % 97}+{i % 30 + 1}+1+{i:06d}', rnd.randint(1, n_pacientes), i % 30 + 1, i % 50 + 1,
+          rnd.choice(SINTOMAS), 'completada',
+          (base + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S.%f')) for i in range(1, n_visitas + 1)])
+    # Las filas ya quedaron indexadas por los triggers; rebuild deja el índice compacto
+    rebuild_search_index(conn)
+    db.session.commit()
+
+
+def like_pacientes(texto):
+    return Paciente.query.filter_by(activo=1).filter(Paciente.nombre.like(f'%{texto}%')).limit(50).all()
+
+
+def scan_visitas(texto):
+    texto = texto.lower()
+    return [v for v in (r.to_dict() for r in get_visitas_resumen())
+            if texto in v['folio'].lower() or texto in (v['paciente'] or '').lower()
+            or texto in (v['doctor'] or '').lower()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pacientes', type=int, default=100000)
+    parser.add_argument('--visitas', type=int, default=200000)
+    parser.add_argument('--iteraciones', type=int, default=20)
+    args = parser.parse_args()
+
+    with bench_app():
+        seed(args.pacientes, args.visitas)
+
+        for texto in ['ramon', 'Núñez', 'veronica gut', 'CURP00000001234']:
+            print_comparison(f'{args.pacientes:,} pacientes - "{texto}"', {
+                'LIKE %x%': measure(lambda: like_pacientes(texto), args.iteraciones),
+                'FTS5': measure(lambda: buscar_pacientes(texto), args.iteraciones),
+            })
+
+        for texto in ['12+5', 'toracico']:
+            print_comparison(f'{args.visitas:,} visitas - "{texto}"', {
+                'escaneo en Python': measure(lambda: scan_visitas(texto), 1),
+                'FTS5': measure(lambda: buscar_visitas(texto), args.iteraciones),
+            })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: visitas por segundo que acepta el líder (POST /api/cluster/create-visit)
+con varios clientes a la vez, con un lock global alrededor de toda la
+creación (como antes) vs concurrencia optimista por doctor y cama (columna
+version), y conflictos reales cuando todos compiten por pocos recursos.
+
+Uso:
+    python scripts/bench_visit_concurrency.py [--visitas 400] [--clientes 8] [--recursos 4]
+
+El líder es la app real servida con werkzeug sobre una BD en WAL (como un
+nodo); el lock global se emula envolviendo la vista completa.
+"""
+
+import argparse
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+from bench_common import bench_app, print_comparison
+
+from db_utils import init_read_engine
+from models import db, Sala, Doctor, Cama, Paciente, TrabajadorSocial, VisitaEmergencia
+from routes.cluster_api import cluster_api_bp
+
+VISTA = 'cluster_api.create_visit_distributed'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visitas', type=int, default=400)
+    parser.add_argument('--clientes', type=int, default=8)
+    parser.add_argument('--recursos', type=int, default=4, help='doctores/camas en disputa en la prueba de conflictos')
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    logging.getLogger('routes.cluster_api').setLevel(logging.ERROR)
+
+    with bench_app() as app:
+        init_read_engine(app)
+        db.session.add(Sala(id_sala=1, numero=1, ip_address='localhost', puerto=5555))
+        db.session.add_all([Doctor(id_doctor=i, nombre=f'Dr. {i}', especialidad='General', id_sala=1)
+                            for i in range(1, args.visitas + 1)])
+        db.session.add_all([Cama(id_cama=i, numero=i, id_sala=1) for i in range(1, args.visitas + 1)])
+        db.session.add(Paciente(id_paciente=1, nombre='Paciente', curp='XEXX010101HNEXXXA4'))
+        db.session.add(TrabajadorSocial(id_trabajador=1, nombre='Trabajador', id_sala=1))
+        db.session.commit()
+        app.register_blueprint(cluster_api_bp)
+        optimista = app.view_functions[VISTA]
+        lock = threading.Lock()
+
+        def con_lock():
+            with lock:
+                return optimista()
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/api/cluster/create-visit'
+        sesion = threading.local()
+
+        def crear(par):
+            if not hasattr(sesion, 's'):
+                sesion.s = requests.Session()
+            r = sesion.s.post(url, json={'id_paciente': 1, 'id_doctor': par[0], 'id_cama': par[1],
+                                         'id_trabajador': 1, 'id_sala': 1, 'sintomas': 'Benchmark'}, timeout=30)
+            return r.status_code
+
+        def correr(vista, pares):
+            db.session.execute(db.delete(VisitaEmergencia))
+            db.session.execute(db.update(Doctor).values(disponible=True))
+            db.session.execute(db.update(Cama).values(ocupada=False, id_paciente=None))
+            db.session.commit()
+            app.view_functions[VISTA] = vista
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(args.clientes) as pool:
+                codigos = Counter(pool.map(crear, pares))
+            total = time.perf_counter() - inicio
+            return {'total_s': total, 'ops_s': len(pares) / total, 'us_op': total / len(pares) * 1e6,
+                    'codigos': codigos}
+
+        distintos = [(i, i) for i in range(1, args.visitas + 1)]
+        resultados = {'lock global': correr(con_lock, distintos),
+                      'optimista (version)': correr(optimista, distintos)}
+        print_comparison(f'{args.visitas} visitas con recursos distintos, {args.clientes} clientes', resultados)
+        for nombre, r in resultados.items():
+            print(f"  {nombre}: {dict(r['codigos'])}")
+
+        # Conflictos reales: todos piden entre --recursos doctores/camas ya libres
+        azar = random.Random(7)
+        pares = [(azar.randint(1, args.recursos), azar.randint(1, args.recursos)) for _ in range(args.visitas)]
+        r = correr(optimista, pares)
+        activas = VisitaEmergencia.query.filter_by(estado='activa').all()
+        dobles = (len(activas) - len({v.id_doctor for v in activas})) + (len(activas) - len({v.id_cama for v in activas}))
+        print(f"\n{args.visitas} visitas sobre {args.recursos} doctores/camas: {dict(r['codigos'])}, "
+              f"{r['ops_s']:,.0f} peticiones/s, recursos asignados dos veces: {dobles}")
+
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serialización de listados de visitas.
+
+Uso:
+    python scripts/bench_visitas_resumen.py [--visitas 10000 100000] [--limit 100]
+
+Compara, para el listado completo (pantalla Textual) y para un listado
+limitado (API / consola):
+    - ORM lazy:      VisitaEmergencia.query + to_dict() (1 + 4N queries)
+    - ORM joinedload: with_relaciones(query) + to_dict() (1 query)
+    - proyección:    get_visitas_resumen() + to_dict() (1 query, sin objetos ORM)
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from bench_common import bench_app
+
+from db_utils import count_queries
+from models import db, VisitaEmergencia, get_visitas_resumen, with_relaciones
+
+
+def seed(n_visitas):
+    """Carga masiva con executemany: 4 salas, 50 doctores, 100 camas, n/2 pacientes."""
+    rnd = random.Random(42)
+    conn = db.session.connection()
+    conn.exec_driver_sql('INSERT INTO SALAS (id_sala, numero) VALUES (?, ?)', [(s, s) for s in range(1, 5)])
+    conn.exec_driver_sql('INSERT INTO DOCTORES (id_doctor, nombre, id_sala, disponible, activo) VALUES (?, ?, ?, 1, 1)',
+                         [(i, f'Doctor {i}', i % 4 + 1) for i in range(1, 51)])
+    conn.exec_driver_sql('INSERT INTO CAMAS (id_cama, numero, id_sala, ocupada) VALUES (?, ?, ?, 0)',
+                         [(i, i, i % 4 + 1) for i in range(1, 101)])
+    n_pacientes = max(n_visitas // 2, 1)
+    conn.exec_driver_sql('INSERT INTO PACIENTES (id_paciente, nombre, activo) VALUES (?, ?, 1)',
+                         [(i, f'Paciente {i}') for i in range(1, n_pacientes + 1)])
+    conn.exec_driver_sql("INSERT INTO TRABAJADORES_SOCIALES (id_trabajador, nombre, id_sala) VALUES (1, 'TS', 1)")
+    base = datetime(2025, 1, 1)
+    filas = []
+    for i in range(1, n_visitas + 1):
+        paciente, doctor, cama = rnd.randint(1, n_pacientes), rnd.randint(1, 50), rnd.randint(1, 100)
+        filas.append((f'{paciente}+{doctor}+{cama % 4 + 1}+{i:06d}', paciente, doctor, cama, cama % 4 + 1,
+                      'Síntomas', 'activa' if rnd.random() < 0.1 else 'completada',
+                      base + timedelta(minutes=i)))
+    conn.exec_driver_sql(
+        'INSERT INTO VISITAS_EMERGENCIA (folio, id_paciente, id_doctor, id_cama, id_trabajador, id_sala, '
+        'sintomas, estado, timestamp) VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)', filas)
+    db.session.commit()
+
+
+def run(name, fn, base=None):
+    db.session.expire_all()
+    db.session.expunge_all()
+    with count_queries() as queries:
+        start = time.perf_counter()
+        rows = fn()
+        elapsed = time.perf_counter() - start
+    speedup = f'{base / elapsed:>8.1f}x' if base else f'{"":>9}'
+    print(f'  {name:<18}{len(rows):>9} filas{elapsed * 1000:>11.1f} ms{queries.count:>10} queries{speedup}')
+    return elapsed
+
+
+def bench(limit):
+    orden = VisitaEmergencia.timestamp.desc()
+
+    def lazy():
+        query = VisitaEmergencia.query.order_by(orden)
+        return [v.to_dict() for v in (query.limit(limit) if limit else query)]
+
+    def eager():
+        query = with_relaciones(VisitaEmergencia.query).order_by(orden)
+        return [v.to_dict() for v in (query.limit(limit) if limit else query)]
+
+    def proyeccion():
+        return [v.to_dict() for v in get_visitas_resumen(limit=limit)]
+
+    base = run('ORM lazy', lazy)
+    run('ORM joinedload', eager, base)
+    run('proyección', proyeccion, base)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visitas', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    for n in args.visitas:
+        with bench_app():
+            seed(n)
+            print(f'\n{n:,} visitas - listado completo')
+            bench(None)
+            print(f'{n:,} visitas - últimas {args.limit}')
+            bench(args.limit)
+
+
+if __name__ == '__main__':
+    main()
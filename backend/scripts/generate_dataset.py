@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Generador de datos sintéticos de alto volumen con carga masiva.
+
+Uso:
+    python scripts/generate_dataset.py --force                      # data/emergency_sala1..4.db
+    python scripts/generate_dataset.py --db /tmp/bench.db --visitas 200000
+    python scripts/generate_dataset.py --nodos 1 2 --visitas 2000000 --anios 5 --seed 7 --force
+
+Genera, de forma reproducible a partir de --seed:
+    - salas, doctores con especialidades (distribución realista), camas y
+      trabajadores sociales por sala;
+    - pacientes con nombre, edad, sexo y CURP con formato válido y único;
+    - un historial de visitas de varios años con patrón de llegada diurno
+      (pico a media mañana y al anochecer, mínimo de madrugada), más visitas
+      en fin de semana, pacientes frecuentes, duraciones log-normales y
+      folios/consecutivos consistentes con el formato del sistema;
+    - visitas activas recientes con sus doctores y camas ocupados.
+
+Carga con executemany en transacciones grandes, sin triggers ni índices
+secundarios (migrations.suspend_derived) y los reconstruye al final
+(restore_derived: índices, CONTADORES_SALA y FTS5). Todas las BDs de nodo
+reciben el mismo contenido (la replicación deja en cada nodo todas las
+visitas del cluster), así que se genera una y se copia a las demás.
+
+No crea usuarios: el nodo crea los usuarios por defecto al arrancar.
+"""
+
+import argparse
+import math
+import os
+import shutil
+import sys
+import time
+import unicodedata
+from datetime import datetime, time as hora_cero, timedelta
+from functools import lru_cache
+from random import Random
+
+# Agregar el directorio src al path para importar módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('NODE_ID', '1')
+
+from sqlalchemy import create_engine  # noqa: E402
+
+from config import Config  # noqa: E402
+from migrations import restore_derived, suspend_derived, upgrade_database  # noqa: E402
+
+LOTE = 100000
+
+NOMBRES_H = ['José', 'Juan', 'Luis', 'Carlos', 'Jorge', 'Miguel', 'Alejandro', 'Fernando', 'Ricardo', 'Andrés',
+             'Raúl', 'Héctor', 'Ángel', 'Ramón', 'Óscar', 'Francisco', 'Antonio', 'Eduardo', 'Sergio', 'Diego']
+NOMBRES_M = ['María', 'Guadalupe', 'Ana', 'Sofía', 'Lucía', 'Verónica', 'Mónica', 'Patricia', 'Fernanda',
+             'Gabriela', 'Inés', 'Noemí', 'Rocío', 'Begoña', 'Leticia', 'Daniela', 'Carmen', 'Elena', 'Rosa',
+             'Julia']
+APELLIDOS = ['Hernández', 'García', 'Martínez', 'López', 'González', 'Pérez', 'Rodríguez', 'Sánchez', 'Ramírez',
+             'Cruz', 'Gómez', 'Flores', 'Morales', 'Vázquez', 'Jiménez', 'Reyes', 'Díaz', 'Torres', 'Gutiérrez',
+             'Ruiz', 'Mendoza', 'Aguilar', 'Ortiz', 'Castillo', 'Núñez', 'Romero', 'Chávez', 'Rivera', 'Juárez',
+             'Moreno', 'Domínguez', 'Herrera', 'Medina', 'Castro', 'Vargas', 'Guzmán', 'Velázquez', 'Rojas']
+ENTIDADES = ['AS', 'BC', 'CH', 'CL', 'DF', 'GT', 'GR', 'HG', 'JC', 'MC', 'MN', 'NL', 'OC', 'PL', 'QT', 'SP',
+             'SL', 'SR', 'TC', 'TS', 'VZ', 'YN', 'ZS']
+
+# (especialidad, peso) en una sala de urgencias
+ESPECIALIDADES = [('Medicina General', 35), ('Medicina de Urgencias', 20), ('Traumatología', 15),
+                  ('Pediatría', 12), ('Cardiología', 10), ('Neurología', 8)]
+
+# (síntomas, peso, diagnósticos posibles)
+MOTIVOS = [
+    ('Dolor torácico opresivo', 8, ['Angina inestable', 'Infarto agudo de miocardio', 'Dolor osteomuscular']),
+    ('Fiebre alta y malestar general', 14, ['Infección de vías respiratorias', 'Influenza', 'Infección urinaria']),
+    ('Dificultad respiratoria', 9, ['Crisis asmática', 'Neumonía', 'EPOC exacerbado']),
+    ('Dolor abdominal agudo', 13, ['Apendicitis aguda', 'Gastroenteritis', 'Colecistitis']),
+    ('Traumatismo en extremidad tras caída', 12, ['Fractura de radio', 'Esguince de tobillo', 'Contusión']),
+    ('Herida cortante', 8, ['Herida suturada', 'Laceración superficial']),
+    ('Cefalea intensa', 7, ['Migraña', 'Crisis hipertensiva', 'Cefalea tensional']),
+    ('Mareo y náuseas', 7, ['Vértigo periférico', 'Deshidratación', 'Hipoglucemia']),
+    ('Reacción alérgica con ronchas', 4, ['Urticaria aguda', 'Reacción alérgica medicamentosa']),
+    ('Fiebre en lactante', 6, ['Otitis media', 'Infección viral', 'Faringoamigdalitis']),
+    ('Pérdida súbita de fuerza en un lado del cuerpo', 2,
+     ['Evento vascular cerebral', 'Ataque isquémico transitorio']),
+    ('Crisis convulsiva', 2, ['Epilepsia descompensada', 'Crisis febril']),
+    ('Accidente de tránsito', 5, ['Politraumatismo leve', 'Latigazo cervical', 'Fractura costal']),
+    ('Intoxicación alimentaria', 3, ['Gastroenteritis aguda', 'Intoxicación alimentaria']),
+]
+
+# Llegadas relativas por hora del día (0-23): mínimo de madrugada, picos 11h y 20h
+LLEGADAS_POR_HORA = [3, 2, 2, 1, 1, 1, 2, 4, 6, 8, 9, 10, 9, 8, 8, 8, 8, 9, 10, 10, 10, 8, 6, 4]
+
+_HORA = 3600 * 10 ** 6  # microsegundos
+
+# Fracción de pacientes "frecuentes" y de visitas que concentran
+FRECUENTES, VISITAS_DE_FRECUENTES = 0.2, 0.5
+
+
+@lru_cache(maxsize=None)
+def sin_acentos(texto):
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c)).upper()
+
+
+@lru_cache(maxsize=None)
+def _consonante_interna(palabra):
+    return next((c for c in palabra[1:] if c.isalpha() and c not in 'AEIOU'), 'X')
+
+
+def curp(nombre, ap1, ap2, nacimiento, sexo, entidad, usados):
+    """CURP con formato válido (18 caracteres); varía la homoclave hasta que sea única."""
+    n, a1, a2 = sin_acentos(nombre), sin_acentos(ap1), sin_acentos(ap2)
+    vocal = next((c for c in a1[1:] if c in 'AEIOU'), 'X')
+    base = (f'{a1[0]}{vocal}{a2[0]}{n[0]}{nacimiento:%y%m%d}{"H" if sexo == "M" else "M"}{entidad}'
+            f'{_consonante_interna(a1)}{_consonante_interna(a2)}{_consonante_interna(n)}')
+    digitos = '0123456789' if nacimiento.year < 2000 else 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    for diferenciador in digitos:
+        for verificador in '0123456789':
+            valor = f'{base}{diferenciador}{verificador}'
+            if valor not in usados:
+                usados.add(valor)
+                return valor
+    return None
+
+
+# ============================================================================
+# GENERACIÓN
+# ============================================================================
+
+class Dataset:
+    """Filas (tuplas) de cada tabla, generadas en orden y de forma reproducible."""
+
+    def __init__(self, seed, salas, doctores, camas, trabajadores, pacientes, visitas, anios, hasta):
+        self.rnd = Random(seed)
+        self.n_salas = salas
+        self.n_doctores = doctores
+        self.n_camas = camas
+        self.n_trabajadores = trabajadores
+        self.n_pacientes = pacientes
+        self.n_visitas = visitas
+        self.anios = anios
+        self.hasta = hasta
+
+    def salas(self):
+        return [(s, s, 'localhost', 5554 + s, s == 1, True) for s in range(1, self.n_salas + 1)]
+
+    def doctores(self):
+        rnd, filas = self.rnd, []
+        especialidades, pesos = zip(*ESPECIALIDADES)
+        for sala in range(1, self.n_salas + 1):
+            for _ in range(self.n_doctores):
+                sexo = rnd.choice('MF')
+                nombre = rnd.choice(NOMBRES_H if sexo == 'M' else NOMBRES_M)
+                titulo = 'Dr.' if sexo == 'M' else 'Dra.'
+                filas.append((len(filas) + 1, f'{titulo} {nombre} {rnd.choice(APELLIDOS)}',
+                              rnd.choices(especialidades, pesos)[0], sala, True, True))
+        return filas
+
+    def camas(self):
+        return [((sala - 1) * self.n_camas + i, i, sala, False, None)
+                for sala in range(1, self.n_salas + 1) for i in range(1, self.n_camas + 1)]
+
+    def trabajadores(self):
+        rnd, filas = self.rnd, []
+        for sala in range(1, self.n_salas + 1):
+            for _ in range(self.n_trabajadores):
+                nombre = rnd.choice(NOMBRES_H + NOMBRES_M)
+                filas.append((len(filas) + 1, f'{nombre} {rnd.choice(APELLIDOS)}', sala, True))
+        return filas
+
+    def pacientes(self):
+        rnd, usados, filas = self.rnd, set(), []
+        hoy = self.hasta.date()
+        for i in range(1, self.n_pacientes + 1):
+            sexo = rnd.choice('MF')
+            nombre = rnd.choice(NOMBRES_H if sexo == 'M' else NOMBRES_M)
+            ap1, ap2 = rnd.choice(APELLIDOS), rnd.choice(APELLIDOS)
+            # Edad: niños y adultos mayores sobrerrepresentados en urgencias
+            edad = min(int(rnd.choice((rnd.expovariate(1 / 6), rnd.gauss(42, 16), rnd.gauss(72, 9)))), 99)
+            edad = max(edad, 0)
+            nacimiento = hoy - timedelta(days=edad * 365 + rnd.randrange(365))
+            telefono = f'55{rnd.randrange(10 ** 8):08d}'
+            contacto = (f'{rnd.choice(NOMBRES_H + NOMBRES_M)} {ap1} - 55{rnd.randrange(10 ** 8):08d}'
+                        if rnd.random() < 0.7 else None)
+            filas.append((i, f'{nombre} {ap1} {ap2}', edad, sexo,
+                          curp(nombre, ap1, ap2, nacimiento, sexo, rnd.choice(ENTIDADES), usados),
+                          telefono, contacto, 1))
+        return filas
+
+    def _llegadas(self):
+        """
+        Llegadas ordenadas en microsegundos desde la medianoche del primer día
+        del periodo (el último día es el de `hasta`).
+
+        Returns:
+            tuple: (inicio, llegadas)
+        """
+        rnd = self.rnd
+        dias = self.anios * 365
+        inicio = datetime.combine(self.hasta.date(), hora_cero()) - timedelta(days=dias - 1)
+        # Fin de semana +15% y ligera tendencia creciente a lo largo de los años
+        pesos_dia = [(1.15 if (inicio + timedelta(days=d)).weekday() >= 5 else 1.0) * (0.8 + 0.4 * d / dias)
+                     for d in range(dias)]
+        n = self.n_visitas
+        dia = rnd.choices(range(dias), pesos_dia, k=n)
+        hora = rnd.choices(range(24), LLEGADAS_POR_HORA, k=n)
+        rand = rnd.random
+        # Las llegadas de hoy se reparten hasta `hasta` para no quedar en el futuro
+        hoy = (dias - 1) * 24 * _HORA
+        transcurrido = int((self.hasta - inicio).total_seconds() * 10 ** 6) - hoy
+        llegadas = sorted(hoy + int(rand() * transcurrido) if d == dias - 1
+                          else (d * 24 + h) * _HORA + int(rand() * _HORA) for d, h in zip(dia, hora))
+        return inicio, llegadas
+
+    def visitas(self, doctores, camas, trabajadores):
+        """
+        Filas de VISITAS_EMERGENCIA en orden cronológico (id_visita crece con el
+        tiempo) y los consecutivos finales por (sala, día).
+
+        Returns:
+            tuple: (visitas, consecutivos)
+        """
+        rnd = self.rnd
+        inicio, llegadas = self._llegadas()
+        por_sala = {s: ([d[0] for d in doctores if d[3] == s], [c[0] for c in camas if c[2] == s],
+                        [t[0] for t in trabajadores if t[2] == s]) for s in range(1, self.n_salas + 1)}
+        sintomas, pesos, diagnosticos = zip(*MOTIVOS)
+        motivos = rnd.choices(range(len(MOTIVOS)), pesos, k=len(llegadas))
+        salas = [int(rnd.random() * self.n_salas) + 1 for _ in llegadas]
+        frecuentes = max(int(self.n_pacientes * FRECUENTES), 1)
+
+        # rnd.random() con índices en lugar de choice()/randrange(): este ciclo
+        # corre una vez por visita y domina el tiempo de generación
+        rand, gauss = rnd.random, rnd.gauss
+        n_pacientes, duracion_media = self.n_pacientes, math.log(3 * 3600)
+        # Formato DATETIME del ORM armado con tablas de días y de segundos del
+        # día, sin aritmética de datetime por fila
+        fechas = [f'{inicio + timedelta(days=d):%Y-%m-%d}' for d in range(self.anios * 365 + 60)]
+        reloj = [f'{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}' for s in range(86400)]
+
+        def texto(us):
+            s, us = divmod(us, 10 ** 6)
+            dia, s = divmod(s, 86400)
+            return f'{fechas[dia]} {reloj[s]}.{us:06d}'
+
+        consecutivos, folios, filas = {}, set(), []
+        for i, (llegada, sala, motivo) in enumerate(zip(llegadas, salas, motivos), 1):
+            docs, cams, trabs = por_sala[sala]
+            if rand() < VISITAS_DE_FRECUENTES:
+                paciente = int(rand() * frecuentes) + 1
+            else:
+                paciente = int(rand() * n_pacientes) + 1
+            doctor = docs[int(rand() * len(docs))]
+            ts = texto(llegada)
+
+            # Consecutivo del día; se salta un número si el folio ya existe
+            # (mismo paciente+doctor+sala con el mismo consecutivo en otro día)
+            dia = (sala, fechas[llegada // (24 * _HORA)])
+            numero = consecutivos.get(dia, 0) + 1
+            folio = f'{paciente}+{doctor}+{sala}+{numero:03d}'
+            while folio in folios:
+                numero += 1
+                folio = f'{paciente}+{doctor}+{sala}+{numero:03d}'
+            folios.add(folio)
+            consecutivos[dia] = numero
+
+            if rand() < 0.04:
+                estado, diagnostico = 'cancelada', None
+            else:
+                opciones = diagnosticos[motivo]
+                estado, diagnostico = 'completada', opciones[int(rand() * len(opciones))]
+            cierre = llegada + int(math.exp(gauss(duracion_media, 0.6)) * 10 ** 6)
+            filas.append((i, folio, paciente, doctor, cams[int(rand() * len(cams))], trabs[int(rand() * len(trabs))],
+                          sala, sintomas[motivo], diagnostico, estado, ts, texto(cierre)))
+
+        self._activar_recientes(filas, por_sala)
+        return filas, [(sala, dia, numero) for (sala, dia), numero in sorted(consecutivos.items())]
+
+    def _activar_recientes(self, filas, por_sala):
+        """
+        Las visitas más recientes de cada sala (una por doctor, hasta ~60% de
+        las camas) quedan activas, cada una en una cama distinta.
+        """
+        for sala, (docs, cams, _) in por_sala.items():
+            cupo = min(int(len(cams) * 0.6), len(docs))
+            camas_libres = list(cams)
+            self.rnd.shuffle(camas_libres)
+            ocupados = set()
+            for j in range(len(filas) - 1, -1, -1):
+                if len(ocupados) == cupo:
+                    break
+                fila = filas[j]
+                # El doctor forma parte del folio: se conserva y se omiten sus visitas anteriores
+                if fila[6] != sala or fila[3] in ocupados:
+                    continue
+                ocupados.add(fila[3])
+                filas[j] = fila[:4] + (camas_libres.pop(),) + fila[5:8] + (None, 'activa', fila[10], None)
+
+
+# ============================================================================
+# CARGA
+# ============================================================================
+
+def _insert(conn, tabla, columnas, filas):
+    sql = f'INSERT INTO {tabla} ({", ".join(columnas)}) VALUES ({", ".join("?" * len(columnas))})'
+    for i in range(0, len(filas), LOTE):
+        conn.exec_driver_sql(sql, filas[i:i + LOTE])
+
+
+def load(path, dataset, log=print):
+    """Crea el esquema en `path` (debe no existir) y carga el dataset. Returns: dict de conteos"""
+    t0 = time.perf_counter()
+    salas, doctores, camas = dataset.salas(), dataset.doctores(), dataset.camas()
+    trabajadores, pacientes = dataset.trabajadores(), dataset.pacientes()
+    visitas, consecutivos = dataset.visitas(doctores, camas, trabajadores)
+    t1 = time.perf_counter()
+    log(f'  generación: {t1 - t0:.1f}s')
+
+    upgrade_database(path)
+    engine = create_engine(f'sqlite:///{os.path.abspath(path)}')
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql('PRAGMA journal_mode = MEMORY')
+            conn.exec_driver_sql('PRAGMA synchronous = OFF')
+            conn.exec_driver_sql('PRAGMA cache_size = -262144')  # 256 MB
+            conn.commit()
+
+            with conn.begin():
+                suspend_derived(conn)
+                _insert(conn, 'SALAS', ('id_sala', 'numero', 'ip_address', 'puerto', 'es_maestro', 'activa'), salas)
+                _insert(conn, 'DOCTORES', ('id_doctor', 'nombre', 'especialidad', 'id_sala', 'disponible', 'activo'),
+                        doctores)
+                _insert(conn, 'CAMAS', ('id_cama', 'numero', 'id_sala', 'ocupada', 'id_paciente'), camas)
+                _insert(conn, 'TRABAJADORES_SOCIALES', ('id_trabajador', 'nombre', 'id_sala', 'activo'), trabajadores)
+                _insert(conn, 'PACIENTES', ('id_paciente', 'nombre', 'edad', 'sexo', 'curp', 'telefono',
+                                            'contacto_emergencia', 'activo'), pacientes)
+                _insert(conn, 'VISITAS_EMERGENCIA', ('id_visita', 'folio', 'id_paciente', 'id_doctor', 'id_cama',
+                                                     'id_trabajador', 'id_sala', 'sintomas', 'diagnostico',
+                                                     'estado', 'timestamp', 'fecha_cierre'), visitas)
+                _insert(conn, 'CONSECUTIVOS', ('id_sala', 'fecha', 'consecutivo'), consecutivos)
+
+                # Recursos ocupados por las visitas activas
+                activas = [(v[2], v[4]) for v in visitas if v[9] == 'activa']
+                conn.exec_driver_sql('UPDATE DOCTORES SET disponible = 0 WHERE id_doctor = ?',
+                                     [(v[3],) for v in visitas if v[9] == 'activa'])
+                conn.exec_driver_sql('UPDATE CAMAS SET ocupada = 1, id_paciente = ? WHERE id_cama = ?', activas)
+                t2 = time.perf_counter()
+                log(f'  inserción: {t2 - t1:.1f}s')
+
+                restore_derived(conn)
+            conn.exec_driver_sql('ANALYZE')
+            conn.exec_driver_sql('PRAGMA journal_mode = DELETE')
+            conn.commit()
+            log(f'  índices, contadores y FTS: {time.perf_counter() - t2:.1f}s')
+    finally:
+        engine.dispose()
+
+    return {'salas': len(salas), 'doctores': len(doctores), 'camas': len(camas), 'trabajadores': len(trabajadores),
+            'pacientes': len(pacientes), 'visitas': len(visitas), 'activas': len(activas)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    destino = parser.add_mutually_exclusive_group()
+    destino.add_argument('--db', nargs='+', help='archivos .db destino')
+    destino.add_argument('--nodos', type=int, nargs='+', default=[1, 2, 3, 4],
+                         help='nodos destino: data/emergency_salaN.db (default: 1 2 3 4)')
+    parser.add_argument('--visitas', type=int, default=1000000)
+    parser.add_argument('--pacientes', type=int, help='default: visitas / 4')
+    parser.add_argument('--anios', type=int, default=3, help='años de historial')
+    parser.add_argument('--salas', type=int, default=4)
+    parser.add_argument('--doctores-por-sala', type=int, default=12)
+    parser.add_argument('--camas-por-sala', type=int, default=30)
+    parser.add_argument('--trabajadores-por-sala', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--hasta', help='fecha/hora UTC final del historial (ISO; default: ahora)')
+    parser.add_argument('--force', action='store_true', help='reemplazar archivos existentes')
+    args = parser.parse_args(argv)
+
+    paths = args.db or [os.path.join(Config._DATA_DIR, f'emergency_sala{n}.db') for n in args.nodos]
+    existentes = [p for p in paths if os.path.exists(p)]
+    if existentes and not args.force:
+        parser.error(f'ya existen {", ".join(existentes)} (usar --force para reemplazarlos)')
+    for path in existentes:
+        for sufijo in ('', '-journal', '-wal', '-shm'):
+            if os.path.exists(path + sufijo):
+                os.remove(path + sufijo)
+
+    hasta = datetime.fromisoformat(args.hasta) if args.hasta else datetime.utcnow()
+    dataset = Dataset(args.seed, args.salas, args.doctores_por_sala, args.camas_por_sala,
+                      args.trabajadores_por_sala, args.pacientes or max(args.visitas // 4, 1),
+                      args.visitas, args.anios, hasta)
+
+    inicio = time.perf_counter()
+    print(f'{paths[0]}')
+    conteos = load(paths[0], dataset)
+    for path in paths[1:]:
+        shutil.copyfile(paths[0], path)
+        print(f'{path} (copia)')
+
+    print(', '.join(f'{v:,} {k}' for k, v in conteos.items()))
+    print(f'Total: {time.perf_counter() - inicio:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,6 +16,7 @@ os.environ['NODE_ID'] = '1'
 
 from app import app, db
 from models import Sala, Doctor, TrabajadorSocial, Paciente, Cama, VisitaEmergencia, Consecutivo, Usuario
+from migrations import run_migrations
 import random
 
 def init_test_database():
@@ -25,6 +26,7 @@ def init_test_database():
         # Crear todas las tablas
         print("Creando tablas...")
         db.create_all()
+        run_migrations(db.engine)
 
         # Limpiar datos existentes
         print("Limpiando datos existentes...")
@@ -0,0 +1,283 @@
+"""
+Cola de admisión del líder para POST /api/cluster/create-visit (group commit).
+
+En una llegada masiva de pacientes muchos followers reenvían create-visit al
+líder a la vez; cada petición hacía su propio commit y su propia entrada del
+log de replicación (un mensaje por visita a cada nodo). Ahora:
+
+    - Las peticiones se juntan en lotes. La primera de un lote es su "líder":
+      espera a que termine el lote anterior (mientras tanto se suman las que
+      llegan) y, si ADMISSION_BATCH_WINDOW > 0, hasta esos segundos más o a
+      que el lote llegue a ADMISSION_BATCH_SIZE.
+    - El líder del lote precarga doctores, camas, pacientes y trabajadores
+      de todas las peticiones, las valida en orden de llegada (si dos piden
+      el mismo doctor o cama gana la primera y la otra recibe 409) y crea
+      todas las visitas en una sola transacción: un flush, un commit.
+    - Ese flush produce UNA entrada del log de replicación con todas las
+      visitas y recursos del lote (ver replication_log._capturar): el lote
+      viaja a cada nodo como un solo mensaje.
+    - Cada petición recibe su propio resultado (folio, 404 o 409) y espera
+      por su cuenta el quorum de replicación del lote.
+    - Si el lote choca con otro escritor (columna version de doctores y
+      camas, ver models.py) se deshace y sus peticiones se procesan una por
+      una, cada una en su transacción; también las que habían perdido un
+      recurso frente a otra petición del mismo lote, que ya no lo tiene.
+
+Con poca carga cada petición es un lote de uno y no espera nada (con la
+ventana en 0); ADMISSION_BATCH_SIZE <= 1 desactiva la cola.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from config import Config
+from idempotency import idempotency, respuesta_repetida
+from models import db, Cama, Doctor, Paciente, TrabajadorSocial, VisitaEmergencia
+from replication_log import envio_del_commit, fila_visita
+
+logger = logging.getLogger(__name__)
+
+
+class Pedido:
+    """
+    Una petición de create-visit en la cola.
+
+    Attributes:
+        data: JSON de la petición (ids ya convertidos a int)
+        llave: llave de idempotencia o None
+        status, respuesta: resultado (código HTTP y JSON) cuando `listo` está puesto
+        envio: Envio de replicación de su lote (None si no creó visita)
+    """
+
+    __slots__ = ('data', 'llave', 'status', 'respuesta', 'envio', 'listo')
+
+    def __init__(self, data, llave=None):
+        self.data = data
+        self.llave = llave
+        self.status = None
+        self.respuesta = None
+        self.envio = None
+        self.listo = threading.Event()
+
+    def resolver(self, status, respuesta, envio=None):
+        self.status, self.respuesta, self.envio = status, respuesta, envio
+        self.listo.set()
+
+
+class _Lote:
+    __slots__ = ('pedidos', 'creado')
+
+    def __init__(self):
+        self.pedidos = []
+        self.creado = time.monotonic()
+
+
+def _error(status, mensaje):
+    return status, {'success': False, 'error': mensaje}
+
+
+class AdmissionQueue:
+    """Lotes de create-visit en el líder: validación, asignación y commit por lote"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._abierto = None  # lote que todavía acepta peticiones
+        self._turno = threading.Lock()  # un lote escribiendo a la vez
+        self._contadores = {'batches': 0, 'requests': 0, 'created': 0, 'max_batch': 0, 'fallbacks': 0}
+
+    def crear(self, data, llave=None):
+        """
+        Crea una visita (requiere contexto de app); bloquea hasta tener el resultado.
+
+        Returns:
+            Pedido: con status, respuesta y envio
+        """
+        pedido = Pedido(data, llave)
+        if Config.ADMISSION_BATCH_SIZE <= 1:
+            self._procesar([pedido])
+            return pedido
+
+        with self._cond:
+            lote = self._abierto
+            lider = lote is None
+            if lider:
+                lote = self._abierto = _Lote()
+            lote.pedidos.append(pedido)
+            if len(lote.pedidos) >= Config.ADMISSION_BATCH_SIZE:
+                self._abierto = None  # lleno: la siguiente abre otro
+                self._cond.notify_all()
+        if not lider:
+            pedido.listo.wait()
+            return pedido
+
+        with self._turno:
+            with self._cond:
+                if Config.ADMISSION_BATCH_WINDOW > 0:
+                    limite = lote.creado + Config.ADMISSION_BATCH_WINDOW
+                    self._cond.wait_for(lambda: len(lote.pedidos) >= Config.ADMISSION_BATCH_SIZE,
+                                        timeout=max(0.0, limite - time.monotonic()))
+                if self._abierto is lote:
+                    self._abierto = None
+            self._procesar(lote.pedidos)
+        return pedido
+
+    # ------------------------------------------------------------------------
+
+    def _procesar(self, pedidos):
+        """Cuenta el lote y resuelve todos sus pedidos"""
+        with self._cond:
+            self._contadores['batches'] += 1
+            self._contadores['requests'] += len(pedidos)
+            self._contadores['max_batch'] = max(self._contadores['max_batch'], len(pedidos))
+        self._resolver(pedidos)
+
+    def _resolver(self, pedidos):
+        """Resuelve los pedidos sin contarlos (un lote de varios se reintenta uno por uno si choca)"""
+        try:
+            self._en_una_transaccion(pedidos)
+        except (StaleDataError, IntegrityError) as e:
+            db.session.rollback()
+            if len(pedidos) > 1:
+                logger.info(f'Batch of {len(pedidos)} visits hit a concurrent writer ({type(e).__name__}), '
+                            f'retrying one by one')
+                with self._cond:
+                    self._contadores['fallbacks'] += 1
+                # Los que ya tienen respuesta (404, o 409 por el estado ya guardado) no
+                # dependen de este lote; los 409 por otro pedido del lote se repiten
+                for pedido in [p for p in pedidos if not p.listo.is_set()]:
+                    self._resolver([pedido])
+                return
+            pedido = pedidos[0]
+            # Un reintento con la misma llave que terminó mientras éste se procesaba
+            previa = idempotency.buscar(pedido.llave)
+            if previa is not None:
+                pedido.resolver(*respuesta_repetida(previa))
+            elif isinstance(e, StaleDataError):
+                logger.info(f"Doctor {pedido.data['id_doctor']} or bed {pedido.data['id_cama']} "
+                            f"taken by a concurrent visit")
+                pedido.resolver(*_error(409, 'Doctor or bed was just assigned to another visit'))
+            else:
+                logger.error(f'Error creating visit: {e}')
+                pedido.resolver(*_error(500, str(e)))
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f'Error creating visits ({len(pedidos)} in batch): {e}', exc_info=True)
+            for pedido in pedidos:
+                if not pedido.listo.is_set():
+                    pedido.resolver(*_error(500, str(e)))
+        finally:
+            # Nadie se queda esperando aunque algo falle antes de resolverlo
+            for pedido in pedidos:
+                if not pedido.listo.is_set():
+                    pedido.resolver(*_error(500, 'Visit was not processed'))
+
+    def _en_una_transaccion(self, pedidos):
+        def ids(campo):
+            return {p.data[campo] for p in pedidos}
+
+        doctores = {d.id_doctor: d for d in Doctor.query.filter(Doctor.id_doctor.in_(ids('id_doctor')))}
+        camas = {c.id_cama: c for c in Cama.query.filter(Cama.id_cama.in_(ids('id_cama')))}
+        pacientes = set(db.session.scalars(
+            db.select(Paciente.id_paciente).where(Paciente.id_paciente.in_(ids('id_paciente')))))
+        trabajadores = set(db.session.scalars(
+            db.select(TrabajadorSocial.id_trabajador).where(TrabajadorSocial.id_trabajador.in_(ids('id_trabajador')))))
+
+        creadas = []
+        por_llave = {}  # llave -> pedido del lote que ya la usó
+        # 409 por un doctor o una cama que ocupó otro pedido de ESTE lote: se
+        # contestan hasta el commit (si el lote se deshace, ese recurso sigue libre)
+        diferidos = []
+        doctores_del_lote, camas_del_lote = set(), set()
+        for pedido in pedidos:
+            data = pedido.data
+            previa = idempotency.buscar(pedido.llave)
+            if previa is not None:
+                pedido.resolver(*respuesta_repetida(previa))
+                continue
+            if pedido.llave is not None and pedido.llave in por_llave:
+                continue  # se resuelve con el resultado del primero, abajo
+
+            doctor, cama = doctores.get(data['id_doctor']), camas.get(data['id_cama'])
+            if not doctor:
+                resultado = _error(404, f"Doctor {data['id_doctor']} not found")
+            elif not doctor.disponible:
+                resultado = _error(409, f'Doctor {doctor.nombre} is not available')
+            elif not cama:
+                resultado = _error(404, f"Bed {data['id_cama']} not found")
+            elif cama.ocupada:
+                resultado = _error(409, f'Bed {cama.numero} is occupied')
+            elif data['id_paciente'] not in pacientes:
+                resultado = _error(404, f"Patient {data['id_paciente']} not found")
+            elif data['id_trabajador'] not in trabajadores:
+                resultado = _error(404, f"Social worker {data['id_trabajador']} not found")
+            else:
+                resultado = None
+            if resultado is not None:
+                if resultado[0] == 409 and (data['id_doctor'] in doctores_del_lote
+                                            or data['id_cama'] in camas_del_lote):
+                    diferidos.append((pedido, resultado))
+                else:
+                    pedido.resolver(*resultado)
+                continue
+
+            # Folio generado por el evento before_insert; recursos ocupados
+            # con UPDATE ... WHERE version = <leída> (ver models.py)
+            visita = VisitaEmergencia(id_paciente=data['id_paciente'], id_doctor=data['id_doctor'],
+                                      id_cama=data['id_cama'], id_trabajador=data['id_trabajador'],
+                                      id_sala=data['id_sala'], sintomas=data['sintomas'], estado='activa',
+                                      timestamp=datetime.utcnow())
+            doctor.disponible = False
+            cama.ocupada = True
+            cama.id_paciente = data['id_paciente']
+            db.session.add(visita)
+            creadas.append((pedido, visita))
+            doctores_del_lote.add(doctor.id_doctor)
+            camas_del_lote.add(cama.id_cama)
+            if pedido.llave is not None:
+                por_llave[pedido.llave] = pedido
+
+        if not creadas:
+            db.session.rollback()
+            return
+
+        # Un solo flush: una entrada del log de replicación para todo el lote
+        db.session.flush()
+        respuestas = []
+        for pedido, visita in creadas:
+            visita_data = fila_visita(visita)
+            respuesta = {'success': True, 'folio': visita_data['folio'], 'visita': visita_data, 'replication': None}
+            idempotency.guardar(pedido.llave, 'create-visit', 201, respuesta)
+            respuestas.append((pedido, respuesta))
+        db.session.commit()
+        envio = envio_del_commit(db.session)
+        if envio is None:
+            logger.warning('Replication log not active, visits not replicated')
+        logger.info(f'{len(creadas)} visits created in leader in one commit')
+
+        with self._cond:
+            self._contadores['created'] += len(creadas)
+        for pedido, respuesta in respuestas:
+            pedido.resolver(201, respuesta, envio)
+        for pedido, resultado in diferidos:
+            pedido.resolver(*resultado)
+        for pedido in pedidos:
+            if not pedido.listo.is_set():
+                primero = por_llave[pedido.llave]
+                pedido.resolver(*respuesta_repetida((primero.status, primero.respuesta)), envio)
+
+    def metrics(self):
+        with self._cond:
+            metricas = dict(self._contadores)
+        metricas['avg_batch'] = round(metricas['requests'] / metricas['batches'], 2) if metricas['batches'] else 0
+        return {'batch_size': Config.ADMISSION_BATCH_SIZE, 'window_s': Config.ADMISSION_BATCH_WINDOW, **metricas}
+
+    def reset(self):
+        with self._cond:
+            self._contadores = dict.fromkeys(self._contadores, 0)
+
+
+admission = AdmissionQueue()
@@ -0,0 +1,473 @@
+"""
+Anti-entropía de VISITAS_EMERGENCIA, DOCTORES y CAMAS con árboles de Merkle.
+
+El log de replicación (replication_log.py) mantiene a los seguidores al día
+mientras las entradas lleguen, pero no detecta lo que quedó distinto por
+otros caminos: un cierre local que nunca llegó al líder (el proceso terminó
+con el cambio en memoria), escrituras fuera del ORM o una BD restaurada.
+Comparar las tablas completas por HTTP cuesta lo mismo que copiarlas, así
+que cada nodo mantiene un árbol de Merkle por tabla:
+
+    - Cada fila (visitas por folio, doctores y camas por id) tiene un digest
+      de sus columnas replicadas (las mismas de replication_log.fila_*), y
+      cae en una de HOJAS cubetas según el hash de su llave.
+    - Hoja = hash de los digests de su cubeta; cada nodo interno = hash de
+      sus FANOUT hijos; dos niveles hasta la raíz.
+    - El árbol se construye completo la primera vez que se pide y después
+      sólo se recalculan las filas que tocaron los commits (hooks de la
+      sesión de SQLAlchemy).
+    - Las visitas que el archivo puede mover al histórico (cerradas antes
+      del corte de ARCHIVE_AFTER_DAYS, redondeado al día) quedan fuera: cada
+      nodo archiva a su ritmo y no deben contar como divergencia.
+
+Cada ANTI_ENTROPY_INTERVAL segundos un seguidor compara sus raíces con las
+del líder, baja sólo los hashes de los subárboles distintos y, de las
+cubetas que difieren, pide las filas. El líder manda; las excepciones son
+las visitas que sólo existen aquí y los cierres locales que el líder no
+tiene, que se reenvían al líder por el log para que lleguen a todos.
+Cuando lo transferido en una ronda (JSON sin comprimir) llega a
+ANTI_ENTROPY_BUDGET_KB no se hacen más peticiones: lo que falte se revisa
+en la siguiente.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime, time as hora, timedelta
+
+from sqlalchemy import event, func, or_, select
+from sqlalchemy.orm import Session
+
+from cluster_client import request_node
+from config import Config
+from models import db, Cama, Doctor, VisitaEmergencia
+from replication_log import ESTADOS_CERRADOS, fila_cama, fila_doctor, fila_visita, replication_log
+
+logger = logging.getLogger(__name__)
+
+_CAMBIOS_KEY = '_anti_entropy_cambios'
+
+FANOUT = 16
+HOJAS = FANOUT * FANOUT  # cubetas por tabla
+
+# tabla -> (columna llave, columnas leídas, función de fila)
+TABLAS = {
+    'visitas': (VisitaEmergencia.folio,
+                (VisitaEmergencia.folio, VisitaEmergencia.id_paciente, VisitaEmergencia.id_doctor,
+                 VisitaEmergencia.id_cama, VisitaEmergencia.id_trabajador, VisitaEmergencia.id_sala,
+                 VisitaEmergencia.sintomas, VisitaEmergencia.diagnostico, VisitaEmergencia.estado,
+                 VisitaEmergencia.timestamp, VisitaEmergencia.fecha_cierre),
+                fila_visita),
+    'doctores': (Doctor.id_doctor, (Doctor.id_doctor, Doctor.disponible, Doctor.activo), fila_doctor),
+    'camas': (Cama.id_cama, (Cama.id_cama, Cama.ocupada, Cama.id_paciente), fila_cama),
+}
+
+# Llaves por consulta al releer filas
+_LOTE_LLAVES = 500
+
+
+# ============================================================================
+# DIGESTS Y FILAS LOCALES
+# ============================================================================
+
+def _sha1(texto):
+    return hashlib.sha1(texto.encode()).hexdigest()
+
+
+def digest_fila(fila):
+    return _sha1(json.dumps(fila, sort_keys=True, separators=(',', ':')))
+
+
+def cubeta(llave):
+    """Cubeta (0..HOJAS-1) de una fila según su llave"""
+    return int(_sha1(str(llave))[:8], 16) % HOJAS
+
+
+def llave_fila(tabla, fila):
+    return fila[TABLAS[tabla][0].key]
+
+
+def corte_archivo():
+    """
+    Visitas cerradas antes de este momento pueden estar ya archivadas en
+    algún nodo. Se redondea al día siguiente para que todos los nodos usen
+    el mismo corte (y cubra lo que el archivo ya movió).
+    """
+    limite = datetime.utcnow() - timedelta(days=Config.ARCHIVE_AFTER_DAYS)
+    return datetime.combine(limite.date() + timedelta(days=1), hora())
+
+
+def filas_locales(tabla, llaves=None, corte=None):
+    """
+    Filas de la tabla local en el formato de replication_log.fila_*.
+
+    Args:
+        tabla: 'visitas', 'doctores' o 'camas'
+        llaves: (opcional) sólo estas llaves
+        corte: (opcional) corte del archivo (default: corte_archivo())
+
+    Returns:
+        dict: llave -> fila
+    """
+    columna, columnas, fila = TABLAS[tabla]
+    consulta = select(*columnas)
+    if tabla == 'visitas':
+        v = VisitaEmergencia
+        consulta = consulta.where(v.folio.isnot(None), or_(
+            v.estado.notin_(ESTADOS_CERRADOS),
+            func.coalesce(v.fecha_cierre, v.timestamp) >= (corte or corte_archivo())))
+
+    if llaves is None:
+        return {getattr(r, columna.key): fila(r) for r in db.session.execute(consulta)}
+    llaves = list(llaves)
+    resultado = {}
+    for i in range(0, len(llaves), _LOTE_LLAVES):
+        for r in db.session.execute(consulta.where(columna.in_(llaves[i:i + _LOTE_LLAVES]))):
+            resultado[getattr(r, columna.key)] = fila(r)
+    return resultado
+
+
+class _Arbol:
+    """Árbol de Merkle de una tabla: HOJAS cubetas {llave: digest}, hashes calculados al pedirlos"""
+
+    def __init__(self, filas):
+        self.cubetas = [{} for _ in range(HOJAS)]
+        self._hojas = [None] * HOJAS
+        self._nivel1 = [None] * FANOUT
+        for llave, fila in filas.items():
+            self.cubetas[cubeta(llave)][llave] = digest_fila(fila)
+
+    def poner(self, llave, digest):
+        """Actualiza (o quita, con digest None) una fila e invalida su camino a la raíz"""
+        b = cubeta(llave)
+        if digest is None:
+            self.cubetas[b].pop(llave, None)
+        else:
+            self.cubetas[b][llave] = digest
+        self._hojas[b] = None
+        self._nivel1[b // FANOUT] = None
+
+    def hoja(self, b):
+        if self._hojas[b] is None:
+            self._hojas[b] = _sha1(''.join(f'{llave}:{d};' for llave, d in sorted(self.cubetas[b].items())))
+        return self._hojas[b]
+
+    def nodo(self, p):
+        if self._nivel1[p] is None:
+            self._nivel1[p] = _sha1(''.join(self.hoja(p * FANOUT + j) for j in range(FANOUT)))
+        return self._nivel1[p]
+
+    def raiz(self):
+        return _sha1(''.join(self.nodo(p) for p in range(FANOUT)))
+
+    def hijos(self, nivel, padre=0):
+        """Hashes de los hijos de `padre`: nivel 1 (bajo la raíz) o 2 (hojas del nodo `padre`)"""
+        if nivel == 1:
+            return [self.nodo(p) for p in range(FANOUT)]
+        return [self.hoja(padre * FANOUT + j) for j in range(FANOUT)]
+
+    def filas(self):
+        return sum(len(c) for c in self.cubetas)
+
+
+# ============================================================================
+# SERVICIO
+# ============================================================================
+
+class _SinPresupuesto(Exception):
+    pass
+
+
+class AntiEntropy:
+    """Árboles de Merkle locales y rondas de comparación contra el líder"""
+
+    def __init__(self):
+        self.app = None
+        self.bully_manager = None
+        self._lock = threading.RLock()
+        self._arboles = {}
+        self._corte = None
+        self._sucias = {tabla: set() for tabla in TABLAS}
+        self._contadores = dict.fromkeys(
+            ('rounds', 'rounds_in_sync', 'differing_buckets', 'rows_pulled', 'rows_pushed', 'rows_unresolved',
+             'bytes', 'budget_exhausted', 'errors'), 0)
+        self._ultima = None
+        self._stop = threading.Event()
+        self._hilo = None
+
+    # ------------------------------------------------------------------
+    # Árboles locales
+    # ------------------------------------------------------------------
+
+    def marcar(self, cambios):
+        """Llaves tocadas por un commit ({tabla: llaves}); se releen al pedir el árbol"""
+        with self._lock:
+            if self._corte is None:
+                return
+            for tabla, llaves in cambios.items():
+                self._sucias[tabla] |= llaves
+
+    def arbol(self, tabla):
+        """
+        Árbol de `tabla` al día. Se construye completo la primera vez y al
+        cambiar el corte del archivo; después sólo relee las filas marcadas.
+        """
+        with self._lock:
+            corte = corte_archivo()
+            if corte != self._corte:
+                self._corte = corte
+                for sucias in self._sucias.values():
+                    sucias.clear()
+                self._arboles = {t: _Arbol(filas_locales(t, corte=corte)) for t in TABLAS}
+            arbol = self._arboles[tabla]
+            if self._sucias[tabla]:
+                llaves, self._sucias[tabla] = self._sucias[tabla], set()
+                filas = filas_locales(tabla, llaves, corte)
+                for llave in llaves:
+                    arbol.poner(llave, digest_fila(filas[llave]) if llave in filas else None)
+            return arbol
+
+    def raices(self):
+        with self._lock:
+            return {tabla: self.arbol(tabla).raiz() for tabla in TABLAS}
+
+    def hijos(self, tabla, nivel, padres=(0,)):
+        """{padre: hashes de sus FANOUT hijos} (ver _Arbol.hijos)"""
+        with self._lock:
+            arbol = self.arbol(tabla)
+            return {padre: arbol.hijos(nivel, padre) for padre in padres}
+
+    def filas_cubetas(self, tabla, cubetas):
+        """Filas locales de las cubetas dadas"""
+        with self._lock:
+            arbol = self.arbol(tabla)
+            llaves = set().union(*(arbol.cubetas[b] for b in cubetas))
+        return list(filas_locales(tabla, llaves).values())
+
+    def resumen_local(self):
+        with self._lock:
+            return {tabla: {'root': self.arbol(tabla).raiz(), 'rows': self.arbol(tabla).filas()}
+                    for tabla in TABLAS}
+
+    # ------------------------------------------------------------------
+    # Ronda contra el líder
+    # ------------------------------------------------------------------
+
+    def _pedir(self, ronda, path, **kwargs):
+        if ronda['bytes'] >= ronda['budget_bytes']:
+            raise _SinPresupuesto()
+        respuesta = request_node(ronda['peer'], ronda['url'], path, **kwargs)
+        if not respuesta.ok:
+            raise RuntimeError(f'{path}: {respuesta.status} ({respuesta.error})')
+        ronda['bytes'] += len(json.dumps(respuesta.data, separators=(',', ':')))
+        return respuesta.data
+
+    def sincronizar(self):
+        """
+        Una ronda de anti-entropía contra el líder (requiere contexto de app).
+
+        Returns:
+            dict: resumen de la ronda (peer, bytes, in_sync, tables, ...);
+            None si este nodo es el líder, no hay líder o todavía hay cambios
+            locales en camino al líder
+        """
+        from models import get_leader_flask_url
+
+        lider = self.bully_manager.get_current_leader() if self.bully_manager else None
+        if lider is None or lider == Config.NODE_ID:
+            return None
+        replication_log.ponerse_al_dia()
+        if replication_log.pendientes():
+            return None
+
+        _, url = get_leader_flask_url(self.bully_manager)
+        inicio = time.perf_counter()
+        ronda = {'peer': lider, 'url': url, 'at': datetime.utcnow().isoformat(), 'bytes': 0,
+                 'budget_bytes': Config.ANTI_ENTROPY_BUDGET_KB * 1024, 'budget_exhausted': False, 'tables': {}}
+        try:
+            remotas = self._pedir(ronda, '/api/cluster/anti-entropy/roots')['roots']
+            locales = self.raices()
+            for tabla in TABLAS:
+                estado = {'in_sync': remotas[tabla] == locales[tabla], 'differing_buckets': 0,
+                          'repaired_buckets': 0}
+                ronda['tables'][tabla] = estado
+                if not estado['in_sync']:
+                    self._comparar(ronda, tabla, estado)
+        except _SinPresupuesto:
+            ronda['budget_exhausted'] = True
+        finally:
+            del ronda['url']
+            ronda['duration_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+            ronda['in_sync'] = bool(ronda['tables']) and all(t['in_sync'] for t in ronda['tables'].values())
+            with self._lock:
+                self._contadores['rounds'] += 1
+                self._contadores['rounds_in_sync'] += ronda['in_sync']
+                self._contadores['bytes'] += ronda['bytes']
+                self._contadores['budget_exhausted'] += ronda['budget_exhausted']
+                self._ultima = ronda
+        return ronda
+
+    def _comparar(self, ronda, tabla, estado):
+        """Baja por los subárboles distintos y repara las cubetas que difieren"""
+        remotos = self._pedir(ronda, '/api/cluster/anti-entropy/tree',
+                              params={'table': tabla, 'level': 1})['children']['0']
+        locales = self.hijos(tabla, 1)[0]
+        padres = [p for p in range(FANOUT) if remotos[p] != locales[p]]
+        if not padres:
+            return
+
+        remotos = self._pedir(ronda, '/api/cluster/anti-entropy/tree',
+                              params={'table': tabla, 'level': 2, 'parents': ','.join(map(str, padres))})['children']
+        locales = self.hijos(tabla, 2, padres)
+        distintas = [p * FANOUT + j for p in padres for j in range(FANOUT)
+                     if remotos[str(p)][j] != locales[p][j]]
+        estado['differing_buckets'] = len(distintas)
+        with self._lock:
+            self._contadores['differing_buckets'] += len(distintas)
+
+        for i in range(0, len(distintas), FANOUT):
+            cubetas = distintas[i:i + FANOUT]
+            filas = self._pedir(ronda, '/api/cluster/anti-entropy/rows', method='POST',
+                                json={'table': tabla, 'buckets': cubetas})['rows']
+            self._reconciliar(tabla, cubetas, filas)
+            estado['repaired_buckets'] += len(cubetas)
+
+    def _reconciliar(self, tabla, cubetas, filas_remotas):
+        """
+        Deja las cubetas como en el líder. De las visitas, las que sólo
+        existen aquí y los cierres que el líder no tiene se le reenvían.
+        """
+        with self._lock:
+            arbol = self.arbol(tabla)
+            llaves = set().union(*(arbol.cubetas[b] for b in cubetas))
+        remotas = {llave_fila(tabla, f): f for f in filas_remotas}
+        locales = filas_locales(tabla, llaves | remotas.keys())
+
+        copiar, reenviar, sin_resolver = [], [], 0
+        for llave in remotas.keys() | locales.keys():
+            remota, local = remotas.get(llave), locales.get(llave)
+            if remota is not None and local is not None and digest_fila(remota) == digest_fila(local):
+                continue
+            if tabla == 'visitas':
+                if remota is None:
+                    reenviar.append(('visita_creada', local))
+                elif (local is not None and local['estado'] in ESTADOS_CERRADOS
+                      and remota['estado'] not in ESTADOS_CERRADOS):
+                    reenviar.append(('visita_cerrada', local))
+                else:
+                    copiar.append(remota)
+            elif remota is not None and local is not None:
+                copiar.append(remota)
+            else:
+                sin_resolver += 1  # catálogos distintos: no se crean ni borran doctores/camas
+
+        if copiar:
+            replication_log.reparar([{tabla: copiar}])
+        if reenviar:
+            replication_log.reenviar([(tipo, {'visitas': [fila], 'doctores': [], 'camas': []})
+                                      for tipo, fila in reenviar])
+            logger.info(f'Anti-entropía: {len(reenviar)} visitas locales reenviadas al líder')
+        with self._lock:
+            self._contadores['rows_pulled'] += len(copiar)
+            self._contadores['rows_pushed'] += len(reenviar)
+            self._contadores['rows_unresolved'] += sin_resolver
+
+    # ------------------------------------------------------------------
+    # Métricas e hilo
+    # ------------------------------------------------------------------
+
+    def metrics(self):
+        """Contadores acumulados y resumen de la última ronda"""
+        with self._lock:
+            return {
+                'active': self._hilo is not None,
+                'interval_s': Config.ANTI_ENTROPY_INTERVAL,
+                'budget_kb': Config.ANTI_ENTROPY_BUDGET_KB,
+                **self._contadores,
+                'last_round': self._ultima
+            }
+
+    def reset(self):
+        """Olvida los árboles y los contadores"""
+        with self._lock:
+            self._arboles = {}
+            self._corte = None
+            for sucias in self._sucias.values():
+                sucias.clear()
+            for nombre in self._contadores:
+                self._contadores[nombre] = 0
+            self._ultima = None
+
+    def start(self, app, bully_manager):
+        """Arranca las rondas periódicas (ANTI_ENTROPY_INTERVAL = 0 las desactiva)"""
+        self.app = app
+        self.bully_manager = bully_manager
+        if Config.ANTI_ENTROPY_INTERVAL <= 0 or self._hilo is not None:
+            return
+        self._stop.clear()
+        self._hilo = threading.Thread(target=self._run, name='anti-entropy', daemon=True)
+        self._hilo.start()
+        logger.info(f'Anti-entropía contra el líder cada {Config.ANTI_ENTROPY_INTERVAL}s '
+                    f'(máx. {Config.ANTI_ENTROPY_BUDGET_KB} KB por ronda)')
+
+    def stop(self):
+        self._stop.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+        self._hilo = None
+
+    def _run(self):
+        while not self._stop.wait(Config.ANTI_ENTROPY_INTERVAL):
+            try:
+                with self.app.app_context():
+                    try:
+                        ronda = self.sincronizar()
+                    finally:
+                        db.session.remove()
+                if ronda and not ronda['in_sync']:
+                    distintas = {t: e['differing_buckets'] for t, e in ronda['tables'].items() if not e['in_sync']}
+                    logger.info(f'Anti-entropía con el líder {ronda["peer"]}: cubetas distintas {distintas} '
+                                f'({ronda["bytes"]} bytes)')
+            except Exception as e:
+                with self._lock:
+                    self._contadores['errors'] += 1
+                logger.error(f'Error en la ronda de anti-entropía: {e}')
+
+
+anti_entropy = AntiEntropy()
+
+
+# ============================================================================
+# FILAS TOCADAS POR CADA COMMIT
+# ============================================================================
+
+@event.listens_for(Session, 'after_flush')
+def _registrar(session, flush_context):
+    if session.info.get('engine_lectura'):
+        return
+    for obj in [*session.new, *session.dirty, *session.deleted]:
+        if isinstance(obj, VisitaEmergencia):
+            tabla, llave = 'visitas', obj.folio
+        elif isinstance(obj, Doctor):
+            tabla, llave = 'doctores', obj.id_doctor
+        elif isinstance(obj, Cama):
+            tabla, llave = 'camas', obj.id_cama
+        else:
+            continue
+        if llave is not None:
+            session.info.setdefault(_CAMBIOS_KEY, {}).setdefault(tabla, set()).add(llave)
+
+
+@event.listens_for(Session, 'after_commit')
+def _marcar(session):
+    if session.in_nested_transaction():
+        return
+    cambios = session.info.pop(_CAMBIOS_KEY, None)
+    if cambios:
+        anti_entropy.marcar(cambios)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar(session):
+    session.info.pop(_CAMBIOS_KEY, None)
@@ -4,6 +4,15 @@ from flask_socketio import SocketIO, emit
 from config import Config
 from models import db, Usuario, get_metricas_dashboard
 from auth import login_manager, init_default_users, get_user_info
+from migrations import run_migrations
+from availability import availability
+from archive import Archiver
+from resource_cache import resource_cache
+from replication_log import replication_log
+from anti_entropy import anti_entropy
+from bootstrap import bootstrap_si_hace_falta
+from cluster_client import watch_bully
+from db_utils import init_read_engine, init_read_requests
 import logging
 import logging.handlers
 import os
@@ -20,6 +29,7 @@ app.config.from_object(Config)
 
 # Inicializar extensiones
 db.init_app(app)
+init_read_requests(app)
 login_manager.init_app(app)
 socketio = SocketIO(app, async_mode=app.config['SOCKETIO_ASYNC_MODE'])
 
@@ -265,9 +275,12 @@ app.notificar_cambio_lider = notificar_cambio_lider
 
 def init_db():
     """Inicializa la base de datos y usuarios por defecto"""
+    init_read_engine(app)
     with app.app_context():
         db.create_all()
+        run_migrations(db.engine)
         init_default_users()
+        availability.load()
         logger.info('Base de datos inicializada correctamente')
 
 
@@ -308,6 +321,9 @@ def init_bully():
     # Iniciar el sistema Bully
     bully_manager.start()
 
+    # Nodos perdidos/vistos por Bully alimentan los circuit breakers HTTP
+    watch_bully(bully_manager)
+
     # Hacer accesible globalmente en app
     app.bully_manager = bully_manager
 
@@ -351,6 +367,21 @@ if __name__ == '__main__':
     # Inicializar sistema Bully
     bully_manager = init_bully()
 
+    # Archivo periódico de visitas cerradas antiguas
+    Archiver(app).start()
+
+    # Caché de recursos de las demás salas (deltas empujados + digest periódico)
+    resource_cache.start(app, bully_manager)
+
+    # Nodo nuevo o con la BD borrada: copiar la BD del líder antes de replicar
+    bootstrap_si_hace_falta(app, bully_manager)
+
+    # Log de replicación: captura de cambios, reenvío al líder y puesta al día
+    replication_log.start(app, bully_manager)
+
+    # Anti-entropía: comparación periódica de visitas, doctores y camas con el líder
+    anti_entropy.start(app, bully_manager)
+
     # Información de inicio
     logger.info('='*60)
     logger.info(f'🏥 Sistema de Emergencias Médicas - Nodo {Config.NODE_ID}')
@@ -6,6 +6,9 @@ from flask import Flask
 from config import Config
 from models import db
 from auth import init_default_users
+from migrations import run_migrations
+from availability import availability
+from db_utils import init_read_engine
 import logging
 import os
 
@@ -22,6 +25,7 @@ def create_app():
 
     # Inicializar SQLAlchemy (mantener setup existente sin cambios)
     db.init_app(app)
+    init_read_engine(app)
 
     # Asegurar que existe el directorio de datos
     data_dir = os.path.join(os.path.dirname(__file__), '../data')
@@ -33,9 +37,11 @@ def create_app():
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
 
-    # Crear tablas y usuarios por defecto
+    # Crear tablas, migrar BDs existentes y usuarios por defecto
     with app.app_context():
         db.create_all()
+        run_migrations(db.engine)
         init_default_users()  # Función existente de auth.py
+        availability.load()
 
     return app
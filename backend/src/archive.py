@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Archivo de visitas cerradas (separación caliente/frío).
+
+VISITAS_EMERGENCIA crece sin límite, pero casi todas las consultas (visitas
+activas, contadores, deduplicación por folio en la replicación) sólo miran
+las visitas recientes. Este módulo mueve las visitas completadas o canceladas
+con más de ARCHIVE_AFTER_DAYS días a tablas históricas mensuales
+(VISITAS_HIST_AAAAMM) dentro de la misma BD.
+
+    - ARCHIVO_FOLIOS (folio -> mes) permite que la búsqueda por folio caiga
+      al histórico con una sola lectura por llave primaria.
+    - RESUMEN_ARCHIVO (mes, sala, estado -> visitas) guarda los totales del
+      histórico para las estadísticas del cluster sin recorrer las tablas.
+    - Cada lote (ARCHIVE_BATCH_SIZE visitas) es una transacción corta:
+      copiar, indexar folios, sumar totales y borrar de la tabla caliente.
+      Un corte a la mitad no deja nada a medias y la siguiente pasada continúa.
+    - El borrado dispara los triggers de CONTADORES_SALA: los contadores
+      siguen describiendo sólo la tabla caliente.
+
+Uso:
+    python archive.py                     # archiva las BDs de data/
+    python archive.py ruta/sala1.db --dias 30 --lote 1000
+"""
+import argparse
+import glob
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, Index, MetaData, Table, create_engine, select
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from config import Config
+from models import db, VisitaEmergencia, VisitaResumen, Paciente, Doctor, Cama, Sala, visitas_resumen_query
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_CERRADOS = ('completada', 'cancelada')
+
+_metadata = MetaData()
+_tablas = {}
+_tablas_lock = threading.Lock()
+
+
+# ============================================================================
+# TABLAS HISTÓRICAS
+# ============================================================================
+
+def tabla_historico(mes):
+    """
+    Table de SQLAlchemy para el histórico de un mes ('AAAAMM').
+
+    Mismas columnas que VISITAS_EMERGENCIA, sin llaves foráneas: el histórico
+    debe poder conservar visitas aunque cambien los catálogos.
+    """
+    with _tablas_lock:
+        tabla = _tablas.get(mes)
+        if tabla is None:
+            nombre = f'VISITAS_HIST_{mes}'
+            columnas = [Column(c.name, c.type, primary_key=c.primary_key)
+                        for c in VisitaEmergencia.__table__.columns]
+            tabla = Table(nombre, _metadata, *columnas)
+            Index(f'ux_{nombre.lower()}_folio', tabla.c.folio, unique=True)
+            Index(f'ix_{nombre.lower()}_paciente', tabla.c.id_paciente, tabla.c.timestamp)
+            _tablas[mes] = tabla
+        return tabla
+
+
+def _crear_tabla(conn, tabla):
+    conn.execute(CreateTable(tabla, if_not_exists=True))
+    for index in tabla.indexes:
+        conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def meses_archivados(conn=None):
+    """Meses ('AAAAMM') que tienen visitas en el histórico, del más reciente al más antiguo"""
+    conn = conn or db.session.connection()
+    return [m for (m,) in conn.exec_driver_sql('SELECT DISTINCT mes FROM RESUMEN_ARCHIVO ORDER BY mes DESC')]
+
+
+# ============================================================================
+# ARCHIVADO
+# ============================================================================
+
+def archive_batch(conn, cutoff, batch_size):
+    """
+    Archiva un lote de visitas cerradas anteriores a `cutoff` en la transacción de `conn`.
+
+    Returns:
+        int: visitas archivadas (0 cuando ya no quedan)
+    """
+    # Usa ix_visitas_estado_timestamp; fecha_cierre >= timestamp, así que el
+    # filtro por timestamp es necesario y el de fecha_cierre lo completa.
+    filas = conn.exec_driver_sql(f"""
+        SELECT id_visita, strftime('%Y%m', timestamp) FROM VISITAS_EMERGENCIA
+        WHERE estado IN ('completada', 'cancelada') AND timestamp < ?
+          AND COALESCE(fecha_cierre, timestamp) < ?
+        LIMIT {int(batch_size)}
+    """, (cutoff, cutoff)).all()
+    if not filas:
+        return 0
+
+    por_mes = {}
+    for id_visita, mes in filas:
+        por_mes.setdefault(mes, []).append(id_visita)
+
+    columnas = ', '.join(f'"{c.name}"' for c in VisitaEmergencia.__table__.columns)
+    for mes, ids in por_mes.items():
+        tabla = tabla_historico(mes)
+        _crear_tabla(conn, tabla)
+        marcas = ', '.join('?' * len(ids))
+        conn.exec_driver_sql(
+            f'INSERT OR IGNORE INTO "{tabla.name}" ({columnas}) '
+            f'SELECT {columnas} FROM VISITAS_EMERGENCIA WHERE id_visita IN ({marcas})', tuple(ids))
+        conn.exec_driver_sql(
+            f'INSERT OR IGNORE INTO ARCHIVO_FOLIOS (folio, mes) '
+            f'SELECT folio, ? FROM VISITAS_EMERGENCIA WHERE id_visita IN ({marcas}) AND folio IS NOT NULL',
+            (mes, *ids))
+        conn.exec_driver_sql(
+            f'INSERT INTO RESUMEN_ARCHIVO (mes, id_sala, estado, visitas) '
+            f'SELECT ?, id_sala, estado, COUNT(*) FROM VISITAS_EMERGENCIA WHERE id_visita IN ({marcas}) '
+            f'GROUP BY id_sala, estado '
+            f'ON CONFLICT (mes, id_sala, estado) DO UPDATE SET visitas = visitas + excluded.visitas',
+            (mes, *ids))
+        conn.exec_driver_sql(f'DELETE FROM VISITAS_EMERGENCIA WHERE id_visita IN ({marcas})', tuple(ids))
+
+    return len(filas)
+
+
+def archive_visits(engine=None, dias=None, batch_size=None, max_batches=None, pausa=0.0):
+    """
+    Archiva las visitas cerradas con más de `dias` días, en lotes de transacción corta.
+
+    Args:
+        engine: Engine de la BD (default: db.engine, requiere contexto de app)
+        dias: antigüedad mínima (default: Config.ARCHIVE_AFTER_DAYS)
+        batch_size: visitas por transacción (default: Config.ARCHIVE_BATCH_SIZE)
+        max_batches: (opcional) detenerse tras N lotes; la siguiente pasada continúa
+        pausa: segundos entre lotes para ceder el lock de escritura a otros
+
+    Returns:
+        int: total de visitas archivadas
+    """
+    engine = engine or db.engine
+    dias = Config.ARCHIVE_AFTER_DAYS if dias is None else dias
+    batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+    # Mismo formato de texto que guarda el ORM (SQLite compara DATETIME como texto)
+    cutoff = (datetime.utcnow() - timedelta(days=dias)).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    total = lotes = 0
+    while max_batches is None or lotes < max_batches:
+        with engine.begin() as conn:
+            archivadas = archive_batch(conn, cutoff, batch_size)
+        if not archivadas:
+            break
+        total += archivadas
+        lotes += 1
+        if pausa:
+            time.sleep(pausa)
+
+    if total:
+        logger.info(f'Archivo: {total} visitas cerradas movidas al histórico ({lotes} lotes)')
+    return total
+
+
+# ============================================================================
+# LECTURA (tabla caliente + histórico)
+# ============================================================================
+
+def folio_archivado(folio):
+    """Mes ('AAAAMM') en que quedó archivado el folio, o None"""
+    return db.session.execute(
+        db.text('SELECT mes FROM ARCHIVO_FOLIOS WHERE folio = :folio'), {'folio': folio}).scalar()
+
+
+def folios_archivados(folios):
+    """Subconjunto de `folios` que está en el histórico (una sola consulta)"""
+    folios = list(folios)
+    if not folios:
+        return set()
+    consulta = db.text('SELECT folio FROM ARCHIVO_FOLIOS WHERE folio IN :folios').bindparams(
+        db.bindparam('folios', expanding=True))
+    return set(db.session.execute(consulta, {'folios': folios}).scalars())
+
+
+def folio_existe(folio):
+    """True si el folio está en la tabla caliente o en el histórico"""
+    if db.session.query(VisitaEmergencia.id_visita).filter_by(folio=folio).first() is not None:
+        return True
+    return folio_archivado(folio) is not None
+
+
+def get_visita_por_folio(folio):
+    """
+    Busca una visita por folio: primero la tabla caliente y, si no está, el histórico.
+
+    Returns:
+        tuple: (VisitaResumen, archivada) o (None, False) si no existe
+    """
+    row = db.session.execute(visitas_resumen_query().where(VisitaEmergencia.folio == folio)).first()
+    if row is not None:
+        return VisitaResumen(*row), False
+
+    mes = folio_archivado(folio)
+    if mes is None:
+        return None, False
+
+    h = tabla_historico(mes).c
+    stmt = (
+        select(h.id_visita, h.folio, h.id_paciente, Paciente.nombre, h.id_doctor, Doctor.nombre,
+               h.id_cama, Cama.numero, h.id_sala, Sala.numero, h.sintomas, h.diagnostico,
+               h.estado, h.timestamp, h.fecha_cierre)
+        .outerjoin(Paciente, Paciente.id_paciente == h.id_paciente)
+        .outerjoin(Doctor, Doctor.id_doctor == h.id_doctor)
+        .outerjoin(Cama, Cama.id_cama == h.id_cama)
+        .outerjoin(Sala, Sala.id_sala == h.id_sala)
+        .where(h.folio == folio)
+    )
+    row = db.session.execute(stmt).first()
+    return (VisitaResumen(*row), True) if row is not None else (None, False)
+
+
+def get_totales_archivo(id_sala=None):
+    """
+    Totales del histórico desde RESUMEN_ARCHIVO (sin recorrer las tablas mensuales).
+
+    Returns:
+        dict: {'total': int, 'completada': int, 'cancelada': int}
+    """
+    sql = 'SELECT estado, SUM(visitas) FROM RESUMEN_ARCHIVO'
+    params = {}
+    if id_sala is not None:
+        sql += ' WHERE id_sala = :id_sala'
+        params['id_sala'] = id_sala
+    totales = dict.fromkeys(ESTADOS_CERRADOS, 0)
+    for estado, visitas in db.session.execute(db.text(sql + ' GROUP BY estado'), params):
+        totales[estado] = visitas
+    totales['total'] = sum(totales.values())
+    return totales
+
+
+# ============================================================================
+# TAREA PERIÓDICA
+# ============================================================================
+
+class Archiver:
+    """Hilo daemon que archiva cada `interval` segundos dentro del contexto de la app"""
+
+    def __init__(self, app, interval=None):
+        self.app = app
+        self.interval = Config.ARCHIVE_INTERVAL if interval is None else interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='archiver', daemon=True)
+        self._thread.start()
+        logger.info(f'Archivo de visitas cada {self.interval}s (antigüedad {Config.ARCHIVE_AFTER_DAYS} días)')
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    archive_visits(pausa=0.05)
+                except Exception as e:
+                    logger.error(f'Error archivando visitas: {e}')
+                finally:
+                    db.session.remove()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Archiva visitas cerradas antiguas en tablas mensuales')
+    parser.add_argument('paths', nargs='*', help='Archivos .db (default: data/emergency_sala*.db)')
+    parser.add_argument('--dias', type=int, default=Config.ARCHIVE_AFTER_DAYS, help='antigüedad mínima')
+    parser.add_argument('--lote', type=int, default=Config.ARCHIVE_BATCH_SIZE, help='visitas por transacción')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+    from migrations import upgrade_database
+
+    paths = args.paths or sorted(glob.glob(os.path.join(Config._DATA_DIR, 'emergency_sala*.db')))
+    if not paths:
+        print('No se encontraron bases de datos')
+        return 0
+
+    for path in paths:
+        upgrade_database(path)
+        engine = create_engine(f'sqlite:///{os.path.abspath(path)}')
+        try:
+            total = archive_visits(engine, dias=args.dias, batch_size=args.lote)
+        finally:
+            engine.dispose()
+        print(f'{path}: {total} visitas archivadas')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
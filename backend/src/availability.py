@@ -0,0 +1,333 @@
+"""
+Índice en memoria de recursos disponibles (doctores y camas) por sala.
+
+Cada proceso mantiene, por sala, el conjunto de doctores libres (activos y
+disponibles) y de camas libres, además de cubetas por especialidad. Así
+"elegir un doctor/cama libre en la sala X" y "contar libres" son O(1) y
+listar recursos no consulta SQLite.
+
+Coherencia:
+    - Se carga completo al arrancar (init_db / create_app) con load().
+    - Los cambios hechos con el ORM (crear/cerrar visitas, replicación desde
+      el líder, CRUD de doctores y camas) se capturan en after_flush y se
+      aplican sólo en after_commit; un rollback los descarta.
+    - Escrituras fuera del ORM (SQL crudo, cargas masivas, otro proceso
+      sobre la misma BD) requieren llamar a load() de nuevo.
+
+El índice es una pista rápida, no la fuente de verdad: quien asigna un
+recurso debe seguir validándolo contra la BD dentro de su transacción.
+"""
+import logging
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Doctor, Cama
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = '_availability_pending'
+
+
+# ============================================================================
+# REGISTROS LIGEROS (lo que ven las vistas en lugar de objetos ORM)
+# ============================================================================
+
+class DoctorDisponible:
+    """Datos mínimos de un doctor libre; mismos nombres de atributo que Doctor"""
+    __slots__ = ('id_doctor', 'nombre', 'especialidad', 'id_sala')
+    disponible = True
+    activo = True
+
+    def __init__(self, id_doctor, nombre, especialidad, id_sala):
+        self.id_doctor = id_doctor
+        self.nombre = nombre
+        self.especialidad = especialidad
+        self.id_sala = id_sala
+
+    def to_dict(self):
+        return {
+            'id_doctor': self.id_doctor,
+            'nombre': self.nombre,
+            'especialidad': self.especialidad,
+            'id_sala': self.id_sala
+        }
+
+    def __repr__(self):
+        return f'<DoctorDisponible {self.id_doctor} {self.nombre}>'
+
+
+class CamaDisponible:
+    """Datos mínimos de una cama libre; mismos nombres de atributo que Cama"""
+    __slots__ = ('id_cama', 'numero', 'id_sala')
+    ocupada = False
+
+    def __init__(self, id_cama, numero, id_sala):
+        self.id_cama = id_cama
+        self.numero = numero
+        self.id_sala = id_sala
+
+    def to_dict(self):
+        return {
+            'id_cama': self.id_cama,
+            'numero': self.numero,
+            'id_sala': self.id_sala
+        }
+
+    def __repr__(self):
+        return f'<CamaDisponible {self.id_cama} #{self.numero}>'
+
+
+class _Bolsa:
+    """Conjunto con agregar/quitar/elegir en O(1) (lista + posiciones, swap-remove)"""
+    __slots__ = ('_items', '_pos')
+
+    def __init__(self):
+        self._items = []
+        self._pos = {}
+
+    def add(self, key, record):
+        if key in self._pos:
+            self._items[self._pos[key]] = (key, record)
+            return
+        self._pos[key] = len(self._items)
+        self._items.append((key, record))
+
+    def discard(self, key):
+        pos = self._pos.pop(key, None)
+        if pos is None:
+            return
+        last = self._items.pop()
+        if pos < len(self._items):
+            self._items[pos] = last
+            self._pos[last[0]] = pos
+
+    def first(self, excluir=()):
+        for key, record in self._items:
+            if key not in excluir:
+                return record
+        return None
+
+    def records(self):
+        return [record for _, record in self._items]
+
+    def __len__(self):
+        return len(self._items)
+
+
+# ============================================================================
+# ÍNDICE
+# ============================================================================
+
+class AvailabilityIndex:
+    """Conjuntos de doctores y camas libres por sala (y por especialidad)"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._doctores = {}       # id_sala -> _Bolsa
+        self._especialidad = {}   # (id_sala, especialidad) -> _Bolsa
+        self._camas = {}          # id_sala -> _Bolsa
+        self._doctor_sala = {}    # id_doctor -> (id_sala, especialidad) de los libres
+        self._cama_sala = {}      # id_cama -> id_sala de las libres
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def load(self):
+        """
+        (Re)construye el índice desde la BD. Requiere contexto de aplicación.
+
+        Returns:
+            tuple: (doctores libres, camas libres) cargados
+        """
+        doctores = db.session.query(
+            Doctor.id_doctor, Doctor.nombre, Doctor.especialidad, Doctor.id_sala
+        ).filter_by(disponible=True, activo=True).all()
+        camas = db.session.query(
+            Cama.id_cama, Cama.numero, Cama.id_sala
+        ).filter_by(ocupada=False).all()
+
+        with self._lock:
+            self._clear()
+            for row in doctores:
+                self._add_doctor(DoctorDisponible(*row))
+            for row in camas:
+                self._add_cama(CamaDisponible(*row))
+            self._loaded = True
+
+        logger.info(f'Índice de disponibilidad cargado: {len(doctores)} doctores, {len(camas)} camas libres')
+        return len(doctores), len(camas)
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def _clear(self):
+        self._doctores.clear()
+        self._especialidad.clear()
+        self._camas.clear()
+        self._doctor_sala.clear()
+        self._cama_sala.clear()
+
+    # ---------------------------------------------------------------- mutación
+
+    def _add_doctor(self, record):
+        self._remove_doctor(record.id_doctor)
+        self._doctores.setdefault(record.id_sala, _Bolsa()).add(record.id_doctor, record)
+        self._especialidad.setdefault((record.id_sala, record.especialidad), _Bolsa()).add(record.id_doctor, record)
+        self._doctor_sala[record.id_doctor] = (record.id_sala, record.especialidad)
+
+    def _remove_doctor(self, id_doctor):
+        ubicacion = self._doctor_sala.pop(id_doctor, None)
+        if ubicacion is None:
+            return
+        id_sala, especialidad = ubicacion
+        self._doctores[id_sala].discard(id_doctor)
+        self._especialidad[(id_sala, especialidad)].discard(id_doctor)
+
+    def _add_cama(self, record):
+        self._remove_cama(record.id_cama)
+        self._camas.setdefault(record.id_sala, _Bolsa()).add(record.id_cama, record)
+        self._cama_sala[record.id_cama] = record.id_sala
+
+    def _remove_cama(self, id_cama):
+        id_sala = self._cama_sala.pop(id_cama, None)
+        if id_sala is not None:
+            self._camas[id_sala].discard(id_cama)
+
+    def apply(self, cambios):
+        """
+        Aplica cambios confirmados.
+
+        Args:
+            cambios: dict {('doctor'|'cama', id): registro libre o None si ya no está libre}
+        """
+        with self._lock:
+            for (tipo, key), record in cambios.items():
+                if tipo == 'doctor':
+                    if record is None:
+                        self._remove_doctor(key)
+                    else:
+                        self._add_doctor(record)
+                else:
+                    if record is None:
+                        self._remove_cama(key)
+                    else:
+                        self._add_cama(record)
+
+    # ---------------------------------------------------------------- lectura
+
+    def pick_doctor(self, id_sala, especialidad=None, excluir=()):
+        """Un doctor libre de la sala (opcionalmente de una especialidad), o None"""
+        self.ensure_loaded()
+        with self._lock:
+            bolsa = (self._especialidad.get((id_sala, especialidad)) if especialidad
+                     else self._doctores.get(id_sala))
+            return bolsa.first(excluir) if bolsa else None
+
+    def pick_cama(self, id_sala, excluir=()):
+        """Una cama libre de la sala, o None"""
+        self.ensure_loaded()
+        with self._lock:
+            bolsa = self._camas.get(id_sala)
+            return bolsa.first(excluir) if bolsa else None
+
+    def count_doctores(self, id_sala, especialidad=None):
+        self.ensure_loaded()
+        with self._lock:
+            bolsa = (self._especialidad.get((id_sala, especialidad)) if especialidad
+                     else self._doctores.get(id_sala))
+            return len(bolsa) if bolsa else 0
+
+    def count_camas(self, id_sala):
+        self.ensure_loaded()
+        with self._lock:
+            bolsa = self._camas.get(id_sala)
+            return len(bolsa) if bolsa else 0
+
+    def is_doctor_disponible(self, id_doctor):
+        self.ensure_loaded()
+        return id_doctor in self._doctor_sala
+
+    def is_cama_disponible(self, id_cama):
+        self.ensure_loaded()
+        return id_cama in self._cama_sala
+
+    def doctores_disponibles(self, id_sala=None, especialidad=None):
+        """Lista de DoctorDisponible ordenada por id (todas las salas si id_sala es None)"""
+        self.ensure_loaded()
+        with self._lock:
+            if especialidad:
+                bolsas = [b for (sala, esp), b in self._especialidad.items()
+                          if esp == especialidad and (id_sala is None or sala == id_sala)]
+            elif id_sala is None:
+                bolsas = list(self._doctores.values())
+            else:
+                bolsas = [self._doctores.get(id_sala)]
+            records = [r for b in bolsas if b for r in b.records()]
+        return sorted(records, key=lambda r: r.id_doctor)
+
+    def camas_disponibles(self, id_sala=None):
+        """Lista de CamaDisponible ordenada por id (todas las salas si id_sala es None)"""
+        self.ensure_loaded()
+        with self._lock:
+            bolsas = list(self._camas.values()) if id_sala is None else [self._camas.get(id_sala)]
+            records = [r for b in bolsas if b for r in b.records()]
+        return sorted(records, key=lambda r: r.id_cama)
+
+    def especialidades(self, id_sala):
+        """Especialidades con al menos un doctor libre en la sala"""
+        self.ensure_loaded()
+        with self._lock:
+            return sorted(esp for (sala, esp), b in self._especialidad.items()
+                          if sala == id_sala and len(b) and esp)
+
+
+availability = AvailabilityIndex()
+
+
+# ============================================================================
+# SINCRONIZACIÓN CON LA SESIÓN DE SQLALCHEMY
+# ============================================================================
+
+def _snapshot(obj):
+    """Registro libre del objeto, o None si ya no está libre (o fue eliminado)"""
+    if isinstance(obj, Doctor):
+        if obj.disponible is not False and obj.activo is not False:
+            return DoctorDisponible(obj.id_doctor, obj.nombre, obj.especialidad, obj.id_sala)
+        return None
+    if obj.ocupada:
+        return None
+    return CamaDisponible(obj.id_cama, obj.numero, obj.id_sala)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    """Guarda en session.info el estado de doctores/camas escritos en este flush"""
+    deleted = session.deleted
+    for obj in [*session.new, *session.dirty, *deleted]:
+        if isinstance(obj, Doctor):
+            key = ('doctor', obj.id_doctor)
+        elif isinstance(obj, Cama):
+            key = ('cama', obj.id_cama)
+        else:
+            continue
+        pending = session.info.setdefault(_PENDING_KEY, {})
+        pending[key] = None if obj in deleted else _snapshot(obj)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    if session.in_nested_transaction():
+        return  # liberar un savepoint no es el commit real
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending and availability.loaded:
+        availability.apply(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Arranque de un nodo nuevo (o con la BD borrada) desde un snapshot del líder.
+
+Una sala que se une al cluster empieza con un emergency_salaN.db vacío (más
+los usuarios por defecto) y sólo ve lo que se replica desde ese momento: ni
+visitas históricas ni el estado de las demás salas. Con este módulo:
+
+    - El líder genera una copia consistente de su BD con la API de backup
+      de SQLite (en WAL la copia es una transacción de lectura: no bloquea
+      a los escritores) y anota el seq de replicación que contiene.
+    - La copia se sirve en trozos de BOOTSTRAP_CHUNK_KB con su SHA-256 en
+      el manifiesto; el nodo nuevo los baja en paralelo
+      (BOOTSTRAP_PARALLEL), verifica cada uno y reintenta los corruptos.
+    - El archivo completo se restaura sobre la BD local, otra vez con la API
+      de backup, y se migra si el líder tenía una versión de esquema anterior.
+    - El log de replicación sigue desde el seq del snapshot: la puesta al día
+      de replication_log.py pide sólo lo posterior.
+
+Al arrancar (bootstrap_si_hace_falta) se hace sólo si la BD local no tiene
+visitas, visitas archivadas ni entradas del log, y espera hasta
+BOOTSTRAP_LEADER_WAIT segundos a que haya líder. Debe llamarse antes de
+replication_log.start() y de servir peticiones.
+
+Uso (nodo detenido):
+    python bootstrap.py http://localhost:5001 --leader-id 2 [--force]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from cluster_client import request_node
+from config import Config
+from models import db, EntradaReplicacion, VisitaEmergencia
+
+logger = logging.getLogger(__name__)
+
+# Intentos por trozo antes de abortar la descarga
+CHUNK_RETRIES = 3
+
+
+def _ruta_bd():
+    """Ruta absoluta del archivo SQLite del nodo (requiere contexto de app)"""
+    return os.path.abspath(db.engine.url.database)
+
+
+# ============================================================================
+# LÍDER: SNAPSHOTS
+# ============================================================================
+
+class _Snapshot:
+    __slots__ = ('snapshot_id', 'path', 'seq', 'schema_version', 'size', 'chunk_size', 'chunks', 'created',
+                 'backup_ms')
+
+    def manifest(self):
+        return {
+            'snapshot_id': self.snapshot_id,
+            'seq': self.seq,
+            'schema_version': self.schema_version,
+            'size': self.size,
+            'chunk_size': self.chunk_size,
+            'chunks': self.chunks,
+            'backup_ms': self.backup_ms
+        }
+
+
+class SnapshotStore:
+    """Snapshots generados por este nodo, en data/snapshots junto a la BD, por BOOTSTRAP_SNAPSHOT_TTL segundos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = {}
+
+    def crear(self):
+        """
+        Copia consistente de la BD del nodo (requiere contexto de app).
+
+        Returns:
+            dict: manifiesto (snapshot_id, seq, schema_version, size,
+            chunk_size, chunks con el SHA-256 de cada trozo, backup_ms)
+        """
+        self._limpiar()
+        ruta = _ruta_bd()
+        directorio = os.path.join(os.path.dirname(ruta), 'snapshots')
+        os.makedirs(directorio, exist_ok=True)
+
+        snapshot = _Snapshot()
+        snapshot.snapshot_id = uuid.uuid4().hex[:12]
+        snapshot.path = os.path.join(directorio, f'snapshot_{snapshot.snapshot_id}.db')
+        inicio = time.perf_counter()
+        origen = sqlite3.connect(ruta, timeout=30)
+        copia = sqlite3.connect(snapshot.path)
+        try:
+            # Una sola pasada: en WAL es una transacción de lectura (consistente
+            # y sin bloquear escrituras); por pasos se reiniciaría con cada commit
+            origen.backup(copia)
+            snapshot.seq = copia.execute(f'SELECT COALESCE(MAX(seq), 0) FROM '
+                                         f'{EntradaReplicacion.__tablename__}').fetchone()[0]
+            snapshot.schema_version = copia.execute('PRAGMA user_version').fetchone()[0]
+            copia.execute('PRAGMA journal_mode = DELETE')
+        except Exception:
+            copia.close()
+            os.remove(snapshot.path)
+            raise
+        finally:
+            origen.close()
+        copia.close()
+        snapshot.backup_ms = round((time.perf_counter() - inicio) * 1000, 1)
+
+        snapshot.size = os.path.getsize(snapshot.path)
+        snapshot.chunk_size = Config.BOOTSTRAP_CHUNK_KB * 1024
+        snapshot.chunks = []
+        with open(snapshot.path, 'rb') as archivo:
+            while True:
+                trozo = archivo.read(snapshot.chunk_size)
+                if not trozo:
+                    break
+                snapshot.chunks.append(hashlib.sha256(trozo).hexdigest())
+        snapshot.created = time.monotonic()
+
+        with self._lock:
+            self._snapshots[snapshot.snapshot_id] = snapshot
+        logger.info(f'Snapshot {snapshot.snapshot_id} para bootstrap: {snapshot.size / 2**20:.1f} MB, '
+                    f'seq {snapshot.seq}, {len(snapshot.chunks)} trozos ({snapshot.backup_ms} ms)')
+        return snapshot.manifest()
+
+    def leer(self, snapshot_id, n):
+        """
+        Trozo `n` de un snapshot.
+
+        Raises:
+            KeyError: snapshot desconocido o expirado
+            IndexError: trozo fuera de rango
+        """
+        with self._lock:
+            snapshot = self._snapshots[snapshot_id]
+        if not 0 <= n < len(snapshot.chunks):
+            raise IndexError(n)
+        with open(snapshot.path, 'rb') as archivo:
+            archivo.seek(n * snapshot.chunk_size)
+            return archivo.read(snapshot.chunk_size)
+
+    def borrar(self, snapshot_id):
+        with self._lock:
+            snapshot = self._snapshots.pop(snapshot_id, None)
+        if snapshot is not None and os.path.exists(snapshot.path):
+            os.remove(snapshot.path)
+        return snapshot is not None
+
+    def _limpiar(self):
+        limite = time.monotonic() - Config.BOOTSTRAP_SNAPSHOT_TTL
+        with self._lock:
+            viejos = [s for s in self._snapshots.values() if s.created < limite]
+        for snapshot in viejos:
+            self.borrar(snapshot.snapshot_id)
+
+
+snapshots = SnapshotStore()
+
+
+# ============================================================================
+# NODO NUEVO: DESCARGA Y RESTAURACIÓN
+# ============================================================================
+
+def bd_vacia():
+    """True si la BD local no tiene visitas (ni archivadas) ni entradas del log (requiere contexto de app)"""
+    if db.session.query(VisitaEmergencia.id_visita).first() is not None:
+        return False
+    if db.session.query(EntradaReplicacion.seq).first() is not None:
+        return False
+    return db.session.execute(db.text('SELECT 1 FROM ARCHIVO_FOLIOS LIMIT 1')).first() is None
+
+
+def descargar(node_id, base_url, destino):
+    """
+    Pide un snapshot al nodo y lo baja a `destino` verificando cada trozo.
+
+    Returns:
+        dict: manifiesto del snapshot
+
+    Raises:
+        RuntimeError: el nodo no generó el snapshot o un trozo no coincide
+            con su checksum tras CHUNK_RETRIES intentos
+    """
+    respuesta = request_node(node_id, base_url, '/api/cluster/bootstrap/snapshot', method='POST',
+                             timeout=Config.BOOTSTRAP_TIMEOUT)
+    if not respuesta.ok:
+        raise RuntimeError(f'El nodo {node_id} no generó el snapshot: {respuesta.status} ({respuesta.error})')
+    manifest = respuesta.data
+    base = f"{base_url}/api/cluster/bootstrap/snapshot/{manifest['snapshot_id']}"
+    sesion = requests.Session()
+
+    def bajar(n):
+        for intento in range(1, CHUNK_RETRIES + 1):
+            try:
+                r = sesion.get(f'{base}/{n}', timeout=Config.BOOTSTRAP_TIMEOUT)
+                r.raise_for_status()
+                if hashlib.sha256(r.content).hexdigest() == manifest['chunks'][n]:
+                    os.pwrite(fd, r.content, n * manifest['chunk_size'])
+                    return len(r.content)
+                logger.warning(f'Trozo {n} del snapshot con checksum distinto (intento {intento})')
+            except requests.RequestException as e:
+                logger.warning(f'Error bajando el trozo {n} del snapshot (intento {intento}): {e}')
+        raise RuntimeError(f'Trozo {n} del snapshot inválido tras {CHUNK_RETRIES} intentos')
+
+    fd = os.open(destino, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, manifest['size'])
+        with ThreadPoolExecutor(Config.BOOTSTRAP_PARALLEL) as pool:
+            total = sum(pool.map(bajar, range(len(manifest['chunks']))))
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+        try:
+            sesion.delete(base, timeout=Config.BOOTSTRAP_TIMEOUT)
+        except requests.RequestException:
+            pass  # el líder lo borra al expirar
+        sesion.close()
+    if total != manifest['size']:
+        raise RuntimeError(f"Snapshot incompleto: {total} de {manifest['size']} bytes")
+    return manifest
+
+
+def restaurar(app, ruta_snapshot):
+    """
+    Reemplaza el contenido de la BD del nodo por el del snapshot (API de
+    backup de SQLite), la migra y reinicia los estados en memoria que
+    dependían de la BD anterior.
+    """
+    from anti_entropy import anti_entropy
+    from auth import init_default_users
+    from availability import availability
+    from consecutivos import allocator
+    from idempotency import idempotency
+    from migrations import run_migrations
+    from resource_cache import resource_cache
+
+    with app.app_context():
+        ruta = _ruta_bd()
+        db.session.remove()
+        origen = sqlite3.connect(ruta_snapshot)
+        destino = sqlite3.connect(ruta, timeout=30)
+        try:
+            origen.backup(destino)
+        finally:
+            destino.close()
+            origen.close()
+
+        db.engine.dispose()
+        lectura = app.extensions.get('engine_lectura')
+        if lectura is not None:
+            lectura.dispose()
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql('PRAGMA journal_mode = WAL')
+        db.create_all()
+        run_migrations(db.engine)
+        init_default_users()
+        availability.load()
+        db.session.remove()
+
+    allocator.reset()
+    resource_cache.reset()
+    anti_entropy.reset()
+    idempotency.reset()
+    # Cuerpos y ETags de /snapshot de la BD anterior
+    app.extensions.pop('snapshot_cache', None)
+
+
+def bootstrap(app, node_id, base_url):
+    """
+    Descarga un snapshot de `node_id` y lo restaura sobre la BD local.
+
+    Returns:
+        dict: seq, size, chunks, tiempos (snapshot_s en el líder, download_s, restore_s, total_s) y MB/s
+    """
+    with app.app_context():
+        directorio = os.path.dirname(_ruta_bd())
+    inicio = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=directorio, prefix='bootstrap_') as tmp:
+        ruta = os.path.join(tmp, 'snapshot.db')
+        manifest = descargar(node_id, base_url, ruta)
+        descargado = time.perf_counter()
+        restaurar(app, ruta)
+    fin = time.perf_counter()
+
+    resumen = {
+        'leader': node_id,
+        'seq': manifest['seq'],
+        'size': manifest['size'],
+        'chunks': len(manifest['chunks']),
+        'snapshot_s': round(manifest['backup_ms'] / 1000, 2),
+        'download_s': round(descargado - inicio, 2),
+        'restore_s': round(fin - descargado, 2),
+        'total_s': round(fin - inicio, 2),
+        'mb_s': round(manifest['size'] / 2**20 / (fin - inicio), 1)
+    }
+    logger.info(f"Bootstrap desde el nodo {node_id}: {resumen['size'] / 2**20:.1f} MB hasta el seq "
+                f"{resumen['seq']} en {resumen['total_s']}s ({resumen['mb_s']} MB/s)")
+    return resumen
+
+
+def bootstrap_si_hace_falta(app, bully_manager):
+    """
+    Al arrancar: si la BD local está vacía y hay otro nodo líder, se trae su
+    snapshot. Un error deja la BD como estaba (el nodo arranca vacío y sólo
+    recibe la replicación).
+
+    Returns:
+        dict: resumen de bootstrap() o None si no se hizo
+    """
+    from models import get_leader_flask_url
+
+    if Config.BOOTSTRAP_LEADER_WAIT <= 0 or bully_manager is None:
+        return None
+    with app.app_context():
+        vacia = bd_vacia()
+        db.session.remove()
+    if not vacia:
+        return None
+
+    limite = time.monotonic() + Config.BOOTSTRAP_LEADER_WAIT
+    lider = bully_manager.get_current_leader()
+    while lider is None and time.monotonic() < limite:
+        time.sleep(0.5)
+        lider = bully_manager.get_current_leader()
+    if lider is None or lider == Config.NODE_ID:
+        logger.info('BD vacía sin otro líder del cual copiar: se arranca sin bootstrap')
+        return None
+
+    _, url = get_leader_flask_url(bully_manager)
+    try:
+        return bootstrap(app, lider, url)
+    except Exception as e:
+        logger.error(f'Error en el bootstrap desde el líder {lider}: {e}')
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Copia la BD del líder a este nodo (detenido)')
+    parser.add_argument('url', help='URL Flask del líder, p. ej. http://localhost:5001')
+    parser.add_argument('--leader-id', type=int, required=True, help='NODE_ID del líder')
+    parser.add_argument('--force', action='store_true', help='Reemplazar aunque la BD local tenga visitas')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+    Config.initialize_node_id()
+    from app_factory import create_app
+    app = create_app()
+
+    with app.app_context():
+        if not args.force and not bd_vacia():
+            print('La BD local ya tiene visitas o entradas del log (usar --force para reemplazarla)')
+            return 1
+    resumen = bootstrap(app, args.leader_id, args.url.rstrip('/'))
+    print(f"{resumen['size'] / 2**20:.1f} MB hasta el seq {resumen['seq']} en {resumen['total_s']}s "
+          f"(descarga {resumen['download_s']}s, restauración {resumen['restore_s']}s)")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
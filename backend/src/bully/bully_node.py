@@ -4,7 +4,7 @@ import time
 import threading
 import logging
 from enum import Enum
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional
 from .communication import CommunicationManager, Message
 from .discovery import NodeDiscovery
 
@@ -77,6 +77,10 @@ class BullyNode:
         self.node_last_seen: Dict[int, float] = {}
         self.grace_period = 30  # Segundos antes de aceptar líder de menor prioridad
 
+        # Observadores de actividad de otros nodos: fn(evento, node_id) con evento
+        # 'seen', 'discovered' o 'lost' (p. ej. los circuit breakers de cluster_client)
+        self.node_listeners: List[Callable[[str, int], None]] = []
+
         # Inicializar tracking para nodos conocidos
         for nid in self.cluster_nodes.keys():
             if nid != node_id:
@@ -566,6 +570,18 @@ class BullyNode:
         if node_id != self.node_id and node_id in self.node_last_seen:
             self.node_last_seen[node_id] = time.time()
             logger.debug(f"[Node-{self.node_id}] [TRACKING] Updated activity for node {node_id}")
+            self._notify_node_event('seen', node_id)
+
+    def add_node_listener(self, listener: Callable[[str, int], None]):
+        """Registra fn(evento, node_id) para los eventos 'seen', 'discovered' y 'lost'"""
+        self.node_listeners.append(listener)
+
+    def _notify_node_event(self, event: str, node_id: int):
+        for listener in self.node_listeners:
+            try:
+                listener(event, node_id)
+            except Exception as e:
+                logger.error(f"[Node-{self.node_id}] [TRACKING] Node listener failed on {event} {node_id}: {e}")
 
     # ========================================================================
     # GESTIÓN DINÁMICA DE NODOS
@@ -583,6 +599,7 @@ class BullyNode:
         """
         logger.info(f"[Node-{self.node_id}] [DYNAMIC] Callback: New node discovered - {node_id} at {host}:{tcp_port}")
         self.add_node(node_id, host, tcp_port, udp_port)
+        self._notify_node_event('discovered', node_id)
 
         # Si descubrimos un nodo con mayor ID y no hay líder, iniciar elección
         if node_id > self.node_id and self.current_leader is None:
@@ -597,6 +614,7 @@ class BullyNode:
         """
         logger.warning(f"[Node-{self.node_id}] [DYNAMIC] Callback: Node lost - {node_id}")
         self.remove_node(node_id)
+        self._notify_node_event('lost', node_id)
 
         # Si era el líder, iniciar elección
         if self.current_leader == node_id:
@@ -0,0 +1,371 @@
+"""
+Consultas scatter-gather a los demás nodos del cluster.
+
+scatter_gather() hace la misma petición (GET, o POST para difundir cambios)
+a todos los nodos a la vez y espera a lo más un plazo global: un nodo caído
+o lento ya no suma su timeout al de los demás (antes cada nodo muerto
+agregaba 2 s a la consulta), sólo aparece con estado 'timeout' u 'offline'
+junto a los resultados parciales de los demás.
+
+Las peticiones salen de un pool de hilos compartido sobre una sola
+requests.Session, así que las conexiones HTTP keep-alive se reutilizan entre
+consultas. Al vencer el plazo se cancelan las peticiones que no habían
+empezado; las que siguen en curso se abandonan (su resultado se descarta) y
+liberan su hilo al agotar su propio timeout, que nunca excede el plazo.
+
+Las respuestas se piden en la codificación por columnas (y gzip) de codec.py
+y se devuelven ya decodificadas como JSON normal.
+
+Con conditional=True se guarda el ETag y el JSON ya decodificado de cada
+(nodo, ruta); la siguiente petición manda If-None-Match y un 304 reutiliza el
+resultado anterior sin transferir ni parsear el cuerpo.
+
+Cada nodo tiene un circuit breaker (ver CircuitBreaker): tras varias fallas
+seguidas las peticiones a ese nodo fallan al instante con estado
+'circuit_open' en lugar de esperar el timeout. Además de las fallas HTTP lo
+alimentan los eventos de Bully (watch_bully): un nodo perdido por discovery
+abre su circuito y una señal de vida permite probarlo antes de tiempo.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import codec
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Peticiones simultáneas (y conexiones keep-alive por nodo)
+MAX_WORKERS = 16
+
+_lock = threading.Lock()
+_session = None
+_executor = None
+
+# (node_id, url, params) -> (etag, data) de las peticiones condicionales
+_etags = {}
+
+
+def _cliente():
+    """requests.Session y pool de hilos compartidos (se crean en el primer uso)"""
+    global _session, _executor
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='cluster-client')
+        return _session, _executor
+
+
+# ============================================================================
+# CIRCUIT BREAKERS POR NODO
+# ============================================================================
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Estado de las peticiones a un nodo:
+        closed:    pasan; Config.BREAKER_FAILURE_THRESHOLD fallas seguidas lo abren
+        open:      fallan al instante durante Config.BREAKER_RESET_TIMEOUT segundos
+        half_open: pasa UNA petición de prueba; si responde se cierra, si no se reabre
+    """
+
+    __slots__ = ('node_id', 'state', 'failures', 'opened_at', 'probe', 'last_error', 'changed_at')
+
+    def __init__(self, node_id):
+        self.node_id = node_id
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probe = False       # hay una petición de prueba en curso (half_open)
+        self.last_error = None
+        self.changed_at = time.time()
+
+    def to_dict(self):
+        return {'node_id': self.node_id, 'state': self.state, 'failures': self.failures,
+                'last_error': self.last_error, 'since': self.changed_at}
+
+
+class BreakerRegistry:
+    """Circuit breakers de todos los nodos y el historial de sus transiciones"""
+
+    def __init__(self, historial=100):
+        self._lock = threading.Lock()
+        self._breakers = {}
+        self.transitions = deque(maxlen=historial)
+
+    def _breaker(self, node_id):
+        breaker = self._breakers.get(node_id)
+        if breaker is None:
+            breaker = self._breakers[node_id] = CircuitBreaker(node_id)
+        return breaker
+
+    def _transition(self, breaker, state, reason):
+        anterior, breaker.state = breaker.state, state
+        breaker.changed_at = time.time()
+        if state == OPEN:
+            breaker.opened_at = time.monotonic()
+        breaker.probe = False
+        self.transitions.append({'node_id': breaker.node_id, 'from': anterior, 'to': state,
+                                 'reason': reason, 'at': breaker.changed_at})
+        log = logger.warning if state == OPEN else logger.info
+        log(f'Circuito del nodo {breaker.node_id}: {anterior} -> {state} ({reason})')
+
+    def allow(self, node_id):
+        """True si se puede hacer una petición al nodo (en half_open, sólo la de prueba)"""
+        with self._lock:
+            breaker = self._breaker(node_id)
+            if breaker.state == CLOSED:
+                return True
+            if breaker.state == OPEN:
+                if time.monotonic() - breaker.opened_at < Config.BREAKER_RESET_TIMEOUT:
+                    return False
+                self._transition(breaker, HALF_OPEN, 'fin de la espera')
+            if breaker.probe:
+                return False
+            breaker.probe = True
+            return True
+
+    def record(self, node_id, ok, error=None):
+        """Registra el resultado de una petición permitida por allow()"""
+        with self._lock:
+            breaker = self._breaker(node_id)
+            if ok:
+                breaker.failures = 0
+                if breaker.state != CLOSED:
+                    self._transition(breaker, CLOSED, 'respuesta del nodo')
+                return
+            breaker.failures += 1
+            breaker.last_error = error
+            if breaker.state == HALF_OPEN:
+                self._transition(breaker, OPEN, f'falló la prueba: {error}')
+            elif breaker.state == CLOSED and breaker.failures >= Config.BREAKER_FAILURE_THRESHOLD:
+                self._transition(breaker, OPEN, f'{breaker.failures} fallas seguidas: {error}')
+
+    def release(self, node_id):
+        """Devuelve el permiso de allow() de una petición que no llegó a enviarse (no cuenta como falla)"""
+        with self._lock:
+            breaker = self._breakers.get(node_id)
+            if breaker is not None and breaker.state == HALF_OPEN:
+                breaker.probe = False
+
+    def on_node_event(self, event, node_id):
+        """Listener de BullyNode: 'lost' abre el circuito; 'seen'/'discovered' permiten probarlo ya"""
+        with self._lock:
+            if event == 'lost':
+                breaker = self._breaker(node_id)
+                if breaker.state != OPEN:
+                    self._transition(breaker, OPEN, 'nodo perdido (discovery)')
+            elif event in ('seen', 'discovered'):
+                breaker = self._breakers.get(node_id)
+                if breaker is not None and breaker.state == OPEN:
+                    self._transition(breaker, HALF_OPEN, f'señal de vida de Bully ({event})')
+
+    def state(self, node_id):
+        with self._lock:
+            breaker = self._breakers.get(node_id)
+            return breaker.state if breaker else CLOSED
+
+    def snapshot(self):
+        """Estado de cada circuito y las últimas transiciones (para /api/cluster/breakers)"""
+        with self._lock:
+            return {
+                'nodes': [b.to_dict() for _, b in sorted(self._breakers.items())],
+                'transitions': list(self.transitions)
+            }
+
+    def reset(self):
+        with self._lock:
+            self._breakers.clear()
+            self.transitions.clear()
+
+
+breakers = BreakerRegistry()
+
+
+def watch_bully(bully_manager):
+    """Conecta los eventos de actividad de nodos de Bully con los circuit breakers"""
+    if bully_manager is not None and hasattr(bully_manager, 'add_node_listener'):
+        bully_manager.add_node_listener(breakers.on_node_event)
+
+
+def _es_falla(respuesta):
+    """Resultados que cuentan como falla del nodo (un 4xx o JSON inválido prueban que está vivo)"""
+    if respuesta.status in ('offline', 'timeout'):
+        return True
+    return respuesta.status == 'error' and not (respuesta.error or '').startswith(('HTTP 4', 'JSON'))
+
+
+# ============================================================================
+# PETICIONES
+# ============================================================================
+
+class RespuestaNodo:
+    """
+    Resultado de un nodo en scatter_gather().
+
+    status: 'online' (2xx con JSON), 'error' (otro código HTTP o respuesta
+    inválida), 'offline' (conexión rechazada), 'timeout' (sin respuesta
+    dentro del plazo) o 'circuit_open' (no se intentó: circuito abierto).
+
+    not_modified indica que el nodo respondió 304 y `data` es el resultado
+    guardado de la petición anterior (no modificarlo).
+    """
+
+    __slots__ = ('node_id', 'status', 'data', 'elapsed_ms', 'error', 'not_modified')
+
+    def __init__(self, node_id, status, data=None, elapsed_ms=None, error=None, not_modified=False):
+        self.node_id = node_id
+        self.status = status
+        self.data = data
+        self.elapsed_ms = elapsed_ms
+        self.error = error
+        self.not_modified = not_modified
+
+    @property
+    def ok(self):
+        return self.status == 'online'
+
+    def to_dict(self):
+        """Estado del nodo sin los datos (para incluirlo junto a resultados parciales)"""
+        return {'node_id': self.node_id, 'status': self.status,
+                'elapsed_ms': self.elapsed_ms, 'error': self.error, 'not_modified': self.not_modified}
+
+    def __repr__(self):
+        return f'<RespuestaNodo {self.node_id} {self.status}>'
+
+
+def _request(session, node_id, method, url, params, json, timeout, conditional=False):
+    inicio = time.monotonic()
+
+    def respuesta(status, data=None, error=None, not_modified=False):
+        return RespuestaNodo(node_id, status, data, round((time.monotonic() - inicio) * 1000, 1), error,
+                             not_modified)
+
+    clave = (node_id, url, tuple(sorted((params or {}).items())))
+    anterior = _etags.get(clave) if conditional else None
+    headers = {'Accept': codec.ACCEPT}
+    if anterior:
+        headers['If-None-Match'] = anterior[0]
+    try:
+        response = session.request(method, url, params=params, json=json, headers=headers, timeout=timeout)
+    except requests.exceptions.Timeout:
+        return respuesta('timeout', error='timeout')
+    except requests.exceptions.ConnectionError as e:
+        return respuesta('offline', error=str(e))
+    except Exception as e:
+        return respuesta('error', error=str(e))
+
+    if anterior and response.status_code == 304:
+        return respuesta('online', data=anterior[1], not_modified=True)
+    if not response.ok:
+        return respuesta('error', error=f'HTTP {response.status_code}')
+    try:
+        data = codec.decode(response.content, response.headers.get('Content-Type', ''))
+    except (ValueError, KeyError, TypeError) as e:
+        return respuesta('error', error=f'JSON inválido: {e}')
+    if conditional and response.headers.get('ETag'):
+        _etags[clave] = (response.headers['ETag'], data)
+    return respuesta('online', data=data)
+
+
+def scatter_gather(nodos, path, params=None, deadline=None, method='GET', json=None, conditional=False):
+    """
+    Petición HTTP (GET por defecto) a todos los nodos en paralelo, con un plazo global.
+
+    Args:
+        nodos: lista de (node_id, base_url), p. ej. (2, 'http://localhost:5002')
+        path: ruta a consultar, p. ej. '/api/cluster/doctors'
+        params: (opcional) query string; o función node_id -> query string
+            cuando cambia por nodo
+        deadline: (opcional) segundos máximos para toda la consulta
+            (default: Config.CLUSTER_QUERY_DEADLINE)
+        method: (opcional) método HTTP
+        json: (opcional) cuerpo JSON, el mismo para todos los nodos
+        conditional: (opcional) True para usar ETag/If-None-Match (ver arriba)
+
+    Returns:
+        list[RespuestaNodo]: una por nodo, en el orden de `nodos`
+    """
+    if not nodos:
+        return []
+    deadline = Config.CLUSTER_QUERY_DEADLINE if deadline is None else deadline
+    session, executor = _cliente()
+
+    fin = time.monotonic() + deadline
+    futures = [(node_id, executor.submit(_request, session, node_id, method, f'{base_url}{path}',
+                                         params(node_id) if callable(params) else params, json,
+                                         deadline, conditional) if breakers.allow(node_id) else None)
+               for node_id, base_url in nodos]
+    wait([f for _, f in futures if f is not None], timeout=max(fin - time.monotonic(), 0))
+
+    respuestas = []
+    for node_id, future in futures:
+        if future is None:
+            respuestas.append(RespuestaNodo(node_id, 'circuit_open', elapsed_ms=0.0, error='circuito abierto'))
+            continue
+        if future.done() and not future.cancelled():
+            respuesta = future.result()
+        elif future.cancel():
+            # Seguía en la cola del pool (ocupado por otras peticiones): nunca
+            # llegó al nodo, así que no dice nada de él ni cuenta para su circuito
+            respuesta = RespuestaNodo(node_id, 'timeout', elapsed_ms=round(deadline * 1000, 1),
+                                      error='no se envió dentro del plazo (pool ocupado)')
+            breakers.release(node_id)
+            logger.warning(f'Nodo {node_id} {path}: {respuesta.status} ({respuesta.error})')
+            respuestas.append(respuesta)
+            continue
+        else:
+            respuesta = RespuestaNodo(node_id, 'timeout', elapsed_ms=round(deadline * 1000, 1),
+                                      error='sin respuesta dentro del plazo')
+        breakers.record(node_id, not _es_falla(respuesta), respuesta.error)
+        if not respuesta.ok:
+            logger.warning(f'Nodo {node_id} {path}: {respuesta.status} ({respuesta.error})')
+        respuestas.append(respuesta)
+    return respuestas
+
+
+def request_node(node_id, base_url, path, method='GET', json=None, timeout=None, params=None):
+    """
+    Petición a un solo nodo (p. ej. follower -> líder) con su circuit breaker.
+
+    Returns:
+        RespuestaNodo: con status 'circuit_open' si el nodo se sabe caído
+    """
+    return scatter_gather([(node_id, base_url)], path, params=params, deadline=timeout, method=method,
+                          json=json)[0]
+
+
+def request_node_direct(session, node_id, base_url, path, method='GET', json=None, timeout=None, params=None):
+    """
+    Como request_node, pero en el hilo que llama y con su propia sesión.
+
+    Para quien ya tiene hilos dedicados (p. ej. las colas de replication.py):
+    no ocupa el pool compartido de scatter_gather, así que su tráfico no
+    hace esperar a las consultas del usuario. Pasa por el circuit breaker
+    del nodo igual que request_node.
+
+    Args:
+        session: requests.Session del que llama
+        timeout: (opcional) segundos (default: Config.CLUSTER_QUERY_DEADLINE)
+
+    Returns:
+        RespuestaNodo: con status 'circuit_open' si el nodo se sabe caído
+    """
+    if not breakers.allow(node_id):
+        return RespuestaNodo(node_id, 'circuit_open', elapsed_ms=0.0, error='circuito abierto')
+    timeout = Config.CLUSTER_QUERY_DEADLINE if timeout is None else timeout
+    respuesta = _request(session, node_id, method, f'{base_url}{path}', params, json, timeout)
+    breakers.record(node_id, not _es_falla(respuesta), respuesta.error)
+    if not respuesta.ok:
+        logger.warning(f'Nodo {node_id} {path}: {respuesta.status} ({respuesta.error})')
+    return respuesta
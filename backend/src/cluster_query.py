@@ -0,0 +1,369 @@
+"""
+Consultas al cluster con filtros, proyección y agregados resueltos en cada nodo.
+
+get_all_cluster_doctors() y compañía traen las listas completas de cada sala
+y filtran o cuentan en el nodo que pregunta: "cardiólogos libres en todo el
+cluster" transfería todos los doctores de todos los nodos. Aquí el
+agregador manda una especificación pequeña a POST /api/cluster/query; cada
+nodo la compila a UNA consulta SQL sobre su sala y sólo viajan las filas (o
+los conteos) que hacen falta.
+
+Especificación (JSON):
+
+    {
+        "resource": "doctors",                          # ver RECURSOS
+        "where": {"especialidad": "Cardiología",        # igualdad
+                  "disponible": true,
+                  "id_sala": {"in": [1, 2]}},           # o {operador: valor}
+        "fields": ["id_doctor", "nombre", "id_sala"],   # proyección (default: todas)
+        "group_by": ["especialidad"],                   # conteo por grupo
+        "aggregate": "count",                           # sólo el total
+        "limit": 100
+    }
+
+Sólo se aceptan columnas de la lista blanca de cada recurso y los operadores
+de OPERADORES; los valores viajan siempre como parámetros. Las columnas de
+otras tablas (p. ej. paciente_nombre de una cama) agregan su JOIN sólo si la
+especificación las usa.
+
+Resultado: lista de dicts. Con group_by, uno por grupo con su 'count'; con
+aggregate='count', uno solo {'count': n}.
+"""
+import logging
+from datetime import date, datetime
+
+from sqlalchemy import func, select
+
+from models import db, Sala, Paciente, Doctor, Cama, TrabajadorSocial, VisitaEmergencia
+
+logger = logging.getLogger(__name__)
+
+MAX_LIMIT = 10000
+MAX_IN = 1000
+
+
+class QueryError(ValueError):
+    """Especificación de consulta inválida (recurso, columna, operador o valor)"""
+
+
+# ============================================================================
+# RECURSOS (lista blanca)
+# ============================================================================
+
+# Tablas unidas por nombre: (entidad, condición del LEFT JOIN)
+_JOINS = {
+    'sala': lambda base: (Sala, Sala.id_sala == base.id_sala),
+    'paciente': lambda base: (Paciente, Paciente.id_paciente == base.id_paciente),
+    'doctor': lambda base: (Doctor, Doctor.id_doctor == base.id_doctor),
+    'cama': lambda base: (Cama, Cama.id_cama == base.id_cama),
+}
+
+
+class _Recurso:
+    """Tabla base y columnas expuestas: nombre -> (expresión, JOIN que requiere o None)"""
+
+    def __init__(self, modelo, llave, columnas):
+        self.modelo = modelo
+        self.llave = llave
+        self.columnas = columnas
+
+
+RECURSOS = {
+    'doctors': _Recurso(Doctor, Doctor.id_doctor, {
+        'id_doctor': (Doctor.id_doctor, None),
+        'nombre': (Doctor.nombre, None),
+        'especialidad': (Doctor.especialidad, None),
+        'disponible': (Doctor.disponible, None),
+        'activo': (Doctor.activo, None),
+        'id_sala': (Doctor.id_sala, None),
+        'sala_numero': (Sala.numero, 'sala'),
+    }),
+    'beds': _Recurso(Cama, Cama.id_cama, {
+        'id_cama': (Cama.id_cama, None),
+        'numero': (Cama.numero, None),
+        'ocupada': (Cama.ocupada, None),
+        'id_sala': (Cama.id_sala, None),
+        'id_paciente': (Cama.id_paciente, None),
+        'paciente_nombre': (Paciente.nombre, 'paciente'),
+        'sala_numero': (Sala.numero, 'sala'),
+    }),
+    'social_workers': _Recurso(TrabajadorSocial, TrabajadorSocial.id_trabajador, {
+        'id_trabajador': (TrabajadorSocial.id_trabajador, None),
+        'nombre': (TrabajadorSocial.nombre, None),
+        'activo': (TrabajadorSocial.activo, None),
+        'id_sala': (TrabajadorSocial.id_sala, None),
+        'sala_numero': (Sala.numero, 'sala'),
+    }),
+    'visits': _Recurso(VisitaEmergencia, VisitaEmergencia.id_visita, {
+        'id_visita': (VisitaEmergencia.id_visita, None),
+        'folio': (VisitaEmergencia.folio, None),
+        'id_paciente': (VisitaEmergencia.id_paciente, None),
+        'id_doctor': (VisitaEmergencia.id_doctor, None),
+        'id_cama': (VisitaEmergencia.id_cama, None),
+        'id_trabajador': (VisitaEmergencia.id_trabajador, None),
+        'id_sala': (VisitaEmergencia.id_sala, None),
+        'sintomas': (VisitaEmergencia.sintomas, None),
+        'diagnostico': (VisitaEmergencia.diagnostico, None),
+        'estado': (VisitaEmergencia.estado, None),
+        'timestamp': (VisitaEmergencia.timestamp, None),
+        'fecha_cierre': (VisitaEmergencia.fecha_cierre, None),
+        'paciente_nombre': (Paciente.nombre, 'paciente'),
+        'doctor_nombre': (Doctor.nombre, 'doctor'),
+        'cama_numero': (Cama.numero, 'cama'),
+        'sala_numero': (Sala.numero, 'sala'),
+    }),
+}
+
+OPERADORES = {
+    'eq': lambda col, v: col.is_(None) if v is None else col == v,
+    'ne': lambda col, v: col.isnot(None) if v is None else col != v,
+    'lt': lambda col, v: col < v,
+    'le': lambda col, v: col <= v,
+    'gt': lambda col, v: col > v,
+    'ge': lambda col, v: col >= v,
+    'in': lambda col, v: col.in_(v),
+    'contains': lambda col, v: col.ilike(f"%{_escapar_like(v)}%", escape='\\'),
+}
+
+_ESCALARES = (str, int, float, bool, type(None))
+
+
+def _escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+# ============================================================================
+# VALIDACIÓN Y COMPILACIÓN
+# ============================================================================
+
+def _valor(recurso, nombre, operador, valor):
+    """Valida (y convierte) el valor de un filtro"""
+    columna = recurso.columnas[nombre][0]
+    if operador == 'in':
+        if not isinstance(valor, list) or len(valor) > MAX_IN:
+            raise QueryError(f"'{nombre}': 'in' requiere una lista de hasta {MAX_IN} valores")
+        return [_valor(recurso, nombre, 'eq', v) for v in valor]
+    if not isinstance(valor, _ESCALARES):
+        raise QueryError(f"'{nombre}': valor no escalar")
+    if operador == 'contains' and not isinstance(valor, str):
+        raise QueryError(f"'{nombre}': 'contains' requiere texto")
+    # Las fechas llegan como texto ISO; SQLite compara DATETIME como texto en
+    # el formato del ORM, así que se comparan como datetime
+    if isinstance(valor, str) and isinstance(columna.type, db.DateTime):
+        try:
+            return datetime.fromisoformat(valor)
+        except ValueError:
+            raise QueryError(f"'{nombre}': fecha inválida {valor!r}") from None
+    return valor
+
+
+def parse_spec(data):
+    """
+    Valida una especificación de consulta.
+
+    Args:
+        data: dict recibido (JSON)
+
+    Returns:
+        dict: especificación normalizada (resource, where, fields, group_by,
+        aggregate, limit)
+
+    Raises:
+        QueryError: si algo no está en la lista blanca o tiene otro tipo
+    """
+    if not isinstance(data, dict):
+        raise QueryError('La especificación debe ser un objeto JSON')
+    desconocidas = set(data) - {'resource', 'where', 'fields', 'group_by', 'aggregate', 'limit'}
+    if desconocidas:
+        raise QueryError(f'Claves desconocidas: {sorted(desconocidas)}')
+
+    recurso = RECURSOS.get(data.get('resource')) if isinstance(data.get('resource'), str) else None
+    if recurso is None:
+        raise QueryError(f"'resource' debe ser uno de {sorted(RECURSOS)}")
+
+    def columnas(clave):
+        nombres = data.get(clave) or []
+        if not isinstance(nombres, list) or not all(isinstance(n, str) for n in nombres):
+            raise QueryError(f"'{clave}' debe ser una lista de columnas")
+        invalidas = [n for n in nombres if n not in recurso.columnas]
+        if invalidas:
+            raise QueryError(f'Columnas no permitidas en {clave}: {invalidas}')
+        return list(dict.fromkeys(nombres))
+
+    where = data.get('where') or {}
+    if not isinstance(where, dict):
+        raise QueryError("'where' debe ser un objeto")
+    filtros = []
+    for nombre, condicion in where.items():
+        if nombre not in recurso.columnas:
+            raise QueryError(f'Columna no permitida en where: {nombre!r}')
+        pares = condicion.items() if isinstance(condicion, dict) else [('eq', condicion)]
+        for operador, valor in pares:
+            if operador not in OPERADORES:
+                raise QueryError(f'Operador desconocido: {operador!r}')
+            filtros.append((nombre, operador, _valor(recurso, nombre, operador, valor)))
+
+    aggregate = data.get('aggregate')
+    if aggregate not in (None, 'count'):
+        raise QueryError("'aggregate' sólo admite 'count'")
+
+    limit = data.get('limit')
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 1):
+        raise QueryError("'limit' debe ser un entero positivo")
+
+    return {
+        'resource': data['resource'],
+        'where': filtros,
+        'fields': columnas('fields'),
+        'group_by': columnas('group_by'),
+        'aggregate': aggregate,
+        'limit': min(limit or MAX_LIMIT, MAX_LIMIT),
+    }
+
+
+def to_json(spec):
+    """Especificación normalizada -> dict JSON para enviar a otro nodo"""
+    where = {}
+    for nombre, operador, valor in spec['where']:
+        if isinstance(valor, datetime):
+            valor = valor.isoformat()
+        elif isinstance(valor, list):
+            valor = [v.isoformat() if isinstance(v, datetime) else v for v in valor]
+        where.setdefault(nombre, {})[operador] = valor
+    return {'resource': spec['resource'], 'where': where, 'fields': spec['fields'],
+            'group_by': spec['group_by'], 'aggregate': spec['aggregate'], 'limit': spec['limit']}
+
+
+def compile_spec(spec, id_sala=None, excluir_salas=()):
+    """
+    Compila una especificación validada a un SELECT.
+
+    Args:
+        spec: resultado de parse_spec()
+        id_sala: (opcional) restringe a una sala (la del nodo que responde)
+        excluir_salas: (opcional) salas ya respondidas por su propio nodo
+
+    Returns:
+        (Select, nombres de las columnas del resultado)
+    """
+    recurso = RECURSOS[spec['resource']]
+    modelo = recurso.modelo
+
+    if spec['group_by']:
+        nombres = spec['group_by'] + ['count']
+    elif spec['aggregate'] == 'count':
+        nombres = ['count']
+    else:
+        nombres = spec['fields'] or list(recurso.columnas)
+
+    usadas = [n for n in nombres if n != 'count'] + [nombre for nombre, _, _ in spec['where']]
+    joins = dict.fromkeys(recurso.columnas[n][1] for n in usadas if recurso.columnas[n][1])
+
+    expresiones = [func.count().label('count') if n == 'count' else recurso.columnas[n][0].label(n)
+                   for n in nombres]
+    stmt = select(*expresiones).select_from(modelo)
+    for join in joins:
+        stmt = stmt.outerjoin(*_JOINS[join](modelo))
+
+    for nombre, operador, valor in spec['where']:
+        stmt = stmt.where(OPERADORES[operador](recurso.columnas[nombre][0], valor))
+    if id_sala is not None:
+        stmt = stmt.where(modelo.id_sala == id_sala)
+    if excluir_salas:
+        stmt = stmt.where(modelo.id_sala.notin_(list(excluir_salas)))
+
+    if spec['group_by']:
+        grupos = [recurso.columnas[n][0] for n in spec['group_by']]
+        stmt = stmt.group_by(*grupos).order_by(*grupos)
+    elif spec['aggregate'] != 'count':
+        stmt = stmt.order_by(recurso.llave)
+    return stmt.limit(spec['limit']), nombres
+
+
+def _json(valor):
+    return valor.isoformat() if isinstance(valor, (date, datetime)) else valor
+
+
+def run_spec(spec, id_sala=None, excluir_salas=()):
+    """Ejecuta una especificación validada en la BD local; lista de dicts"""
+    stmt, nombres = compile_spec(spec, id_sala=id_sala, excluir_salas=excluir_salas)
+    return [{n: _json(v) for n, v in zip(nombres, fila)} for fila in db.session.execute(stmt)]
+
+
+# ============================================================================
+# AGREGADOR
+# ============================================================================
+
+def merge_results(spec, partes):
+    """
+    Combina los resultados de varias salas.
+
+    Args:
+        spec: especificación validada
+        partes: listas de dicts de run_spec(), una por origen
+
+    Returns:
+        list: filas concatenadas (hasta limit), conteos por grupo sumados o
+        el total sumado
+    """
+    if spec['group_by']:
+        grupos = {}
+        for filas in partes:
+            for fila in filas:
+                clave = tuple(fila[n] for n in spec['group_by'])
+                grupos[clave] = grupos.get(clave, 0) + fila['count']
+        ordenados = sorted(grupos.items(), key=lambda item: tuple((v is None, v) for v in item[0]))
+        return [{**dict(zip(spec['group_by'], clave)), 'count': n}
+                for clave, n in ordenados][:spec['limit']]
+    if spec['aggregate'] == 'count':
+        return [{'count': sum(filas[0]['count'] for filas in partes if filas)}]
+    return [fila for filas in partes for fila in filas][:spec['limit']]
+
+
+def query_cluster(bully_manager, spec):
+    """
+    Ejecuta una especificación en TODO el cluster.
+
+    Cada nodo responde por su sala (POST /api/cluster/query). Las salas sin
+    respuesta de su nodo, y la propia, se responden con la BD local.
+
+    Args:
+        bully_manager: Instancia de BullyNode (None: sólo la BD local)
+        spec: dict de especificación (ver docstring del módulo)
+
+    Returns:
+        ResultadoCluster: dicts del resultado; las filas de otros nodos
+        traen 'source' = 'node_<id>' y las locales 'local' (parcial si
+        algún nodo no respondió; ver .nodos)
+
+    Raises:
+        QueryError: si la especificación no es válida
+    """
+    from cluster_client import scatter_gather
+    from models import ResultadoCluster, otros_nodos
+
+    spec = parse_spec(spec)
+    respuestas = scatter_gather(otros_nodos(bully_manager), '/api/cluster/query',
+                                method='POST', json=to_json(spec))
+
+    remotas = {}
+    for respuesta in respuestas:
+        if respuesta.ok:
+            try:
+                remotas[respuesta.node_id] = respuesta.data['rows']
+            except (KeyError, TypeError) as e:
+                logger.warning(f'Resultado inválido de /query del nodo {respuesta.node_id}: {e}')
+
+    agregado = spec['group_by'] or spec['aggregate']
+    partes = [[fila if agregado else {**fila, 'source': 'local'}
+               for fila in run_spec(spec, excluir_salas=remotas)]]
+    partes += [[fila if agregado else {**fila, 'source': f'node_{node_id}'} for fila in filas]
+               for node_id, filas in remotas.items()]
+
+    nodos = []
+    for respuesta in respuestas:
+        nodo = respuesta.to_dict()
+        if respuesta.ok and respuesta.node_id not in remotas:
+            nodo['status'] = 'error'
+        nodos.append(nodo)
+    return ResultadoCluster(merge_results(spec, partes), nodos=nodos)
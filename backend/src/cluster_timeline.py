@@ -0,0 +1,189 @@
+"""
+Línea de tiempo de visitas de TODO el cluster (más recientes primero).
+
+Juntar las últimas K visitas de N salas pidiendo K a cada nodo y ordenando
+transfiere N×K filas para mostrar K. Aquí cada sala es un flujo ya ordenado
+(GET /api/cluster/visits con su cursor; o la BD local si la sala no tiene
+nodo que responda) y el agregador hace un merge de K vías con un heap:
+
+    - La primera página de cada sala es de ~1.5·K/N filas y se pide a todos
+      los nodos en paralelo.
+    - Cuando un flujo se vacía y su siguiente fila todavía podría entrar en
+      la página (es el que acaba de dar la fila más reciente), se le pide la
+      página siguiente, de a lo más las filas que faltan. Las salas cuyas
+      visitas son más antiguas que lo ya elegido no se vuelven a consultar.
+
+Con visitas repartidas entre salas la página cuesta O(K) filas en total en
+lugar de O(N×K).
+
+El orden global es (timestamp, id_sala, id_visita) descendente: id_sala
+desempata visitas de salas distintas con el mismo timestamp. El cursor de
+la página siguiente es la llave de la última visita mostrada; de ahí se
+deriva el cursor de cada sala (ver _cursor_sala), así que no guarda estado.
+"""
+import heapq
+import logging
+import math
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from cluster_client import request_node, scatter_gather
+from config import Config
+from models import db, ResultadoCluster, Sala, VisitaEmergencia, get_visitas_page, otros_nodos
+from pagination import decode_cursor, encode_cursor, page_size
+
+logger = logging.getLogger(__name__)
+
+ORDEN_GLOBAL = (VisitaEmergencia.timestamp, VisitaEmergencia.id_sala, VisitaEmergencia.id_visita)
+
+# Primera página por sala: K/N filas por este factor (con visitas repartidas
+# así casi nunca hace falta una segunda ronda, que es secuencial) y nunca
+# menos de MIN_PAGINA_SALA
+FACTOR_PRIMERA_PAGINA = 1.5
+MIN_PAGINA_SALA = 5
+
+_EPOCA = datetime(1970, 1, 1)
+_ID_MAX = 2 ** 62
+
+
+class PaginaCluster(ResultadoCluster):
+    """
+    Página de una línea de tiempo del cluster.
+
+    Attributes:
+        next_cursor: cursor de la página siguiente (None si es la última)
+        filas_leidas: filas traídas de los nodos y de la BD local para armarla
+    """
+
+    def __init__(self, items=(), nodos=(), next_cursor=None, filas_leidas=0):
+        super().__init__(items, nodos)
+        self.next_cursor = next_cursor
+        self.filas_leidas = filas_leidas
+
+
+def _cursor_sala(clave, id_sala):
+    """
+    Cursor de /api/cluster/visits de una sala, equivalente a "después de
+    `clave`" (timestamp, id_sala, id_visita) en el orden global.
+    """
+    if clave is None:
+        return None
+    timestamp, sala_clave, id_visita = clave
+    if id_sala == sala_clave:
+        return encode_cursor((timestamp, id_visita))
+    # Salas menores van después en el mismo timestamp; mayores, antes
+    return encode_cursor((timestamp, _ID_MAX if id_sala < sala_clave else 0))
+
+
+def _orden(fila):
+    """Llave de heap (mínimo primero) del orden global descendente"""
+    timestamp = datetime.fromisoformat(fila['timestamp']) if fila['timestamp'] else datetime.min
+    return (-((timestamp - _EPOCA) // timedelta(microseconds=1)), -fila['id_sala'], -fila['id_visita'])
+
+
+class _Flujo:
+    """Visitas de una sala en orden descendente, pedidas por páginas según se consumen"""
+
+    def __init__(self, id_sala, nodo=None):
+        self.id_sala = id_sala
+        self.nodo = nodo  # (node_id, url) o None para la BD local
+        self.filas = deque()
+        self.next_cursor = None
+
+    def cargar(self, filas, next_cursor):
+        self.filas.extend(filas)
+        self.next_cursor = next_cursor
+        return len(filas)
+
+    def pedir_local(self, cursor, limit, estado):
+        page = get_visitas_page(estado=estado, id_sala=self.id_sala, cursor=cursor, limit=limit)
+        return self.cargar([v.to_row() for v in page.items], page.next_cursor)
+
+
+def get_cluster_timeline(bully_manager, limit=50, cursor=None, estado=None):
+    """
+    Una página de las visitas más recientes de todas las salas del cluster.
+
+    Args:
+        bully_manager: Instancia de BullyNode (None: sólo la BD local)
+        limit: tamaño de página (1..pagination.MAX_PAGE_SIZE)
+        cursor: next_cursor de la página anterior (None para la primera)
+        estado: (opcional) 'activa', 'completada' o 'cancelada'
+
+    Returns:
+        PaginaCluster: filas de /api/cluster/visits con 'source'; las salas
+        sin respuesta de su nodo salen de la BD local (parcial; ver .nodos)
+
+    Raises:
+        pagination.CursorError: si el cursor no es válido
+    """
+    limit = page_size(limit)
+    clave = decode_cursor(cursor, ORDEN_GLOBAL) if cursor else None
+
+    otros = dict(otros_nodos(bully_manager))
+    salas = {id_sala for (id_sala,) in db.session.execute(select(Sala.id_sala))}
+    flujos = {id_sala: _Flujo(id_sala, (id_sala, otros[id_sala]) if id_sala in otros else None)
+              for id_sala in sorted(salas | set(otros) | {Config.NODE_ID})}
+    por_sala = min(limit, max(MIN_PAGINA_SALA, math.ceil(limit * FACTOR_PRIMERA_PAGINA / len(flujos))))
+
+    def params(cursor_sala, n):
+        return {k: v for k, v in (('cursor', cursor_sala), ('limit', n), ('estado', estado)) if v}
+
+    def cargar_remota(flujo, respuesta):
+        """Carga la página de un nodo; False (y estado del nodo) si hay que usar la BD local"""
+        nodos[respuesta.node_id] = respuesta.to_dict()
+        if respuesta.ok:
+            try:
+                flujo.cargar(respuesta.data['visits'], respuesta.data['next_cursor'])
+                return True
+            except (KeyError, TypeError) as e:
+                logger.warning(f'Página inválida de /visits del nodo {respuesta.node_id}: {e}')
+                nodos[respuesta.node_id]['status'] = 'error'
+        flujo.nodo = None
+        return False
+
+    # Primera página de las salas remotas, en paralelo
+    nodos = {}
+    filas_leidas = 0
+    remotos = [f for f in flujos.values() if f.nodo]
+    for respuesta in scatter_gather([f.nodo for f in remotos], '/api/cluster/visits',
+                                    params=lambda node_id: params(_cursor_sala(clave, node_id), por_sala)):
+        flujo = flujos[respuesta.node_id]
+        if cargar_remota(flujo, respuesta):
+            filas_leidas += len(flujo.filas)
+
+    for flujo in flujos.values():
+        if flujo.nodo is None:
+            filas_leidas += flujo.pedir_local(_cursor_sala(clave, flujo.id_sala), por_sala, estado)
+
+    # Merge de K vías: el heap tiene la siguiente fila de cada flujo no vacío
+    heap = [(_orden(f.filas[0]), f.id_sala) for f in flujos.values() if f.filas]
+    heapq.heapify(heap)
+    items = []
+    while heap and len(items) < limit:
+        _, id_sala = heapq.heappop(heap)
+        flujo = flujos[id_sala]
+        fila = flujo.filas.popleft()
+        items.append({**fila, 'source': f'node_{id_sala}' if flujo.nodo else 'local'})
+
+        # Flujo vacío que sigue compitiendo: sólo se piden las filas que faltan
+        faltan = limit - len(items)
+        if not flujo.filas and flujo.next_cursor and faltan:
+            if flujo.nodo:
+                respuesta = request_node(*flujo.nodo, '/api/cluster/visits',
+                                         params=params(flujo.next_cursor, faltan))
+                if cargar_remota(flujo, respuesta):
+                    filas_leidas += len(flujo.filas)
+            if flujo.nodo is None and not flujo.filas:
+                filas_leidas += flujo.pedir_local(flujo.next_cursor, faltan, estado)
+        if flujo.filas:
+            heapq.heappush(heap, (_orden(flujo.filas[0]), id_sala))
+
+    hay_mas = any(f.filas or f.next_cursor for f in flujos.values())
+    next_cursor = None
+    if hay_mas and items:
+        ultima = items[-1]
+        next_cursor = encode_cursor((ultima['timestamp'], ultima['id_sala'], ultima['id_visita']))
+    return PaginaCluster(items, nodos=list(nodos.values()), next_cursor=next_cursor, filas_leidas=filas_leidas)
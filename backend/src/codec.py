@@ -0,0 +1,109 @@
+"""
+Codificación compacta de las respuestas de la API inter-nodos (/api/cluster/*).
+
+Las listas de filas (doctores, camas, visitas...) en JSON normal repiten los
+nombres de columna en cada fila y, con miles de filas, serializarlas y
+parsearlas domina el costo de la consulta. Con negociación de contenido:
+
+    - Accept: application/vnd.emergencias.columnar+json
+      Cada lista de dicts de primer nivel se envía por columnas
+      ({"__columns__": [...], "values": [[col1...], [col2...]]}); el resto del
+      payload queda igual. cluster_client lo pide siempre y decode() lo
+      devuelve a lista de dicts, así que quien llama no nota la diferencia.
+    - Accept-Encoding: gzip
+      Cuerpos de más de GZIP_MIN_BYTES se comprimen (requests lo descomprime
+      solo). Entre nodos de la misma red el costo de CPU es bajo y el cuerpo
+      baja ~10x.
+
+Clientes que sólo piden application/json (navegador, curl, nodos con una
+versión anterior) reciben el mismo JSON de siempre.
+"""
+import gzip
+import json
+
+from flask import Response, request
+
+COLUMNAR = 'application/vnd.emergencias.columnar+json'
+ACCEPT = f'{COLUMNAR}, application/json;q=0.9'
+
+# Por debajo de esto gzip no compensa (cabeceras + CPU)
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+
+
+def _es_tabla(valor):
+    """Lista no vacía de dicts con las mismas llaves (en el mismo orden)"""
+    if not isinstance(valor, list) or not valor or not isinstance(valor[0], dict):
+        return False
+    llaves = list(valor[0])
+    return all(isinstance(fila, dict) and list(fila) == llaves for fila in valor)
+
+
+def to_columns(payload):
+    """Payload con sus listas de filas de primer nivel convertidas a columnas"""
+    salida = {}
+    for clave, valor in payload.items():
+        if _es_tabla(valor):
+            columnas = list(valor[0])
+            salida[clave] = {'__columns__': columnas,
+                             'values': [list(col) for col in zip(*(fila.values() for fila in valor))]}
+        else:
+            salida[clave] = valor
+    return salida
+
+
+def from_columns(payload):
+    """Inverso de to_columns(): vuelve las tablas a listas de dicts"""
+    for clave, valor in payload.items():
+        if isinstance(valor, dict) and '__columns__' in valor:
+            columnas = valor['__columns__']
+            payload[clave] = [dict(zip(columnas, fila)) for fila in zip(*valor['values'])]
+    return payload
+
+
+def encode(payload, columnar=False):
+    """Serializa el payload (JSON compacto; por columnas si columnar=True)"""
+    if columnar:
+        payload = to_columns(payload)
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def decode(content, content_type):
+    """Decodifica un cuerpo de respuesta según su Content-Type"""
+    data = json.loads(content)
+    if content_type.startswith(COLUMNAR) and isinstance(data, dict):
+        return from_columns(data)
+    return data
+
+
+def wants_columnar():
+    """True si la petición actual acepta la codificación por columnas"""
+    return request.accept_mimetypes.quality(COLUMNAR) > request.accept_mimetypes.quality('application/json')
+
+
+def representation():
+    """(columnar, gzip) que corresponde a la petición actual"""
+    return wants_columnar(), 'gzip' in request.headers.get('Accept-Encoding', '')
+
+
+def make_response(body, columnar, comprimir, status=200):
+    """
+    Response de Flask para un cuerpo ya serializado con encode().
+
+    Args:
+        body: bytes de encode()
+        columnar: si body está por columnas
+        comprimir: si el cliente acepta gzip (se aplica sólo a cuerpos grandes)
+    """
+    response = Response(body, status=status, mimetype=COLUMNAR if columnar else 'application/json')
+    if comprimir and len(body) >= GZIP_MIN_BYTES:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
+
+
+def cluster_response(payload, status=200):
+    """Reemplazo de jsonify() para /api/cluster/*: negocia columnas y gzip"""
+    columnar, comprimir = representation()
+    return make_response(encode(payload, columnar), columnar, comprimir, status)
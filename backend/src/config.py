@@ -83,6 +83,61 @@ class Config:
     # Configuración de logs
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 
+    # Plazo global (segundos) de las consultas a todo el cluster (ver cluster_client.py)
+    CLUSTER_QUERY_DEADLINE = float(os.getenv('CLUSTER_QUERY_DEADLINE', '2.0'))
+
+    # Circuit breakers por nodo (ver cluster_client.py)
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '3'))  # fallas seguidas para abrir
+    BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '10'))  # segundos abierto antes de probar
+
+    # Replicación asíncrona del líder (ver replication.py)
+    REPLICATION_QUORUM = int(os.getenv('REPLICATION_QUORUM', '1'))  # acks a esperar antes de responder (0 = ninguno)
+    REPLICATION_ACK_TIMEOUT = float(os.getenv('REPLICATION_ACK_TIMEOUT', '3'))  # segundos máximos esperando el quorum
+    REPLICATION_WINDOW = int(os.getenv('REPLICATION_WINDOW', '4'))  # peticiones en vuelo por nodo
+    REPLICATION_TIMEOUT = float(os.getenv('REPLICATION_TIMEOUT', '3'))  # segundos por petición
+    REPLICATION_MAX_RETRIES = int(os.getenv('REPLICATION_MAX_RETRIES', '5'))  # intentos antes de descartar
+    REPLICATION_BATCH_SIZE = int(os.getenv('REPLICATION_BATCH_SIZE', '100'))  # entradas máximas por lote
+    REPLICATION_BATCH_WINDOW = float(os.getenv('REPLICATION_BATCH_WINDOW', '0.005'))  # segundos juntando un lote
+
+    # Log de replicación con secuencia global (ver replication_log.py)
+    REPLICATION_PULL_BATCH = int(os.getenv('REPLICATION_PULL_BATCH', '500'))  # entradas por petición al ponerse al día
+    REPLICATION_CATCHUP_INTERVAL = int(os.getenv('REPLICATION_CATCHUP_INTERVAL', '5'))  # segundos entre verificaciones
+    REPLICATION_GAP_WAIT = float(os.getenv('REPLICATION_GAP_WAIT', '1'))  # segundos esperando entradas faltantes
+
+    # Anti-entropía de visitas, doctores y camas contra el líder (ver anti_entropy.py)
+    ANTI_ENTROPY_INTERVAL = int(os.getenv('ANTI_ENTROPY_INTERVAL', '30'))  # segundos entre rondas (0 = desactivado)
+    ANTI_ENTROPY_BUDGET_KB = int(os.getenv('ANTI_ENTROPY_BUDGET_KB', '256'))  # KB transferidos por ronda como máximo
+
+    # Llaves de idempotencia de create-visit y replicate-visit (ver idempotency.py)
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000'))  # llaves en memoria (LRU)
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))  # segundos que se recuerda cada llave
+
+    # Lotes de create-visit en el líder: un commit y un mensaje de replicación por lote (ver admission.py)
+    ADMISSION_BATCH_SIZE = int(os.getenv('ADMISSION_BATCH_SIZE', '32'))  # visitas por lote (<= 1 = sin lotes)
+    ADMISSION_BATCH_WINDOW = float(os.getenv('ADMISSION_BATCH_WINDOW', '0'))  # segundos extra que espera un lote (0 = ninguno)
+
+    # Arranque de nodos nuevos desde un snapshot del líder (ver bootstrap.py)
+    BOOTSTRAP_LEADER_WAIT = int(os.getenv('BOOTSTRAP_LEADER_WAIT', '15'))  # segundos esperando líder (0 = desactivado)
+    BOOTSTRAP_CHUNK_KB = int(os.getenv('BOOTSTRAP_CHUNK_KB', '4096'))  # tamaño de cada trozo del snapshot
+    BOOTSTRAP_PARALLEL = int(os.getenv('BOOTSTRAP_PARALLEL', '4'))  # trozos descargándose a la vez
+    BOOTSTRAP_TIMEOUT = float(os.getenv('BOOTSTRAP_TIMEOUT', '300'))  # segundos por petición (incluye generarlo)
+    BOOTSTRAP_SNAPSHOT_TTL = int(os.getenv('BOOTSTRAP_SNAPSHOT_TTL', '600'))  # segundos que el líder guarda un snapshot
+
+    # Caché de recursos de las demás salas (ver resource_cache.py)
+    RESOURCE_DIGEST_INTERVAL = int(os.getenv('RESOURCE_DIGEST_INTERVAL', '15'))  # segundos (0 = sin verificación)
+    RESOURCE_CACHE_MAX_AGE = int(os.getenv('RESOURCE_CACHE_MAX_AGE', '60'))  # segundos sin sincronizar
+
+    # Conexiones del engine de solo lectura (ver db_utils.read_session)
+    READ_POOL_SIZE = int(os.getenv('READ_POOL_SIZE', '8'))
+
+    # Consecutivos de folio reservados por bloque (ver consecutivos.py)
+    FOLIO_BLOCK_SIZE = int(os.getenv('FOLIO_BLOCK_SIZE', '50'))
+
+    # Archivo de visitas cerradas (ver archive.py)
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '90'))  # antigüedad mínima
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))  # visitas por transacción
+    ARCHIVE_INTERVAL = int(os.getenv('ARCHIVE_INTERVAL', '3600'))  # segundos entre pasadas (0 = desactivado)
+
     @classmethod
     def initialize_node_id(cls):
         """
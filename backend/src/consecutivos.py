@@ -0,0 +1,152 @@
+"""
+Asignación de consecutivos de folio por bloques (hi/lo).
+
+En lugar de leer-modificar-escribir la fila de CONSECUTIVOS (sala, día) en
+cada visita, el proceso reserva un bloque de N números con un solo UPDATE y
+los entrega desde memoria. CONSECUTIVOS.consecutivo pasa a ser el "techo"
+reservado: el último número que algún proceso puede haber usado.
+
+Seguridad:
+    - La reserva se hace en la MISMA conexión/transacción que inserta la
+      visita (el evento before_insert recibe esa conexión); una conexión
+      aparte se bloquearía contra el lock de escritura de SQLite que la
+      propia transacción ya tiene. Hasta que la sesión confirma, el bloque
+      es "tentativo" (vive en session.info) y sólo lo usa esa sesión;
+      after_commit lo pasa al pool compartido del proceso y after_rollback
+      lo descarta (el UPDATE también se deshizo, así que esos números nunca
+      quedaron reservados en la BD).
+    - Nunca se reutiliza un número: un rollback o una caída del proceso sólo
+      dejan huecos en la secuencia, no duplicados.
+    - El bloque se indexa por (BD, sala, día); al cambiar el día UTC se
+      reserva un bloque nuevo y el del día anterior se descarta.
+"""
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_TENTATIVE_KEY = '_consecutivos_tentativos'
+
+
+class ConsecutivoAllocator:
+    """Reparte consecutivos (sala, día) desde bloques reservados en CONSECUTIVOS"""
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or Config.FOLIO_BLOCK_SIZE
+        self._lock = threading.Lock()
+        self._pool = {}       # (url, id_sala, fecha) -> deque([[siguiente, ultimo], ...])
+        self.reservas = 0     # bloques reservados en la BD (para métricas/benchmarks)
+
+    def next(self, session, connection, id_sala, fecha=None):
+        """
+        Siguiente consecutivo para la sala en el día dado (hoy UTC por defecto).
+
+        Args:
+            session: Session cuya transacción insertará la visita
+            connection: Connection de esa transacción
+            id_sala: ID de la sala
+            fecha: date del consecutivo
+
+        Returns:
+            int: consecutivo único para (sala, fecha)
+        """
+        fecha = fecha or datetime.utcnow().date()
+        key = (str(connection.engine.url), id_sala, fecha)
+
+        # 1. Bloque tentativo de esta misma transacción
+        tentativos = session.info.get(_TENTATIVE_KEY)
+        if tentativos and key in tentativos:
+            numero = self._take(tentativos[key])
+            if numero is not None:
+                return numero
+
+        # 2. Pool compartido (bloques ya confirmados)
+        with self._lock:
+            self._drop_old_days(fecha)
+            rangos = self._pool.get(key)
+            numero = self._take(rangos) if rangos else None
+        if numero is not None:
+            return numero
+
+        # 3. Reservar un bloque nuevo en esta transacción
+        inicio, fin = self._reserve(connection, id_sala, fecha)
+        rangos = session.info.setdefault(_TENTATIVE_KEY, {}).setdefault(key, deque())
+        rangos.append([inicio + 1, fin])
+        return inicio
+
+    @staticmethod
+    def _take(rangos):
+        while rangos:
+            rango = rangos[0]
+            if rango[0] <= rango[1]:
+                numero = rango[0]
+                rango[0] += 1
+                return numero
+            rangos.popleft()
+        return None
+
+    def _reserve(self, connection, id_sala, fecha):
+        """Sube el techo de (sala, fecha) en block_size; retorna (primero, último) del bloque"""
+        params = (id_sala, fecha.isoformat())
+        connection.exec_driver_sql(
+            'INSERT INTO CONSECUTIVOS (id_sala, fecha, consecutivo) VALUES (?, ?, 0) '
+            'ON CONFLICT (id_sala, fecha) DO NOTHING', params)
+        connection.exec_driver_sql(
+            'UPDATE CONSECUTIVOS SET consecutivo = consecutivo + ? WHERE id_sala = ? AND fecha = ?',
+            (self.block_size,) + params)
+        techo = connection.exec_driver_sql(
+            'SELECT consecutivo FROM CONSECUTIVOS WHERE id_sala = ? AND fecha = ?', params).scalar()
+        self.reservas += 1
+        logger.debug(f'Bloque de consecutivos reservado: sala {id_sala} {fecha} '
+                     f'{techo - self.block_size + 1}-{techo}')
+        return techo - self.block_size + 1, techo
+
+    def _drop_old_days(self, fecha):
+        for key in [k for k in self._pool if k[2] < fecha]:
+            del self._pool[key]
+
+    def promote(self, session):
+        """Pasa al pool compartido los bloques tentativos de una transacción confirmada"""
+        tentativos = session.info.pop(_TENTATIVE_KEY, None)
+        if not tentativos:
+            return
+        with self._lock:
+            for key, rangos in tentativos.items():
+                vivos = [r for r in rangos if r[0] <= r[1]]
+                if vivos:
+                    self._pool.setdefault(key, deque()).extend(vivos)
+
+    @staticmethod
+    def discard(session):
+        """Descarta los bloques tentativos (rollback: su UPDATE ya no existe)"""
+        session.info.pop(_TENTATIVE_KEY, None)
+
+    def reset(self):
+        """Olvida todos los bloques en memoria (sólo deja huecos en la secuencia)"""
+        with self._lock:
+            self._pool.clear()
+
+
+allocator = ConsecutivoAllocator()
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session):
+    # after_commit también se dispara al liberar un savepoint: esperar al commit real
+    if not session.in_nested_transaction():
+        allocator.promote(session)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _on_rollback(session):
+    # También se dispara al revertir un savepoint. No se sabe en qué savepoint
+    # se reservó cada bloque: descartarlos todos es seguro (a lo más deja
+    # huecos), conservarlos podría duplicar números.
+    allocator.discard(session)
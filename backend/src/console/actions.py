@@ -5,12 +5,16 @@ All actions that modify data with proper validation.
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
+import uuid
 from datetime import datetime
+from sqlalchemy.orm.exc import StaleDataError
 from models import (
     db, Paciente, Doctor, Cama, TrabajadorSocial, VisitaEmergencia,
-    get_leader_flask_url, replicate_visit_to_cluster
+    get_leader_flask_url, replicate_visit_to_cluster,
+    get_doctores_disponibles, get_camas_disponibles, with_relaciones
 )
-import requests
+from cluster_client import request_node
+from availability import availability
 from console.ui import (
     create_header, show_success, show_error, show_warning, show_info,
     get_text_input, get_int_input, confirm_action, pause, clear_screen
@@ -104,11 +108,7 @@ def create_visit(app, bully_manager, user):
             # Step 3: Select available doctor
             console.print("\n[bold cyan]PASO 3: Asignación de Doctor[/bold cyan]\n")
 
-            doctores = Doctor.query.filter_by(
-                id_sala=app.config['NODE_ID'],
-                disponible=True,
-                activo=True
-            ).all()
+            doctores = get_doctores_disponibles(id_sala=app.config['NODE_ID'])
 
             if not doctores:
                 show_error("No hay doctores disponibles en esta sala")
@@ -137,17 +137,22 @@ def create_visit(app, bully_manager, user):
                 f"\nSeleccione doctor (1-{len(doctores)})",
                 choices=list(range(1, len(doctores) + 1))
             )
-            doctor = doctores[doc_choice - 1]
+            doctor = db.session.get(Doctor, doctores[doc_choice - 1].id_doctor)
+
+            if doctor is None or not doctor.disponible or not doctor.activo:
+                # The index was stale (e.g. written by the web server process): rebuild it
+                availability.load()
+                show_error("El doctor ya no está disponible, intente de nuevo")
+                db.session.rollback()
+                pause()
+                return False
 
             console.print(f"[green]✓[/green] Doctor asignado: {doctor.nombre}")
 
             # Step 4: Select available bed
             console.print("\n[bold cyan]PASO 4: Asignación de Cama[/bold cyan]\n")
 
-            camas = Cama.query.filter_by(
-                id_sala=app.config['NODE_ID'],
-                ocupada=False
-            ).all()
+            camas = get_camas_disponibles(id_sala=app.config['NODE_ID'])
 
             if not camas:
                 show_error("No hay camas disponibles en esta sala")
@@ -174,7 +179,14 @@ def create_visit(app, bully_manager, user):
                 f"\nSeleccione cama (1-{len(camas)})",
                 choices=list(range(1, len(camas) + 1))
             )
-            cama = camas[cama_choice - 1]
+            cama = db.session.get(Cama, camas[cama_choice - 1].id_cama)
+
+            if cama is None or cama.ocupada:
+                availability.load()
+                show_error("La cama ya no está disponible, intente de nuevo")
+                db.session.rollback()
+                pause()
+                return False
 
             console.print(f"[green]✓[/green] Cama asignada: #{cama.numero}")
 
@@ -291,6 +303,8 @@ def create_visit(app, bully_manager, user):
                 )
 
                 console.print(f"[green]✓[/green] Replicación: {replication_result['success_count']}/{replication_result['total_nodes']} nodos")
+                if replication_result['pending_nodes']:
+                    console.print(f"[dim]  En cola para los nodos {replication_result['pending_nodes']}[/dim]")
 
                 # Show success
                 console.print("\n")
@@ -313,17 +327,19 @@ def create_visit(app, bully_manager, user):
                 # FOLLOWER PATH: Send request to leader
                 console.print("\n[cyan]→[/cyan] Enviando solicitud al nodo líder...")
 
-                # Prepare request data
+                # Prepare request data (same idempotency key on every retry, so a
+                # timeout that hid a success doesn't create the visit twice)
                 request_data = {
                     'id_paciente': paciente.id_paciente,
                     'id_doctor': doctor.id_doctor,
                     'id_cama': cama.id_cama,
                     'id_trabajador': trabajador.id_trabajador,
                     'id_sala': app.config['NODE_ID'],
-                    'sintomas': sintomas
+                    'sintomas': sintomas,
+                    'idempotency_key': f"create-visit:{app.config['NODE_ID']}:{uuid.uuid4().hex}"
                 }
 
-                # Get leader URL with retries
+                # Get leader URL with retries (a leader whose circuit is open fails fast)
                 max_retries = 3
                 for attempt in range(max_retries):
                     try:
@@ -336,11 +352,11 @@ def create_visit(app, bully_manager, user):
                             return False
 
                         # Send HTTP POST request to leader
-                        endpoint = f"{leader_url}/api/cluster/create-visit"
-                        response = requests.post(endpoint, json=request_data, timeout=10)
+                        respuesta = request_node(leader_id, leader_url, '/api/cluster/create-visit',
+                                                 method='POST', json=request_data, timeout=10)
 
-                        if response.ok:
-                            result = response.json()
+                        if respuesta.ok:
+                            result = respuesta.data
 
                             if result.get('success'):
                                 folio = result.get('folio')
@@ -371,37 +387,25 @@ def create_visit(app, bully_manager, user):
                                 pause()
                                 return False
 
-                        else:
-                            # HTTP error
-                            if attempt < max_retries - 1:
-                                console.print(f"[yellow]⚠[/yellow] Error de conexión (intento {attempt + 1}/{max_retries}), reintentando...")
-                                continue
-                            else:
-                                show_error(f"Error HTTP del líder: {response.status_code}")
-                                db.session.rollback()
-                                pause()
-                                return False
-
-                    except requests.exceptions.Timeout:
-                        if attempt < max_retries - 1:
-                            console.print(f"[yellow]⚠[/yellow] Timeout (intento {attempt + 1}/{max_retries}), reintentando...")
-                            continue
-                        else:
-                            show_error("Timeout al conectar con el líder")
+                        if respuesta.status == 'circuit_open':
+                            # Leader known to be down: don't wait, the next election picks a new one
+                            show_error(f"El líder (nodo {leader_id}) no responde; espere a que se elija otro líder")
                             db.session.rollback()
                             pause()
                             return False
 
-                    except requests.exceptions.ConnectionError:
+                        mensajes = {
+                            'timeout': "Timeout al conectar con el líder",
+                            'offline': "No se pudo conectar con el nodo líder",
+                        }
                         if attempt < max_retries - 1:
-                            console.print(f"[yellow]⚠[/yellow] Error de conexión (intento {attempt + 1}/{max_retries}), verificando líder...")
                             # Leader might have changed, get new leader in next iteration
+                            console.print(f"[yellow]⚠[/yellow] {respuesta.status} (intento {attempt + 1}/{max_retries}), reintentando...")
                             continue
-                        else:
-                            show_error("No se pudo conectar con el nodo líder")
-                            db.session.rollback()
-                            pause()
-                            return False
+                        show_error(mensajes.get(respuesta.status, f"Error del líder: {respuesta.error}"))
+                        db.session.rollback()
+                        pause()
+                        return False
 
                     except Exception as e:
                         show_error(f"Error enviando solicitud al líder: {e}")
@@ -421,6 +425,13 @@ def create_visit(app, bully_manager, user):
         pause()
         return False
 
+    except StaleDataError:
+        # Optimistic version check: another visit took the doctor or bed while confirming
+        show_error("El doctor o la cama acaban de asignarse a otra visita; intente de nuevo")
+        db.session.rollback()
+        pause()
+        return False
+
     except Exception as e:
         show_error(f"Error al crear visita: {e}")
         db.session.rollback()
@@ -451,10 +462,10 @@ def close_visit(app, user):
     try:
         with app.app_context():
             # Step 1: Show doctor's active visits
-            visitas_activas = VisitaEmergencia.query.filter_by(
+            visitas_activas = with_relaciones(VisitaEmergencia.query.filter_by(
                 id_doctor=user.id_relacionado,
                 estado='activa'
-            ).order_by(VisitaEmergencia.timestamp.desc()).all()
+            )).order_by(VisitaEmergencia.timestamp.desc()).all()
 
             if not visitas_activas:
                 show_warning("No tiene visitas activas asignadas")
@@ -602,7 +613,7 @@ def assign_doctor_to_patient(app, bully_manager, user):
             console.print("[bold cyan]PASO 1: Seleccionar Paciente[/bold cyan]\n")
 
             # Show available patients (with existing visits)
-            visitas = VisitaEmergencia.query.filter_by(estado='activa').all()
+            visitas = with_relaciones(VisitaEmergencia.query.filter_by(estado='activa')).all()
 
             if not visitas:
                 show_warning("No hay visitas activas para asignar doctor")
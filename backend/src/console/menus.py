@@ -8,9 +8,9 @@ from rich.console import Console
 from rich.panel import Panel
 
 from console.views import (
-    show_my_visits, show_all_visits, show_dashboard, show_bully_status,
+    show_my_visits, show_all_visits, show_cluster_timeline, show_dashboard, show_bully_status,
     show_available_resources, show_doctors, show_patients, show_beds,
-    show_patient_visits
+    show_patient_visits, show_search
 )
 from console.actions import create_visit, close_visit, assign_doctor_to_patient
 from console.ui import clear_screen, show_error
@@ -121,7 +121,7 @@ def doctor_menu(app, bully_manager, user):
             close_visit(app, user)
 
         elif choice == "🏥 Ver todas las visitas":
-            visitas_submenu(app)
+            visitas_submenu(app, bully_manager=bully_manager)
 
         elif choice == "📊 Ver dashboard de métricas":
             show_dashboard(app)
@@ -174,7 +174,7 @@ def trabajador_social_menu(app, bully_manager, user):
             assign_doctor_to_patient(app, bully_manager, user)
 
         elif choice == "🏥 Ver todas las visitas":
-            visitas_submenu(app)
+            visitas_submenu(app, bully_manager=bully_manager)
 
         elif choice == "📊 Ver dashboard de métricas":
             show_dashboard(app)
@@ -208,6 +208,7 @@ def visitas_submenu(app, is_admin=False, bully_manager=None, user=None):
             "📋 Ver todas las visitas",
             "✅ Ver visitas activas",
             "🏁 Ver visitas completadas",
+            "🌐 Ver últimas visitas del cluster",
             "⬅️  Volver al menú principal"
         ]
 
@@ -229,6 +230,9 @@ def visitas_submenu(app, is_admin=False, bully_manager=None, user=None):
         elif choice == "🏁 Ver visitas completadas":
             show_all_visits(app, estado_filter='completada')
 
+        elif choice == "🌐 Ver últimas visitas del cluster":
+            show_cluster_timeline(app, bully_manager)
+
 
 def consultas_menu(app, bully_manager):
     """
@@ -249,6 +253,7 @@ def consultas_menu(app, bully_manager):
         choices = [
             "👨‍⚕️ Ver todos los doctores",
             "🏥 Ver todos los pacientes",
+            "🔍 Buscar pacientes y visitas",
             "🛏️  Ver estado de camas",
             "💼 Ver recursos disponibles",
             "⬅️  Volver al menú principal"
@@ -269,6 +274,9 @@ def consultas_menu(app, bully_manager):
         elif choice == "🏥 Ver todos los pacientes":
             show_patients(app)
 
+        elif choice == "🔍 Buscar pacientes y visitas":
+            show_search(app)
+
         elif choice == "🛏️  Ver estado de camas":
             show_beds(app)
 
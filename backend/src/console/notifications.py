@@ -8,7 +8,8 @@ import logging
 from datetime import datetime, timedelta
 from rich.console import Console
 from rich.panel import Panel
-from models import VisitaEmergencia, Doctor, Cama
+from models import VisitaEmergencia, get_contadores_sala, with_relaciones
+from db_utils import read_session
 
 console = Console()
 logger = logging.getLogger(__name__)
@@ -116,27 +117,12 @@ class NotificationMonitor:
     def _initialize_state(self):
         """Initialize state tracking on first run."""
         try:
-            with self.app.app_context():
-                self._last_visit_count = VisitaEmergencia.query.filter_by(
-                    id_sala=self.app.config['NODE_ID'],
-                    estado='activa'
-                ).count()
-
-                self._last_completed_count = VisitaEmergencia.query.filter_by(
-                    id_sala=self.app.config['NODE_ID'],
-                    estado='completada'
-                ).count()
-
-                self._last_doctors_available = Doctor.query.filter_by(
-                    id_sala=self.app.config['NODE_ID'],
-                    disponible=True,
-                    activo=True
-                ).count()
-
-                self._last_beds_available = Cama.query.filter_by(
-                    id_sala=self.app.config['NODE_ID'],
-                    ocupada=False
-                ).count()
+            with self.app.app_context(), read_session():
+                contadores = get_contadores_sala(self.app.config['NODE_ID'])
+                self._last_visit_count = contadores['visitas_activas']
+                self._last_completed_count = contadores['visitas_completadas']
+                self._last_doctors_available = contadores['doctores_disponibles']
+                self._last_beds_available = contadores['camas_disponibles']
 
                 self._last_leader_id = self.bully_manager.get_current_leader()
                 self._last_check_time = datetime.utcnow()
@@ -153,12 +139,9 @@ class NotificationMonitor:
     def _check_visits(self):
         """Check for new or completed visits."""
         try:
-            with self.app.app_context():
+            with self.app.app_context(), read_session():
                 # Check for new active visits
-                current_active = VisitaEmergencia.query.filter_by(
-                    id_sala=self.app.config['NODE_ID'],
-                    estado='activa'
-                ).count()
+                current_active = get_contadores_sala(self.app.config['NODE_ID'])['visitas_activas']
 
                 if current_active > self._last_visit_count:
                     new_count = current_active - self._last_visit_count
@@ -171,7 +154,7 @@ class NotificationMonitor:
 
                 # Check for completed visits (since last check)
                 if self._last_check_time:
-                    recently_completed = VisitaEmergencia.query.filter(
+                    recently_completed = with_relaciones(VisitaEmergencia.query).filter(
                         VisitaEmergencia.id_sala == self.app.config['NODE_ID'],
                         VisitaEmergencia.estado == 'completada',
                         VisitaEmergencia.fecha_cierre >= self._last_check_time
@@ -218,18 +201,12 @@ class NotificationMonitor:
     def _check_resources(self):
         """Check for significant resource availability changes."""
         try:
-            with self.app.app_context():
-                # Check doctors availability
-                current_doctors = Doctor.query.filter_by(
-                    id_sala=self.app.config['NODE_ID'],
-                    disponible=True,
-                    activo=True
-                ).count()
+            with self.app.app_context(), read_session():
+                contadores = get_contadores_sala(self.app.config['NODE_ID'])
 
-                total_doctors = Doctor.query.filter_by(
-                    id_sala=self.app.config['NODE_ID'],
-                    activo=True
-                ).count()
+                # Check doctors availability
+                current_doctors = contadores['doctores_disponibles']
+                total_doctors = contadores['doctores_total']
 
                 # Notify if doctors become critically low (<=1)
                 if current_doctors <= 1 and self._last_doctors_available > 1:
@@ -251,14 +228,8 @@ class NotificationMonitor:
                 self._last_doctors_available = current_doctors
 
                 # Check beds availability
-                current_beds = Cama.query.filter_by(
-                    id_sala=self.app.config['NODE_ID'],
-                    ocupada=False
-                ).count()
-
-                total_beds = Cama.query.filter_by(
-                    id_sala=self.app.config['NODE_ID']
-                ).count()
+                current_beds = contadores['camas_disponibles']
+                total_beds = contadores['camas_total']
 
                 # Notify if beds become critically low (<=1)
                 if current_beds <= 1 and self._last_beds_available > 1:
@@ -2,18 +2,29 @@
 Console views using Rich tables for data display.
 All read-only operations for viewing system data.
 """
+from datetime import datetime
+
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from rich.layout import Layout
-from models import VisitaEmergencia, Doctor, Paciente, Cama, TrabajadorSocial
+from models import (
+    Paciente, Cama, TrabajadorSocial,
+    get_contadores_sala, get_metricas_dashboard, get_visitas_resumen, get_visitas_page
+)
+from search import buscar_pacientes, buscar_visitas
+from db_utils import read_session
 from console.ui import (
     create_header, create_table, format_datetime, format_time,
-    truncate_text, status_color, bool_icon, pause, clear_screen
+    truncate_text, status_color, bool_icon, pause, clear_screen, confirm_action,
+    get_text_input
 )
 
 console = Console()
 
+# Visits per page in show_all_visits (keyset pagination)
+VISITS_PAGE_SIZE = 50
+
 def show_my_visits(app, user):
     """
     Show visits assigned to current doctor.
@@ -25,11 +36,8 @@ def show_my_visits(app, user):
     clear_screen()
     console.print(create_header("Mis Visitas Asignadas"))
 
-    with app.app_context():
-        visitas = VisitaEmergencia.query.filter_by(
-            id_doctor=user.id_relacionado,
-            estado='activa'
-        ).order_by(VisitaEmergencia.timestamp.desc()).limit(50).all()
+    with app.app_context(), read_session():
+        visitas = get_visitas_resumen(estado='activa', id_doctor=user.id_relacionado, limit=50)
 
         if not visitas:
             console.print("\n[yellow]No tiene visitas asignadas actualmente[/yellow]")
@@ -47,9 +55,9 @@ def show_my_visits(app, user):
         for v in visitas:
             table.add_row(
                 v.folio,
-                v.paciente.nombre,
+                v.paciente_nombre,
                 truncate_text(v.sintomas, 40),
-                f"#{v.cama.numero}",
+                f"#{v.cama_numero}",
                 format_time(v.timestamp)
             )
 
@@ -73,40 +81,113 @@ def show_all_visits(app, estado_filter=None):
 
     console.print(create_header(title))
 
-    with app.app_context():
-        query = VisitaEmergencia.query
+    with app.app_context(), read_session():
+        cursor = None
+        pagina = 1
+
+        while True:
+            page = get_visitas_page(estado=estado_filter, cursor=cursor, limit=VISITS_PAGE_SIZE)
+            visitas = page.items
+
+            if not visitas:
+                console.print(f"\n[yellow]No hay visitas{' con ese estado' if estado_filter else ''}[/yellow]")
+                pause()
+                return
+
+            # Create table
+            table = Table(show_header=True, header_style="bold magenta",
+                          title=f"Página {pagina}: {len(visitas)} visitas")
+            table.add_column("Folio", style="cyan", width=18)
+            table.add_column("Paciente", style="green", width=20)
+            table.add_column("Doctor", style="blue", width=20)
+            table.add_column("Estado", width=12)
+            table.add_column("Sala", justify="center", width=6)
+            table.add_column("Fecha", style="yellow", width=16)
+
+            for v in visitas:
+                color = status_color(v.estado)
+                table.add_row(
+                    v.folio,
+                    truncate_text(v.paciente_nombre, 18),
+                    truncate_text(v.doctor_nombre, 18),
+                    f"[{color}]{v.estado}[/]",
+                    str(v.id_sala),
+                    format_datetime(v.timestamp)
+                )
 
-        if estado_filter:
-            query = query.filter_by(estado=estado_filter)
+            console.print(table)
 
-        visitas = query.order_by(VisitaEmergencia.timestamp.desc()).limit(100).all()
+            # Keyset pagination: next page starts after the last visit shown
+            if not page.next_cursor or not confirm_action("¿Ver siguiente página?", default=True):
+                break
 
-        if not visitas:
-            console.print(f"\n[yellow]No hay visitas{' con ese estado' if estado_filter else ''}[/yellow]")
-            pause()
-            return
+            cursor = page.next_cursor
+            pagina += 1
+            clear_screen()
+            console.print(create_header(title))
 
-        # Create table
-        table = Table(show_header=True, header_style="bold magenta", title=f"Total: {len(visitas)} visitas")
-        table.add_column("Folio", style="cyan", width=18)
-        table.add_column("Paciente", style="green", width=20)
-        table.add_column("Doctor", style="blue", width=20)
-        table.add_column("Estado", width=12)
-        table.add_column("Sala", justify="center", width=6)
-        table.add_column("Fecha", style="yellow", width=16)
+        pause()
 
-        for v in visitas:
-            color = status_color(v.estado)
-            table.add_row(
-                v.folio,
-                truncate_text(v.paciente.nombre, 18),
-                truncate_text(v.doctor.nombre, 18),
-                f"[{color}]{v.estado}[/]",
-                str(v.id_sala),
-                format_datetime(v.timestamp)
-            )
+def show_cluster_timeline(app, bully_manager, estado_filter=None):
+    """
+    Show the latest visits of ALL cluster salas, merged by time (DISTRIBUTED).
+
+    Each node streams its own visits in pages; only the rows that make it
+    into the page shown are fetched (see cluster_timeline.py).
+
+    Args:
+        app: Flask application
+        bully_manager: BullyNode instance for cluster queries
+        estado_filter: Optional status filter ('activa', 'completada', None for all)
+    """
+    from cluster_timeline import get_cluster_timeline
+    title = "Últimas Visitas - TODO EL CLUSTER"
+    clear_screen()
+    console.print(create_header(title))
+
+    with app.app_context(), read_session():
+        cursor = None
+        pagina = 1
+
+        while True:
+            page = get_cluster_timeline(bully_manager, limit=VISITS_PAGE_SIZE, cursor=cursor, estado=estado_filter)
+            print_partial_warning(page)
+
+            if not page:
+                console.print("\n[yellow]No hay visitas en el cluster[/yellow]")
+                pause()
+                return
+
+            table = Table(show_header=True, header_style="bold magenta",
+                          title=f"Página {pagina}: {len(page)} visitas")
+            table.add_column("Folio", style="cyan", width=18)
+            table.add_column("Paciente", style="green", width=20)
+            table.add_column("Doctor", style="blue", width=20)
+            table.add_column("Estado", width=12)
+            table.add_column("Sala", justify="center", width=6)
+            table.add_column("Fecha", style="yellow", width=16)
+
+            for v in page:
+                color = status_color(v['estado'])
+                table.add_row(
+                    v['folio'],
+                    truncate_text(v['paciente_nombre'], 18),
+                    truncate_text(v['doctor_nombre'], 18),
+                    f"[{color}]{v['estado']}[/]",
+                    str(v['id_sala']),
+                    format_datetime(datetime.fromisoformat(v['timestamp']) if v['timestamp'] else None)
+                )
+
+            console.print(table)
+
+            if not page.next_cursor or not confirm_action("¿Ver siguiente página?", default=True):
+                break
+
+            cursor = page.next_cursor
+            pagina += 1
+            clear_screen()
+            console.print(create_header(title))
 
-        console.print(table)
         pause()
 
 def show_dashboard(app):
@@ -119,32 +200,16 @@ def show_dashboard(app):
     clear_screen()
     console.print(create_header("Dashboard de Métricas", f"Nodo {app.config['NODE_ID']}"))
 
-    with app.app_context():
-        # Get metrics
-        total_visitas_activas = VisitaEmergencia.query.filter_by(estado='activa').count()
-        total_visitas_hoy = VisitaEmergencia.query.filter(
-            VisitaEmergencia.timestamp >= db.func.date('now')
-        ).count() if hasattr(db, 'func') else 0
-
-        doctores_disponibles = Doctor.query.filter_by(
-            id_sala=app.config['NODE_ID'],
-            disponible=True,
-            activo=True
-        ).count()
-
-        camas_disponibles = Cama.query.filter_by(
-            id_sala=app.config['NODE_ID'],
-            ocupada=False
-        ).count()
-
-        total_doctores = Doctor.query.filter_by(
-            id_sala=app.config['NODE_ID'],
-            activo=True
-        ).count()
-
-        total_camas = Cama.query.filter_by(
-            id_sala=app.config['NODE_ID']
-        ).count()
+    with app.app_context(), read_session():
+        # Get metrics (materialized counters, no COUNT(*) queries)
+        metricas = get_metricas_dashboard()
+        contadores = get_contadores_sala(app.config['NODE_ID'])
+        total_visitas_activas = metricas['visitas_activas']
+        total_visitas_hoy = metricas['visitas_hoy']
+        doctores_disponibles = contadores['doctores_disponibles']
+        camas_disponibles = contadores['camas_disponibles']
+        total_doctores = contadores['doctores_total']
+        total_camas = contadores['camas_total']
 
         # Create layout
         layout = Layout()
@@ -163,13 +228,11 @@ def show_dashboard(app):
         layout["metrics"].update(Panel(metrics_text, title="Métricas del Sistema", border_style="green"))
 
         # Recent visits
-        visitas_recientes = VisitaEmergencia.query.filter_by(
-            id_sala=app.config['NODE_ID']
-        ).order_by(VisitaEmergencia.timestamp.desc()).limit(5).all()
+        visitas_recientes = get_visitas_resumen(id_sala=app.config['NODE_ID'], limit=5)
 
         if visitas_recientes:
             recent_text = "\n".join([
-                f"[cyan]{v.folio}[/cyan] - {truncate_text(v.paciente.nombre, 20)} - [{status_color(v.estado)}]{v.estado}[/]"
+                f"[cyan]{v.folio}[/cyan] - {truncate_text(v.paciente_nombre, 20)} - [{status_color(v.estado)}]{v.estado}[/]"
                 for v in visitas_recientes
             ])
         else:
@@ -253,9 +316,20 @@ def show_bully_status(app, bully_manager):
 
     pause()
 
+def print_partial_warning(resultado):
+    """Warn that nodes which did not answer are missing from a cluster-wide result."""
+    caidos = [n for n in getattr(resultado, 'nodos', []) if n['status'] not in ('online', 'cached')]
+    if caidos:
+        nodos = ", ".join(f"nodo {n['node_id']} ({n['status']})" for n in caidos)
+        console.print(f"[yellow]⚠ Resultados parciales, sin respuesta de: {nodos}[/yellow]")
+
+
 def show_available_resources(app, bully_manager):
     """
-    Show available doctors and beds from ALL cluster nodes (DISTRIBUTED).
+    Show available doctors and free beds from ALL cluster nodes (DISTRIBUTED).
+
+    Filters and projections are pushed down to every node (see
+    cluster_query.py), so only matching rows cross the network.
 
     Args:
         app: Flask application
@@ -264,60 +338,63 @@ def show_available_resources(app, bully_manager):
     clear_screen()
     console.print(create_header("Recursos Disponibles - TODO EL CLUSTER"))
 
-    with app.app_context():
-        # DISTRIBUTED QUERY: Get all doctors from cluster
-        from models import get_all_cluster_doctors, get_all_cluster_beds
-        doctores = get_all_cluster_doctors(bully_manager, activo=True)
-
-        console.print("\n[bold cyan]Doctores (todas las salas):[/bold cyan]")
+    with app.app_context(), read_session():
+        # DISTRIBUTED QUERY: available doctors, counted by specialty
+        from cluster_query import query_cluster
+        doctores = query_cluster(bully_manager, {
+            'resource': 'doctors',
+            'where': {'activo': True, 'disponible': True},
+            'fields': ['id_doctor', 'nombre', 'especialidad', 'id_sala']
+        })
+        por_especialidad = query_cluster(bully_manager, {
+            'resource': 'doctors',
+            'where': {'activo': True, 'disponible': True},
+            'group_by': ['especialidad']
+        })
+
+        console.print("\n[bold cyan]Doctores disponibles (todas las salas):[/bold cyan]")
+        print_partial_warning(doctores)
         if doctores:
             table_doc = Table(show_header=True, header_style="bold magenta")
             table_doc.add_column("ID", justify="center", width=6)
             table_doc.add_column("Nombre", style="green", width=25)
             table_doc.add_column("Especialidad", style="cyan", width=18)
             table_doc.add_column("Sala", justify="center", width=6)
-            table_doc.add_column("Disponible", justify="center", width=12)
 
             for doc in doctores:
-                disp_color = "green" if doc['disponible'] else "red"
                 table_doc.add_row(
                     str(doc['id_doctor']),
                     doc['nombre'],
                     doc['especialidad'] or "General",
-                    str(doc['id_sala']),
-                    f"[{disp_color}]{bool_icon(doc['disponible'])}[/]"
+                    str(doc['id_sala'])
                 )
 
             console.print(table_doc)
+            console.print("  " + " · ".join(f"{g['especialidad'] or 'General'}: {g['count']}"
+                                           for g in por_especialidad))
         else:
-            console.print("[yellow]No hay doctores en el cluster[/yellow]")
+            console.print("[yellow]No hay doctores disponibles en el cluster[/yellow]")
 
-        # DISTRIBUTED QUERY: Get all beds from cluster
-        camas = get_all_cluster_beds(bully_manager)
+        # DISTRIBUTED QUERY: free beds
+        camas = query_cluster(bully_manager, {
+            'resource': 'beds',
+            'where': {'ocupada': False},
+            'fields': ['numero', 'id_sala']
+        })
 
-        console.print("\n[bold cyan]Camas (todas las salas):[/bold cyan]")
+        console.print("\n[bold cyan]Camas libres (todas las salas):[/bold cyan]")
+        print_partial_warning(camas)
         if camas:
             table_camas = Table(show_header=True, header_style="bold magenta")
             table_camas.add_column("Número", justify="center", width=10)
             table_camas.add_column("Sala", justify="center", width=6)
-            table_camas.add_column("Estado", justify="center", width=15)
-            table_camas.add_column("Paciente Actual", style="yellow", width=30)
 
             for cama in camas:
-                estado = "Ocupada" if cama['ocupada'] else "Libre"
-                estado_color = "red" if cama['ocupada'] else "green"
-                paciente_nombre = cama['paciente_nombre'] if cama['paciente_nombre'] else "-"
-
-                table_camas.add_row(
-                    str(cama['numero']),
-                    str(cama['id_sala']),
-                    f"[{estado_color}]{estado}[/]",
-                    paciente_nombre
-                )
+                table_camas.add_row(str(cama['numero']), str(cama['id_sala']))
 
             console.print(table_camas)
         else:
-            console.print("[yellow]No hay camas registradas en el cluster[/yellow]")
+            console.print("[yellow]No hay camas libres en el cluster[/yellow]")
 
         pause()
 
@@ -332,10 +409,15 @@ def show_doctors(app, bully_manager):
     clear_screen()
     console.print(create_header("Lista de Doctores - TODAS LAS SALAS"))
 
-    with app.app_context():
-        # DISTRIBUTED QUERY: Get doctors from all cluster nodes
-        from models import get_all_cluster_doctors
-        doctores = get_all_cluster_doctors(bully_manager, activo=True)
+    with app.app_context(), read_session():
+        # DISTRIBUTED QUERY: active doctors from all cluster nodes (filter pushed down)
+        from cluster_query import query_cluster
+        doctores = query_cluster(bully_manager, {
+            'resource': 'doctors',
+            'where': {'activo': True},
+            'fields': ['id_doctor', 'nombre', 'especialidad', 'id_sala', 'disponible']
+        })
+        print_partial_warning(doctores)
 
         if not doctores:
             console.print("\n[yellow]No hay doctores registrados en el cluster[/yellow]")
@@ -372,7 +454,7 @@ def show_patients(app):
     clear_screen()
     console.print(create_header("Lista de Pacientes"))
 
-    with app.app_context():
+    with app.app_context(), read_session():
         pacientes = Paciente.query.filter_by(activo=1).limit(100).all()
 
         if not pacientes:
@@ -401,6 +483,62 @@ def show_patients(app):
         console.print(table)
         pause()
 
+def show_search(app):
+    """
+    Full-text search over patients (name, CURP) and visits (folio, symptoms,
+    diagnosis, patient or doctor name). Accent-insensitive, prefix matching.
+
+    Args:
+        app: Flask application
+    """
+    clear_screen()
+    console.print(create_header("Buscar Pacientes y Visitas"))
+
+    texto = get_text_input("Buscar (nombre, CURP, folio o síntomas)", default="")
+    if not texto.strip():
+        return
+
+    with app.app_context(), read_session():
+        pacientes = buscar_pacientes(texto, limit=20)
+        visitas = buscar_visitas(texto, limit=20)
+
+        if not pacientes and not visitas:
+            console.print(f"\n[yellow]Sin resultados para '{texto}'[/yellow]")
+            pause()
+            return
+
+        if pacientes:
+            table = Table(show_header=True, header_style="bold magenta", title=f"Pacientes: {len(pacientes)}")
+            table.add_column("ID", justify="center", width=6)
+            table.add_column("Nombre", style="green", width=25)
+            table.add_column("Edad", justify="center", width=6)
+            table.add_column("CURP", style="cyan", width=20)
+            for pac in pacientes:
+                table.add_row(str(pac.id_paciente), pac.nombre, str(pac.edad) if pac.edad else "-", pac.curp or "-")
+            console.print(table)
+
+        if visitas:
+            table = Table(show_header=True, header_style="bold magenta", title=f"Visitas: {len(visitas)}")
+            table.add_column("Folio", style="cyan", width=18)
+            table.add_column("Paciente", style="green", width=20)
+            table.add_column("Doctor", style="blue", width=20)
+            table.add_column("Síntomas", width=25)
+            table.add_column("Estado", width=12)
+            table.add_column("Fecha", style="yellow", width=16)
+            for v in visitas:
+                color = status_color(v.estado)
+                table.add_row(
+                    v.folio,
+                    truncate_text(v.paciente_nombre, 18),
+                    truncate_text(v.doctor_nombre, 18),
+                    truncate_text(v.sintomas, 23),
+                    f"[{color}]{v.estado}[/]",
+                    format_datetime(v.timestamp)
+                )
+            console.print(table)
+
+        pause()
+
 def show_beds(app):
     """
     Show all beds in current sala.
@@ -411,7 +549,7 @@ def show_beds(app):
     clear_screen()
     console.print(create_header("Estado de Camas", f"Sala {app.config['NODE_ID']}"))
 
-    with app.app_context():
+    with app.app_context(), read_session():
         camas = Cama.query.filter_by(id_sala=app.config['NODE_ID']).all()
 
         if not camas:
@@ -452,7 +590,7 @@ def show_social_workers(app):
     clear_screen()
     console.print(create_header("Lista de Trabajadores Sociales"))
 
-    with app.app_context():
+    with app.app_context(), read_session():
         trabajadores = TrabajadorSocial.query.filter_by(activo=True).all()
 
         if not trabajadores:
@@ -491,10 +629,8 @@ def show_patient_visits(app, user):
     clear_screen()
     console.print(create_header("Mis Visitas de Emergencia"))
 
-    with app.app_context():
-        visitas = VisitaEmergencia.query.filter_by(
-            id_paciente=user.id_relacionado
-        ).order_by(VisitaEmergencia.timestamp.desc()).limit(50).all()
+    with app.app_context(), read_session():
+        visitas = get_visitas_resumen(id_paciente=user.id_relacionado, limit=50)
 
         if not visitas:
             console.print("\n[yellow]No tiene visitas registradas[/yellow]")
@@ -513,7 +649,7 @@ def show_patient_visits(app, user):
             color = status_color(v.estado)
             table.add_row(
                 v.folio,
-                truncate_text(v.doctor.nombre, 23),
+                truncate_text(v.doctor_nombre, 23),
                 truncate_text(v.sintomas, 33),
                 f"[{color}]{v.estado}[/]",
                 format_datetime(v.timestamp)
@@ -0,0 +1,179 @@
+"""
+Utilidades de acceso a la base de datos compartidas por rutas, consola,
+pruebas y benchmarks.
+
+Lecturas y escrituras usan engines separados (init_read_engine):
+    - escritura: el engine de Flask-SQLAlchemy, en modo WAL. SQLite deja
+      escribir a una sola conexión a la vez; las demás esperan (busy timeout).
+    - lectura: engine propio con su pool, abierto con mode=ro y
+      PRAGMA query_only. En WAL los lectores ven la última versión confirmada
+      sin bloquear al escritor, y el escritor no los bloquea a ellos.
+
+Dentro de read_session() (todas las peticiones GET, las pantallas y la
+consola al cargar datos) db.session y Model.query usan el engine de lectura.
+"""
+import logging
+import os
+from contextlib import ExitStack, contextmanager
+
+from flask import current_app, g, request
+from sqlalchemy import create_engine, event
+
+from models import db, modo_lectura
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# ENGINES DE LECTURA / ESCRITURA
+# ============================================================================
+
+def _pragmas_escritura(dbapi_connection, connection_record):
+    # En WAL, synchronous=NORMAL solo arriesga la última transacción ante un
+    # corte de luz, nunca la integridad del archivo
+    dbapi_connection.execute('PRAGMA synchronous = NORMAL')
+
+
+def _pragmas_lectura(dbapi_connection, connection_record):
+    dbapi_connection.execute('PRAGMA query_only = 1')
+
+
+def init_read_engine(app):
+    """
+    Pasa la BD del nodo a modo WAL y crea el engine de solo lectura de la app.
+
+    Debe llamarse después de db.init_app(app) y antes de usar la BD. Con una
+    BD en memoria o que no es SQLite no hace nada y read_session() usa la
+    sesión normal.
+
+    Returns:
+        Engine de lectura o None
+    """
+    with app.app_context():
+        escritura = db.engine
+    ruta = escritura.url.database
+    if escritura.url.get_backend_name() != 'sqlite' or not ruta or ruta == ':memory:':
+        return None
+
+    event.listen(escritura, 'connect', _pragmas_escritura)
+    with escritura.connect() as conn:
+        conn.exec_driver_sql('PRAGMA journal_mode = WAL')
+
+    pool_size = app.config.get('READ_POOL_SIZE', 8)
+    lectura = create_engine(f'sqlite:///file:{os.path.abspath(ruta)}?mode=ro&uri=true',
+                            pool_size=pool_size, max_overflow=pool_size)
+    event.listen(lectura, 'connect', _pragmas_lectura)
+    app.extensions['engine_lectura'] = lectura
+    logger.info(f'Engine de solo lectura: {pool_size} conexiones (WAL)')
+    return lectura
+
+
+@contextmanager
+def read_session():
+    """
+    db.session (y Model.query) de solo lectura durante el bloque.
+
+    La sesión es distinta de la de escritura del mismo contexto de app y se
+    cierra al salir, así que los objetos leídos deben usarse (o convertirse a
+    dict) dentro del bloque. Escribir con ella falla con "attempt to write a
+    readonly database". Anidar bloques no crea otra sesión.
+
+    Ejemplo:
+        with app.app_context(), read_session():
+            visitas = [v.to_dict() for v in get_visitas_resumen(limit=50)]
+
+    Yields:
+        Session: la sesión de lectura (la misma que db.session)
+    """
+    engine = current_app.extensions.get('engine_lectura')
+    if engine is None or modo_lectura.get():
+        yield db.session
+        return
+
+    token = modo_lectura.set(True)
+    try:
+        db.session.info['engine_lectura'] = engine
+        yield db.session
+    finally:
+        db.session.remove()
+        modo_lectura.reset(token)
+
+
+def init_read_requests(app):
+    """Atiende todas las peticiones GET/HEAD de la app dentro de read_session()."""
+
+    @app.before_request
+    def _abrir_lectura():
+        if request.method in ('GET', 'HEAD'):
+            g.lectura = ExitStack()
+            g.lectura.enter_context(read_session())
+
+    @app.teardown_request
+    def _cerrar_lectura(exc=None):
+        lectura = g.pop('lectura', None)
+        if lectura is not None:
+            lectura.close()
+
+
+# ============================================================================
+# CONTEO DE QUERIES
+# ============================================================================
+
+
+class QueryCounter:
+    """Sentencias SQL ejecutadas dentro de un bloque count_queries()"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __repr__(self):
+        return f'<QueryCounter {self.count} queries>'
+
+
+@contextmanager
+def count_queries(engine=None):
+    """
+    Cuenta las sentencias SQL que se ejecutan en el bloque.
+
+    Args:
+        engine: Engine a observar (default: el de db.session, de lectura
+            dentro de read_session())
+
+    Yields:
+        QueryCounter: con .count y .statements (SQL de cada sentencia)
+
+    Ejemplo:
+        with count_queries() as queries:
+            get_visitas_resumen(limit=10)
+        assert queries.count == 1
+    """
+    engine = engine or db.session.get_bind()
+    counter = QueryCounter()
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(maximo, engine=None):
+    """
+    Falla (AssertionError) si el bloque ejecuta más de `maximo` sentencias SQL.
+
+    Pensado para pruebas de regresión N+1: el mensaje incluye el SQL ejecutado.
+    """
+    with count_queries(engine) as queries:
+        yield queries
+    assert queries.count <= maximo, (
+        f'Se esperaban a lo más {maximo} queries y se ejecutaron {queries.count}:\n'
+        + '\n'.join(queries.statements)
+    )
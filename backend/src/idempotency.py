@@ -0,0 +1,188 @@
+"""
+Llaves de idempotencia para las peticiones que un reintento puede repetir.
+
+El follower reenvía la creación de visitas al líder y la reintenta hasta 3
+veces (console/actions.py): si un timeout oculta que el líder sí la creó, el
+reintento crea otra visita y ocupa otra cama. Ahora quien envía genera una
+llave por operación y la repite en cada intento (campo idempotency_key del
+JSON o cabecera Idempotency-Key):
+
+    - La primera petición que termina bien guarda la llave con su respuesta
+      en IDEMPOTENCIA, en la misma transacción que la visita: quedan las dos
+      o ninguna.
+    - Los reintentos reciben la respuesta guardada sin volver a ejecutarse:
+      primero se busca en un LRU en memoria de IDEMPOTENCY_CACHE_SIZE llaves
+      (O(1), sin tocar la BD) y, si no está (reinicio o desalojo), en la
+      tabla por llave primaria.
+    - Las llaves se olvidan a los IDEMPOTENCY_TTL segundos; las vencidas se
+      borran de la tabla al guardar nuevas (como mucho una vez por minuto).
+
+Las respuestas con error no se guardan: el cliente puede corregir y
+reintentar con la misma llave.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import Config
+from models import db, ClaveIdempotencia
+
+logger = logging.getLogger(__name__)
+
+# Cabecera HTTP alternativa al campo idempotency_key del JSON
+HEADER = 'Idempotency-Key'
+# Longitud máxima de una llave (columna llave)
+MAX_LLAVE = 100
+# Segundos entre purgas de llaves vencidas en la tabla
+PURGA_INTERVAL = 60
+
+_PENDIENTES_KEY = '_idempotency_pendientes'  # (llave, status, respuesta) guardadas en esta transacción
+
+
+def llave_de(data, headers=None):
+    """
+    Llave de idempotencia de una petición (cabecera o campo del JSON).
+
+    Returns:
+        str o None si la petición no trae llave
+
+    Raises:
+        ValueError: llave vacía o de más de MAX_LLAVE caracteres
+    """
+    llave = (headers or {}).get(HEADER) or (data or {}).get('idempotency_key')
+    if llave is None:
+        return None
+    llave = str(llave).strip()
+    if not llave or len(llave) > MAX_LLAVE:
+        raise ValueError(f'Invalid idempotency key (1-{MAX_LLAVE} characters)')
+    return llave
+
+
+def respuesta_repetida(previa):
+    """
+    Respuesta a un reintento cuya llave ya se procesó.
+
+    Args:
+        previa: (status, respuesta) devuelto por IdempotencyCache.buscar
+
+    Returns:
+        tuple: (status, respuesta con 'idempotent_replay': True)
+    """
+    status, respuesta = previa
+    return status, {**respuesta, 'idempotent_replay': True}
+
+
+class IdempotencyCache:
+    """LRU en memoria de llaves ya procesadas, respaldado por la tabla IDEMPOTENCIA"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._llaves = OrderedDict()  # llave -> (vence (monotonic), status, respuesta)
+        self._ultima_purga = 0.0
+        self._contadores = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stored': 0, 'purged': 0}
+
+    def _recordar(self, llave, status, respuesta, vence):
+        with self._lock:
+            self._llaves[llave] = (vence, status, respuesta)
+            self._llaves.move_to_end(llave)
+            while len(self._llaves) > Config.IDEMPOTENCY_CACHE_SIZE:
+                self._llaves.popitem(last=False)
+
+    def buscar(self, llave):
+        """
+        Respuesta ya dada a `llave` (requiere contexto de app si no está en memoria).
+
+        Returns:
+            tuple: (status, respuesta) o None si la llave no se ha procesado o venció
+        """
+        if llave is None:
+            return None
+        ahora = time.monotonic()
+        with self._lock:
+            guardada = self._llaves.get(llave)
+            if guardada is not None:
+                if guardada[0] > ahora:
+                    self._llaves.move_to_end(llave)
+                    self._contadores['memory_hits'] += 1
+                    return guardada[1], guardada[2]
+                del self._llaves[llave]
+
+        fila = db.session.get(ClaveIdempotencia, llave)
+        edad = (datetime.utcnow() - fila.creado).total_seconds() if fila is not None else None
+        if fila is None or edad >= Config.IDEMPOTENCY_TTL:
+            with self._lock:
+                self._contadores['misses'] += 1
+            return None
+        respuesta = json.loads(fila.respuesta)
+        self._recordar(llave, fila.status, respuesta, ahora + Config.IDEMPOTENCY_TTL - edad)
+        with self._lock:
+            self._contadores['db_hits'] += 1
+        return fila.status, respuesta
+
+    def guardar(self, llave, endpoint, status, respuesta):
+        """
+        Agrega la llave con su respuesta a la transacción actual de db.session;
+        pasa a memoria cuando esa transacción hace commit.
+        """
+        if llave is None:
+            return
+        db.session.add(ClaveIdempotencia(llave=llave, endpoint=endpoint, status=status,
+                                         respuesta=json.dumps(respuesta), creado=datetime.utcnow()))
+        db.session.info.setdefault(_PENDIENTES_KEY, []).append((llave, status, respuesta))
+        self._purgar()
+
+    def _purgar(self):
+        """Borra de la tabla (en la transacción actual) las llaves vencidas"""
+        ahora = time.monotonic()
+        with self._lock:
+            if ahora - self._ultima_purga < PURGA_INTERVAL:
+                return
+            self._ultima_purga = ahora
+        limite = datetime.utcnow() - timedelta(seconds=Config.IDEMPOTENCY_TTL)
+        borradas = db.session.execute(
+            db.delete(ClaveIdempotencia).where(ClaveIdempotencia.creado < limite)).rowcount
+        if borradas:
+            logger.info(f'{borradas} llaves de idempotencia vencidas borradas')
+            with self._lock:
+                self._contadores['purged'] += borradas
+
+    def _confirmar(self, pendientes):
+        vence = time.monotonic() + Config.IDEMPOTENCY_TTL
+        for llave, status, respuesta in pendientes:
+            self._recordar(llave, status, respuesta, vence)
+        with self._lock:
+            self._contadores['stored'] += len(pendientes)
+
+    def metrics(self):
+        with self._lock:
+            return {'cached': len(self._llaves), 'capacity': Config.IDEMPOTENCY_CACHE_SIZE, **self._contadores}
+
+    def reset(self):
+        """Olvida lo que hay en memoria (la tabla se conserva)"""
+        with self._lock:
+            self._llaves.clear()
+            self._ultima_purga = 0.0
+            self._contadores = dict.fromkeys(self._contadores, 0)
+
+
+idempotency = IdempotencyCache()
+
+
+@event.listens_for(Session, 'after_commit')
+def _confirmar(session):
+    if session.in_nested_transaction():
+        return
+    pendientes = session.info.pop(_PENDIENTES_KEY, None)
+    if pendientes:
+        idempotency._confirmar(pendientes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar(session):
+    session.info.pop(_PENDIENTES_KEY, None)
@@ -19,6 +19,7 @@ from console.auth import login
 from console.menus import main_menu
 from console.notifications import create_notification_monitor
 from config import Config
+from cluster_client import watch_bully
 
 console = Console()
 
@@ -170,6 +171,21 @@ def main():
             bully_manager.start()
             logger.info(f"Bully system started (STATIC) - TCP:{Config.TCP_PORT}, UDP:{Config.UDP_PORT}")
 
+        # Bully liveness events feed the inter-node circuit breakers
+        watch_bully(bully_manager)
+
+        # New or wiped node: copy the leader's database before replicating
+        from bootstrap import bootstrap_si_hace_falta
+        bootstrap_si_hace_falta(app, bully_manager)
+
+        # Replication log: capture local changes, forward them to the leader, catch up
+        from replication_log import replication_log
+        replication_log.start(app, bully_manager)
+
+        # Anti-entropy: periodic Merkle comparison of visits, doctors and beds with the leader
+        from anti_entropy import anti_entropy
+        anti_entropy.start(app, bully_manager)
+
         # Initialize notification monitor
         console.print("[dim]Iniciando monitor de notificaciones...[/dim]")
         notification_monitor = create_notification_monitor(app, bully_manager, check_interval=10)
@@ -116,6 +116,10 @@ def create_bully_manager(app):
 
     # Start Bully system
     bully_manager.start()
+
+    # Bully liveness events feed the inter-node circuit breakers
+    from cluster_client import watch_bully
+    watch_bully(bully_manager)
     logger.info(f"Bully manager started - Node ID: {bully_manager.node_id}, Mode: {cluster_mode}")
 
     return bully_manager
@@ -133,6 +137,18 @@ def main():
         # Create Bully manager
         bully_manager = create_bully_manager(app)
 
+        # New or wiped node: copy the leader's database before replicating
+        from bootstrap import bootstrap_si_hace_falta
+        bootstrap_si_hace_falta(app, bully_manager)
+
+        # Replication log: capture local changes, forward them to the leader, catch up
+        from replication_log import replication_log
+        replication_log.start(app, bully_manager)
+
+        # Anti-entropy: periodic Merkle comparison of visits, doctors and beds with the leader
+        from anti_entropy import anti_entropy
+        anti_entropy.start(app, bully_manager)
+
         # Import Textual app
         from textual_app import MedicalApp
 
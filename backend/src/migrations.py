@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+"""
+Migraciones versionadas del esquema SQLite de cada nodo.
+
+db.create_all() solo crea las tablas que faltan: no agrega índices, columnas ni
+triggers a bases de datos que ya existen (data/emergency_sala*.db). Este módulo
+guarda la versión del esquema en PRAGMA user_version y aplica en orden las
+migraciones pendientes.
+
+Cada migración debe ser idempotente (CREATE ... IF NOT EXISTS, etc.): si un
+arranque se interrumpe a la mitad basta con volver a ejecutarla.
+
+Uso:
+    python migrations.py                  # migra todas las BDs de data/
+    python migrations.py ruta/sala1.db    # migra archivos específicos
+    python migrations.py --status         # solo muestra la versión de cada BD
+    python migrations.py --repair-counters  # reconstruye CONTADORES_SALA
+    python migrations.py --rebuild-search   # reconstruye los índices FTS5
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+
+from sqlalchemy import create_engine
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# MIGRACIONES
+# ============================================================================
+
+def _m001_indices(conn):
+    """Índices secundarios declarados en models.py (ver __table_args__)."""
+    # Un contador por (sala, fecha): fusionar duplicados antes del índice único
+    conn.exec_driver_sql("""
+        UPDATE CONSECUTIVOS SET consecutivo = (
+            SELECT MAX(c2.consecutivo) FROM CONSECUTIVOS c2
+            WHERE c2.id_sala = CONSECUTIVOS.id_sala AND c2.fecha = CONSECUTIVOS.fecha
+        )
+    """)
+    conn.exec_driver_sql("""
+        DELETE FROM CONSECUTIVOS WHERE id NOT IN (
+            SELECT MIN(id) FROM CONSECUTIVOS GROUP BY id_sala, fecha
+        )
+    """)
+
+    statements = [
+        'CREATE INDEX IF NOT EXISTS ix_visitas_estado ON VISITAS_EMERGENCIA (estado, id_sala, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_visitas_estado_timestamp ON VISITAS_EMERGENCIA (estado, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_visitas_sala_timestamp ON VISITAS_EMERGENCIA (id_sala, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_visitas_doctor ON VISITAS_EMERGENCIA (id_doctor, estado)',
+        'CREATE INDEX IF NOT EXISTS ix_visitas_paciente ON VISITAS_EMERGENCIA (id_paciente, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_visitas_timestamp ON VISITAS_EMERGENCIA (timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_doctores_disponible ON DOCTORES (id_sala, disponible, activo)',
+        'CREATE INDEX IF NOT EXISTS ix_camas_estado ON CAMAS (id_sala, ocupada)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS ux_consecutivos_sala_fecha ON CONSECUTIVOS (id_sala, fecha)',
+    ]
+    for sql in statements:
+        conn.exec_driver_sql(sql)
+
+
+# Aporte de una fila (NEW u OLD) a los contadores de su sala. Los triggers
+# restan el aporte de OLD y suman el de NEW, así INSERT/UPDATE/DELETE comparten
+# la misma fórmula.
+_VISITA_DELTA = """
+    UPDATE CONTADORES_SALA SET
+        visitas_activas = visitas_activas {op} ({row}.estado = 'activa'),
+        visitas_completadas = visitas_completadas {op} ({row}.estado = 'completada'),
+        visitas_hoy = CASE
+            WHEN date({row}.timestamp) IS NOT date('now') THEN visitas_hoy
+            WHEN fecha_hoy IS date('now') THEN visitas_hoy {op} 1
+            ELSE MAX(0, 0 {op} 1)
+        END,
+        fecha_hoy = CASE WHEN date({row}.timestamp) IS date('now') THEN date('now') ELSE fecha_hoy END
+    WHERE id_sala = {row}.id_sala;
+"""
+
+_DOCTOR_DELTA = """
+    UPDATE CONTADORES_SALA SET
+        doctores_total = doctores_total {op} (COALESCE({row}.activo, 0) = 1),
+        doctores_disponibles = doctores_disponibles {op}
+            (COALESCE({row}.activo, 0) = 1 AND COALESCE({row}.disponible, 0) = 1)
+    WHERE id_sala = {row}.id_sala;
+"""
+
+_CAMA_DELTA = """
+    UPDATE CONTADORES_SALA SET
+        camas_total = camas_total {op} 1,
+        camas_disponibles = camas_disponibles {op} (COALESCE({row}.ocupada, 0) = 0)
+    WHERE id_sala = {row}.id_sala;
+"""
+
+_ENSURE_ROW = "INSERT OR IGNORE INTO CONTADORES_SALA (id_sala) VALUES ({row}.id_sala);"
+
+
+def _counter_triggers(prefix, table, delta, update_columns):
+    """Genera los triggers INSERT/UPDATE/DELETE que mantienen CONTADORES_SALA."""
+    add = _ENSURE_ROW.format(row='NEW') + delta.format(op='+', row='NEW')
+    remove = delta.format(op='-', row='OLD')
+    return [
+        f'DROP TRIGGER IF EXISTS {prefix}_ai',
+        f'DROP TRIGGER IF EXISTS {prefix}_au',
+        f'DROP TRIGGER IF EXISTS {prefix}_ad',
+        f'CREATE TRIGGER {prefix}_ai AFTER INSERT ON {table} BEGIN {add} END',
+        f'CREATE TRIGGER {prefix}_au AFTER UPDATE OF {update_columns} ON {table} BEGIN {remove} {add} END',
+        f'CREATE TRIGGER {prefix}_ad AFTER DELETE ON {table} BEGIN {remove} END',
+    ]
+
+
+def rebuild_counters(conn):
+    """
+    Reconstruye CONTADORES_SALA desde las tablas fuente.
+
+    Es el comando de reparación de consistencia: se ejecuta en la migración que
+    crea la tabla y con `python migrations.py --repair-counters`.
+    """
+    conn.exec_driver_sql('DELETE FROM CONTADORES_SALA')
+    conn.exec_driver_sql("""
+        INSERT INTO CONTADORES_SALA (id_sala)
+        SELECT id_sala FROM VISITAS_EMERGENCIA
+        UNION SELECT id_sala FROM DOCTORES
+        UNION SELECT id_sala FROM CAMAS
+    """)
+    conn.exec_driver_sql("""
+        UPDATE CONTADORES_SALA SET
+            visitas_activas = (SELECT COUNT(*) FROM VISITAS_EMERGENCIA v
+                               WHERE v.id_sala = CONTADORES_SALA.id_sala AND v.estado = 'activa'),
+            visitas_completadas = (SELECT COUNT(*) FROM VISITAS_EMERGENCIA v
+                                   WHERE v.id_sala = CONTADORES_SALA.id_sala AND v.estado = 'completada'),
+            visitas_hoy = (SELECT COUNT(*) FROM VISITAS_EMERGENCIA v
+                           WHERE v.id_sala = CONTADORES_SALA.id_sala
+                             AND v.timestamp >= date('now') AND v.timestamp < date('now', '+1 day')),
+            fecha_hoy = date('now'),
+            doctores_total = (SELECT COUNT(*) FROM DOCTORES d
+                              WHERE d.id_sala = CONTADORES_SALA.id_sala AND d.activo = 1),
+            doctores_disponibles = (SELECT COUNT(*) FROM DOCTORES d
+                                    WHERE d.id_sala = CONTADORES_SALA.id_sala
+                                      AND d.activo = 1 AND d.disponible = 1),
+            camas_total = (SELECT COUNT(*) FROM CAMAS c WHERE c.id_sala = CONTADORES_SALA.id_sala),
+            camas_disponibles = (SELECT COUNT(*) FROM CAMAS c
+                                 WHERE c.id_sala = CONTADORES_SALA.id_sala AND COALESCE(c.ocupada, 0) = 0)
+    """)
+
+    # Los contadores pudieron cambiar sin pasar por los triggers: invalidar
+    # los ETag de /api/cluster/snapshot (CAMBIOS_SALA existe desde la v5)
+    if conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'CAMBIOS_SALA'").first():
+        conn.exec_driver_sql("""
+            INSERT INTO CAMBIOS_SALA (id_sala, version) SELECT id_sala, 1 FROM CONTADORES_SALA WHERE true
+            ON CONFLICT (id_sala) DO UPDATE SET version = version + 1
+        """)
+
+
+def _m002_contadores(conn):
+    """Contadores materializados por sala mantenidos con triggers."""
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS "CONTADORES_SALA" (
+            id_sala INTEGER NOT NULL PRIMARY KEY,
+            visitas_activas INTEGER DEFAULT '0' NOT NULL,
+            visitas_completadas INTEGER DEFAULT '0' NOT NULL,
+            visitas_hoy INTEGER DEFAULT '0' NOT NULL,
+            fecha_hoy DATE,
+            doctores_disponibles INTEGER DEFAULT '0' NOT NULL,
+            doctores_total INTEGER DEFAULT '0' NOT NULL,
+            camas_disponibles INTEGER DEFAULT '0' NOT NULL,
+            camas_total INTEGER DEFAULT '0' NOT NULL
+        )
+    """)
+
+    statements = (
+        _counter_triggers('trg_contadores_visitas', 'VISITAS_EMERGENCIA', _VISITA_DELTA,
+                          'estado, id_sala, timestamp')
+        + _counter_triggers('trg_contadores_doctores', 'DOCTORES', _DOCTOR_DELTA,
+                            'disponible, activo, id_sala')
+        + _counter_triggers('trg_contadores_camas', 'CAMAS', _CAMA_DELTA, 'ocupada, id_sala')
+    )
+    for sql in statements:
+        conn.exec_driver_sql(sql)
+
+    rebuild_counters(conn)
+
+
+def _m003_archivo(conn):
+    """Índice de folios archivados y totales precalculados del histórico (ver archive.py)."""
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS "ARCHIVO_FOLIOS" (
+            folio VARCHAR(50) NOT NULL PRIMARY KEY,
+            mes VARCHAR(6) NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS "RESUMEN_ARCHIVO" (
+            mes VARCHAR(6) NOT NULL,
+            id_sala INTEGER NOT NULL,
+            estado VARCHAR(20) NOT NULL,
+            visitas INTEGER DEFAULT '0' NOT NULL,
+            PRIMARY KEY (mes, id_sala, estado)
+        )
+    """)
+
+
+# Tokenizador común: sin acentos ("José" = "jose") y '+' como parte de la
+# palabra para que un folio (1+2+1+005) sea un solo término buscable por prefijo.
+_FTS_TOKENIZE = "unicode61 remove_diacritics 2 tokenchars '+'"
+
+
+def _fts_triggers(prefix, fts, table, key, columns):
+    """Triggers que mantienen un índice FTS5 de contenido externo al día con su tabla."""
+    cols = ', '.join(columns)
+    new = ', '.join(f'NEW.{c}' for c in columns)
+    old = ', '.join(f'OLD.{c}' for c in columns)
+    insert = f'INSERT INTO {fts} (rowid, {cols}) VALUES (NEW.{key}, {new});'
+    delete = f"INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', OLD.{key}, {old});"
+    return [
+        f'DROP TRIGGER IF EXISTS {prefix}_ai',
+        f'DROP TRIGGER IF EXISTS {prefix}_au',
+        f'DROP TRIGGER IF EXISTS {prefix}_ad',
+        f'CREATE TRIGGER {prefix}_ai AFTER INSERT ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER {prefix}_au AFTER UPDATE OF {cols} ON {table} BEGIN {delete} {insert} END',
+        f'CREATE TRIGGER {prefix}_ad AFTER DELETE ON {table} BEGIN {delete} END',
+    ]
+
+
+def _m004_busqueda(conn):
+    """Índices de texto completo (FTS5) de pacientes y visitas (ver search.py)."""
+    conn.exec_driver_sql(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS PACIENTES_FTS USING fts5(
+            nombre, curp,
+            content='PACIENTES', content_rowid='id_paciente',
+            tokenize="{_FTS_TOKENIZE}", prefix='2 3'
+        )
+    """)
+    conn.exec_driver_sql(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS VISITAS_FTS USING fts5(
+            folio, sintomas, diagnostico,
+            content='VISITAS_EMERGENCIA', content_rowid='id_visita',
+            tokenize="{_FTS_TOKENIZE}", prefix='2 3'
+        )
+    """)
+
+    statements = (
+        _fts_triggers('trg_pacientes_fts', 'PACIENTES_FTS', 'PACIENTES', 'id_paciente', ['nombre', 'curp'])
+        + _fts_triggers('trg_visitas_fts', 'VISITAS_FTS', 'VISITAS_EMERGENCIA', 'id_visita',
+                        ['folio', 'sintomas', 'diagnostico'])
+    )
+    for sql in statements:
+        conn.exec_driver_sql(sql)
+
+    rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn):
+    """Reconstruye los índices FTS5 desde PACIENTES y VISITAS_EMERGENCIA."""
+    conn.exec_driver_sql("INSERT INTO PACIENTES_FTS (PACIENTES_FTS) VALUES ('rebuild')")
+    conn.exec_driver_sql("INSERT INTO VISITAS_FTS (VISITAS_FTS) VALUES ('rebuild')")
+
+
+# Cualquier cambio en una fila de la sala (NEW u OLD) sube su versión
+_BUMP_VERSION = """
+    INSERT INTO CAMBIOS_SALA (id_sala, version) VALUES ({row}.id_sala, 1)
+    ON CONFLICT (id_sala) DO UPDATE SET version = version + 1;
+"""
+
+
+def _version_triggers(prefix, table, update_columns=None):
+    """Triggers INSERT/UPDATE/DELETE que suben CAMBIOS_SALA.version de la sala afectada."""
+    new = _BUMP_VERSION.format(row='NEW')
+    old = _BUMP_VERSION.format(row='OLD')
+    update_of = f' OF {update_columns}' if update_columns else ''
+    return [
+        f'DROP TRIGGER IF EXISTS {prefix}_ai',
+        f'DROP TRIGGER IF EXISTS {prefix}_au',
+        f'DROP TRIGGER IF EXISTS {prefix}_ad',
+        f'CREATE TRIGGER {prefix}_ai AFTER INSERT ON {table} BEGIN {new} END',
+        f'CREATE TRIGGER {prefix}_au AFTER UPDATE{update_of} ON {table} BEGIN {old} {new} END',
+        f'CREATE TRIGGER {prefix}_ad AFTER DELETE ON {table} BEGIN {old} END',
+    ]
+
+
+def _m005_cambios(conn):
+    """Versión por sala de doctores, camas, trabajadores y visitas (ETag de /api/cluster/snapshot)."""
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS "CAMBIOS_SALA" (
+            id_sala INTEGER NOT NULL PRIMARY KEY,
+            version INTEGER DEFAULT '0' NOT NULL
+        )
+    """)
+
+    statements = (
+        _version_triggers('trg_cambios_doctores', 'DOCTORES')
+        + _version_triggers('trg_cambios_camas', 'CAMAS')
+        + _version_triggers('trg_cambios_trabajadores', 'TRABAJADORES_SOCIALES')
+        # De las visitas el snapshot sólo incluye conteos por estado
+        + _version_triggers('trg_cambios_visitas', 'VISITAS_EMERGENCIA', 'estado, id_sala')
+    )
+    for sql in statements:
+        conn.exec_driver_sql(sql)
+
+
+def _m006_replicacion(conn):
+    """Log de replicación con secuencia global (ver replication_log.py)."""
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS "REPLICACION_LOG" (
+            seq INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            tipo VARCHAR(30) NOT NULL,
+            datos TEXT NOT NULL,
+            id_origen INTEGER,
+            id_lider INTEGER,
+            timestamp DATETIME NOT NULL
+        )
+    """)
+
+
+def _m007_idempotencia(conn):
+    """Llaves de idempotencia ya procesadas con su respuesta (ver idempotency.py)."""
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS "IDEMPOTENCIA" (
+            llave VARCHAR(100) NOT NULL PRIMARY KEY,
+            endpoint VARCHAR(50) NOT NULL,
+            status INTEGER NOT NULL,
+            respuesta TEXT NOT NULL,
+            creado DATETIME NOT NULL
+        )
+    """)
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_idempotencia_creado ON IDEMPOTENCIA (creado)')
+
+
+def _m008_versiones_recursos(conn):
+    """Columna version de doctores y camas para la concurrencia optimista de create-visit."""
+    for tabla in ('DOCTORES', 'CAMAS'):
+        columnas = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{tabla}")')}
+        if 'version' not in columnas:
+            conn.exec_driver_sql(f'ALTER TABLE "{tabla}" ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+
+
+# (versión, descripción, función) - agregar siempre al final, nunca renumerar
+MIGRATIONS = [
+    (1, 'Índices secundarios para consultas frecuentes', _m001_indices),
+    (2, 'Contadores materializados por sala (CONTADORES_SALA)', _m002_contadores),
+    (3, 'Archivo histórico de visitas (ARCHIVO_FOLIOS, RESUMEN_ARCHIVO)', _m003_archivo),
+    (4, 'Búsqueda de texto completo (PACIENTES_FTS, VISITAS_FTS)', _m004_busqueda),
+    (5, 'Versión de cambios por sala (CAMBIOS_SALA)', _m005_cambios),
+    (6, 'Log de replicación (REPLICACION_LOG)', _m006_replicacion),
+    (7, 'Llaves de idempotencia (IDEMPOTENCIA)', _m007_idempotencia),
+    (8, 'Versión de doctores y camas (concurrencia optimista)', _m008_versiones_recursos),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+# ============================================================================
+# CARGA MASIVA
+# ============================================================================
+
+def suspend_derived(conn):
+    """
+    Quita triggers e índices secundarios de VISITAS_EMERGENCIA antes de una
+    carga masiva: insertar sin mantenerlos fila por fila y reconstruirlos al
+    final con restore_derived() es mucho más rápido.
+    """
+    triggers = conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'").all()
+    for (name,) in triggers:
+        conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS "{name}"')
+    indices = conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'VISITAS_EMERGENCIA' "
+        "AND name LIKE 'ix_visitas_%'").all()
+    for (name,) in indices:
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+
+
+def restore_derived(conn):
+    """Recrea índices, triggers, CONTADORES_SALA, índices FTS5 y versiones tras una carga masiva."""
+    _m001_indices(conn)
+    _m002_contadores(conn)
+    _m004_busqueda(conn)
+    _m005_cambios(conn)
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def get_schema_version(conn):
+    """Retorna la versión del esquema guardada en PRAGMA user_version."""
+    return conn.exec_driver_sql('PRAGMA user_version').scalar() or 0
+
+
+def _set_schema_version(conn, version):
+    conn.exec_driver_sql(f'PRAGMA user_version = {int(version)}')
+
+
+def run_migrations(engine):
+    """
+    Aplica las migraciones pendientes sobre una BD cuyas tablas ya existen.
+
+    Cada migración corre en su propia transacción y actualiza user_version al
+    terminar, así que un fallo deja la BD en la última versión completa.
+
+    Args:
+        engine: Engine de SQLAlchemy (por ejemplo db.engine)
+
+    Returns:
+        list: Versiones aplicadas en esta llamada
+    """
+    applied = []
+
+    with engine.connect() as conn:
+        current = get_schema_version(conn)
+
+    for version, descripcion, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+
+        logger.info(f"Aplicando migración {version}: {descripcion}")
+        with engine.begin() as conn:
+            migrate(conn)
+            _set_schema_version(conn, version)
+        applied.append(version)
+
+    if applied:
+        logger.info(f"Esquema actualizado a versión {SCHEMA_VERSION} (aplicadas: {applied})")
+
+    return applied
+
+
+def upgrade_database(path):
+    """
+    Actualiza en sitio un archivo de BD de nodo (crea tablas faltantes y migra).
+
+    Args:
+        path: Ruta al archivo .db
+
+    Returns:
+        list: Versiones aplicadas
+    """
+    from models import db
+
+    engine = create_engine(f'sqlite:///{os.path.abspath(path)}')
+    try:
+        db.metadata.create_all(engine)
+        return run_migrations(engine)
+    finally:
+        engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migra las BDs SQLite de los nodos')
+    parser.add_argument('paths', nargs='*', help='Archivos .db (default: data/emergency_sala*.db)')
+    parser.add_argument('--status', action='store_true', help='Solo mostrar versión actual')
+    parser.add_argument('--repair-counters', action='store_true',
+                        help='Reconstruir CONTADORES_SALA desde las tablas fuente')
+    parser.add_argument('--rebuild-search', action='store_true',
+                        help='Reconstruir los índices de búsqueda (FTS5)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+    paths = args.paths
+    if not paths:
+        from config import Config
+        paths = sorted(glob.glob(os.path.join(Config._DATA_DIR, 'emergency_sala*.db')))
+
+    if not paths:
+        print('No se encontraron bases de datos')
+        return 0
+
+    for path in paths:
+        if args.status:
+            engine = create_engine(f'sqlite:///{os.path.abspath(path)}')
+            with engine.connect() as conn:
+                version = get_schema_version(conn)
+            engine.dispose()
+            print(f'{path}: versión {version}/{SCHEMA_VERSION}')
+        elif args.repair_counters:
+            upgrade_database(path)
+            engine = create_engine(f'sqlite:///{os.path.abspath(path)}')
+            with engine.begin() as conn:
+                rebuild_counters(conn)
+            engine.dispose()
+            print(f'{path}: contadores reconstruidos')
+        elif args.rebuild_search:
+            upgrade_database(path)
+            engine = create_engine(f'sqlite:///{os.path.abspath(path)}')
+            with engine.begin() as conn:
+                rebuild_search_index(conn)
+            engine.dispose()
+            print(f'{path}: índices de búsqueda reconstruidos')
+        else:
+            applied = upgrade_database(path)
+            print(f'{path}: {"aplicadas " + str(applied) if applied else "al día"}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,35 @@
+import json
+from contextvars import ContextVar
+
+from flask.globals import app_ctx
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
 from flask_login import UserMixin
+from sqlalchemy.orm import joinedload, object_session
 from datetime import datetime
 import bcrypt
 
-db = SQLAlchemy()
+# True dentro de db_utils.read_session(): db.session apunta a otra sesión,
+# ligada al engine de solo lectura
+modo_lectura = ContextVar('modo_lectura', default=False)
+
+
+def _alcance_sesion():
+    """Una sesión por contexto de app y modo (escritura / lectura)"""
+    return id(app_ctx._get_current_object()), modo_lectura.get()
+
+
+class SesionEnrutada(FlaskSession):
+    """Sesión que usa el engine de solo lectura si read_session() se lo asignó en info"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = self.info.get('engine_lectura')
+        if bind is None and engine is not None:
+            return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': SesionEnrutada, 'scopefunc': _alcance_sesion})
 
 class Sala(db.Model):
     __tablename__ = 'SALAS'
@@ -53,10 +79,20 @@ class Doctor(db.Model):
     id_sala = db.Column(db.Integer, db.ForeignKey('SALAS.id_sala'), nullable=False)
     disponible = db.Column(db.Boolean, default=True)
     activo = db.Column(db.Boolean, default=True)
+    version = db.Column(db.Integer, nullable=False, server_default='1')  # Concurrencia optimista
 
     # Relaciones
     visitas = db.relationship('VisitaEmergencia', backref='doctor', lazy=True)
 
+    # Índices (doctores disponibles por sala)
+    __table_args__ = (
+        db.Index('ix_doctores_disponible', 'id_sala', 'disponible', 'activo'),
+    )
+
+    # Cada UPDATE del ORM lleva "AND version = <leída>" y la incrementa: si
+    # otra transacción cambió el doctor entretanto, el flush lanza StaleDataError
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self):
         return f'<Doctor {self.nombre} - {self.especialidad}>'
 
@@ -84,11 +120,20 @@ class Cama(db.Model):
     id_sala = db.Column(db.Integer, db.ForeignKey('SALAS.id_sala'), nullable=False)
     ocupada = db.Column(db.Boolean, default=False)
     id_paciente = db.Column(db.Integer, db.ForeignKey('PACIENTES.id_paciente'))
+    version = db.Column(db.Integer, nullable=False, server_default='1')  # Concurrencia optimista
 
     # Relaciones
     visitas = db.relationship('VisitaEmergencia', backref='cama', lazy=True)
     paciente_actual = db.relationship('Paciente', foreign_keys=[id_paciente])
 
+    # Índices (camas libres por sala)
+    __table_args__ = (
+        db.Index('ix_camas_estado', 'id_sala', 'ocupada'),
+    )
+
+    # Igual que Doctor: dos visitas no pueden ocupar la misma cama
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self):
         return f'<Cama {self.numero} - Sala {self.id_sala}>'
 
@@ -109,6 +154,17 @@ class VisitaEmergencia(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     fecha_cierre = db.Column(db.DateTime)
 
+    # Índices para las consultas frecuentes (visitas activas, conteos por sala,
+    # listados ordenados por fecha). Ver también migrations.py para BDs existentes.
+    __table_args__ = (
+        db.Index('ix_visitas_estado', 'estado', 'id_sala', 'timestamp'),
+        db.Index('ix_visitas_estado_timestamp', 'estado', 'timestamp'),
+        db.Index('ix_visitas_sala_timestamp', 'id_sala', 'timestamp'),
+        db.Index('ix_visitas_doctor', 'id_doctor', 'estado'),
+        db.Index('ix_visitas_paciente', 'id_paciente', 'timestamp'),
+        db.Index('ix_visitas_timestamp', 'timestamp'),
+    )
+
     def __repr__(self):
         return f'<VisitaEmergencia {self.folio} - {self.estado}>'
 
@@ -136,13 +192,112 @@ class Consecutivo(db.Model):
     fecha = db.Column(db.Date, nullable=False)
     consecutivo = db.Column(db.Integer, default=0)
 
+    # Un solo contador por sala y día
+    __table_args__ = (
+        db.Index('ux_consecutivos_sala_fecha', 'id_sala', 'fecha', unique=True),
+    )
+
     def __repr__(self):
         return f'<Consecutivo Sala {self.id_sala} - {self.fecha}: {self.consecutivo}>'
 
 
+class ContadorSala(db.Model):
+    """
+    Contadores materializados por sala para dashboards y estadísticas.
+
+    Los mantienen triggers de SQLite sobre VISITAS_EMERGENCIA, DOCTORES y CAMAS
+    (ver migrations.py), así que cualquier escritura (ORM, SQL directo,
+    replicación) los deja al día dentro de la misma transacción.
+    """
+    __tablename__ = 'CONTADORES_SALA'
+
+    id_sala = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    visitas_activas = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    visitas_completadas = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    visitas_hoy = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    fecha_hoy = db.Column(db.Date)  # Día al que corresponde visitas_hoy
+    doctores_disponibles = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    doctores_total = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    camas_disponibles = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    camas_total = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    CAMPOS = ('visitas_activas', 'visitas_completadas', 'visitas_hoy', 'doctores_disponibles',
+              'doctores_total', 'camas_disponibles', 'camas_total')
+
+    def __repr__(self):
+        return f'<ContadorSala {self.id_sala}: {self.visitas_activas} activas>'
+
+    def to_dict(self):
+        """Convierte a diccionario; visitas_hoy vale 0 si el contador es de otro día"""
+        data = {campo: getattr(self, campo) or 0 for campo in self.CAMPOS}
+        if self.fecha_hoy != datetime.utcnow().date():
+            data['visitas_hoy'] = 0
+        data['id_sala'] = self.id_sala
+        return data
+
+
+class EntradaReplicacion(db.Model):
+    """
+    Entrada del log de replicación (ver replication_log.py).
+
+    El líder numera cada cambio replicado con seq (creciente, sin huecos) y
+    cada seguidor guarda las entradas que aplica con el mismo seq: su
+    MAX(seq) es hasta dónde va aplicado y, si llega a líder, sigue numerando
+    desde ahí.
+    """
+    __tablename__ = 'REPLICACION_LOG'
+
+    seq = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(30), nullable=False)  # visita_creada, visita_cerrada, visita_reasignada, ...
+    datos = db.Column(db.Text, nullable=False)  # JSON: filas completas de visitas, doctores y camas
+    id_origen = db.Column(db.Integer)  # Nodo donde ocurrió el cambio
+    id_lider = db.Column(db.Integer)  # Nodo que le asignó seq
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    def __repr__(self):
+        return f'<EntradaReplicacion {self.seq} {self.tipo}>'
+
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'tipo': self.tipo,
+            'datos': json.loads(self.datos),
+            'id_origen': self.id_origen,
+            'id_lider': self.id_lider,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+        }
+
+
+class ClaveIdempotencia(db.Model):
+    """
+    Llave de idempotencia de una petición ya procesada y la respuesta que se
+    dio (ver idempotency.py). Se guarda en la misma transacción que el cambio
+    que produjo la petición.
+    """
+    __tablename__ = 'IDEMPOTENCIA'
+
+    llave = db.Column(db.String(100), primary_key=True)
+    endpoint = db.Column(db.String(50), nullable=False)  # create-visit, replicate-visit
+    status = db.Column(db.Integer, nullable=False)  # Código HTTP de la respuesta
+    respuesta = db.Column(db.Text, nullable=False)  # JSON de la respuesta
+    creado = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_idempotencia_creado', 'creado'),
+    )
+
+    def __repr__(self):
+        return f'<ClaveIdempotencia {self.llave} {self.endpoint}>'
+
+
 def get_next_consecutivo(id_sala):
     """
-    Obtiene el siguiente consecutivo para una sala.
+    Obtiene el siguiente consecutivo para una sala (día actual, UTC).
+
+    Los números salen de bloques reservados en CONSECUTIVOS (ver
+    consecutivos.py); dentro de la transacción de db.session.
 
     Args:
         id_sala: ID de la sala
@@ -150,30 +305,8 @@ def get_next_consecutivo(id_sala):
     Returns:
         int: Próximo número consecutivo
     """
-    from sqlalchemy import func
-    hoy = datetime.utcnow().date()
-
-    # Buscar consecutivo para hoy
-    consecutivo = Consecutivo.query.filter_by(
-        id_sala=id_sala,
-        fecha=hoy
-    ).first()
-
-    if not consecutivo:
-        # Crear nuevo consecutivo para hoy
-        consecutivo = Consecutivo(
-            id_sala=id_sala,
-            fecha=hoy,
-            consecutivo=1
-        )
-        db.session.add(consecutivo)
-        db.session.flush()
-        return 1
-    else:
-        # Incrementar consecutivo
-        consecutivo.consecutivo += 1
-        db.session.flush()
-        return consecutivo.consecutivo
+    from consecutivos import allocator
+    return allocator.next(db.session(), db.session.connection(), id_sala)
 
 
 class Usuario(UserMixin, db.Model):
@@ -205,68 +338,238 @@ class Usuario(UserMixin, db.Model):
 
 # Funciones de utilidad para queries comunes
 
-def get_doctores_disponibles(id_sala=None):
-    """Obtiene doctores disponibles, opcionalmente filtrados por sala"""
-    query = Doctor.query.filter_by(disponible=True, activo=True)
-    if id_sala:
-        query = query.filter_by(id_sala=id_sala)
-    return query.all()
+def get_doctores_disponibles(id_sala=None, especialidad=None):
+    """
+    Obtiene doctores disponibles, opcionalmente filtrados por sala y especialidad.
+
+    Se leen del índice en memoria (availability.py), sin consultar la BD.
+    Retorna registros DoctorDisponible (id_doctor, nombre, especialidad, id_sala);
+    para modificar un doctor usar db.session.get(Doctor, id_doctor).
+    """
+    from availability import availability
+    return availability.doctores_disponibles(id_sala=id_sala or None, especialidad=especialidad)
 
 
 def get_camas_disponibles(id_sala=None):
-    """Obtiene camas disponibles, opcionalmente filtradas por sala"""
-    query = Cama.query.filter_by(ocupada=False)
-    if id_sala:
-        query = query.filter_by(id_sala=id_sala)
-    return query.all()
+    """
+    Obtiene camas disponibles, opcionalmente filtradas por sala.
+
+    Se leen del índice en memoria (availability.py). Retorna registros
+    CamaDisponible (id_cama, numero, id_sala).
+    """
+    from availability import availability
+    return availability.camas_disponibles(id_sala=id_sala or None)
+
+
+def with_relaciones(query):
+    """
+    Carga paciente, doctor, cama y sala en la misma consulta (JOIN) para las
+    vistas que necesitan objetos ORM completos (plantillas), evitando 1 + 4N queries.
+    """
+    return query.options(
+        joinedload(VisitaEmergencia.paciente),
+        joinedload(VisitaEmergencia.doctor),
+        joinedload(VisitaEmergencia.cama),
+        joinedload(VisitaEmergencia.sala)
+    )
 
 
 def get_visitas_activas(id_doctor=None, id_sala=None):
-    """Obtiene visitas activas, opcionalmente filtradas por doctor o sala"""
+    """Obtiene visitas activas (con relaciones precargadas), opcionalmente filtradas por doctor o sala"""
     query = VisitaEmergencia.query.filter_by(estado='activa')
     if id_doctor:
         query = query.filter_by(id_doctor=id_doctor)
     if id_sala:
         query = query.filter_by(id_sala=id_sala)
-    return query.order_by(VisitaEmergencia.timestamp.desc()).all()
+    return with_relaciones(query).order_by(VisitaEmergencia.timestamp.desc()).all()
+
+
+class VisitaResumen:
+    """
+    Fila de solo lectura de una visita con los nombres ya resueltos.
+
+    Lo produce get_visitas_resumen() a partir de una sola consulta con JOIN y
+    columnas proyectadas (sin instanciar objetos ORM). to_dict() devuelve las
+    mismas llaves que VisitaEmergencia.to_dict().
+    """
+    __slots__ = ('id_visita', 'folio', 'id_paciente', 'paciente_nombre', 'id_doctor', 'doctor_nombre',
+                 'id_cama', 'cama_numero', 'id_sala', 'sala_numero', 'sintomas', 'diagnostico',
+                 'estado', 'timestamp', 'fecha_cierre')
+
+    def __init__(self, *values):
+        for campo, valor in zip(self.__slots__, values):
+            setattr(self, campo, valor)
+
+    def to_dict(self):
+        return {
+            'id_visita': self.id_visita,
+            'folio': self.folio,
+            'paciente': self.paciente_nombre,
+            'doctor': self.doctor_nombre,
+            'cama': self.cama_numero,
+            'sala': self.sala_numero,
+            'sintomas': self.sintomas,
+            'estado': self.estado,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'fecha_cierre': self.fecha_cierre.isoformat() if self.fecha_cierre else None
+        }
+
+    def to_row(self):
+        """Fila de /api/cluster/visits (ids y nombres por separado)"""
+        return {
+            'id_visita': self.id_visita,
+            'folio': self.folio,
+            'id_paciente': self.id_paciente,
+            'paciente_nombre': self.paciente_nombre,
+            'id_doctor': self.id_doctor,
+            'doctor_nombre': self.doctor_nombre,
+            'id_cama': self.id_cama,
+            'cama_numero': self.cama_numero,
+            'id_sala': self.id_sala,
+            'sintomas': self.sintomas,
+            'diagnostico': self.diagnostico,
+            'estado': self.estado,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'fecha_cierre': self.fecha_cierre.isoformat() if self.fecha_cierre else None
+        }
+
+    def __repr__(self):
+        return f'<VisitaResumen {self.folio} - {self.estado}>'
+
+
+def visitas_resumen_query():
+    """
+    SELECT proyectado de VisitaResumen: VISITAS_EMERGENCIA + LEFT JOIN a pacientes,
+    doctores, camas y salas (LEFT JOIN mantiene a VISITAS_EMERGENCIA como tabla
+    externa, así el orden por timestamp usa sus índices).
+    """
+    v = VisitaEmergencia
+    return (
+        db.select(v.id_visita, v.folio, v.id_paciente, Paciente.nombre, v.id_doctor, Doctor.nombre,
+                  v.id_cama, Cama.numero, v.id_sala, Sala.numero, v.sintomas, v.diagnostico,
+                  v.estado, v.timestamp, v.fecha_cierre)
+        .select_from(v)
+        .outerjoin(Paciente, Paciente.id_paciente == v.id_paciente)
+        .outerjoin(Doctor, Doctor.id_doctor == v.id_doctor)
+        .outerjoin(Cama, Cama.id_cama == v.id_cama)
+        .outerjoin(Sala, Sala.id_sala == v.id_sala)
+    )
+
+
+def get_visitas_resumen(estado=None, id_sala=None, id_doctor=None, id_paciente=None, limit=None):
+    """
+    Lista de visitas para listados y JSON en una sola consulta.
+
+    Args:
+        estado: (opcional) 'activa', 'completada', ...
+        id_sala: (opcional) filtrar por sala
+        id_doctor: (opcional) filtrar por doctor
+        id_paciente: (opcional) filtrar por paciente
+        limit: (opcional) máximo de filas
+
+    Returns:
+        list[VisitaResumen]: ordenadas por timestamp descendente
+    """
+    stmt = _filtrar_visitas(visitas_resumen_query(), estado, id_sala, id_doctor, id_paciente)
+    stmt = stmt.order_by(VisitaEmergencia.timestamp.desc(), VisitaEmergencia.id_visita.desc())
+    if limit:
+        stmt = stmt.limit(limit)
+    return [VisitaResumen(*row) for row in db.session.execute(stmt)]
+
+
+def _filtrar_visitas(stmt, estado=None, id_sala=None, id_doctor=None, id_paciente=None):
+    v = VisitaEmergencia
+    if estado:
+        stmt = stmt.where(v.estado == estado)
+    if id_sala:
+        stmt = stmt.where(v.id_sala == id_sala)
+    if id_doctor:
+        stmt = stmt.where(v.id_doctor == id_doctor)
+    if id_paciente:
+        stmt = stmt.where(v.id_paciente == id_paciente)
+    return stmt
+
+
+# Orden estable de los listados de visitas: más recientes primero, id como desempate
+VISITAS_ORDEN = (VisitaEmergencia.timestamp, VisitaEmergencia.id_visita)
+
+
+def get_visitas_page(estado=None, id_sala=None, id_doctor=None, id_paciente=None, cursor=None, limit=50):
+    """
+    Una página de visitas (VisitaResumen) con paginación por llave.
+
+    Args:
+        estado, id_sala, id_doctor, id_paciente: filtros opcionales (ver get_visitas_resumen)
+        cursor: next_cursor de la página anterior (None para la primera)
+        limit: tamaño de página
+
+    Returns:
+        pagination.Page: items (VisitaResumen) y next_cursor
+
+    Raises:
+        pagination.CursorError: si el cursor no es válido
+    """
+    from pagination import fetch_page
+    stmt = _filtrar_visitas(visitas_resumen_query(), estado, id_sala, id_doctor, id_paciente)
+    return fetch_page(stmt, VISITAS_ORDEN, key=lambda row: (row.timestamp, row.id_visita),
+                      cursor=cursor, limit=limit, descending=True, item=lambda row: VisitaResumen(*row))
+
+
+def get_contadores_sala(id_sala):
+    """
+    Obtiene los contadores materializados de una sala (una lectura por llave primaria).
+
+    Args:
+        id_sala: ID de la sala
+
+    Returns:
+        dict: visitas_activas, visitas_completadas, visitas_hoy, doctores_disponibles,
+              doctores_total, camas_disponibles, camas_total
+    """
+    contador = db.session.get(ContadorSala, id_sala)
+    if contador is None:
+        data = dict.fromkeys(ContadorSala.CAMPOS, 0)
+        data['id_sala'] = id_sala
+        return data
+    return contador.to_dict()
+
+
+def get_version_sala(id_sala):
+    """
+    Versión de cambios de una sala: la suben los triggers de CAMBIOS_SALA con
+    cada escritura a sus doctores, camas, trabajadores o visitas (ver migrations.py).
+
+    Args:
+        id_sala: ID de la sala
+
+    Returns:
+        int: versión actual (0 si la sala no tiene cambios registrados)
+    """
+    version = db.session.execute(
+        db.text('SELECT version FROM CAMBIOS_SALA WHERE id_sala = :id_sala'), {'id_sala': id_sala}
+    ).scalar()
+    return version or 0
 
 
 def get_metricas_dashboard(id_sala=None):
-    """Obtiene métricas para el dashboard (OPTIMIZADO - UNA SOLA QUERY)"""
-    from sqlalchemy import func, case, and_
-
-    # Query única optimizada con agregaciones
-    hoy = datetime.utcnow().date()
-
-    # Subquery para visitas
-    visitas_stats = db.session.query(
-        func.count().filter(VisitaEmergencia.estado == 'activa').label('visitas_activas'),
-        func.count().filter(func.date(VisitaEmergencia.timestamp) == hoy).label('visitas_hoy'),
-        func.count().filter(and_(
-            VisitaEmergencia.estado == 'activa',
-            VisitaEmergencia.id_sala == id_sala if id_sala else True
-        )).label('visitas_activas_sala')
-    ).first()
-
-    # Counts optimizados
-    doctores_disponibles = Doctor.query.filter_by(disponible=True, activo=True).count()
-    camas_disponibles = Cama.query.filter_by(ocupada=False).count()
+    """Obtiene métricas para el dashboard desde CONTADORES_SALA (una sola query)"""
+    contadores = [c.to_dict() for c in ContadorSala.query.all()]
+
+    def total(campo):
+        return sum(c[campo] for c in contadores)
 
     metricas = {
-        'visitas_activas': visitas_stats.visitas_activas or 0,
-        'doctores_disponibles': doctores_disponibles,
-        'camas_disponibles': camas_disponibles,
-        'visitas_hoy': visitas_stats.visitas_hoy or 0
+        'visitas_activas': total('visitas_activas'),
+        'doctores_disponibles': total('doctores_disponibles'),
+        'camas_disponibles': total('camas_disponibles'),
+        'visitas_hoy': total('visitas_hoy')
     }
 
     if id_sala:
-        metricas['visitas_activas_sala'] = visitas_stats.visitas_activas_sala or 0
-        metricas['doctores_sala'] = Doctor.query.filter_by(
-            id_sala=id_sala, disponible=True, activo=True
-        ).count()
-        metricas['camas_sala'] = Cama.query.filter_by(
-            id_sala=id_sala, ocupada=False
-        ).count()
+        sala = next((c for c in contadores if c['id_sala'] == id_sala), None)
+        metricas['visitas_activas_sala'] = sala['visitas_activas'] if sala else 0
+        metricas['doctores_sala'] = sala['doctores_disponibles'] if sala else 0
+        metricas['camas_sala'] = sala['camas_disponibles'] if sala else 0
 
     return metricas
 
@@ -280,10 +583,13 @@ def generate_folio(mapper, connection, target):
     Genera el folio automáticamente antes de insertar la visita.
     Formato: IDPACIENTE+IDDOCTOR+SALA+CONSECUTIVO
     Ejemplo: 5+12+3+001
+
+    El consecutivo sale del bloque reservado por el proceso; sólo se escribe
+    en CONSECUTIVOS (en esta misma conexión) cuando hay que reservar otro.
     """
     if not target.folio:
-        # Obtener consecutivo para la sala
-        consecutivo = get_next_consecutivo(target.id_sala)
+        from consecutivos import allocator
+        consecutivo = allocator.next(object_session(target), connection, target.id_sala)
 
         # Generar folio: IDPACIENTE+IDDOCTOR+SALA+CONSECUTIVO
         target.folio = f"{target.id_paciente}+{target.id_doctor}+{target.id_sala}+{consecutivo:03d}"
@@ -293,9 +599,10 @@ def generate_folio(mapper, connection, target):
 # CONSULTAS DISTRIBUIDAS - Agregación de datos del cluster completo
 # ============================================================================
 
-import requests
 import logging
 
+from cluster_client import scatter_gather
+
 cluster_logger = logging.getLogger(__name__)
 
 
@@ -321,27 +628,77 @@ def get_cluster_nodes_info(bully_manager):
     return nodes_info
 
 
-def get_all_cluster_doctors(bully_manager, disponible=None, activo=True):
+def otros_nodos(bully_manager):
+    """
+    Obtiene los demás nodos del cluster (todos menos éste) con la URL de su
+    API Flask, para las consultas y la replicación entre nodos.
+
+    Args:
+        bully_manager: Instancia de BullyNode
+
+    Returns:
+        list: Lista de tuplas (node_id, url Flask)
+    """
+    from config import Config
+    return [(node_id, get_node_flask_url(node_id, host))
+            for node_id, host, _ in get_cluster_nodes_info(bully_manager) if node_id != Config.NODE_ID]
+
+
+class ResultadoCluster(list):
+    """
+    Lista de resultados de todo el cluster con el estado de cada nodo remoto
+    consultado en `nodos` (ver cluster_client.RespuestaNodo.to_dict).
+    """
+
+    def __init__(self, items=(), nodos=()):
+        super().__init__(items)
+        self.nodos = list(nodos)
+
+    @property
+    def parcial(self):
+        """True si algún nodo no respondió (faltan sus resultados)"""
+        return any(nodo['status'] not in ('online', 'cached') for nodo in self.nodos)
+
+
+def _consultar_otros_nodos(bully_manager, path, params=None):
+    """GET `path` a los demás nodos en paralelo (plazo global Config.CLUSTER_QUERY_DEADLINE)"""
+    return scatter_gather(otros_nodos(bully_manager), path, params)
+
+
+def _recursos_remotos(bully_manager, fresh):
+    """Doctores y camas de las demás salas desde la caché de recursos (ver resource_cache.py)"""
+    from resource_cache import resource_cache
+    return resource_cache.lookup(otros_nodos(bully_manager), fresh=fresh)
+
+
+def get_all_cluster_doctors(bully_manager, disponible=None, activo=True, fresh=False):
     """
     Consulta doctores de TODAS las salas del cluster.
 
+    Las salas remotas se responden desde la caché de recursos mientras esté
+    vigente; las que no, se piden a su nodo.
+
     Args:
         bully_manager: Instancia de BullyNode
         disponible: (opcional) True/False/None para filtrar disponibilidad
-        activo: (opcional) True/False para filtrar estado activo
+        activo: (opcional) True/False/None para filtrar estado activo
+        fresh: (opcional) True para ignorar la caché y consultar a los nodos
 
     Returns:
-        list: Lista de dict con información de doctores de todas las salas
+        ResultadoCluster: dicts con información de doctores de todas las salas
+        (parcial si algún nodo no respondió; ver .nodos)
     """
-    all_doctors = []
+    remotos, nodos = _recursos_remotos(bully_manager, fresh)
 
-    # Agregar doctores locales
-    query = Doctor.query.filter_by(activo=activo)
+    # Doctores locales (salas sin datos de su propio nodo)
+    query = Doctor.query.filter(Doctor.id_sala.notin_(list(remotos)))
+    if activo is not None:
+        query = query.filter_by(activo=activo)
     if disponible is not None:
         query = query.filter_by(disponible=disponible)
 
-    local_doctors = query.all()
-    for doc in local_doctors:
+    all_doctors = ResultadoCluster(nodos=nodos)
+    for doc in query.all():
         all_doctors.append({
             'id_doctor': doc.id_doctor,
             'nombre': doc.nombre,
@@ -352,64 +709,43 @@ def get_all_cluster_doctors(bully_manager, disponible=None, activo=True):
             'source': 'local'
         })
 
-    # Consultar doctores de otros nodos
-    nodes_info = get_cluster_nodes_info(bully_manager)
-
-    for node_id, host, tcp_port in nodes_info:
-        # Saltear nodo local
-        from config import Config
-        if node_id == Config.NODE_ID:
-            continue
-
-        try:
-            # Construir URL
-            url = f"http://{host}:{tcp_port}/api/cluster/doctors"
-            params = {}
-            if disponible is not None:
-                params['disponible'] = 'true' if disponible else 'false'
-            if activo is not None:
-                params['activo'] = 'true' if activo else 'false'
-
-            response = requests.get(url, params=params, timeout=2)
-
-            if response.ok:
-                data = response.json()
-                for doc in data.get('doctors', []):
-                    doc['source'] = f'node_{node_id}'
-                    all_doctors.append(doc)
-            else:
-                cluster_logger.warning(f"Node {node_id} returned status {response.status_code}")
-
-        except requests.exceptions.Timeout:
-            cluster_logger.warning(f"Timeout connecting to node {node_id}")
-        except requests.exceptions.ConnectionError:
-            cluster_logger.warning(f"Connection error to node {node_id} (may be down)")
-        except Exception as e:
-            cluster_logger.error(f"Error querying node {node_id}: {e}")
+    # Doctores de otros nodos
+    for node_id, datos in remotos.items():
+        for doc in datos['doctors']:
+            if activo is not None and doc['activo'] != activo:
+                continue
+            if disponible is not None and doc['disponible'] != disponible:
+                continue
+            all_doctors.append({**doc, 'source': f'node_{node_id}'})
 
     return all_doctors
 
 
-def get_all_cluster_beds(bully_manager, ocupada=None):
+def get_all_cluster_beds(bully_manager, ocupada=None, fresh=False):
     """
     Consulta camas de TODAS las salas del cluster.
 
+    Las salas remotas se responden desde la caché de recursos mientras esté
+    vigente; las que no, se piden a su nodo.
+
     Args:
         bully_manager: Instancia de BullyNode
         ocupada: (opcional) True/False/None para filtrar ocupación
+        fresh: (opcional) True para ignorar la caché y consultar a los nodos
 
     Returns:
-        list: Lista de dict con información de camas de todas las salas
+        ResultadoCluster: dicts con información de camas de todas las salas
+        (parcial si algún nodo no respondió; ver .nodos)
     """
-    all_beds = []
+    remotos, nodos = _recursos_remotos(bully_manager, fresh)
 
-    # Agregar camas locales
-    query = Cama.query
+    # Camas locales (salas sin datos de su propio nodo)
+    query = Cama.query.filter(Cama.id_sala.notin_(list(remotos)))
     if ocupada is not None:
         query = query.filter_by(ocupada=ocupada)
 
-    local_beds = query.all()
-    for cama in local_beds:
+    all_beds = ResultadoCluster(nodos=nodos)
+    for cama in query.all():
         all_beds.append({
             'id_cama': cama.id_cama,
             'numero': cama.numero,
@@ -420,30 +756,12 @@ def get_all_cluster_beds(bully_manager, ocupada=None):
             'source': 'local'
         })
 
-    # Consultar camas de otros nodos
-    nodes_info = get_cluster_nodes_info(bully_manager)
-
-    for node_id, host, tcp_port in nodes_info:
-        from config import Config
-        if node_id == Config.NODE_ID:
-            continue
-
-        try:
-            url = f"http://{host}:{tcp_port}/api/cluster/beds"
-            params = {}
-            if ocupada is not None:
-                params['ocupada'] = 'true' if ocupada else 'false'
-
-            response = requests.get(url, params=params, timeout=2)
-
-            if response.ok:
-                data = response.json()
-                for bed in data.get('beds', []):
-                    bed['source'] = f'node_{node_id}'
-                    all_beds.append(bed)
-
-        except Exception as e:
-            cluster_logger.warning(f"Error querying beds from node {node_id}: {e}")
+    # Camas de otros nodos
+    for node_id, datos in remotos.items():
+        for bed in datos['beds']:
+            if ocupada is not None and bed['ocupada'] != ocupada:
+                continue
+            all_beds.append({**bed, 'source': f'node_{node_id}'})
 
     return all_beds
 
@@ -456,78 +774,83 @@ def get_all_cluster_stats(bully_manager):
         bully_manager: Instancia de BullyNode
 
     Returns:
-        dict: Estadísticas agregadas del cluster completo
+        dict: Estadísticas agregadas del cluster completo; 'nodes' incluye
+        el estado de cada nodo ('local', 'online', 'error', 'offline' o
+        'timeout') y 'partial' indica si falta alguno. Las visitas
+        completadas incluyen las ya archivadas (RESUMEN_ARCHIVO), así que el
+        total no baja cuando corre el archivador; 'total_visits_archived'
+        cuenta todas las archivadas (completadas y canceladas)
     """
+    # Snapshot condicional: un nodo sin cambios responde 304 y se reutilizan
+    # sus estadísticas anteriores sin transferir ni parsear nada
+    respuestas = scatter_gather(otros_nodos(bully_manager), '/api/cluster/snapshot', conditional=True)
+
     cluster_stats = {
         'nodes': [],
+        'partial': False,
         'total_doctors_available': 0,
         'total_doctors': 0,
         'total_beds_available': 0,
         'total_beds': 0,
         'total_visits_active': 0,
-        'total_visits_completed': 0
+        'total_visits_completed': 0,
+        'total_visits_archived': 0
     }
 
-    # Estadísticas locales
+    def agregar(node_stats):
+        cluster_stats['nodes'].append(node_stats)
+        cluster_stats['total_doctors_available'] += node_stats['doctors_available']
+        cluster_stats['total_doctors'] += node_stats['doctors_total']
+        cluster_stats['total_beds_available'] += node_stats['beds_available']
+        cluster_stats['total_beds'] += node_stats['beds_total']
+        cluster_stats['total_visits_active'] += node_stats['visits_active']
+        cluster_stats['total_visits_completed'] += node_stats['visits_completed']
+        cluster_stats['total_visits_archived'] += node_stats['visits_archived']
+
+    # Estadísticas locales (contadores materializados + totales del archivo)
     from config import Config
-    local_stats = {
+    from archive import get_totales_archivo
+    contadores = get_contadores_sala(Config.NODE_ID)
+    archivadas = get_totales_archivo(Config.NODE_ID)
+    agregar({
         'node_id': Config.NODE_ID,
         'status': 'local',
-        'doctors_available': Doctor.query.filter_by(id_sala=Config.NODE_ID, disponible=True, activo=True).count(),
-        'doctors_total': Doctor.query.filter_by(id_sala=Config.NODE_ID, activo=True).count(),
-        'beds_available': Cama.query.filter_by(id_sala=Config.NODE_ID, ocupada=False).count(),
-        'beds_total': Cama.query.filter_by(id_sala=Config.NODE_ID).count(),
-        'visits_active': VisitaEmergencia.query.filter_by(id_sala=Config.NODE_ID, estado='activa').count(),
-        'visits_completed': VisitaEmergencia.query.filter_by(id_sala=Config.NODE_ID, estado='completada').count()
-    }
-    cluster_stats['nodes'].append(local_stats)
-
-    # Agregar a totales
-    cluster_stats['total_doctors_available'] += local_stats['doctors_available']
-    cluster_stats['total_doctors'] += local_stats['doctors_total']
-    cluster_stats['total_beds_available'] += local_stats['beds_available']
-    cluster_stats['total_beds'] += local_stats['beds_total']
-    cluster_stats['total_visits_active'] += local_stats['visits_active']
-    cluster_stats['total_visits_completed'] += local_stats['visits_completed']
-
-    # Consultar otros nodos
-    nodes_info = get_cluster_nodes_info(bully_manager)
-
-    for node_id, host, tcp_port in nodes_info:
-        if node_id == Config.NODE_ID:
+        'doctors_available': contadores['doctores_disponibles'],
+        'doctors_total': contadores['doctores_total'],
+        'beds_available': contadores['camas_disponibles'],
+        'beds_total': contadores['camas_total'],
+        'visits_active': contadores['visitas_activas'],
+        'visits_completed': contadores['visitas_completadas'] + archivadas['completada'],
+        'visits_archived': archivadas['total']
+    })
+
+    # Otros nodos
+    for respuesta in respuestas:
+        if not respuesta.ok:
+            cluster_stats['nodes'].append(respuesta.to_dict())
+            cluster_stats['partial'] = True
             continue
-
         try:
-            url = f"http://{host}:{tcp_port}/api/cluster/stats"
-            response = requests.get(url, timeout=2)
-
-            if response.ok:
-                data = response.json()
-                node_stats = {
-                    'node_id': node_id,
-                    'status': 'online',
-                    'doctors_available': data['doctors']['available'],
-                    'doctors_total': data['doctors']['total'],
-                    'beds_available': data['beds']['available'],
-                    'beds_total': data['beds']['total'],
-                    'visits_active': data['visits']['active'],
-                    'visits_completed': data['visits']['completed']
-                }
-                cluster_stats['nodes'].append(node_stats)
-
-                # Agregar a totales
-                cluster_stats['total_doctors_available'] += node_stats['doctors_available']
-                cluster_stats['total_doctors'] += node_stats['doctors_total']
-                cluster_stats['total_beds_available'] += node_stats['beds_available']
-                cluster_stats['total_beds'] += node_stats['beds_total']
-                cluster_stats['total_visits_active'] += node_stats['visits_active']
-                cluster_stats['total_visits_completed'] += node_stats['visits_completed']
-            else:
-                cluster_stats['nodes'].append({'node_id': node_id, 'status': 'error'})
-
-        except Exception as e:
-            cluster_logger.warning(f"Error querying stats from node {node_id}: {e}")
-            cluster_stats['nodes'].append({'node_id': node_id, 'status': 'offline'})
+            data = respuesta.data['stats']
+            node_stats = {
+                'node_id': respuesta.node_id,
+                'status': 'online',
+                'elapsed_ms': respuesta.elapsed_ms,
+                'not_modified': respuesta.not_modified,
+                'doctors_available': data['doctors']['available'],
+                'doctors_total': data['doctors']['total'],
+                'beds_available': data['beds']['available'],
+                'beds_total': data['beds']['total'],
+                'visits_active': data['visits']['active'],
+                'visits_completed': data['visits']['completed'] + data['visits']['archived']['completada'],
+                'visits_archived': data['visits']['archived']['total']
+            }
+        except (KeyError, TypeError) as e:
+            cluster_logger.warning(f"Invalid stats from node {respuesta.node_id}: {e}")
+            cluster_stats['nodes'].append({**respuesta.to_dict(), 'status': 'error'})
+            cluster_stats['partial'] = True
+            continue
+        agregar(node_stats)
 
     return cluster_stats
 
@@ -585,7 +908,13 @@ def replicate_visit_to_cluster(bully_manager, visita_data, exclude_node_id=None)
     """
     Replica una visita a todos los nodos del cluster (excepto el excluido).
 
-    Usado por el nodo LÍDER para propagar una visita recién creada.
+    Usado por el nodo LÍDER justo después del commit que creó la visita. Con
+    el log de replicación activo (ver replication_log.py) ese commit ya
+    publicó la entrada y aquí sólo se espera su quorum; si no, la visita se
+    encola directamente en las colas de replicación (ver replication.py).
+    En ambos casos se espera a que confirmen Config.REPLICATION_QUORUM
+    nodos, como mucho Config.REPLICATION_ACK_TIMEOUT segundos; los demás la
+    reciben en segundo plano.
 
     Args:
         bully_manager: Instancia de BullyNode
@@ -596,49 +925,23 @@ def replicate_visit_to_cluster(bully_manager, visita_data, exclude_node_id=None)
         dict: {
             'success_count': int,
             'failed_nodes': [node_ids],
+            'pending_nodes': [node_ids],
             'total_nodes': int
         }
     """
     from config import Config
-
-    nodes_info = get_cluster_nodes_info(bully_manager)
-    success_count = 0
-    failed_nodes = []
-
-    for node_id, host, tcp_port in nodes_info:
-        # Saltar nodo actual y nodo excluido
-        if node_id == Config.NODE_ID or node_id == exclude_node_id:
-            continue
-
-        try:
-            url = get_node_flask_url(node_id, host)
-            endpoint = f"{url}/api/cluster/replicate-visit"
-
-            response = requests.post(endpoint, json=visita_data, timeout=3)
-
-            if response.ok:
-                success_count += 1
-                cluster_logger.info(f"Visit replicated successfully to node {node_id}")
-            else:
-                failed_nodes.append(node_id)
-                cluster_logger.warning(f"Node {node_id} rejected replication: {response.status_code}")
-
-        except requests.exceptions.Timeout:
-            failed_nodes.append(node_id)
-            cluster_logger.warning(f"Timeout replicating to node {node_id}")
-        except requests.exceptions.ConnectionError:
-            failed_nodes.append(node_id)
-            cluster_logger.warning(f"Connection error to node {node_id} (may be down)")
-        except Exception as e:
-            failed_nodes.append(node_id)
-            cluster_logger.error(f"Error replicating to node {node_id}: {e}")
-
-    total_nodes = len(nodes_info) - (1 if Config.NODE_ID in [n[0] for n in nodes_info] else 0)
-    if exclude_node_id:
-        total_nodes -= 1
-
-    return {
-        'success_count': success_count,
-        'failed_nodes': failed_nodes,
-        'total_nodes': total_nodes
-    }
+    from replication import replicator
+    from replication_log import envio_del_commit
+
+    envio = envio_del_commit(db.session)
+    if envio is None:
+        # Los reintentos de la cola repiten la llave: el nodo que ya la aplicó responde sin tocar la BD
+        exclude = () if exclude_node_id is None else (exclude_node_id,)
+        payload = {**visita_data, 'idempotency_key': f"replicate-visit:{visita_data.get('folio')}"}
+        envio = replicator.submit(bully_manager, '/api/cluster/replicate-visit', payload, exclude=exclude)
+    if Config.REPLICATION_QUORUM > 0:
+        envio.wait(Config.REPLICATION_QUORUM, Config.REPLICATION_ACK_TIMEOUT)
+    resultado = envio.resultado()
+    cluster_logger.info(f"Visit {visita_data.get('folio')} replication: {resultado['success_count']}/"
+                        f"{resultado['total_nodes']} acks, {len(resultado['pending_nodes'])} pending")
+    return resultado
@@ -0,0 +1,139 @@
+"""
+Paginación por llave (keyset / seek) con cursores opacos.
+
+En lugar de OFFSET (que recorre y descarta todas las filas anteriores), cada
+página pide "las N filas que siguen a la última vista", usando una condición
+sobre las columnas de orden:
+
+    WHERE (timestamp, id_visita) < (:ts, :id) ORDER BY timestamp DESC, id_visita DESC LIMIT N
+
+Con un índice sobre esas columnas el costo de una página es constante sin
+importar cuán profunda sea. Las columnas de orden deben identificar la fila
+de forma única (por eso se agrega siempre la llave primaria al final).
+
+El cursor que ven los clientes es la llave de la última fila codificada en
+base64 (url-safe); no deben interpretarlo.
+
+SQLite compara los DATETIME como texto: las filas deben guardarse con el
+formato del ORM ('YYYY-MM-DD HH:MM:SS.ffffff'). Una carga con SQL crudo que
+omita los microsegundos haría que la fila frontera se repita en la página
+siguiente.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import tuple_
+
+from models import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class CursorError(ValueError):
+    """Cursor con formato inválido (o que no corresponde al listado)"""
+
+
+class Page:
+    """Una página de resultados: items y cursor para pedir la siguiente (None si es la última)"""
+    __slots__ = ('items', 'next_cursor')
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values):
+    """Codifica la llave de una fila (tupla de valores JSON, datetime o date)"""
+    data = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """
+    Decodifica un cursor para las columnas dadas.
+
+    Raises:
+        CursorError: si el cursor no es válido para esas columnas
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CursorError(f'Cursor inválido: {cursor!r}') from e
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise CursorError(f'Cursor inválido: {cursor!r}')
+
+    result = []
+    for column, value in zip(columns, values):
+        python_type = getattr(column.type, 'python_type', None)
+        try:
+            if value is not None and python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif value is not None and python_type is date:
+                value = date.fromisoformat(value)
+        except (TypeError, ValueError) as e:
+            raise CursorError(f'Cursor inválido: {cursor!r}') from e
+        result.append(value)
+    return result
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Normaliza el tamaño de página pedido por un cliente (1..MAX_PAGE_SIZE)"""
+    if not value or value < 1:
+        return default
+    return min(value, MAX_PAGE_SIZE)
+
+
+def seek(query, columns, cursor=None, descending=False):
+    """
+    Agrega a una Query/Select el orden por `columns` y, si hay cursor, la
+    condición "después de la llave del cursor".
+
+    Args:
+        query: Query del ORM o Select
+        columns: columnas de orden (la última debe ser la llave primaria)
+        cursor: cursor opaco de la página anterior (o None para la primera)
+        descending: orden descendente (más recientes primero)
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        key = tuple_(*columns)
+        query = query.where(key < tuple_(*values) if descending else key > tuple_(*values))
+    return query.order_by(*[c.desc() if descending else c.asc() for c in columns])
+
+
+def fetch_page(query, columns, key, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False, item=None):
+    """
+    Ejecuta una página de keyset.
+
+    Args:
+        query: Query del ORM o Select (sin order_by ni limit)
+        columns: columnas de orden, la última única (p.ej. la llave primaria)
+        key: función fila -> tupla con los valores de `columns`
+        cursor: cursor de la página anterior
+        limit: tamaño de página
+        descending: orden descendente
+        item: (opcional) función fila -> elemento de la página
+
+    Returns:
+        Page
+    """
+    stmt = seek(query, columns, cursor, descending).limit(limit + 1)
+    rows = stmt.all() if hasattr(stmt, 'all') else db.session.execute(stmt).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(key(rows[-1]))
+
+    return Page([item(r) for r in rows] if item else rows, next_cursor)
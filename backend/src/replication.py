@@ -0,0 +1,280 @@
+"""
+Replicación asíncrona del líder a los demás nodos.
+
+Antes el líder creaba la visita y, con el lock de creación tomado, hacía un
+POST a cada nodo esperando su respuesta: la creación de visitas de todo el
+cluster iba al ritmo del nodo más lento. Ahora:
+
+    - Cada nodo destino tiene su cola de salida y un hilo que la envía con
+      hasta REPLICATION_WINDOW peticiones en vuelo (pipelining); un nodo
+      lento sólo retrasa su propia cola. Esas peticiones salen de los hilos
+      y la sesión HTTP de la propia cola, no del pool compartido de
+      cluster_client: la replicación no le quita hilos a las consultas.
+    - submit() encola y regresa de inmediato (el líder suelta el lock en
+      cuanto hace commit local); Envio.wait() espera, fuera del lock, a que
+      REPLICATION_QUORUM nodos confirmen (0 = no esperar).
+    - Los envíos marcados como lote que se acumulan en la cola de un nodo
+      viajan juntos en una sola petición: hasta REPLICATION_BATCH_SIZE, o lo
+      que se juntó en REPLICATION_BATCH_WINDOW segundos desde el primero.
+    - Un envío fallido se reintenta con espera exponencial hasta
+      REPLICATION_MAX_RETRIES veces; después se descarta y queda en las
+      métricas del nodo.
+
+Las entradas se aplican en los nodos de forma idempotente (por folio), así
+que un reintento o la llegada fuera de orden de dos visitas no duplica nada.
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cluster_client import request_node_direct
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Espera antes del primer reintento (se duplica en cada uno)
+RETRY_BACKOFF = 0.2
+
+
+class Envio:
+    """
+    Una entrada replicada a varios nodos, con el seguimiento de sus acks.
+
+    Attributes:
+        seq: número de envío (orden de submit)
+        destinos: node_ids a los que se encoló
+        acks: nodos que la aplicaron
+        fallidos: nodos que la descartaron tras agotar los reintentos
+        al_confirmar: (opcional) función (node_id, JSON de la respuesta) por cada ack
+        lote: si puede viajar junto con otros envíos al mismo path como
+            {"entries": [payload, ...]} (la respuesta trae 'results' con
+            'success' por entrada, en el mismo orden)
+    """
+
+    def __init__(self, seq, path, payload, destinos, al_confirmar=None, lote=False):
+        self.seq = seq
+        self.path = path
+        self.payload = payload
+        self.lote = lote
+        self.destinos = set(destinos)
+        self.acks = set()
+        self.fallidos = set()
+        self.al_confirmar = al_confirmar
+        self._cond = threading.Condition()
+
+    def _resolver(self, node_id, ok, data=None):
+        if ok and self.al_confirmar:
+            try:
+                self.al_confirmar(node_id, data)
+            except Exception as e:
+                logger.error(f'Error procesando el ack #{self.seq} del nodo {node_id}: {e}')
+        with self._cond:
+            (self.acks if ok else self.fallidos).add(node_id)
+            self._cond.notify_all()
+
+    def wait(self, quorum, timeout=None):
+        """
+        Espera a que `quorum` nodos confirmen (o a que todos terminen).
+
+        Args:
+            quorum: acks requeridos (se limita al número de destinos)
+            timeout: segundos máximos de espera
+
+        Returns:
+            bool: True si se alcanzó el quorum
+        """
+        quorum = min(quorum, len(self.destinos))
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.acks) >= quorum
+                                or len(self.acks) + len(self.fallidos) == len(self.destinos), timeout)
+            return len(self.acks) >= quorum
+
+    def resultado(self):
+        """Estado actual: success_count, failed_nodes, pending_nodes y total_nodes"""
+        with self._cond:
+            return {
+                'success_count': len(self.acks),
+                'failed_nodes': sorted(self.fallidos),
+                'pending_nodes': sorted(self.destinos - self.acks - self.fallidos),
+                'total_nodes': len(self.destinos)
+            }
+
+
+class _Seguidor:
+    """Cola de salida de un nodo destino y su hilo emisor"""
+
+    def __init__(self, node_id, url):
+        self.node_id = node_id
+        self.url = url
+        self.cola = deque()  # (Envio, intento, instante en que se encoló)
+        self.en_vuelo = 0
+        self.cond = threading.Condition()
+        self.detenido = False
+        self.contadores = {'sent': 0, 'acked': 0, 'retries': 0, 'dropped': 0, 'requests': 0}
+        self.ultimo_ack_ms = None
+        self.pool = ThreadPoolExecutor(max_workers=Config.REPLICATION_WINDOW,
+                                       thread_name_prefix=f'replication-{node_id}')
+        # Una conexión keep-alive por petición en vuelo
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.REPLICATION_WINDOW)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.hilo = threading.Thread(target=self._emitir, name=f'replication-{node_id}', daemon=True)
+        self.hilo.start()
+
+    def encolar(self, envio, intento=0, al_frente=False):
+        with self.cond:
+            (self.cola.appendleft if al_frente else self.cola.append)((envio, intento, time.monotonic()))
+            self.cond.notify_all()
+
+    def _tomar_grupo(self):
+        """Saca el siguiente envío y, si va en lote, los que le siguen al mismo path (con cond tomado)"""
+        grupo = [self.cola.popleft()]
+        envio = grupo[0][0]
+        while (envio.lote and self.cola and len(grupo) < Config.REPLICATION_BATCH_SIZE
+               and self.cola[0][0].lote and self.cola[0][0].path == envio.path):
+            grupo.append(self.cola.popleft())
+        return grupo
+
+    def _emitir(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.detenido or (self.cola and self.en_vuelo < Config.REPLICATION_WINDOW))
+                if self.detenido:
+                    return
+                # Un lote incompleto espera hasta REPLICATION_BATCH_WINDOW desde
+                # que se encoló su primera entrada, por si llegan más
+                envio, _, encolado = self.cola[0]
+                if envio.lote and len(self.cola) < Config.REPLICATION_BATCH_SIZE:
+                    restante = encolado + Config.REPLICATION_BATCH_WINDOW - time.monotonic()
+                    if restante > 0:
+                        self.cond.wait(restante)
+                        continue
+                grupo = self._tomar_grupo()
+                self.en_vuelo += 1
+            self.pool.submit(self._entregar, grupo)
+
+    def _entregar(self, grupo):
+        inicio = time.monotonic()
+        envio = grupo[0][0]
+        resultados = [False] * len(grupo)
+        data = None
+        try:
+            intento = max(i for _, i, _ in grupo)
+            if intento:
+                time.sleep(RETRY_BACKOFF * 2 ** (intento - 1))
+            payload = {'entries': [e.payload for e, _, _ in grupo]} if envio.lote else envio.payload
+            respuesta = request_node_direct(self.session, self.node_id, self.url, envio.path, method='POST',
+                                            json=payload, timeout=Config.REPLICATION_TIMEOUT)
+            data = respuesta.data
+            if not respuesta.ok:
+                logger.warning(f'Replicación #{envio.seq} (+{len(grupo) - 1}) al nodo {self.node_id} falló '
+                               f'(intento {intento + 1}): {respuesta.status} ({respuesta.error})')
+            elif envio.lote:
+                resultados = [bool(r.get('success')) for r in data['results']]
+            else:
+                resultados = [True]
+        except Exception as e:
+            logger.error(f'Error replicando #{envio.seq} (+{len(grupo) - 1}) al nodo {self.node_id}: {e}')
+
+        reintentar, descartar = [], []
+        with self.cond:
+            self.en_vuelo -= 1
+            self.contadores['requests'] += 1
+            self.contadores['sent'] += len(grupo)
+            if any(resultados):
+                self.ultimo_ack_ms = round((time.monotonic() - inicio) * 1000, 1)
+            for (e, i, _), ok in zip(grupo, resultados):
+                if ok:
+                    self.contadores['acked'] += 1
+                elif i + 1 < Config.REPLICATION_MAX_RETRIES and not self.detenido:
+                    self.contadores['retries'] += 1
+                    reintentar.append((e, i + 1))
+                else:
+                    self.contadores['dropped'] += 1
+                    descartar.append((e, i + 1))
+            self.cond.notify_all()
+
+        for (e, _, _), ok in zip(grupo, resultados):
+            if ok:
+                e._resolver(self.node_id, True, data)
+        for e, i in reversed(reintentar):
+            self.encolar(e, i, al_frente=True)
+        for e, i in descartar:
+            logger.error(f'Replicación #{e.seq} al nodo {self.node_id} descartada tras {i} intentos')
+            e._resolver(self.node_id, False)
+
+    def metrics(self):
+        with self.cond:
+            return {'node_id': self.node_id, 'queued': len(self.cola), 'in_flight': self.en_vuelo,
+                    'last_ack_ms': self.ultimo_ack_ms, **self.contadores}
+
+    def stop(self):
+        with self.cond:
+            self.detenido = True
+            self.cond.notify_all()
+        self.hilo.join(timeout=5)
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.session.close()
+
+
+class ReplicationManager:
+    """Colas de salida por nodo (se crean al primer envío a cada nodo)"""
+
+    def __init__(self):
+        self._seguidores = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+    def _seguidor(self, node_id, url):
+        with self._lock:
+            seguidor = self._seguidores.get(node_id)
+            if seguidor is None:
+                seguidor = self._seguidores[node_id] = _Seguidor(node_id, url)
+            seguidor.url = url  # el nodo pudo redescubrirse en otro host
+            return seguidor
+
+    def submit(self, bully_manager, path, payload, exclude=(), al_confirmar=None, lote=False):
+        """
+        Encola un POST `path` con `payload` a los demás nodos del cluster.
+
+        Args:
+            bully_manager: Instancia de BullyNode (define los nodos destino)
+            path: ruta del endpoint de replicación, p. ej. '/api/cluster/replicate-visit'
+            payload: cuerpo JSON
+            exclude: (opcional) node_ids a omitir
+            al_confirmar: (opcional) función (node_id, JSON de la respuesta) por cada ack
+            lote: (opcional) juntar con otros envíos en lotes (ver Envio)
+
+        Returns:
+            Envio: para esperar acks con wait() o consultar resultado()
+        """
+        from models import otros_nodos
+        nodos = [(node_id, url) for node_id, url in otros_nodos(bully_manager) if node_id not in exclude]
+        envio = Envio(next(self._seq), path, payload, [node_id for node_id, _ in nodos], al_confirmar, lote)
+        for node_id, url in nodos:
+            self._seguidor(node_id, url).encolar(envio)
+        return envio
+
+    def metrics(self):
+        """Estado de la cola de cada nodo destino"""
+        with self._lock:
+            seguidores = list(self._seguidores.values())
+        return [s.metrics() for s in sorted(seguidores, key=lambda s: s.node_id)]
+
+    def stop(self):
+        """Detiene los emisores (lo pendiente en las colas se pierde)"""
+        with self._lock:
+            seguidores = list(self._seguidores.values())
+            self._seguidores.clear()
+        for seguidor in seguidores:
+            seguidor.stop()
+
+
+replicator = ReplicationManager()
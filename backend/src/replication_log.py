@@ -0,0 +1,685 @@
+"""
+Log de replicación con secuencia global (REPLICACION_LOG).
+
+Antes una visita que no llegaba a un nodo caído quedaba sólo en
+failed_nodes, y los cierres y reasignaciones no se replicaban. Ahora todo
+cambio de visitas (alta, cierre, reasignación) y de estado de doctores y
+camas pasa por un log numerado:
+
+    - Un hook de la sesión de SQLAlchemy (after_flush) captura los cambios
+      de VisitaEmergencia, Doctor y Cama, venga de la web, de la consola o
+      de la API. Cada entrada lleva las filas completas resultantes, así que
+      aplicarla es idempotente.
+    - En el LÍDER la entrada se escribe en REPLICACION_LOG en la misma
+      transacción que el cambio (seq = siguiente entero) y, tras el commit,
+      se empuja a los demás nodos con las colas de replication.py, que
+      juntan en lotes las entradas que se acumulan
+      (POST /api/cluster/replicate-batch).
+    - En un SEGUIDOR el cambio se aplica localmente y se reenvía, en orden,
+      al líder (POST /api/cluster/replication/log), que le asigna seq y lo
+      empuja a todos (incluido el nodo de origen).
+    - Cada nodo aplica las entradas en orden de seq y las guarda con el
+      mismo seq: MAX(seq) local es lo aplicado. Un lote (empujado o pedido)
+      se aplica en una sola transacción. Ante un hueco (entrada
+      perdida o reordenada) espera REPLICATION_GAP_WAIT segundos y luego
+      pide el rango faltante al líder (GET /api/cluster/replication/log),
+      igual que al arrancar, al cambiar de líder y cada
+      REPLICATION_CATCHUP_INTERVAL segundos.
+
+Un nodo nuevo líder tiene en su log todo lo que aplicó y sigue numerando
+desde su MAX(seq). Como la replicación es asíncrona, un seguidor puede ir
+adelante del nuevo líder (o el viejo líder volver como seguidor) con
+entradas que el nuevo nunca recibió, y el nuevo reutiliza esos seq para
+otras entradas. Por eso una entrada se identifica por (seq, id_lider,
+contenido), no sólo por seq:
+
+    - Al pedir rangos, el seguidor incluye su última entrada y la compara
+      con la del líder en ese seq; al recibir un push cuyo id_lider no es
+      el de su última entrada (cambio de líder), verifica antes de aplicar.
+    - Si difieren (o el líder no tiene ese seq), busca la última entrada
+      en común, descarta las posteriores de su log y reenvía sus cambios al
+      líder, que los registra con seq nuevos; luego aplica las del líder.
+    - Una entrada empujada con un seq ya aplicado pero distinta de la local
+      se reporta como 'conflict', no como 'duplicate'.
+
+El líder calcula el retraso (entradas y segundos) de cada seguidor con el
+seq que éste reporta en los acks y al pedir rangos.
+
+Los cambios capturados en un seguidor viven en memoria hasta que el líder
+los registra: si el proceso termina antes, quedan sólo en su BD local.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from archive import folios_archivados
+from cluster_client import request_node
+from config import Config
+from models import db, Cama, Doctor, EntradaReplicacion, VisitaEmergencia
+from replication import replicator
+
+logger = logging.getLogger(__name__)
+
+_CAPTURADOS_KEY = '_replication_log_capturados'  # (tipo, datos) de un seguidor, a reenviar
+_ESCRITAS_KEY = '_replication_log_escritas'  # entradas escritas en esta transacción (líder)
+_APLICANDO_KEY = '_replication_log_aplicando'  # la sesión aplica entradas replicadas: no capturar
+ENVIOS_KEY = 'replication_log_envios'  # Envio de las entradas publicadas en el último commit
+
+# Columnas cuyo cambio genera una entrada
+CAMPOS_VISITA = ('estado', 'diagnostico', 'fecha_cierre', 'id_doctor', 'id_cama')
+CAMPOS_DOCTOR = ('disponible', 'activo')
+CAMPOS_CAMA = ('ocupada', 'id_paciente')
+
+ESTADOS_CERRADOS = ('completada', 'cancelada')
+
+
+# ============================================================================
+# FILAS
+# ============================================================================
+
+def fila_visita(v):
+    return {
+        'folio': v.folio,
+        'id_paciente': v.id_paciente,
+        'id_doctor': v.id_doctor,
+        'id_cama': v.id_cama,
+        'id_trabajador': v.id_trabajador,
+        'id_sala': v.id_sala,
+        'sintomas': v.sintomas,
+        'diagnostico': v.diagnostico,
+        'estado': v.estado,
+        'timestamp': v.timestamp.isoformat() if v.timestamp else None,
+        'fecha_cierre': v.fecha_cierre.isoformat() if v.fecha_cierre else None
+    }
+
+
+def fila_doctor(d):
+    return {'id_doctor': d.id_doctor, 'disponible': d.disponible, 'activo': d.activo}
+
+
+def fila_cama(c):
+    return {'id_cama': c.id_cama, 'ocupada': c.ocupada, 'id_paciente': c.id_paciente}
+
+
+def _fecha(valor):
+    return datetime.fromisoformat(valor) if valor else None
+
+
+def _misma_entrada(local, remota):
+    """True si la entrada local (EntradaReplicacion) es la misma que la remota (dict) del mismo seq"""
+    return (local is not None and local.id_lider == remota.get('id_lider') and local.tipo == remota['tipo']
+            and json.loads(local.datos) == remota['datos'])
+
+
+def precargar(lista_datos):
+    """
+    Visitas (por folio), doctores y camas que tocan varias entradas, con una
+    consulta por tabla en lugar de una por fila.
+
+    Returns:
+        dict: visitas, archivados, doctores y camas (para aplicar_datos)
+    """
+    folios, id_doctores, id_camas = set(), set(), set()
+    for datos in lista_datos:
+        folios.update(f['folio'] for f in datos.get('visitas', ()))
+        id_doctores.update(f['id_doctor'] for f in datos.get('doctores', ()))
+        id_camas.update(f['id_cama'] for f in datos.get('camas', ()))
+
+    visitas = {v.folio: v for v in VisitaEmergencia.query.filter(VisitaEmergencia.folio.in_(folios))} \
+        if folios else {}
+    return {
+        'visitas': visitas,
+        'archivados': folios_archivados(folios - visitas.keys()),
+        'doctores': {d.id_doctor: d for d in Doctor.query.filter(Doctor.id_doctor.in_(id_doctores))}
+        if id_doctores else {},
+        'camas': {c.id_cama: c for c in Cama.query.filter(Cama.id_cama.in_(id_camas))} if id_camas else {}
+    }
+
+
+def aplicar_datos(datos, precargado=None):
+    """
+    Deja en db.session las filas de una entrada (sin commit).
+
+    Las visitas se crean si no existen (salvo que ya estén archivadas) o se
+    actualizan; doctores y camas sólo se actualizan si existen.
+
+    Args:
+        datos: filas de la entrada
+        precargado: (opcional) resultado de precargar() que incluya estas filas
+    """
+    if precargado is None:
+        precargado = precargar([datos])
+
+    for fila in datos.get('visitas', ()):
+        visita = precargado['visitas'].get(fila['folio'])
+        if visita is None:
+            if fila['folio'] in precargado['archivados']:
+                continue
+            visita = VisitaEmergencia(folio=fila['folio'], id_paciente=fila['id_paciente'],
+                                      id_trabajador=fila['id_trabajador'], id_sala=fila['id_sala'],
+                                      sintomas=fila['sintomas'],
+                                      timestamp=_fecha(fila['timestamp']) or datetime.utcnow())
+            db.session.add(visita)
+            precargado['visitas'][fila['folio']] = visita
+        visita.id_doctor = fila['id_doctor']
+        visita.id_cama = fila['id_cama']
+        visita.estado = fila['estado']
+        visita.diagnostico = fila['diagnostico']
+        visita.fecha_cierre = _fecha(fila['fecha_cierre'])
+
+    for fila in datos.get('doctores', ()):
+        doctor = precargado['doctores'].get(fila['id_doctor'])
+        if doctor:
+            doctor.disponible = fila['disponible']
+            doctor.activo = fila['activo']
+
+    for fila in datos.get('camas', ()):
+        cama = precargado['camas'].get(fila['id_cama'])
+        if cama:
+            cama.ocupada = fila['ocupada']
+            cama.id_paciente = fila['id_paciente']
+
+
+# ============================================================================
+# LOG
+# ============================================================================
+
+class ReplicationLog:
+    """Registro (líder), reenvío (seguidor), aplicación en orden y puesta al día"""
+
+    def __init__(self):
+        self.app = None
+        self.bully_manager = None
+        self.activo = False
+        self._cond = threading.Condition(threading.RLock())  # serializa la aplicación de entradas
+        self._salida = queue.Queue()  # cambios de este seguidor para el líder
+        self._progreso = {}  # node_id -> (seq aplicado reportado, time.time())
+        self._stop = threading.Event()
+        self._hilos = []
+
+    # ------------------------------------------------------------------
+    # Roles
+    # ------------------------------------------------------------------
+
+    def lider(self):
+        """node_id del líder actual (None si no hay)"""
+        if self.bully_manager is None:
+            return None
+        return self.bully_manager.get_current_leader()
+
+    def es_lider(self):
+        return self.lider() == Config.NODE_ID
+
+    def ultimo_seq(self):
+        """MAX(seq) de REPLICACION_LOG (conexión propia: no ve transacciones sin commit)"""
+        with db.engine.connect() as conn:
+            return conn.execute(select(func.max(EntradaReplicacion.seq))).scalar() or 0
+
+    # ------------------------------------------------------------------
+    # Líder: registrar y publicar
+    # ------------------------------------------------------------------
+
+    def registrar(self, tipo, datos, id_origen):
+        """
+        Aplica y registra en el log un cambio reenviado por un seguidor.
+
+        Args:
+            tipo: tipo de entrada (visita_creada, visita_cerrada, ...)
+            datos: filas completas del cambio
+            id_origen: nodo donde ocurrió
+
+        Returns:
+            int: seq asignado
+        """
+        with self._cond:
+            db.session.info[_APLICANDO_KEY] = True
+            try:
+                aplicar_datos(datos)
+                entrada = EntradaReplicacion(tipo=tipo, datos=json.dumps(datos), id_origen=id_origen,
+                                             id_lider=Config.NODE_ID, timestamp=datetime.utcnow())
+                db.session.add(entrada)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.info.pop(_APLICANDO_KEY, None)
+            self._cond.notify_all()
+        db.session.info[ENVIOS_KEY] = self.publicar([entrada.to_dict()])
+        return entrada.seq
+
+    def publicar(self, entradas):
+        """Encola las entradas (dicts de EntradaReplicacion.to_dict) a los demás nodos"""
+        return [replicator.submit(self.bully_manager, '/api/cluster/replicate-batch', entrada,
+                                  al_confirmar=self._confirmado, lote=True)
+                for entrada in entradas]
+
+    def _confirmado(self, node_id, data):
+        if data and 'applied_seq' in data:
+            self.reportar(node_id, data['applied_seq'])
+
+    def reportar(self, node_id, seq):
+        """Guarda hasta qué seq tiene aplicado un seguidor"""
+        anterior = self._progreso.get(node_id, (0, 0))[0]
+        self._progreso[node_id] = (max(anterior, seq), time.time())
+
+    def lag(self, nodos):
+        """
+        Retraso de cada seguidor frente al log local.
+
+        Args:
+            nodos: node_ids de los seguidores
+
+        Returns:
+            list: {node_id, applied_seq, lag_entries, lag_seconds, reported_s_ago}
+            (None donde el seguidor todavía no reportó)
+        """
+        ultimo = self.ultimo_seq()
+        ahora = time.time()
+        filas = []
+        for node_id in sorted(set(nodos) | set(self._progreso)):
+            if node_id == Config.NODE_ID:
+                continue
+            aplicado, reportado = self._progreso.get(node_id, (None, None))
+            fila = {'node_id': node_id, 'applied_seq': aplicado, 'lag_entries': None, 'lag_seconds': None,
+                    'reported_s_ago': round(ahora - reportado, 1) if reportado else None}
+            if aplicado is not None:
+                fila['lag_entries'] = max(0, ultimo - aplicado)
+                fila['lag_seconds'] = 0.0
+                if fila['lag_entries']:
+                    pendiente = db.session.get(EntradaReplicacion, aplicado + 1)
+                    if pendiente is not None:
+                        fila['lag_seconds'] = round((datetime.utcnow() - pendiente.timestamp).total_seconds(), 1)
+            filas.append(fila)
+        return filas
+
+    def entradas(self, after, limit):
+        """Entradas con seq > after, en orden"""
+        return (EntradaReplicacion.query.filter(EntradaReplicacion.seq > after)
+                .order_by(EntradaReplicacion.seq).limit(limit).all())
+
+    # ------------------------------------------------------------------
+    # Seguidor: aplicar en orden
+    # ------------------------------------------------------------------
+
+    def _aplicar(self, entradas, verificar=True):
+        """
+        Aplica (con _cond tomado) las entradas que continúan el log local, en
+        UNA transacción y con las filas que tocan leídas por lotes.
+
+        Args:
+            entradas: dicts de EntradaReplicacion.to_dict
+            verificar: False si ya se comprobó que continúan el log local
+                (ponerse_al_dia); True para las empujadas: la primera de
+                otro líder que la última local no se aplica sin verificar
+
+        Returns:
+            dict: seq -> 'applied', 'duplicate' (ya estaba), 'gap' (falta una
+            anterior; no se aplicó) o 'conflict' (el log local diverge del
+            de quien la envía, o falta verificarlo; no se aplicó)
+        """
+        aplicado = self.ultimo_seq()
+        repetidas = [e['seq'] for e in entradas if e['seq'] <= aplicado]
+        locales = {e.seq: e for e in EntradaReplicacion.query.filter(EntradaReplicacion.seq.in_(repetidas))} \
+            if repetidas else {}
+        ultima = db.session.get(EntradaReplicacion, aplicado) if aplicado and verificar else None
+        resultados, contiguas, divergente = {}, [], False
+        for entrada in sorted(entradas, key=lambda e: e['seq']):
+            if entrada['seq'] <= aplicado:
+                if _misma_entrada(locales.get(entrada['seq']), entrada):
+                    resultados[entrada['seq']] = 'duplicate'
+                else:
+                    resultados[entrada['seq']] = 'conflict'
+                    divergente = True
+            elif divergente:
+                resultados[entrada['seq']] = 'conflict'
+            elif entrada['seq'] == aplicado + 1:
+                if not contiguas and ultima is not None and ultima.id_lider is not None \
+                        and entrada.get('id_lider') != ultima.id_lider:
+                    resultados[entrada['seq']] = 'conflict'
+                    divergente = True
+                    continue
+                contiguas.append(entrada)
+                aplicado = entrada['seq']
+                resultados[entrada['seq']] = 'applied'
+            else:
+                resultados[entrada['seq']] = 'gap'
+        if not contiguas:
+            return resultados
+
+        db.session.info[_APLICANDO_KEY] = True
+        try:
+            precargado = precargar([e['datos'] for e in contiguas])
+            for entrada in contiguas:
+                aplicar_datos(entrada['datos'], precargado)
+            db.session.add_all([EntradaReplicacion(seq=e['seq'], tipo=e['tipo'], datos=json.dumps(e['datos']),
+                                                   id_origen=e.get('id_origen'), id_lider=e.get('id_lider'),
+                                                   timestamp=_fecha(e.get('timestamp')) or datetime.utcnow())
+                                for e in contiguas])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.info.pop(_APLICANDO_KEY, None)
+            self._cond.notify_all()
+        return resultados
+
+    def recibir(self, entradas):
+        """
+        Aplica entradas empujadas por el líder (una o un lote ordenado).
+
+        Si falta alguna anterior a la primera espera REPLICATION_GAP_WAIT
+        segundos a que llegue (los envíos van en paralelo) y, si no, pide el
+        rango al líder.
+
+        Returns:
+            tuple: (último seq aplicado, {seq: resultado} como en _aplicar)
+        """
+        primera = min(e['seq'] for e in entradas)
+        with self._cond:
+            self._cond.wait_for(lambda: self.ultimo_seq() >= primera - 1, Config.REPLICATION_GAP_WAIT)
+        if self.ultimo_seq() < primera - 1:
+            logger.info(f'Hueco en el log antes de la entrada {primera}: pidiendo el rango al líder')
+            self.ponerse_al_dia()
+        with self._cond:
+            resultados = self._aplicar(entradas)
+        if 'conflict' in resultados.values():
+            # Cambio de líder o log divergente: verificar (y reconciliar) contra el líder
+            logger.info(f'Entradas {min(resultados)}-{max(resultados)} no continúan el log local: '
+                        f'verificando con el líder')
+            self.ponerse_al_dia()
+            with self._cond:
+                resultados = self._aplicar(entradas)
+        with self._cond:
+            return self.ultimo_seq(), resultados
+
+    def ponerse_al_dia(self):
+        """
+        Pide al líder, por lotes de REPLICATION_PULL_BATCH, las entradas que
+        faltan y las aplica.
+
+        Cada lote empieza con la última entrada local: si no coincide con la
+        del líder (o el líder no llega a ese seq) el log local diverge y se
+        reconcilia (ver _reconciliar) antes de seguir.
+
+        Returns:
+            int: entradas aplicadas
+        """
+        from models import get_leader_flask_url
+
+        lider = self.lider()
+        if lider is None or lider == Config.NODE_ID:
+            return 0
+        _, url = get_leader_flask_url(self.bully_manager)
+        aplicadas = 0
+        while True:
+            desde = self.ultimo_seq()
+            respuesta = request_node(lider, url, '/api/cluster/replication/log',
+                                     params={'after': max(desde - 1, 0), 'limit': Config.REPLICATION_PULL_BATCH,
+                                             'node_id': Config.NODE_ID})
+            if not respuesta.ok:
+                logger.warning(f'No se pudo leer el log del líder {lider}: {respuesta.status} ({respuesta.error})')
+                return aplicadas
+            entradas = respuesta.data['entries']
+            with self._cond:
+                divergente = respuesta.data['last_seq'] < desde or (
+                    desde > 0 and not _misma_entrada(db.session.get(EntradaReplicacion, desde), entradas[0]))
+                if not divergente:
+                    self._aplicar(entradas, verificar=False)
+                hasta = self.ultimo_seq()
+            if divergente:
+                if not self._reconciliar(lider, url, desde):
+                    return aplicadas
+                continue
+            aplicadas += hasta - desde
+            if len(entradas) < Config.REPLICATION_PULL_BATCH or hasta == desde:
+                if aplicadas:
+                    logger.info(f'Log de replicación al día con el líder {lider}: {aplicadas} entradas '
+                                f'(seq {hasta})')
+                return aplicadas
+
+    def _reconciliar(self, lider, url, desde):
+        """
+        Descarta del log local lo que sigue a la última entrada en común con
+        el líder y reenvía esos cambios al líder (que les asigna seq nuevos).
+
+        Las filas que esos cambios tocaron quedan como están hasta que se
+        apliquen las entradas del líder y los cambios reenviados.
+
+        Returns:
+            bool: False si no se pudo leer el log del líder
+        """
+        comun = self._ultima_en_comun(lider, url, desde)
+        if comun is None:
+            return False
+        with self._cond:
+            sobrantes = (EntradaReplicacion.query.filter(EntradaReplicacion.seq > comun)
+                         .order_by(EntradaReplicacion.seq).all())
+            cambios = [(e.tipo, json.loads(e.datos)) for e in sobrantes]
+            EntradaReplicacion.query.filter(EntradaReplicacion.seq > comun).delete()
+            db.session.commit()
+        logger.warning(f'Log de replicación divergente del líder {lider} desde seq {comun + 1}: '
+                       f'se descartan {len(cambios)} entradas locales y se reenvían sus cambios al líder')
+        self.reenviar(cambios)
+        return True
+
+    def _ultima_en_comun(self, lider, url, desde):
+        """Mayor seq <= desde cuya entrada coincide con la del líder (0 si ninguna; None si falla)"""
+        hasta = desde
+        while hasta > 0:
+            inicio = max(hasta - Config.REPLICATION_PULL_BATCH, 0)
+            respuesta = request_node(lider, url, '/api/cluster/replication/log',
+                                     params={'after': inicio, 'limit': hasta - inicio})
+            if not respuesta.ok:
+                logger.warning(f'No se pudo leer el log del líder {lider}: {respuesta.status} ({respuesta.error})')
+                return None
+            remotas = {e['seq']: e for e in respuesta.data['entries']}
+            locales = {e.seq: e for e in EntradaReplicacion.query.filter(EntradaReplicacion.seq > inicio,
+                                                                          EntradaReplicacion.seq <= hasta)}
+            for seq in range(hasta, inicio, -1):
+                if seq in remotas and _misma_entrada(locales.get(seq), remotas[seq]):
+                    return seq
+            hasta = inicio
+        return 0
+
+    # ------------------------------------------------------------------
+    # Seguidor: reenviar cambios locales al líder
+    # ------------------------------------------------------------------
+
+    def reenviar(self, cambios):
+        for tipo, datos in cambios:
+            self._salida.put((tipo, datos))
+
+    def pendientes(self):
+        """Cambios locales que todavía no llegan al líder"""
+        return self._salida.qsize()
+
+    def reparar(self, lista_datos):
+        """
+        Aplica filas copiadas del líder sin generar entradas (ver anti_entropy.py):
+        corrige una divergencia, no es un cambio nuevo.
+        """
+        with self._cond:
+            db.session.info[_APLICANDO_KEY] = True
+            try:
+                precargado = precargar(lista_datos)
+                for datos in lista_datos:
+                    aplicar_datos(datos, precargado)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.info.pop(_APLICANDO_KEY, None)
+
+    def _reenviar(self):
+        from models import get_leader_flask_url
+
+        pendiente = None
+        while not self._stop.is_set():
+            if pendiente is None:
+                pendiente = self._salida.get()
+                if pendiente is None:
+                    continue
+            tipo, datos = pendiente
+            try:
+                lider = self.lider()
+                if lider == Config.NODE_ID:
+                    # Este nodo pasó a ser el líder: registrarlo aquí mismo
+                    with self.app.app_context():
+                        try:
+                            self.registrar(tipo, datos, Config.NODE_ID)
+                        finally:
+                            db.session.remove()
+                    pendiente = None
+                    continue
+                if lider is not None:
+                    _, url = get_leader_flask_url(self.bully_manager)
+                    respuesta = request_node(lider, url, '/api/cluster/replication/log', method='POST',
+                                             json={'tipo': tipo, 'datos': datos, 'id_origen': Config.NODE_ID},
+                                             timeout=Config.REPLICATION_TIMEOUT)
+                    if respuesta.ok:
+                        pendiente = None
+                        continue
+                    logger.warning(f'El líder {lider} no registró el cambio {tipo}: '
+                                   f'{respuesta.status} ({respuesta.error})')
+            except Exception as e:
+                logger.error(f'Error reenviando el cambio {tipo} al líder: {e}')
+            self._stop.wait(1)
+
+    # ------------------------------------------------------------------
+    # Hilos
+    # ------------------------------------------------------------------
+
+    def start(self, app, bully_manager):
+        """Activa la captura de cambios, el reenvío al líder y la puesta al día periódica"""
+        if self._hilos:
+            return
+        self.app = app
+        self.bully_manager = bully_manager
+        self.activo = True
+        self._stop.clear()
+        self._hilos = [threading.Thread(target=self._reenviar, name='replication-log-forward', daemon=True),
+                       threading.Thread(target=self._vigilar, name='replication-log-catchup', daemon=True)]
+        for hilo in self._hilos:
+            hilo.start()
+        logger.info(f'Log de replicación activo (puesta al día cada {Config.REPLICATION_CATCHUP_INTERVAL}s)')
+
+    def stop(self):
+        """Detiene los hilos (los cambios pendientes de reenviar se pierden)"""
+        self.activo = False
+        self._stop.set()
+        self._salida.put(None)
+        for hilo in self._hilos:
+            hilo.join(timeout=5)
+        self._hilos = []
+        self._progreso.clear()
+        while not self._salida.empty():
+            self._salida.get_nowait()
+
+    def _vigilar(self):
+        """Se pone al día al arrancar, al cambiar de líder y cada REPLICATION_CATCHUP_INTERVAL segundos"""
+        lider_visto, proxima = None, 0
+        while not self._stop.wait(1 if lider_visto is not None else 0.2):
+            lider = self.lider()
+            if lider == lider_visto and time.monotonic() < proxima:
+                continue
+            if lider != lider_visto and lider is not None:
+                logger.info(f'Líder {lider}: verificando el log de replicación')
+            lider_visto, proxima = lider, time.monotonic() + Config.REPLICATION_CATCHUP_INTERVAL
+            try:
+                with self.app.app_context():
+                    try:
+                        self.ponerse_al_dia()
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                logger.error(f'Error poniendo al día el log de replicación: {e}')
+
+
+replication_log = ReplicationLog()
+
+
+def envio_del_commit(session):
+    """
+    Envio (ver replication.py) de la última entrada publicada por el último
+    commit de `session` en el líder; None si no publicó ninguna.
+    """
+    envios = session.info.pop(ENVIOS_KEY, None)
+    return envios[-1] if envios else None
+
+
+# ============================================================================
+# CAPTURA CON LA SESIÓN DE SQLALCHEMY
+# ============================================================================
+
+def _cambio(obj, campos):
+    estado = inspect(obj)
+    return any(estado.attrs[campo].history.has_changes() for campo in campos)
+
+
+def _tipo(nuevas, visitas):
+    """Tipo de entrada según lo que cambió en las visitas del flush"""
+    if nuevas:
+        return 'visita_creada'
+    if any(inspect(v).attrs.estado.history.has_changes() and v.estado in ESTADOS_CERRADOS for v in visitas):
+        return 'visita_cerrada'
+    if any(inspect(v).attrs.id_doctor.history.has_changes() for v in visitas):
+        return 'visita_reasignada'
+    return 'visita_actualizada' if visitas else 'recursos'
+
+
+@event.listens_for(Session, 'after_flush')
+def _capturar(session, flush_context):
+    """Convierte los cambios de visitas, doctores y camas de este flush en una entrada"""
+    if not replication_log.activo or session.info.get(_APLICANDO_KEY) or session.info.get('engine_lectura'):
+        return
+
+    nuevas = [o for o in session.new if isinstance(o, VisitaEmergencia)]
+    visitas = nuevas + [o for o in session.dirty
+                        if isinstance(o, VisitaEmergencia) and _cambio(o, CAMPOS_VISITA)]
+    doctores = [o for o in session.dirty if isinstance(o, Doctor) and _cambio(o, CAMPOS_DOCTOR)]
+    camas = [o for o in session.dirty if isinstance(o, Cama) and _cambio(o, CAMPOS_CAMA)]
+    if not (visitas or doctores or camas):
+        return
+
+    tipo = _tipo(nuevas, visitas)
+    datos = {'visitas': [fila_visita(v) for v in visitas],
+             'doctores': [fila_doctor(d) for d in doctores],
+             'camas': [fila_cama(c) for c in camas]}
+
+    if replication_log.es_lider():
+        timestamp = datetime.utcnow()
+        resultado = session.connection().execute(EntradaReplicacion.__table__.insert().values(
+            tipo=tipo, datos=json.dumps(datos), id_origen=Config.NODE_ID, id_lider=Config.NODE_ID,
+            timestamp=timestamp))
+        session.info.setdefault(_ESCRITAS_KEY, []).append({
+            'seq': resultado.inserted_primary_key[0], 'tipo': tipo, 'datos': datos, 'id_origen': Config.NODE_ID,
+            'id_lider': Config.NODE_ID, 'timestamp': timestamp.isoformat()})
+    else:
+        session.info.setdefault(_CAPTURADOS_KEY, []).append((tipo, datos))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publicar(session):
+    if session.in_nested_transaction():
+        return
+    escritas = session.info.pop(_ESCRITAS_KEY, None)
+    capturados = session.info.pop(_CAPTURADOS_KEY, None)
+    if escritas:
+        session.info[ENVIOS_KEY] = replication_log.publicar(escritas)
+    if capturados:
+        replication_log.reenviar(capturados)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar(session):
+    session.info.pop(_ESCRITAS_KEY, None)
+    session.info.pop(_CAPTURADOS_KEY, None)
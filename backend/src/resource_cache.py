@@ -0,0 +1,454 @@
+"""
+Caché, en cada nodo, de los doctores y camas de las demás salas.
+
+Antes cada vista de recursos del cluster hacía un fan-out HTTP a todos los
+nodos aunque los recursos sólo cambian al crear, cerrar o reasignar visitas.
+Ahora cada nodo guarda una réplica de los doctores y camas de las otras salas
+y el dueño de cada sala (el nodo con node_id == id_sala) le empuja los
+cambios a los demás:
+
+    - Cada nodo numera los commits que tocan doctores/camas de SU sala con
+      (epoch, version): epoch cambia en cada arranque del proceso y version
+      crece en 1 por commit.
+    - Un hilo publicador junta los cambios pendientes y envía un delta
+      (filas completas de los ids que cambiaron, from_version..version) por
+      POST /api/cluster/resources/delta a los demás nodos.
+    - El receptor aplica el delta sólo si continúa su versión; un hueco
+      (delta perdido) o un epoch distinto marcan la entrada como vieja y la
+      siguiente consulta la vuelve a pedir completa (GET /api/cluster/resources).
+    - Un hilo compara cada RESOURCE_DIGEST_INTERVAL segundos el digest
+      (hash de las filas) de cada sala con el del dueño y recarga las que no
+      coinciden: cubre escrituras fuera del ORM y deltas perdidos sin hueco
+      visible (el último antes de un silencio).
+
+Una entrada sin sincronizar en RESOURCE_CACHE_MAX_AGE segundos (dueño caído
+o inalcanzable) deja de usarse. La caché sólo responde en procesos que
+reciben deltas (los que llamaron a start(), es decir el servidor Flask); en
+los demás get_all_cluster_doctors/beds siguen consultando a los nodos.
+"""
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from config import Config
+from models import db, Doctor, Cama
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = '_resource_cache_pending'
+
+# Espera del publicador para juntar varios commits en un solo delta (segundos)
+COALESCE_DELAY = 0.05
+
+
+# ============================================================================
+# FILAS Y DIGEST (mismo formato que /api/cluster/doctors y /api/cluster/beds)
+# ============================================================================
+
+def doctor_row(d):
+    return {
+        'id_doctor': d.id_doctor,
+        'nombre': d.nombre,
+        'especialidad': d.especialidad,
+        'disponible': d.disponible,
+        'activo': d.activo,
+        'id_sala': d.id_sala
+    }
+
+
+def cama_row(c):
+    return {
+        'id_cama': c.id_cama,
+        'numero': c.numero,
+        'ocupada': c.ocupada,
+        'id_sala': c.id_sala,
+        'id_paciente': c.id_paciente,
+        'paciente_nombre': c.paciente_actual.nombre if c.paciente_actual else None
+    }
+
+
+def digest(doctors, beds):
+    """Hash estable de las filas de una sala (independiente del orden)"""
+    canonico = json.dumps({
+        'doctors': sorted(doctors, key=lambda d: d['id_doctor']),
+        'beds': sorted(beds, key=lambda c: c['id_cama'])
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonico.encode()).hexdigest()
+
+
+class _Entrada:
+    """Réplica de los recursos de una sala remota"""
+    __slots__ = ('node_id', 'epoch', 'version', 'doctors', 'beds', 'synced', 'stale')
+
+    def __init__(self, node_id, epoch, version, doctors, beds):
+        self.node_id = node_id
+        self.epoch = epoch
+        self.version = version
+        self.doctors = {d['id_doctor']: d for d in doctors}
+        self.beds = {c['id_cama']: c for c in beds}
+        self.synced = time.monotonic()
+        self.stale = False
+
+    def digest(self):
+        return digest(list(self.doctors.values()), list(self.beds.values()))
+
+
+# ============================================================================
+# CACHÉ
+# ============================================================================
+
+class ResourceCache:
+    """Versión local de los recursos de esta sala + réplicas de las demás salas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex
+        self.version = 0
+        self._entradas = {}          # node_id -> _Entrada
+        self._cola = queue.Queue()   # (version, {'doctors': ids, 'beds': ids}) por publicar
+        self._stop = threading.Event()
+        self._hilos = []
+        self.app = None
+        self.bully_manager = None
+        self._contadores = dict.fromkeys(
+            ('hits', 'misses', 'deltas_applied', 'deltas_ignored', 'gaps', 'full_refreshes',
+             'digest_mismatches', 'pushes', 'push_failures'), 0)
+
+    @property
+    def activo(self):
+        """True si este proceso recibe deltas (sólo entonces se responde desde la caché)"""
+        return bool(self._hilos)
+
+    def _contar(self, nombre, n=1):
+        with self._lock:
+            self._contadores[nombre] += n
+
+    # ------------------------------------------------------------------
+    # Lado del dueño: versión y snapshot de la sala local
+    # ------------------------------------------------------------------
+
+    def bump(self, ids):
+        """Registra un commit que cambió doctores/camas de la sala local"""
+        with self._lock:
+            self.version += 1
+            version = self.version
+        if self.activo:
+            self._cola.put((version, ids))
+
+    def snapshot_local(self, ids=None):
+        """
+        Filas actuales de la sala local. Requiere contexto de aplicación.
+
+        La versión se lee ANTES que las filas: las filas pueden ser más nuevas
+        que la versión (el siguiente delta las reaplica), nunca más viejas.
+
+        Args:
+            ids: (opcional) {'doctors': ids, 'beds': ids} para leer sólo esos
+
+        Returns:
+            dict: node_id, epoch, version, doctors y beds
+        """
+        with self._lock:
+            epoch, version = self.epoch, self.version
+        doctores = Doctor.query.filter_by(id_sala=Config.NODE_ID)
+        camas = Cama.query.filter_by(id_sala=Config.NODE_ID)
+        if ids is not None:
+            doctores = doctores.filter(Doctor.id_doctor.in_(ids['doctors']))
+            camas = camas.filter(Cama.id_cama.in_(ids['beds']))
+        return {
+            'node_id': Config.NODE_ID,
+            'epoch': epoch,
+            'version': version,
+            'doctors': [doctor_row(d) for d in doctores.all()],
+            'beds': [cama_row(c) for c in camas.all()]
+        }
+
+    # ------------------------------------------------------------------
+    # Lado del receptor: réplicas de las demás salas
+    # ------------------------------------------------------------------
+
+    def apply_snapshot(self, data):
+        """Reemplaza la réplica de una sala con su snapshot completo"""
+        entrada = _Entrada(data['node_id'], data['epoch'], data['version'], data['doctors'], data['beds'])
+        with self._lock:
+            actual = self._entradas.get(entrada.node_id)
+            # Un delta más nuevo pudo llegar mientras se pedía el snapshot
+            if (actual is not None and not actual.stale and actual.epoch == entrada.epoch
+                    and actual.version > entrada.version):
+                return actual
+            self._entradas[entrada.node_id] = entrada
+            self._contadores['full_refreshes'] += 1
+        return entrada
+
+    def apply_delta(self, delta):
+        """
+        Aplica un delta empujado por el dueño de una sala.
+
+        Returns:
+            str: 'applied', 'duplicate' (versión ya aplicada), 'gap' (faltan
+            versiones: la entrada queda vieja) o 'unknown' (sin réplica base
+            o de otro epoch: se pedirá completa)
+        """
+        with self._lock:
+            entrada = self._entradas.get(delta['node_id'])
+            if entrada is None or entrada.epoch != delta['epoch']:
+                if entrada is not None:
+                    entrada.stale = True
+                self._contadores['deltas_ignored'] += 1
+                return 'unknown'
+            if delta['version'] <= entrada.version:
+                self._contadores['deltas_ignored'] += 1
+                return 'duplicate'
+            if delta['from_version'] > entrada.version + 1:
+                entrada.stale = True
+                self._contadores['gaps'] += 1
+                return 'gap'
+
+            for d in delta['doctors']:
+                entrada.doctors[d['id_doctor']] = d
+            for c in delta['beds']:
+                entrada.beds[c['id_cama']] = c
+            for id_doctor in delta['removed']['doctors']:
+                entrada.doctors.pop(id_doctor, None)
+            for id_cama in delta['removed']['beds']:
+                entrada.beds.pop(id_cama, None)
+            entrada.version = delta['version']
+            entrada.synced = time.monotonic()
+            self._contadores['deltas_applied'] += 1
+            return 'applied'
+
+    def _vigente(self, entrada, ahora):
+        return (entrada is not None and not entrada.stale
+                and ahora - entrada.synced <= Config.RESOURCE_CACHE_MAX_AGE)
+
+    def lookup(self, nodos, fresh=False):
+        """
+        Recursos de las salas `nodos`: de la caché si están vigentes, si no
+        (o con fresh=True) se piden completos a sus nodos en paralelo.
+
+        Args:
+            nodos: lista de (node_id, base_url)
+            fresh: True para ignorar la caché
+
+        Returns:
+            tuple: ({node_id: {'doctors': [...], 'beds': [...]}} de las salas
+            obtenidas, lista con el estado de cada nodo: 'cached' o el de
+            cluster_client.RespuestaNodo)
+        """
+        from cluster_client import scatter_gather
+
+        datos, estados, faltan = {}, {}, []
+        ahora = time.monotonic()
+        with self._lock:
+            for node_id, url in nodos:
+                entrada = self._entradas.get(node_id)
+                if not fresh and self.activo and self._vigente(entrada, ahora):
+                    datos[node_id] = {'doctors': list(entrada.doctors.values()),
+                                      'beds': list(entrada.beds.values())}
+                    estados[node_id] = {'node_id': node_id, 'status': 'cached',
+                                        'age_s': round(ahora - entrada.synced, 3), 'error': None}
+                else:
+                    faltan.append((node_id, url))
+            self._contadores['hits'] += len(datos)
+            self._contadores['misses'] += len(faltan)
+
+        for respuesta in scatter_gather(faltan, '/api/cluster/resources') if faltan else []:
+            if respuesta.ok:
+                try:
+                    self.apply_snapshot(respuesta.data)
+                    datos[respuesta.node_id] = {'doctors': respuesta.data['doctors'],
+                                                'beds': respuesta.data['beds']}
+                except (KeyError, TypeError) as e:
+                    respuesta.status, respuesta.error = 'error', f'respuesta inválida: {e}'
+            estados[respuesta.node_id] = respuesta.to_dict()
+
+        return datos, [estados[node_id] for node_id, _ in nodos]
+
+    def metrics(self):
+        """Aciertos, antigüedad y versión de cada réplica y contadores de sincronización"""
+        ahora = time.monotonic()
+        with self._lock:
+            contadores = dict(self._contadores)
+            consultas = contadores['hits'] + contadores['misses']
+            return {
+                'active': self.activo,
+                'epoch': self.epoch,
+                'version': self.version,
+                **contadores,
+                'hit_rate': round(contadores['hits'] / consultas, 4) if consultas else None,
+                'salas': {
+                    node_id: {
+                        'epoch': e.epoch,
+                        'version': e.version,
+                        'age_s': round(ahora - e.synced, 3),
+                        'stale': not self._vigente(e, ahora),
+                        'doctors': len(e.doctors),
+                        'beds': len(e.beds)
+                    } for node_id, e in sorted(self._entradas.items())
+                }
+            }
+
+    def reset(self):
+        """Olvida las réplicas y reinicia la versión local (nuevo epoch)"""
+        with self._lock:
+            self._entradas.clear()
+            self.epoch = uuid.uuid4().hex
+            self.version = 0
+            for nombre in self._contadores:
+                self._contadores[nombre] = 0
+
+    # ------------------------------------------------------------------
+    # Hilos: publicación de deltas y verificación de digest
+    # ------------------------------------------------------------------
+
+    def start(self, app, bully_manager):
+        """Arranca el publicador de deltas y la verificación periódica de digest"""
+        if self._hilos:
+            return
+        self.app = app
+        self.bully_manager = bully_manager
+        self._stop.clear()
+        self._hilos = [threading.Thread(target=self._publicar, name='resource-cache-push', daemon=True)]
+        if Config.RESOURCE_DIGEST_INTERVAL > 0:
+            self._hilos.append(threading.Thread(target=self._verificar, name='resource-cache-digest',
+                                                daemon=True))
+        for hilo in self._hilos:
+            hilo.start()
+        logger.info(f'Caché de recursos del cluster activa (digest cada {Config.RESOURCE_DIGEST_INTERVAL}s)')
+
+    def stop(self):
+        self._stop.set()
+        self._cola.put(None)
+        for hilo in self._hilos:
+            hilo.join(timeout=5)
+        self._hilos = []
+
+    def _otros_nodos(self):
+        from models import get_cluster_nodes_info, get_node_flask_url
+        return [(node_id, get_node_flask_url(node_id, host))
+                for node_id, host, _ in get_cluster_nodes_info(self.bully_manager) if node_id != Config.NODE_ID]
+
+    def _publicar(self):
+        from cluster_client import scatter_gather
+        from db_utils import read_session
+
+        while not self._stop.is_set():
+            item = self._cola.get()
+            if item is None:
+                continue
+            time.sleep(COALESCE_DELAY)
+            pendientes = [item]
+            while True:
+                try:
+                    pendientes.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            pendientes = [p for p in pendientes if p is not None]
+
+            ids = {'doctors': set(), 'beds': set()}
+            for _, cambio in pendientes:
+                ids['doctors'] |= cambio['doctors']
+                ids['beds'] |= cambio['beds']
+
+            try:
+                with self.app.app_context(), read_session():
+                    try:
+                        delta = self.snapshot_local(ids)
+                    finally:
+                        db.session.remove()
+                # Sólo se leyeron los ids de estos commits: el delta no puede
+                # anunciar versiones posteriores aunque self.version ya avanzó
+                delta['from_version'] = pendientes[0][0]
+                delta['version'] = pendientes[-1][0]
+                delta['removed'] = {
+                    'doctors': sorted(ids['doctors'] - {d['id_doctor'] for d in delta['doctors']}),
+                    'beds': sorted(ids['beds'] - {c['id_cama'] for c in delta['beds']})
+                }
+                respuestas = scatter_gather(self._otros_nodos(), '/api/cluster/resources/delta',
+                                            method='POST', json=delta)
+            except Exception as e:
+                logger.error(f'Error publicando delta de recursos: {e}')
+                continue
+            self._contar('pushes')
+            self._contar('push_failures', sum(not r.ok for r in respuestas))
+
+    def _verificar(self):
+        from cluster_client import scatter_gather
+
+        while not self._stop.wait(Config.RESOURCE_DIGEST_INTERVAL):
+            try:
+                nodos = self._otros_nodos()
+                urls = dict(nodos)
+                recargar = []
+                for respuesta in scatter_gather(nodos, '/api/cluster/resources/digest'):
+                    if not respuesta.ok:
+                        continue
+                    remoto = respuesta.data
+                    with self._lock:
+                        entrada = self._entradas.get(respuesta.node_id)
+                        coincide = (entrada is not None and entrada.epoch == remoto['epoch']
+                                    and entrada.version == remoto['version']
+                                    and entrada.digest() == remoto['digest'])
+                        if coincide:
+                            entrada.synced = time.monotonic()
+                            entrada.stale = False
+                        elif entrada is not None:
+                            self._contadores['digest_mismatches'] += 1
+                    if not coincide:
+                        recargar.append((respuesta.node_id, urls[respuesta.node_id]))
+
+                for respuesta in scatter_gather(recargar, '/api/cluster/resources'):
+                    if respuesta.ok:
+                        self.apply_snapshot(respuesta.data)
+            except Exception as e:
+                logger.error(f'Error verificando digest de recursos: {e}')
+
+
+resource_cache = ResourceCache()
+
+
+# ============================================================================
+# VERSIONADO CON LA SESIÓN DE SQLALCHEMY
+# ============================================================================
+
+def _es_local(obj):
+    """True si el objeto es (o era antes de este flush) de la sala local"""
+    if obj.id_sala == Config.NODE_ID:
+        return True
+    return Config.NODE_ID in inspect(obj).attrs.id_sala.history.deleted
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    """Guarda en session.info los ids de doctores/camas de la sala local escritos en este flush"""
+    for obj in [*session.new, *session.dirty, *session.deleted]:
+        if isinstance(obj, Doctor):
+            clave, id_ = 'doctors', obj.id_doctor
+        elif isinstance(obj, Cama):
+            clave, id_ = 'beds', obj.id_cama
+        else:
+            continue
+        if _es_local(obj):
+            pending = session.info.setdefault(_PENDING_KEY, {'doctors': set(), 'beds': set()})
+            pending[clave].add(id_)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_changes(session):
+    if session.in_nested_transaction():
+        return
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        resource_cache.bump(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -1,7 +1,10 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_login import login_required
 from models import (get_metricas_dashboard, get_doctores_disponibles, get_camas_disponibles,
-                   get_visitas_activas, VisitaEmergencia, Sala)
+                   get_visitas_resumen, VisitaEmergencia, Sala)
+from search import buscar_pacientes, buscar_visitas
+from cluster_timeline import get_cluster_timeline
+from pagination import CursorError
 from config import Config
 from datetime import datetime, timedelta
 import logging
@@ -66,7 +69,7 @@ def visitas_activas():
         id_sala = request.args.get('sala', type=int)
         id_doctor = request.args.get('doctor', type=int)
 
-        visitas = get_visitas_activas(id_doctor=id_doctor, id_sala=id_sala)
+        visitas = get_visitas_resumen(estado='activa', id_doctor=id_doctor, id_sala=id_sala)
 
         data = {
             'visitas': [v.to_dict() for v in visitas],
@@ -172,9 +175,7 @@ def ultimas_visitas():
     try:
         limit = request.args.get('limit', 10, type=int)
 
-        visitas = VisitaEmergencia.query.order_by(
-            VisitaEmergencia.timestamp.desc()
-        ).limit(limit).all()
+        visitas = get_visitas_resumen(limit=limit)
 
         data = {
             'visitas': [v.to_dict() for v in visitas]
@@ -184,3 +185,71 @@ def ultimas_visitas():
     except Exception as e:
         logger.error(f'Error al obtener últimas visitas: {str(e)}')
         return jsonify({'error': str(e)}), 500
+
+
+@api_bp.route('/timeline')
+@login_required
+def timeline():
+    """
+    Visitas más recientes de TODAS las salas del cluster, paginadas.
+
+    Query params:
+        - limit: (opcional) tamaño de página (default: 50, máximo 500)
+        - cursor: (opcional) next_cursor de la respuesta anterior
+        - estado: (opcional) 'activa', 'completada' o 'cancelada'
+    """
+    try:
+        estado = request.args.get('estado')
+        if estado not in ('activa', 'completada', 'cancelada'):
+            estado = None
+
+        page = get_cluster_timeline(getattr(current_app, 'bully_manager', None),
+                                    limit=request.args.get('limit', 50, type=int),
+                                    cursor=request.args.get('cursor'), estado=estado)
+
+        return jsonify({
+            'visitas': list(page),
+            'next_cursor': page.next_cursor,
+            'partial': page.parcial,
+            'nodes': page.nodos
+        })
+    except CursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f'Error al obtener la línea de tiempo del cluster: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
+
+@api_bp.route('/buscar')
+@login_required
+def buscar():
+    """
+    Búsqueda de texto completo de pacientes y visitas.
+
+    Query params:
+        - q: texto a buscar (nombre, CURP, folio, síntomas o diagnóstico)
+        - tipo: (opcional) 'pacientes', 'visitas' o 'todo' (default)
+        - estado: (opcional) filtrar visitas por estado
+        - limit: (opcional) máximo de resultados por tipo (default: 20)
+    """
+    try:
+        q = request.args.get('q', '')
+        tipo = request.args.get('tipo', 'todo')
+        limit = min(request.args.get('limit', 20, type=int), 200)
+
+        data = {'q': q}
+        if tipo in ('pacientes', 'todo'):
+            data['pacientes'] = [{
+                'id_paciente': p.id_paciente,
+                'nombre': p.nombre,
+                'edad': p.edad,
+                'curp': p.curp
+            } for p in buscar_pacientes(q, limit=limit)]
+        if tipo in ('visitas', 'todo'):
+            data['visitas'] = [v.to_dict() for v in
+                               buscar_visitas(q, estado=request.args.get('estado'), limit=limit)]
+
+        return jsonify(data)
+    except Exception as e:
+        logger.error(f'Error en búsqueda: {str(e)}')
+        return jsonify({'error': str(e)}), 500
@@ -2,19 +2,32 @@
 API REST para comunicación inter-nodos del cluster.
 Permite que los nodos consulten datos de otros nodos para agregación distribuida.
 """
-from flask import Blueprint, jsonify, request
-from models import Doctor, Paciente, Cama, TrabajadorSocial, VisitaEmergencia, db, replicate_visit_to_cluster
+from flask import Blueprint, Response, current_app, jsonify, request
+from models import (Doctor, Paciente, Cama, TrabajadorSocial, VisitaEmergencia, db,
+                    get_contadores_sala, get_version_sala, get_visitas_page)
+from pagination import CursorError, fetch_page, page_size
+from archive import folio_existe, get_totales_archivo, get_visita_por_folio
 from config import Config
+from resource_cache import resource_cache, digest, doctor_row, cama_row
+from cluster_client import breakers
+from codec import cluster_response, encode, make_response, representation
+from cluster_query import QueryError, parse_spec, run_spec
+from replication import replicator
+from replication_log import replication_log
+from anti_entropy import (anti_entropy, FANOUT as ANTI_ENTROPY_FANOUT, HOJAS as ANTI_ENTROPY_HOJAS,
+                          TABLAS as ANTI_ENTROPY_TABLAS)
+from bootstrap import snapshots
+from idempotency import idempotency, llave_de, respuesta_repetida
+from admission import admission
+import hashlib
 import logging
 import threading
+import uuid
 from datetime import datetime
 
 cluster_api_bp = Blueprint('cluster_api', __name__, url_prefix='/api/cluster')
 logger = logging.getLogger(__name__)
 
-# Lock para exclusión mutua en creación de visitas (solo usado por el líder)
-visit_creation_lock = threading.Lock()
-
 
 @cluster_api_bp.route('/health', methods=['GET'])
 def health_check():
@@ -60,7 +73,7 @@ def get_doctors():
 
         doctores = query.all()
 
-        return jsonify({
+        return cluster_response({
             'node_id': Config.NODE_ID,
             'count': len(doctores),
             'doctors': [{
@@ -71,7 +84,7 @@ def get_doctors():
                 'activo': d.activo,
                 'id_sala': d.id_sala
             } for d in doctores]
-        }), 200
+        })
 
     except Exception as e:
         logger.error(f"Error en /api/cluster/doctors: {e}")
@@ -100,7 +113,7 @@ def get_beds():
 
         camas = query.all()
 
-        return jsonify({
+        return cluster_response({
             'node_id': Config.NODE_ID,
             'count': len(camas),
             'beds': [{
@@ -111,13 +124,79 @@ def get_beds():
                 'id_paciente': c.id_paciente,
                 'paciente_nombre': c.paciente_actual.nombre if c.paciente_actual else None
             } for c in camas]
-        }), 200
+        })
 
     except Exception as e:
         logger.error(f"Error en /api/cluster/beds: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@cluster_api_bp.route('/resources', methods=['GET'])
+def get_resources():
+    """
+    Snapshot de doctores y camas de ESTA sala para la caché de recursos de
+    los demás nodos (ver resource_cache.py).
+
+    Returns:
+        JSON con node_id, epoch, version, digest, doctors y beds
+    """
+    try:
+        snapshot = resource_cache.snapshot_local()
+        snapshot['digest'] = digest(snapshot['doctors'], snapshot['beds'])
+        return cluster_response(snapshot)
+
+    except Exception as e:
+        logger.error(f"Error en /api/cluster/resources: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/resources/digest', methods=['GET'])
+def get_resources_digest():
+    """
+    Versión y digest de los recursos de ESTA sala, para que los demás nodos
+    verifiquen su réplica sin descargarla.
+
+    Returns:
+        JSON con node_id, epoch, version y digest
+    """
+    try:
+        snapshot = resource_cache.snapshot_local()
+        return jsonify({
+            'node_id': snapshot['node_id'],
+            'epoch': snapshot['epoch'],
+            'version': snapshot['version'],
+            'digest': digest(snapshot['doctors'], snapshot['beds'])
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error en /api/cluster/resources/digest: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/resources/delta', methods=['POST'])
+def receive_resources_delta():
+    """
+    Recibe los cambios de doctores/camas que empuja el dueño de otra sala.
+
+    Body (JSON): node_id, epoch, from_version, version, doctors, beds y
+    removed ({'doctors': ids, 'beds': ids})
+
+    Returns:
+        JSON con el resultado: 'applied', 'duplicate', 'gap' o 'unknown'
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        return jsonify({'node_id': Config.NODE_ID, 'status': resource_cache.apply_delta(data)}), 200
+
+    except (KeyError, TypeError) as e:
+        return jsonify({'error': f'Delta inválido: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Error en /api/cluster/resources/delta: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @cluster_api_bp.route('/social-workers', methods=['GET'])
 def get_social_workers():
     """
@@ -140,7 +219,7 @@ def get_social_workers():
 
         trabajadores = query.all()
 
-        return jsonify({
+        return cluster_response({
             'node_id': Config.NODE_ID,
             'count': len(trabajadores),
             'social_workers': [{
@@ -149,7 +228,7 @@ def get_social_workers():
                 'activo': ts.activo,
                 'id_sala': ts.id_sala
             } for ts in trabajadores]
-        }), 200
+        })
 
     except Exception as e:
         logger.error(f"Error en /api/cluster/social-workers: {e}")
@@ -159,65 +238,78 @@ def get_social_workers():
 @cluster_api_bp.route('/visits', methods=['GET'])
 def get_visits():
     """
-    Retorna lista de visitas de emergencia de ESTA sala.
+    Retorna lista de visitas de emergencia de ESTA sala (más recientes primero).
 
     Query params:
         - estado: (opcional) 'activa', 'completada', 'cancelada'
-        - limit: (opcional) número máximo de resultados (default: 50)
+        - limit: (opcional) tamaño de página (default: 50, máximo 500)
+        - cursor: (opcional) next_cursor de la respuesta anterior
 
     Returns:
-        JSON array con visitas
+        JSON con visitas y next_cursor (null en la última página)
     """
     try:
-        query = VisitaEmergencia.query.filter_by(id_sala=Config.NODE_ID)
-
         # Filtro por estado
         estado = request.args.get('estado')
-        if estado in ['activa', 'completada', 'cancelada']:
-            query = query.filter_by(estado=estado)
+        if estado not in ['activa', 'completada', 'cancelada']:
+            estado = None
 
         # Limit
-        limit = request.args.get('limit', type=int, default=50)
+        limit = page_size(request.args.get('limit', type=int), default=50)
 
-        visitas = query.order_by(VisitaEmergencia.timestamp.desc()).limit(limit).all()
+        # Una sola consulta con JOIN, paginada por (timestamp, id_visita)
+        page = get_visitas_page(estado=estado, id_sala=Config.NODE_ID,
+                                cursor=request.args.get('cursor'), limit=limit)
+        visitas = page.items
 
-        return jsonify({
+        return cluster_response({
             'node_id': Config.NODE_ID,
             'count': len(visitas),
-            'visits': [{
-                'id_visita': v.id_visita,
-                'folio': v.folio,
-                'id_paciente': v.id_paciente,
-                'paciente_nombre': v.paciente.nombre,
-                'id_doctor': v.id_doctor,
-                'doctor_nombre': v.doctor.nombre,
-                'id_cama': v.id_cama,
-                'cama_numero': v.cama.numero,
-                'id_sala': v.id_sala,
-                'sintomas': v.sintomas,
-                'diagnostico': v.diagnostico,
-                'estado': v.estado,
-                'timestamp': v.timestamp.isoformat() if v.timestamp else None,
-                'fecha_cierre': v.fecha_cierre.isoformat() if v.fecha_cierre else None
-            } for v in visitas]
-        }), 200
+            'next_cursor': page.next_cursor,
+            'visits': [v.to_row() for v in visitas]
+        })
 
+    except CursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error en /api/cluster/visits: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@cluster_api_bp.route('/visits/<folio>', methods=['GET'])
+def get_visit(folio):
+    """
+    Retorna una visita por folio, buscando también en el histórico archivado.
+
+    Returns:
+        JSON con la visita y 'archivada', o 404 si no existe
+    """
+    try:
+        visita, archivada = get_visita_por_folio(folio)
+        if visita is None:
+            return jsonify({'error': f'Visita {folio} no encontrada'}), 404
+
+        data = visita.to_dict()
+        data['archivada'] = archivada
+        return jsonify({'node_id': Config.NODE_ID, 'visit': data}), 200
+
+    except Exception as e:
+        logger.error(f"Error en /api/cluster/visits/{folio}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @cluster_api_bp.route('/patients', methods=['GET'])
 def get_patients():
     """
-    Retorna lista de pacientes registrados en el sistema.
+    Retorna lista de pacientes registrados en el sistema (por id_paciente).
 
     Query params:
-        - limit: (opcional) número máximo de resultados (default: 100)
+        - limit: (opcional) tamaño de página (default: 100, máximo 500)
         - activo: (opcional) 'true' o 'false'
+        - cursor: (opcional) next_cursor de la respuesta anterior
 
     Returns:
-        JSON array con pacientes
+        JSON con pacientes y next_cursor (null en la última página)
     """
     try:
         query = Paciente.query
@@ -229,13 +321,16 @@ def get_patients():
             query = query.filter_by(activo=0)
 
         # Limit
-        limit = request.args.get('limit', type=int, default=100)
+        limit = page_size(request.args.get('limit', type=int), default=100)
 
-        pacientes = query.limit(limit).all()
+        page = fetch_page(query, (Paciente.id_paciente,), key=lambda p: (p.id_paciente,),
+                          cursor=request.args.get('cursor'), limit=limit)
+        pacientes = page.items
 
-        return jsonify({
+        return cluster_response({
             'node_id': Config.NODE_ID,
             'count': len(pacientes),
+            'next_cursor': page.next_cursor,
             'patients': [{
                 'id_paciente': p.id_paciente,
                 'nombre': p.nombre,
@@ -246,13 +341,74 @@ def get_patients():
                 'contacto_emergencia': p.contacto_emergencia,
                 'activo': p.activo
             } for p in pacientes]
-        }), 200
+        })
 
+    except CursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error en /api/cluster/patients: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@cluster_api_bp.route('/query', methods=['POST'])
+def query():
+    """
+    Ejecuta una especificación de consulta sobre ESTA sala (ver cluster_query.py).
+
+    Body:
+        JSON con resource, where, fields, group_by, aggregate y limit
+
+    Returns:
+        JSON con las filas (o conteos) resultantes; 400 si la especificación
+        no es válida
+    """
+    try:
+        spec = parse_spec(request.get_json(silent=True))
+        rows = run_spec(spec, id_sala=Config.NODE_ID)
+        return cluster_response({
+            'node_id': Config.NODE_ID,
+            'count': len(rows),
+            'rows': rows
+        })
+
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error en /api/cluster/query: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def _stats_nodo():
+    """Estadísticas de ESTA sala desde los contadores materializados (/stats y /snapshot)"""
+    contadores = get_contadores_sala(Config.NODE_ID)
+    stats = {
+        'node_id': Config.NODE_ID,
+        'doctors': {
+            'total': contadores['doctores_total'],
+            'available': contadores['doctores_disponibles']
+        },
+        'beds': {
+            'total': contadores['camas_total'],
+            'available': contadores['camas_disponibles']
+        },
+        'visits': {
+            'active': contadores['visitas_activas'],
+            'completed': contadores['visitas_completadas'],
+            'archived': get_totales_archivo(Config.NODE_ID)
+        },
+        'social_workers': {
+            'total': TrabajadorSocial.query.filter_by(id_sala=Config.NODE_ID, activo=True).count()
+        }
+    }
+
+    # Calcular capacidad disponible
+    stats['capacity'] = {
+        'doctors_pct': (stats['doctors']['available'] / stats['doctors']['total'] * 100) if stats['doctors']['total'] > 0 else 0,
+        'beds_pct': (stats['beds']['available'] / stats['beds']['total'] * 100) if stats['beds']['total'] > 0 else 0
+    }
+    return stats
+
+
 @cluster_api_bp.route('/stats', methods=['GET'])
 def get_stats():
     """
@@ -263,30 +419,16 @@ def get_stats():
         JSON con estadísticas del nodo
     """
     try:
-        stats = {
-            'node_id': Config.NODE_ID,
-            'doctors': {
-                'total': Doctor.query.filter_by(id_sala=Config.NODE_ID, activo=True).count(),
-                'available': Doctor.query.filter_by(id_sala=Config.NODE_ID, disponible=True, activo=True).count()
-            },
-            'beds': {
-                'total': Cama.query.filter_by(id_sala=Config.NODE_ID).count(),
-                'available': Cama.query.filter_by(id_sala=Config.NODE_ID, ocupada=False).count()
-            },
-            'visits': {
-                'active': VisitaEmergencia.query.filter_by(id_sala=Config.NODE_ID, estado='activa').count(),
-                'completed': VisitaEmergencia.query.filter_by(id_sala=Config.NODE_ID, estado='completada').count()
-            },
-            'social_workers': {
-                'total': TrabajadorSocial.query.filter_by(id_sala=Config.NODE_ID, activo=True).count()
-            }
-        }
+        stats = _stats_nodo()
 
-        # Calcular capacidad disponible
-        stats['capacity'] = {
-            'doctors_pct': (stats['doctors']['available'] / stats['doctors']['total'] * 100) if stats['doctors']['total'] > 0 else 0,
-            'beds_pct': (stats['beds']['available'] / stats['beds']['total'] * 100) if stats['beds']['total'] > 0 else 0
-        }
+        # Aciertos y antigüedad de la caché de recursos de las demás salas
+        stats['resource_cache'] = resource_cache.metrics()
+
+        # Circuit breakers de las peticiones a los demás nodos
+        stats['breakers'] = breakers.snapshot()['nodes']
+
+        # Colas de replicación hacia los demás nodos (sólo con datos en el líder)
+        stats['replication'] = replicator.metrics()
 
         return jsonify(stats), 200
 
@@ -295,18 +437,419 @@ def get_stats():
         return jsonify({'error': str(e)}), 500
 
 
+@cluster_api_bp.route('/breakers', methods=['GET'])
+def get_breakers():
+    """
+    Estado del circuit breaker de cada nodo remoto (closed, open o half_open)
+    y sus últimas transiciones, vistos desde ESTE nodo.
+
+    Returns:
+        JSON con nodes y transitions
+    """
+    return jsonify({'node_id': Config.NODE_ID, **breakers.snapshot()}), 200
+
+
+@cluster_api_bp.route('/replication', methods=['GET'])
+def get_replication():
+    """
+    Estado de la replicación vista desde ESTE nodo:
+
+        - followers: colas hacia los demás nodos (ver replication.py):
+          encoladas y en vuelo, enviadas, confirmadas, reintentos,
+          descartadas y latencia del último ack.
+        - log: último seq del log local y líder actual (ver replication_log.py).
+        - lag: en el líder, retraso de cada seguidor en entradas y segundos.
+        - idempotency: llaves en memoria y aciertos (ver idempotency.py).
+
+    Returns:
+        JSON con node_id, quorum, followers, log, lag e idempotency
+    """
+    try:
+        from models import otros_nodos
+        es_lider = replication_log.es_lider()
+        nodos = [node_id for node_id, _ in otros_nodos(replication_log.bully_manager)] if es_lider else []
+        return jsonify({
+            'node_id': Config.NODE_ID,
+            'quorum': Config.REPLICATION_QUORUM,
+            'followers': replicator.metrics(),
+            'log': {'last_seq': replication_log.ultimo_seq(), 'leader': replication_log.lider()},
+            'lag': replication_log.lag(nodos) if es_lider else [],
+            'idempotency': idempotency.metrics()
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error en /api/cluster/replication: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/replication/log', methods=['GET'])
+def get_replication_log():
+    """
+    Entradas del log de replicación con seq > after (para ponerse al día).
+
+    Query params:
+        after: último seq aplicado por quien pide (default 0)
+        limit: máximo de entradas (default Config.REPLICATION_PULL_BATCH)
+        node_id: (opcional) nodo que pide; su `after` cuenta como su progreso
+
+    Returns:
+        JSON con entries (en orden de seq) y last_seq
+    """
+    try:
+        after = request.args.get('after', 0, type=int)
+        limit = min(request.args.get('limit', Config.REPLICATION_PULL_BATCH, type=int),
+                    Config.REPLICATION_PULL_BATCH)
+        node_id = request.args.get('node_id', type=int)
+        if node_id is not None:
+            replication_log.reportar(node_id, after)
+
+        return cluster_response({
+            'node_id': Config.NODE_ID,
+            'last_seq': replication_log.ultimo_seq(),
+            'entries': [e.to_dict() for e in replication_log.entradas(after, limit)]
+        })
+
+    except Exception as e:
+        logger.error(f"Error en /api/cluster/replication/log: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/replication/log', methods=['POST'])
+def append_replication_log():
+    """
+    Registra en el log del LÍDER un cambio ocurrido en un seguidor: lo
+    aplica, le asigna seq y lo empuja a todos los nodos.
+
+    Request JSON:
+        {"tipo": str, "datos": {...}, "id_origen": int}
+
+    Returns:
+        JSON: {'success': True, 'seq': int}; 409 si este nodo no es el líder
+    """
+    try:
+        data = request.get_json()
+        if not data or 'tipo' not in data or 'datos' not in data:
+            return jsonify({'success': False, 'error': 'tipo and datos required'}), 400
+
+        if not replication_log.es_lider():
+            return jsonify({'success': False, 'error': 'Not the leader',
+                            'leader': replication_log.lider()}), 409
+
+        seq = replication_log.registrar(data['tipo'], data['datos'], data.get('id_origen'))
+        return jsonify({'success': True, 'seq': seq}), 201
+
+    except Exception as e:
+        logger.error(f"Error registrando cambio replicado: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/replication/apply', methods=['POST'])
+def apply_replication_entry():
+    """
+    Aplica una entrada del log empujada por el líder (en orden de seq; ante
+    un hueco espera o pide el rango faltante, ver ReplicationLog.recibir).
+
+    Request JSON: EntradaReplicacion.to_dict()
+
+    Returns:
+        JSON: {'success': bool, 'applied_seq': int}; 409 si la entrada no
+        pudo aplicarse porque todavía falta alguna anterior o porque el log
+        de este nodo diverge del de quien la envía
+    """
+    try:
+        entrada = request.get_json()
+        if not entrada or 'seq' not in entrada:
+            return jsonify({'success': False, 'error': 'seq required'}), 400
+
+        aplicado, resultados = replication_log.recibir([entrada])
+        aplicada = resultados[entrada['seq']] in ('applied', 'duplicate')
+        return jsonify({'success': aplicada, 'applied_seq': aplicado}), 200 if aplicada else 409
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error aplicando entrada replicada: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/replicate-batch', methods=['POST'])
+def replicate_batch():
+    """
+    Aplica un lote ordenado de entradas del log en UNA transacción (las
+    visitas, doctores y camas que tocan se leen con una consulta por
+    tabla). Cada entrada es idempotente: las que ya estaban aplicadas se
+    reportan como 'duplicate'; una con el seq de otra entrada local distinta
+    (log divergente tras un cambio de líder) como 'conflict'.
+
+    Request JSON:
+        {"entries": [EntradaReplicacion.to_dict(), ...]}
+
+    Returns:
+        JSON: {'applied_seq': int, 'results': [{'seq', 'status', 'success'}]}
+        en el orden recibido; status es 'applied', 'duplicate', 'gap'
+        (falta una entrada anterior: no se aplicó y hay que reenviarla) o
+        'conflict' (el log de este nodo no coincide con el de quien envía y
+        no se pudo reconciliar con el líder: no se aplicó)
+    """
+    try:
+        data = request.get_json()
+        entradas = (data or {}).get('entries')
+        if not entradas or not all(isinstance(e, dict) and 'seq' in e for e in entradas):
+            return jsonify({'error': 'entries with seq required'}), 400
+
+        aplicado, resultados = replication_log.recibir(entradas)
+        return jsonify({
+            'node_id': Config.NODE_ID,
+            'applied_seq': aplicado,
+            'results': [{'seq': e['seq'], 'status': resultados[e['seq']],
+                         'success': resultados[e['seq']] in ('applied', 'duplicate')} for e in entradas]
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error aplicando lote replicado: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/anti-entropy', methods=['GET'])
+def get_anti_entropy():
+    """
+    Estado de la anti-entropía de ESTE nodo (ver anti_entropy.py): rondas,
+    cubetas distintas, filas copiadas del líder / reenviadas / sin resolver,
+    bytes transferidos, última ronda y raíz y filas de cada árbol local.
+
+    Returns:
+        JSON con node_id, contadores, last_round y local
+    """
+    try:
+        return jsonify({'node_id': Config.NODE_ID, **anti_entropy.metrics(),
+                        'local': anti_entropy.resumen_local()}), 200
+
+    except Exception as e:
+        logger.error(f"Error en /api/cluster/anti-entropy: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/anti-entropy/roots', methods=['GET'])
+def get_anti_entropy_roots():
+    """
+    Raíz del árbol de Merkle de visitas, doctores y camas de ESTE nodo.
+
+    Returns:
+        JSON con node_id y roots ({tabla: hash})
+    """
+    try:
+        return jsonify({'node_id': Config.NODE_ID, 'roots': anti_entropy.raices()}), 200
+
+    except Exception as e:
+        logger.error(f"Error en /api/cluster/anti-entropy/roots: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/anti-entropy/tree', methods=['GET'])
+def get_anti_entropy_tree():
+    """
+    Hashes de los hijos de nodos del árbol de Merkle de una tabla.
+
+    Query params:
+        table: visitas, doctores o camas
+        level: 1 (hijos de la raíz) o 2 (hojas de los nodos en `parents`)
+        parents: (level 2) índices de nivel 1 separados por comas
+
+    Returns:
+        JSON con children ({padre: [hashes]})
+    """
+    try:
+        tabla = request.args.get('table')
+        nivel = request.args.get('level', 1, type=int)
+        padres = [0]
+        if nivel == 2:
+            padres = [int(p) for p in request.args.get('parents', '').split(',') if p]
+        if tabla not in ANTI_ENTROPY_TABLAS or nivel not in (1, 2) \
+                or not all(0 <= p < ANTI_ENTROPY_FANOUT for p in padres):
+            return jsonify({'error': 'table, level (1-2) and parents required'}), 400
+
+        hijos = anti_entropy.hijos(tabla, nivel, padres)
+        return jsonify({'node_id': Config.NODE_ID, 'table': tabla, 'level': nivel,
+                        'children': {str(p): h for p, h in hijos.items()}}), 200
+
+    except ValueError:
+        return jsonify({'error': 'parents must be integers'}), 400
+    except Exception as e:
+        logger.error(f"Error en /api/cluster/anti-entropy/tree: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/anti-entropy/rows', methods=['POST'])
+def get_anti_entropy_rows():
+    """
+    Filas de ESTE nodo en unas cubetas del árbol de Merkle de una tabla.
+
+    Request JSON:
+        {"table": "visitas" | "doctores" | "camas", "buckets": [int, ...]}
+
+    Returns:
+        JSON con rows (formato de replication_log.fila_*)
+    """
+    try:
+        data = request.get_json() or {}
+        tabla, cubetas = data.get('table'), data.get('buckets')
+        if tabla not in ANTI_ENTROPY_TABLAS or not isinstance(cubetas, list) \
+                or not all(isinstance(b, int) and 0 <= b < ANTI_ENTROPY_HOJAS for b in cubetas):
+            return jsonify({'error': 'table and buckets required'}), 400
+
+        return cluster_response({'node_id': Config.NODE_ID, 'table': tabla,
+                                 'rows': anti_entropy.filas_cubetas(tabla, cubetas)})
+
+    except Exception as e:
+        logger.error(f"Error en /api/cluster/anti-entropy/rows: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/bootstrap/snapshot', methods=['POST'])
+def create_bootstrap_snapshot():
+    """
+    Genera una copia consistente de la BD de ESTE nodo para que un nodo
+    nuevo arranque desde ella (ver bootstrap.py).
+
+    Returns:
+        JSON (201): manifiesto con snapshot_id, seq (último del log incluido),
+        schema_version, size, chunk_size y chunks (SHA-256 de cada trozo)
+    """
+    try:
+        return jsonify({'node_id': Config.NODE_ID, **snapshots.crear()}), 201
+
+    except Exception as e:
+        logger.error(f"Error generando snapshot de bootstrap: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/bootstrap/snapshot/<snapshot_id>/<int:n>', methods=['GET'])
+def get_bootstrap_chunk(snapshot_id, n):
+    """
+    Trozo `n` de un snapshot de bootstrap (binario; su SHA-256 está en el
+    manifiesto y en la cabecera X-Chunk-SHA256).
+
+    Returns:
+        application/octet-stream; 404 si el snapshot expiró o el trozo no existe
+    """
+    try:
+        trozo = snapshots.leer(snapshot_id, n)
+        return Response(trozo, mimetype='application/octet-stream',
+                        headers={'X-Chunk-SHA256': hashlib.sha256(trozo).hexdigest()})
+
+    except (KeyError, IndexError):
+        return jsonify({'error': 'Snapshot or chunk not found'}), 404
+    except Exception as e:
+        logger.error(f"Error leyendo trozo de snapshot: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@cluster_api_bp.route('/bootstrap/snapshot/<snapshot_id>', methods=['DELETE'])
+def delete_bootstrap_snapshot(snapshot_id):
+    """Borra un snapshot de bootstrap ya descargado"""
+    try:
+        return jsonify({'success': snapshots.borrar(snapshot_id)}), 200
+
+    except Exception as e:
+        logger.error(f"Error borrando snapshot de bootstrap: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+_snapshot_lock = threading.Lock()
+
+
+def _snapshot_cache():
+    """
+    Últimos cuerpos serializados de /snapshot de esta app (uno por
+    codificación, ver codec.py). El epoch distingue
+    arranques: si CAMBIOS_SALA vuelve a una versión anterior (BD restaurada)
+    no se repiten ETags ya entregados; quitar 'snapshot_cache' de
+    app.extensions invalida ambos.
+    """
+    with _snapshot_lock:
+        return current_app.extensions.setdefault(
+            'snapshot_cache', {'epoch': uuid.uuid4().hex[:8], 'etag': None, 'bodies': {}})
+
+
+@cluster_api_bp.route('/snapshot', methods=['GET'])
+def get_snapshot():
+    """
+    Doctores, camas, trabajadores sociales y estadísticas de ESTA sala en
+    una sola respuesta, con ETag derivado de la versión de cambios de la sala
+    (CAMBIOS_SALA).
+
+    Headers:
+        - If-None-Match: (opcional) ETag de la respuesta anterior; si la sala
+          no cambió se responde 304 sin cuerpo
+
+    Returns:
+        JSON con node_id, version, doctors, beds, social_workers y stats
+    """
+    try:
+        # La versión se lee antes que los datos: el cuerpo puede ser más
+        # nuevo que su ETag (la siguiente consulta lo vuelve a pedir), nunca más viejo
+        cache = _snapshot_cache()
+        version = get_version_sala(Config.NODE_ID)
+        etag = f"{Config.NODE_ID}-{cache['epoch']}-{version}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            columnar, comprimir = representation()
+            with _snapshot_lock:
+                if cache['etag'] != etag:
+                    cache.update(etag=etag, bodies={})
+                body = cache['bodies'].get(columnar)
+            if body is None:
+                body = encode({
+                    'node_id': Config.NODE_ID,
+                    'version': version,
+                    'doctors': [doctor_row(d) for d in Doctor.query.filter_by(id_sala=Config.NODE_ID)],
+                    'beds': [cama_row(c) for c in Cama.query.filter_by(id_sala=Config.NODE_ID)],
+                    'social_workers': [{
+                        'id_trabajador': ts.id_trabajador,
+                        'nombre': ts.nombre,
+                        'activo': ts.activo,
+                        'id_sala': ts.id_sala
+                    } for ts in TrabajadorSocial.query.filter_by(id_sala=Config.NODE_ID)],
+                    'stats': _stats_nodo()
+                }, columnar)
+                with _snapshot_lock:
+                    if cache['etag'] == etag:
+                        cache['bodies'][columnar] = body
+            response = make_response(body, columnar, comprimir)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    except Exception as e:
+        logger.error(f"Error en /api/cluster/snapshot: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def _respuesta_repetida(previa):
+    """Respuesta guardada de una petición cuya llave de idempotencia ya se procesó"""
+    status, respuesta = respuesta_repetida(previa)
+    return jsonify(respuesta), status
+
+
 @cluster_api_bp.route('/create-visit', methods=['POST'])
 def create_visit_distributed():
     """
-    Endpoint para crear una visita en el nodo LÍDER con exclusión mutua.
+    Endpoint para crear una visita en el nodo LÍDER.
 
     Flujo:
     1. Nodo follower envía solicitud aquí
-    2. Este endpoint (líder) aplica exclusión mutua
-    3. Valida disponibilidad de recursos
-    4. Crea visita localmente
-    5. Replica a todos los nodos del cluster
-    6. Retorna folio al solicitante
+    2. La petición entra a la cola de admisión (ver admission.py), que junta
+       las que llegan a la vez, valida disponibilidad de recursos y crea
+       las visitas del lote en una sola transacción y una sola entrada del
+       log de replicación
+    3. Espera a que REPLICATION_QUORUM nodos confirmen el lote
+    4. Retorna folio al solicitante
+
+    No hay lock global: doctores y camas llevan una columna version y el
+    UPDATE que los ocupa sólo aplica si nadie los cambió desde que se
+    leyeron. Si dos peticiones compiten por el mismo doctor o cama, una
+    gana y la otra recibe 409.
 
     Request JSON:
         {
@@ -315,11 +858,17 @@ def create_visit_distributed():
             "id_cama": int,
             "id_trabajador": int,
             "id_sala": int,
-            "sintomas": str
+            "sintomas": str,
+            "idempotency_key": str (opcional; o cabecera Idempotency-Key)
         }
 
+    Un reintento con la misma llave recibe la respuesta de la visita ya
+    creada (con 'idempotent_replay': True y sin esperar replicación) en vez
+    de crear otra (ver idempotency.py).
+
     Returns:
-        JSON: {'success': True, 'folio': str, 'visita': {...}} o {'success': False, 'error': str}
+        JSON: {'success': True, 'folio': str, 'visita': {...}, 'replication': {...}}
+        o {'success': False, 'error': str}
     """
     try:
         # Obtener datos de la solicitud
@@ -328,6 +877,14 @@ def create_visit_distributed():
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
 
+        try:
+            llave = llave_de(data, request.headers)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        previa = idempotency.buscar(llave)
+        if previa is not None:
+            return _respuesta_repetida(previa)
+
         # Validar campos requeridos
         required_fields = ['id_paciente', 'id_doctor', 'id_cama', 'id_trabajador', 'id_sala', 'sintomas']
         missing_fields = [field for field in required_fields if field not in data]
@@ -338,98 +895,35 @@ def create_visit_distributed():
                 'error': f'Missing required fields: {", ".join(missing_fields)}'
             }), 400
 
-        # EXCLUSIÓN MUTUA: adquirir lock
-        with visit_creation_lock:
-            logger.info(f"Processing distributed visit creation request from sala {data['id_sala']}")
-
-            # Validar que doctor existe y está disponible
-            doctor = Doctor.query.get(data['id_doctor'])
-            if not doctor:
-                return jsonify({'success': False, 'error': f'Doctor {data["id_doctor"]} not found'}), 404
-
-            if not doctor.disponible:
-                return jsonify({'success': False, 'error': f'Doctor {doctor.nombre} is not available'}), 409
-
-            # Validar que cama existe y está disponible
-            cama = Cama.query.get(data['id_cama'])
-            if not cama:
-                return jsonify({'success': False, 'error': f'Bed {data["id_cama"]} not found'}), 404
-
-            if cama.ocupada:
-                return jsonify({'success': False, 'error': f'Bed {cama.numero} is occupied'}), 409
-
-            # Validar que paciente existe
-            paciente = Paciente.query.get(data['id_paciente'])
-            if not paciente:
-                return jsonify({'success': False, 'error': f'Patient {data["id_paciente"]} not found'}), 404
-
-            # Validar que trabajador existe
-            trabajador = TrabajadorSocial.query.get(data['id_trabajador'])
-            if not trabajador:
-                return jsonify({'success': False, 'error': f'Social worker {data["id_trabajador"]} not found'}), 404
-
-            # Crear la visita (folio se genera automáticamente por el evento before_insert)
-            visita = VisitaEmergencia(
-                id_paciente=data['id_paciente'],
-                id_doctor=data['id_doctor'],
-                id_cama=data['id_cama'],
-                id_trabajador=data['id_trabajador'],
-                id_sala=data['id_sala'],
-                sintomas=data['sintomas'],
-                estado='activa',
-                timestamp=datetime.utcnow()
-            )
-
-            # Marcar recursos como ocupados
-            doctor.disponible = False
-            cama.ocupada = True
-            cama.id_paciente = data['id_paciente']
+        # Los ids se comparan contra lo precargado por el lote: normalizarlos a int
+        try:
+            data = {**data, **{campo: int(data[campo]) for campo in required_fields if campo != 'sintomas'}}
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Resource ids must be integers'}), 400
 
-            # Guardar en BD
-            db.session.add(visita)
-            db.session.commit()
-
-            # Refresh para obtener el folio auto-generado
-            db.session.refresh(visita)
-
-            logger.info(f"Visit created successfully in leader: folio={visita.folio}")
-
-            # Preparar datos para replicación
-            visita_data = {
-                'folio': visita.folio,
-                'id_paciente': visita.id_paciente,
-                'id_doctor': visita.id_doctor,
-                'id_cama': visita.id_cama,
-                'id_trabajador': visita.id_trabajador,
-                'id_sala': visita.id_sala,
-                'sintomas': visita.sintomas,
-                'diagnostico': visita.diagnostico,
-                'estado': visita.estado,
-                'timestamp': visita.timestamp.isoformat() if visita.timestamp else None,
-                'fecha_cierre': visita.fecha_cierre.isoformat() if visita.fecha_cierre else None
-            }
-
-            # Replicar a todos los nodos del cluster
-            # Necesitamos obtener bully_manager desde app
-            from flask import current_app
-            bully_manager = getattr(current_app, 'bully_manager', None)
-
-            if bully_manager:
-                replication_result = replicate_visit_to_cluster(
-                    bully_manager,
-                    visita_data,
-                    exclude_node_id=Config.NODE_ID  # No replicar al líder mismo
-                )
-                logger.info(f"Replication result: {replication_result}")
-            else:
-                logger.warning("bully_manager not available, skipping replication")
-
-            # Retornar respuesta exitosa
-            return jsonify({
-                'success': True,
-                'folio': visita.folio,
-                'visita': visita_data
-            }), 201
+        logger.info(f"Processing distributed visit creation request from sala {data['id_sala']}")
+
+        pedido = admission.crear(data, llave)
+        if pedido.status != 201 or pedido.respuesta.get('idempotent_replay'):
+            return jsonify(pedido.respuesta), pedido.status
+
+        logger.info(f"Visit created successfully in leader: folio={pedido.respuesta['folio']}")
+
+        # El commit del lote ya registró la visita en el log de replicación y
+        # la encoló a los demás nodos (ver replication_log.py)
+        envio = pedido.envio
+
+        # Esperar (como máximo REPLICATION_ACK_TIMEOUT) a que REPLICATION_QUORUM
+        # nodos confirmen antes de responder
+        replication_result = None
+        if envio:
+            if Config.REPLICATION_QUORUM > 0:
+                envio.wait(Config.REPLICATION_QUORUM, Config.REPLICATION_ACK_TIMEOUT)
+            replication_result = envio.resultado()
+            logger.info(f"Replication result: {replication_result}")
+
+        # Retornar respuesta exitosa
+        return jsonify({**pedido.respuesta, 'replication': replication_result}), 201
 
     except Exception as e:
         db.session.rollback()
@@ -437,6 +931,20 @@ def create_visit_distributed():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@cluster_api_bp.route('/admission', methods=['GET'])
+def get_admission():
+    """
+    Lotes de create-visit procesados por ESTE nodo (ver admission.py):
+    tamaño máximo y ventana configurados, lotes, peticiones, visitas
+    creadas, lote más grande y promedio, y lotes que se reintentaron uno por
+    uno por chocar con otro escritor.
+
+    Returns:
+        JSON con node_id y las métricas de la cola
+    """
+    return jsonify({'node_id': Config.NODE_ID, **admission.metrics()}), 200
+
+
 @cluster_api_bp.route('/replicate-visit', methods=['POST'])
 def replicate_visit():
     """
@@ -445,7 +953,7 @@ def replicate_visit():
     Este endpoint se ejecuta en TODOS los nodos cuando el líder crea una visita.
     No valida disponibilidad de recursos (el líder ya lo hizo).
 
-    Request JSON: Datos completos de la visita
+    Request JSON: Datos completos de la visita (más idempotency_key opcional)
 
     Returns:
         JSON: {'success': True} o {'success': False, 'error': str}
@@ -456,11 +964,18 @@ def replicate_visit():
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
 
+        try:
+            llave = llave_de(data, request.headers)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        previa = idempotency.buscar(llave)
+        if previa is not None:
+            return _respuesta_repetida(previa)
+
         logger.info(f"Receiving replicated visit: folio={data.get('folio')}")
 
-        # Verificar si la visita ya existe (evitar duplicados)
-        existing_visit = VisitaEmergencia.query.filter_by(folio=data.get('folio')).first()
-        if existing_visit:
+        # Verificar si la visita ya existe (evitar duplicados), también en el histórico
+        if folio_existe(data.get('folio')):
             logger.warning(f"Visit {data.get('folio')} already exists, skipping replication")
             return jsonify({'success': True, 'message': 'Visit already exists'}), 200
 
@@ -490,12 +1005,14 @@ def replicate_visit():
             cama.id_paciente = data['id_paciente']
 
         # Guardar en BD
+        respuesta = {'success': True, 'message': 'Visit replicated successfully'}
         db.session.add(visita)
+        idempotency.guardar(llave, 'replicate-visit', 201, respuesta)
         db.session.commit()
 
         logger.info(f"Visit replicated successfully: folio={visita.folio}")
 
-        return jsonify({'success': True, 'message': 'Visit replicated successfully'}), 201
+        return jsonify(respuesta), 201
 
     except Exception as e:
         db.session.rollback()
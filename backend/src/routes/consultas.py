@@ -1,7 +1,11 @@
-from flask import Blueprint, render_template, request
+from flask import Blueprint, current_app, render_template, request
 from flask_login import login_required
 from auth import role_required
-from models import Doctor, Paciente, Cama, VisitaEmergencia, TrabajadorSocial, Sala
+from models import (Doctor, Paciente, Cama, VisitaEmergencia, Sala,
+                    with_relaciones, VISITAS_ORDEN)
+from pagination import CursorError, decode_cursor, fetch_page
+from search import buscar_pacientes
+from cluster_query import query_cluster
 from config import Config
 import logging
 
@@ -9,6 +13,19 @@ consultas_bp = Blueprint('consultas', __name__)
 logger = logging.getLogger(__name__)
 
 
+def _cursor_arg(nombre, columnas):
+    """Cursor del query param `nombre`; None (primera página) si falta o no es válido"""
+    cursor = request.args.get(nombre)
+    if not cursor:
+        return None
+    try:
+        decode_cursor(cursor, columnas)
+    except CursorError:
+        logger.warning(f'Cursor inválido en {nombre}: {cursor!r}')
+        return None
+    return cursor
+
+
 @consultas_bp.route('/global')
 @login_required
 @role_required('admin')
@@ -19,37 +36,38 @@ def global_view():
     filtro_sala = request.args.get('sala', type=int)
     filtro_disponible = request.args.get('disponible')
 
-    # Doctores
-    query_doctores = Doctor.query
-    if filtro_sala:
-        query_doctores = query_doctores.filter_by(id_sala=filtro_sala)
-    if filtro_disponible == '1':
-        query_doctores = query_doctores.filter_by(disponible=True)
-    elif filtro_disponible == '0':
-        query_doctores = query_doctores.filter_by(disponible=False)
-
-    doctores = query_doctores.all()
-
-    # Pacientes
-    pacientes = Paciente.query.filter_by(activo=1).all()
-
-    # Camas
-    query_camas = Cama.query
-    if filtro_sala:
-        query_camas = query_camas.filter_by(id_sala=filtro_sala)
-    camas = query_camas.all()
-
-    # Trabajadores Sociales
-    query_trabajadores = TrabajadorSocial.query
-    if filtro_sala:
-        query_trabajadores = query_trabajadores.filter_by(id_sala=filtro_sala)
-    trabajadores = query_trabajadores.all()
-
-    # Visitas
-    query_visitas = VisitaEmergencia.query
+    # Doctores, camas y trabajadores sociales: cada nodo filtra su sala (ver
+    # cluster_query.py); las salas sin respuesta salen de la BD local
+    where = {'id_sala': filtro_sala} if filtro_sala else {}
+    filtro_doctores = dict(where)
+    if filtro_disponible in ('1', '0'):
+        filtro_doctores['disponible'] = filtro_disponible == '1'
+    bully_manager = getattr(current_app, 'bully_manager', None)
+
+    doctores = query_cluster(bully_manager, {
+        'resource': 'doctors', 'where': filtro_doctores,
+        'fields': ['id_doctor', 'nombre', 'especialidad', 'disponible', 'sala_numero']
+    })
+    camas = query_cluster(bully_manager, {
+        'resource': 'beds', 'where': where,
+        'fields': ['id_cama', 'numero', 'ocupada', 'paciente_nombre', 'sala_numero']
+    })
+    trabajadores = query_cluster(bully_manager, {
+        'resource': 'social_workers', 'where': where,
+        'fields': ['id_trabajador', 'nombre', 'activo', 'sala_numero']
+    })
+
+    # Pacientes (crecen sin límite: paginados por id_paciente)
+    columnas = (Paciente.id_paciente,)
+    page_pacientes = fetch_page(Paciente.query.filter_by(activo=1), columnas, key=lambda p: (p.id_paciente,),
+                                cursor=_cursor_arg('cursor_pacientes', columnas), limit=100)
+
+    # Visitas (más recientes primero, paginadas por (timestamp, id_visita))
+    query_visitas = with_relaciones(VisitaEmergencia.query)
     if filtro_sala:
         query_visitas = query_visitas.filter_by(id_sala=filtro_sala)
-    visitas = query_visitas.order_by(VisitaEmergencia.timestamp.desc()).limit(50).all()
+    page_visitas = fetch_page(query_visitas, VISITAS_ORDEN, key=lambda v: (v.timestamp, v.id_visita),
+                              cursor=_cursor_arg('cursor_visitas', VISITAS_ORDEN), limit=50, descending=True)
 
     # Salas
     salas = Sala.query.all()
@@ -57,12 +75,16 @@ def global_view():
     return render_template(
         'consultas.html',
         doctores=doctores,
-        pacientes=pacientes,
+        pacientes=page_pacientes.items,
+        next_cursor_pacientes=page_pacientes.next_cursor,
         camas=camas,
         trabajadores=trabajadores,
-        visitas=visitas,
+        visitas=page_visitas.items,
+        next_cursor_visitas=page_visitas.next_cursor,
         salas=salas,
-        filtro_sala=filtro_sala
+        nodos=doctores.nodos + camas.nodos + trabajadores.nodos,
+        filtro_sala=filtro_sala,
+        filtro_disponible=filtro_disponible
     )
 
 
@@ -87,12 +109,11 @@ def pacientes():
     """Lista de todos los pacientes"""
     busqueda = request.args.get('q', '')
 
-    query = Paciente.query.filter_by(activo=1)
-
     if busqueda:
-        query = query.filter(Paciente.nombre.like(f'%{busqueda}%'))
-
-    pacientes_list = query.all()
+        # Índice FTS5: nombre o CURP, por prefijo y sin distinguir acentos
+        pacientes_list = buscar_pacientes(busqueda, limit=200)
+    else:
+        pacientes_list = Paciente.query.filter_by(activo=1).all()
 
     return render_template('pacientes.html', pacientes=pacientes_list, busqueda=busqueda)
 
@@ -1,8 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
+from sqlalchemy.orm.exc import StaleDataError
 from auth import role_required, get_user_info
 from models import (db, VisitaEmergencia, Paciente, Doctor, Cama, TrabajadorSocial,
-                   get_doctores_disponibles, get_camas_disponibles, get_visitas_activas)
+                   get_doctores_disponibles, get_camas_disponibles, get_visitas_activas,
+                   with_relaciones, VISITAS_ORDEN)
+from pagination import CursorError, fetch_page
 from config import Config
 from datetime import datetime
 import logging
@@ -91,6 +94,12 @@ def crear_visita():
             )
 
             db.session.add(visita)
+
+            # Marcar recursos como ocupados (el índice de disponibilidad se actualiza al confirmar)
+            doctor.disponible = False
+            cama.ocupada = True
+            cama.id_paciente = paciente.id_paciente
+
             db.session.commit()
 
             # El trigger ya generó el folio, recargar para obtenerlo
@@ -110,6 +119,12 @@ def crear_visita():
 
             return redirect(url_for('visitas.crear_visita'))
 
+        except StaleDataError:
+            # Otra visita ocupó el doctor o la cama entre la lectura y el commit (columna version)
+            db.session.rollback()
+            flash('El doctor o la cama acaban de asignarse a otra visita', 'warning')
+            return redirect(url_for('visitas.crear_visita'))
+
         except Exception as e:
             db.session.rollback()
             flash(f'Error al crear visita: {str(e)}', 'danger')
@@ -173,7 +188,12 @@ def cerrar_visita(folio):
         visita.diagnostico = diagnostico
         visita.fecha_cierre = datetime.utcnow()
 
-        # El trigger liberará automáticamente el doctor y la cama
+        # Liberar doctor y cama (en la misma transacción: el cierre se
+        # replica con su estado, ver replication_log.py)
+        visita.doctor.disponible = True
+        visita.cama.ocupada = False
+        visita.cama.id_paciente = None
+
         db.session.commit()
 
         # Notificar vía WebSocket
@@ -207,6 +227,13 @@ def todas_visitas():
     if estado and estado != 'todas':
         query = query.filter_by(estado=estado)
 
-    visitas = query.order_by(VisitaEmergencia.timestamp.desc()).limit(100).all()
-
-    return render_template('todas_visitas.html', visitas=visitas, estado=estado)
+    # Paginación por llave (timestamp, id_visita): cada página cuesta lo mismo
+    try:
+        page = fetch_page(with_relaciones(query), VISITAS_ORDEN, key=lambda v: (v.timestamp, v.id_visita),
+                          cursor=request.args.get('cursor'), limit=100, descending=True)
+    except CursorError:
+        flash('El enlace de paginación no es válido; mostrando la primera página', 'warning')
+        return redirect(url_for('visitas.todas_visitas', estado=estado))
+
+    return render_template('todas_visitas.html', visitas=page.items, estado=estado,
+                           next_cursor=page.next_cursor, paginado=bool(request.args.get('cursor')))
@@ -0,0 +1,133 @@
+"""
+Búsqueda de texto completo de pacientes y visitas (SQLite FTS5).
+
+Los índices PACIENTES_FTS (nombre, curp) y VISITAS_FTS (folio, sintomas,
+diagnostico) son tablas FTS5 de contenido externo creadas en la migración 4
+y mantenidas por triggers, así que cualquier escritura (ORM, replicación,
+SQL crudo) queda indexada en la misma transacción.
+
+Cada palabra del texto buscado se trata como prefijo y todas deben
+aparecer ("jose her" encuentra "José Hernández"). El tokenizador quita los
+acentos tanto del índice como de la consulta.
+
+Las visitas archivadas (ver archive.py) salen del índice junto con la
+tabla caliente; se consultan por folio con archive.get_visita_por_folio().
+"""
+import re
+import unicodedata
+
+from sqlalchemy import or_
+
+from models import db, Paciente, Doctor, VisitaEmergencia, VisitaResumen, visitas_resumen_query
+
+# Caracteres que el tokenizador considera parte de una palabra (ver _FTS_TOKENIZE en migrations.py)
+_PALABRA = re.compile(r"[\w+]+", re.UNICODE)
+
+# Con más candidatos que esto conviene recorrer las visitas por fecha y parar
+# al llenar la página, en lugar de leerlas todas por id y ordenarlas
+MUCHOS_CANDIDATOS = 2000
+
+
+def fts_query(texto):
+    """
+    Convierte texto libre en una consulta FTS5 segura: cada palabra como
+    prefijo entre comillas, unidas con AND implícito.
+
+    Returns:
+        str o None si el texto no tiene palabras buscables
+    """
+    palabras = _PALABRA.findall(texto or '')
+    if not palabras:
+        return None
+    return ' '.join(f'"{p}"*' for p in palabras)
+
+
+def normalizar(texto):
+    """Minúsculas y sin acentos (mismo criterio que el tokenizador FTS5)"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def _contar(fts, query):
+    """Número de filas de un índice FTS5 que coinciden con la consulta"""
+    sql = db.text(f'SELECT count(*) FROM {fts} WHERE {fts} MATCH :q')
+    return db.session.execute(sql, {'q': query}).scalar()
+
+
+def buscar_pacientes(texto, limit=50, solo_activos=True):
+    """
+    Pacientes cuyo nombre o CURP coinciden con el texto, en orden de registro.
+
+    Args:
+        texto: texto libre ("maria gar", "HEMJ80")
+        limit: máximo de resultados
+        solo_activos: excluir pacientes dados de baja
+
+    Returns:
+        list: objetos Paciente
+    """
+    query = fts_query(texto)
+    if query is None:
+        return []
+
+    # Orden por rowid (id de registro): FTS5 lo entrega ya ordenado y se detiene
+    # en el límite; ordenar por relevancia (rank) obliga a puntuar todas las
+    # coincidencias de un nombre común
+    activo = 'AND p.activo = 1' if solo_activos else ''
+    stmt = db.text(f"""
+        SELECT p.* FROM PACIENTES_FTS f JOIN PACIENTES p ON p.id_paciente = f.rowid
+        WHERE PACIENTES_FTS MATCH :q {activo}
+        ORDER BY f.rowid LIMIT :limit
+    """).bindparams(q=query, limit=limit)
+    return db.session.execute(db.select(Paciente).from_statement(stmt)).scalars().all()
+
+
+def buscar_visitas(texto, estado=None, id_sala=None, limit=100):
+    """
+    Visitas (más recientes primero) cuyo folio, síntomas o diagnóstico coinciden
+    con el texto, o cuyo paciente o doctor se llama así.
+
+    Args:
+        texto: texto libre
+        estado: (opcional) filtrar por estado
+        id_sala: (opcional) filtrar por sala
+        limit: máximo de resultados
+
+    Returns:
+        list: VisitaResumen
+    """
+    query = fts_query(texto)
+    if query is None:
+        return []
+
+    # Los doctores son pocos por sala: se comparan en memoria con el mismo criterio
+    palabras = [normalizar(p) for p in _PALABRA.findall(texto)]
+    doctores = [id_doctor for id_doctor, nombre in db.session.query(Doctor.id_doctor, Doctor.nombre)
+                if all(any(w.startswith(p) for w in _PALABRA.findall(normalizar(nombre))) for p in palabras)]
+
+    # Pocas coincidencias: leerlas por llave y ordenarlas. Muchas (un síntoma o
+    # nombre común, un doctor): "+ 0" impide usar esos índices y SQLite recorre
+    # ix_visitas_timestamp hacia atrás probando cada visita contra las listas,
+    # deteniéndose al llenar la página.
+    v = VisitaEmergencia
+    if doctores or _contar('VISITAS_FTS', query) + _contar('PACIENTES_FTS', query) > MUCHOS_CANDIDATOS:
+        id_visita, id_paciente, id_doctor = v.id_visita + 0, v.id_paciente + 0, v.id_doctor + 0
+    else:
+        id_visita, id_paciente, id_doctor = v.id_visita, v.id_paciente, v.id_doctor
+
+    por_texto = db.text('SELECT rowid FROM VISITAS_FTS WHERE VISITAS_FTS MATCH :qv') \
+        .bindparams(qv=query).columns(db.column('rowid'))
+    por_paciente = db.text('SELECT rowid FROM PACIENTES_FTS WHERE PACIENTES_FTS MATCH :qp') \
+        .bindparams(qp=query).columns(db.column('rowid'))
+    condiciones = [id_visita.in_(por_texto), id_paciente.in_(por_paciente)]
+    if doctores:
+        condiciones.append(id_doctor.in_(doctores))
+
+    stmt = visitas_resumen_query().where(or_(*condiciones))
+    if estado:
+        stmt = stmt.where(VisitaEmergencia.estado == estado)
+    if id_sala is not None:
+        stmt = stmt.where(VisitaEmergencia.id_sala == id_sala)
+    stmt = stmt.order_by(VisitaEmergencia.timestamp.desc(), VisitaEmergencia.id_visita.desc()).limit(limit)
+
+    return [VisitaResumen(*row) for row in db.session.execute(stmt)]
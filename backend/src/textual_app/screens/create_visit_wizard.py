@@ -206,7 +206,9 @@ class CreateVisitWizard(Screen):
     def load_resources(self) -> None:
         """Load available doctors and beds from database"""
         try:
-            with self.flask_app.app_context():
+            from db_utils import read_session
+
+            with self.flask_app.app_context(), read_session():
                 from models import get_doctores_disponibles, get_camas_disponibles
                 from config import Config
 
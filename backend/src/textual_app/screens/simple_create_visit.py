@@ -202,25 +202,27 @@ class SimpleCreateVisitScreen(ModalScreen):
     ) -> Dict[str, Any]:
         """Create visit in database"""
         with self.flask_app.app_context():
-            from models import (
-                db, VisitaEmergencia, Paciente,
-                get_doctores_disponibles, get_camas_disponibles
-            )
+            from models import db, VisitaEmergencia, Paciente, Doctor, Cama
+            from availability import availability
 
             try:
-                # 1. Get available resources
-                doctores = get_doctores_disponibles(id_sala=self.bully_manager.node_id)
-                camas = get_camas_disponibles(id_sala=self.bully_manager.node_id)
+                # 1. Auto-assign first available resources (O(1) from the in-memory index)
+                libre_doctor = availability.pick_doctor(self.bully_manager.node_id)
+                libre_cama = availability.pick_cama(self.bully_manager.node_id)
 
-                if not doctores:
+                if not libre_doctor:
                     return {'success': False, 'error': 'No hay doctores disponibles'}
 
-                if not camas:
+                if not libre_cama:
                     return {'success': False, 'error': 'No hay camas disponibles'}
 
-                # Auto-assign first available
-                doctor = doctores[0]
-                cama = camas[0]
+                doctor = db.session.get(Doctor, libre_doctor.id_doctor)
+                cama = db.session.get(Cama, libre_cama.id_cama)
+
+                if not doctor or not doctor.disponible or not cama or cama.ocupada:
+                    # The index was stale (e.g. written by another process): rebuild it
+                    availability.load()
+                    return {'success': False, 'error': 'Recursos ocupados, intente de nuevo'}
 
                 # 2. Create or find patient
                 paciente = None
@@ -251,6 +253,12 @@ class SimpleCreateVisitScreen(ModalScreen):
                 )
 
                 db.session.add(visita)
+
+                # 4. Mark resources as busy
+                doctor.disponible = False
+                cama.ocupada = True
+                cama.id_paciente = paciente.id_paciente
+
                 db.session.commit()
 
                 db.session.refresh(visita)
@@ -35,9 +35,14 @@ class VisitasScreen(Screen):
         Binding("ctrl+r", "refresh", "Actualizar", show=True),
         Binding("ctrl+n", "new_visit", "Nueva Visita", show=True),
         Binding("ctrl+b", "show_cluster", "Cluster Bully", show=True),
+        Binding("ctrl+l", "load_more", "Cargar más", show=True),
         Binding("escape", "app.pop_screen", "Volver", show=True),
     ]
 
+    # Visits fetched per page (keyset pagination, see pagination.py)
+    PAGE_SIZE = 200
+    SEARCH_DEBOUNCE = 0.25  # seconds
+
     CSS = """
     VisitasScreen {
         background: $surface;
@@ -115,7 +120,7 @@ class VisitasScreen(Screen):
     # Reactive state
     visitas_data: reactive[List[Dict[str, Any]]] = reactive([], init=False)
     search_query: reactive[str] = reactive("")
-    filter_estado: reactive[str] = reactive("todas")
+    filter_estado: reactive[str] = reactive("todas", init=False)
     is_loading: reactive[bool] = reactive(False)
 
     def __init__(self, flask_app, bully_manager, username: str, user_info: Dict[str, Any] = None):
@@ -125,6 +130,7 @@ class VisitasScreen(Screen):
         self.username = username
         self.user_info = user_info or {}
         self.filtered_visitas: List[Dict[str, Any]] = []
+        self.next_cursor = None
 
     def compose(self) -> ComposeResult:
         """Compose the visitas screen UI"""
@@ -145,7 +151,7 @@ class VisitasScreen(Screen):
         # Toolbar with search, filter, and new visit button
         with Horizontal(id="toolbar"):
             yield Input(
-                placeholder="🔍 Buscar por folio, paciente o doctor...",
+                placeholder="🔍 Buscar por folio, paciente, doctor o síntomas...",
                 id="search-input"
             )
             yield Select(
@@ -188,19 +194,24 @@ class VisitasScreen(Screen):
         self.load_visitas()
 
     @work(exclusive=True)
-    async def load_visitas(self) -> None:
-        """Load visits from database asynchronously"""
+    async def load_visitas(self, more: bool = False) -> None:
+        """Load the first page of visits (or the next one if more=True) asynchronously"""
+        if more and not self.next_cursor:
+            self.notify("No hay más visitas", severity="information")
+            return
+
         self.is_loading = True
         self.update_status("⏳ Cargando visitas...")
 
         try:
             # Run DB query in thread pool to avoid blocking UI
-            visitas = await asyncio.to_thread(self._fetch_visitas_from_db)
+            cursor = self.next_cursor if more else None
+            visitas, self.next_cursor = await asyncio.to_thread(self._fetch_visitas_from_db, cursor)
 
             # Update reactive state (triggers watch_visitas_data)
-            self.visitas_data = visitas
+            self.visitas_data = self.visitas_data + visitas if more else visitas
 
-            self.update_status(f"✓ {len(visitas)} visitas cargadas")
+            self.update_status(f"✓ {len(self.visitas_data)} visitas cargadas")
 
         except Exception as e:
             self.update_status(f"❌ Error: {str(e)}")
@@ -208,18 +219,19 @@ class VisitasScreen(Screen):
         finally:
             self.is_loading = False
 
-    def _fetch_visitas_from_db(self) -> List[Dict[str, Any]]:
-        """Fetch visits from database (runs in thread pool)"""
-        with self.flask_app.app_context():
-            from models import VisitaEmergencia
+    def _fetch_visitas_from_db(self, cursor=None):
+        """Fetch one page of visits from database (runs in thread pool)"""
+        from db_utils import read_session
 
-            # Query all visits ordered by timestamp desc
-            visitas = VisitaEmergencia.query.order_by(
-                VisitaEmergencia.timestamp.desc()
-            ).all()
+        with self.flask_app.app_context(), read_session():
+            from models import get_visitas_page
+
+            # Single joined, column-projected query; the estado filter is pushed to SQL
+            estado = self.filter_estado if self.filter_estado != "todas" else None
+            page = get_visitas_page(estado=estado, cursor=cursor, limit=self.PAGE_SIZE)
 
             # Convert to dict format
-            return [v.to_dict() for v in visitas]
+            return [v.to_dict() for v in page.items], page.next_cursor
 
     def watch_visitas_data(self, visitas: List[Dict[str, Any]]) -> None:
         """React to changes in visitas data"""
@@ -230,33 +242,44 @@ class VisitasScreen(Screen):
         self.apply_filters()
 
     def watch_filter_estado(self, estado: str) -> None:
-        """React to filter changes"""
-        self.apply_filters()
+        """React to filter changes (reload from the first page with the new filter)"""
+        if self.is_mounted:
+            self.load_visitas()
 
     def apply_filters(self) -> None:
         """Apply search and filter to visitas data"""
-        # Start with all visitas
-        filtered = self.visitas_data.copy()
-
-        # Apply estado filter
-        if self.filter_estado != "todas":
-            filtered = [v for v in filtered if v.get('estado') == self.filter_estado]
-
-        # Apply search query
-        query = self.search_query.lower().strip()
-        if query:
-            filtered = [
-                v for v in filtered
-                if (
-                    query in str(v.get('folio', '')).lower() or
-                    query in str(v.get('paciente', '')).lower() or
-                    query in str(v.get('doctor', '')).lower()
-                )
-            ]
+        # With a search query, results come from the full-text index (all visits,
+        # not just the loaded pages); estado is already filtered in SQL either way
+        if self.search_query.strip():
+            self.search_visitas(self.search_query)
+            return
 
-        self.filtered_visitas = filtered
+        self.filtered_visitas = self.visitas_data.copy()
         self.update_table()
 
+    @work(exclusive=True, group="search")
+    async def search_visitas(self, query: str) -> None:
+        """Run a debounced full-text search in the database"""
+        # Typing restarts this exclusive worker, so only the last keystroke queries
+        await asyncio.sleep(self.SEARCH_DEBOUNCE)
+
+        try:
+            self.filtered_visitas = await asyncio.to_thread(self._search_visitas_in_db, query)
+            self.update_table()
+        except Exception as e:
+            self.update_status(f"❌ Error: {str(e)}")
+            self.notify(f"Error en la búsqueda: {str(e)}", severity="error")
+
+    def _search_visitas_in_db(self, query: str):
+        """Search visits by folio, symptoms, diagnosis, patient or doctor (runs in thread pool)"""
+        from db_utils import read_session
+
+        with self.flask_app.app_context(), read_session():
+            from search import buscar_visitas
+
+            estado = self.filter_estado if self.filter_estado != "todas" else None
+            return [v.to_dict() for v in buscar_visitas(query, estado=estado, limit=self.PAGE_SIZE)]
+
     def update_table(self) -> None:
         """Update DataTable with filtered visitas"""
         table = self.query_one("#visitas-table", DataTable)
@@ -299,10 +322,14 @@ class VisitasScreen(Screen):
         total = len(self.visitas_data)
         showing = len(self.filtered_visitas)
 
-        if total == showing:
-            self.update_status(f"📊 Mostrando {total} visitas")
+        more = " (Ctrl+L para cargar más)" if self.next_cursor else ""
+
+        if self.search_query.strip():
+            self.update_status(f"🔍 {showing} visitas coinciden con '{self.search_query.strip()}'")
+        elif total == showing:
+            self.update_status(f"📊 Mostrando {total} visitas{more}")
         else:
-            self.update_status(f"📊 Mostrando {showing} de {total} visitas")
+            self.update_status(f"📊 Mostrando {showing} de {total} visitas{more}")
 
     def update_status(self, message: str) -> None:
         """Update status bar message"""
@@ -350,6 +377,10 @@ class VisitasScreen(Screen):
         self.notify("🔄 Actualizando visitas...", severity="information")
         self.load_visitas()
 
+    def action_load_more(self) -> None:
+        """Append the next page of visits"""
+        self.load_visitas(more=True)
+
     def action_new_visit(self) -> None:
         """Create new visit"""
         from .simple_create_visit import SimpleCreateVisitScreen
@@ -0,0 +1,80 @@
+"""
+Fixtures compartidas para las pruebas con pytest.
+
+Cada prueba obtiene una app Flask mínima (sin SocketIO ni Bully) apuntando a
+una BD SQLite temporal, con el esquema creado y migrado igual que en un nodo.
+"""
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+os.environ.setdefault('NODE_ID', '1')
+
+from flask import Flask  # noqa: E402
+
+from config import Config  # noqa: E402
+from availability import availability  # noqa: E402
+from cluster_client import breakers  # noqa: E402
+from db_utils import init_read_engine, init_read_requests  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from models import db, Sala, Doctor, Cama, Paciente, TrabajadorSocial  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def reset_breakers():
+    """Cada prueba empieza con todos los circuit breakers cerrados."""
+    breakers.reset()
+    yield
+    breakers.reset()
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App Flask con BD temporal en tmp_path (contexto de app activo)."""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['NODE_ID'] = 1
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'emergency_sala1.db'}"
+    app.config['TESTING'] = True
+    db.init_app(app)
+    init_read_requests(app)
+    lectura = init_read_engine(app)
+
+    with app.app_context():
+        db.create_all()
+        run_migrations(db.engine)
+        availability.load()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+        lectura.dispose()
+
+
+@pytest.fixture
+def seeded(app):
+    """Sala 1 con 3 doctores, 4 camas, 2 pacientes y 1 trabajador social."""
+    db.session.add(Sala(id_sala=1, numero=1, ip_address='localhost', puerto=5555))
+    db.session.add_all([
+        Doctor(id_doctor=1, nombre='Dr. Juan Pérez', especialidad='Cardiología', id_sala=1),
+        Doctor(id_doctor=2, nombre='Dra. María García', especialidad='Pediatría', id_sala=1),
+        Doctor(id_doctor=3, nombre='Dr. Carlos López', especialidad='Cardiología', id_sala=1),
+    ])
+    db.session.add_all([Cama(id_cama=i, numero=i, id_sala=1) for i in range(1, 5)])
+    db.session.add_all([
+        Paciente(id_paciente=1, nombre='José Hernández', curp='HEMJ800101HDFRRS01'),
+        Paciente(id_paciente=2, nombre='Ana Torres', curp='TOAA900202MDFRRN02'),
+    ])
+    db.session.add(TrabajadorSocial(id_trabajador=1, nombre='Ana López', id_sala=1))
+    db.session.commit()
+    return app
+
+
+@pytest.fixture
+def client(seeded):
+    """Cliente HTTP de prueba con la API inter-nodos (/api/cluster) registrada."""
+    from routes.cluster_api import cluster_api_bp
+    seeded.register_blueprint(cluster_api_bp)
+    return seeded.test_client()
@@ -0,0 +1,130 @@
+"""
+Pruebas de la cola de admisión de create-visit (admission.py): las
+peticiones simultáneas se crean en un solo commit y una sola entrada del log
+de replicación, cada una con su propio resultado, y un lote que choca con
+otro escritor se reintenta petición por petición.
+"""
+import json
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import event
+
+import models
+from admission import Pedido, admission
+from config import Config
+from idempotency import idempotency
+from models import db, EntradaReplicacion, VisitaEmergencia
+from replication_log import replication_log
+
+
+class Lider:
+    node_id = 1
+
+    def get_current_leader(self):
+        return 1
+
+
+@pytest.fixture
+def lider(client, monkeypatch):
+    """Nodo 1 líder sin seguidores; cada lote espera hasta 5 s a llenarse"""
+    monkeypatch.setattr(models, 'otros_nodos', lambda bully: [])
+    monkeypatch.setattr(Config, 'REPLICATION_QUORUM', 0)
+    monkeypatch.setattr(Config, 'ADMISSION_BATCH_WINDOW', 5.0)
+    replication_log.start(client.application, Lider())
+    admission.reset()
+    idempotency.reset()
+    yield client
+    replication_log.stop()
+    admission.reset()
+    idempotency.reset()
+
+
+def _en_paralelo(client, monkeypatch, cuerpos):
+    """Envía todos los cuerpos a la vez; el lote se cierra al llegar el último"""
+    monkeypatch.setattr(Config, 'ADMISSION_BATCH_SIZE', len(cuerpos))
+    with ThreadPoolExecutor(len(cuerpos)) as pool:
+        return list(pool.map(lambda c: client.post('/api/cluster/create-visit', json=c), cuerpos))
+
+
+def _visita(id_doctor, id_cama, **extra):
+    return {'id_paciente': 1, 'id_doctor': id_doctor, 'id_cama': id_cama, 'id_trabajador': 1, 'id_sala': 1,
+            'sintomas': 'Dolor', **extra}
+
+
+def test_batch_is_one_commit_and_one_log_entry_with_per_request_results(lider, monkeypatch):
+    respuestas = _en_paralelo(lider, monkeypatch, [_visita(1, 1), _visita(2, 2), _visita(3, 3),
+                                                   _visita(1, 4), _visita(99, 4)])
+
+    assert Counter(r.status_code for r in respuestas) == {201: 3, 409: 1, 404: 1}
+    assert respuestas[4].json['error'] == 'Doctor 99 not found'
+    creadas = [r.json for r in respuestas if r.status_code == 201]
+    assert len({r['folio'] for r in creadas}) == 3
+    assert all(r['replication'] is not None for r in creadas)
+
+    entradas = EntradaReplicacion.query.all()
+    assert len(entradas) == 1
+    datos = json.loads(entradas[0].datos)
+    assert sorted(v['folio'] for v in datos['visitas']) == sorted(r['folio'] for r in creadas)
+    assert len(datos['doctores']) == 3 and len(datos['camas']) == 3
+
+    metricas = lider.get('/api/cluster/admission').json
+    assert metricas['batches'] == 1 and metricas['requests'] == 5 and metricas['created'] == 3
+    assert metricas['max_batch'] == 5 and metricas['fallbacks'] == 0
+
+
+def test_same_key_twice_in_a_batch_creates_one_visit(lider, monkeypatch):
+    respuestas = _en_paralelo(lider, monkeypatch, [_visita(1, 1, idempotency_key='k1'),
+                                                   _visita(2, 2, idempotency_key='k1')])
+
+    assert [r.status_code for r in respuestas] == [201, 201]
+    assert respuestas[0].json['folio'] == respuestas[1].json['folio']
+    assert sum(bool(r.json.get('idempotent_replay')) for r in respuestas) == 1
+    assert VisitaEmergencia.query.count() == 1
+
+
+def _con_cama_ocupada_antes_del_flush(id_cama, funcion):
+    """Ejecuta `funcion` mientras otra transacción ocupa la cama justo antes del primer flush del lote"""
+    session_cls = type(db.session())
+    hecho = []
+    lock = threading.Lock()
+
+    def ocupar_cama(session, flush_context, instances):
+        with lock:
+            if hecho or not any(isinstance(o, VisitaEmergencia) for o in session.new):
+                return
+            hecho.append(True)
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(f'UPDATE CAMAS SET ocupada = 1, version = version + 1 WHERE id_cama = {id_cama}')
+
+    event.listen(session_cls, 'before_flush', ocupar_cama)
+    try:
+        return funcion()
+    finally:
+        event.remove(session_cls, 'before_flush', ocupar_cama)
+
+
+def test_conflicting_batch_falls_back_to_one_by_one(lider, monkeypatch):
+    """Otra transacción ocupa la cama 3 entre la validación del lote y su flush"""
+    respuestas = _con_cama_ocupada_antes_del_flush(3, lambda: _en_paralelo(
+        lider, monkeypatch, [_visita(1, 1), _visita(2, 2), _visita(3, 3)]))
+
+    assert [r.status_code for r in respuestas] == [201, 201, 409]
+    assert VisitaEmergencia.query.count() == 2
+    assert EntradaReplicacion.query.count() == 2  # una por visita al reintentar
+    metricas = admission.metrics()
+    assert metricas['fallbacks'] == 1
+    assert metricas['batches'] == 1 and metricas['requests'] == 3 and metricas['avg_batch'] == 3
+
+
+def test_in_batch_conflict_is_retried_when_the_batch_rolls_back(lider):
+    """El doctor 1 se lo llevó el primer pedido del lote, que al reintentarse solo no consigue su cama"""
+    pedidos = [Pedido(_visita(1, 1)), Pedido(_visita(1, 2))]
+    _con_cama_ocupada_antes_del_flush(1, lambda: admission._procesar(pedidos))
+
+    assert [p.status for p in pedidos] == [409, 201]
+    assert 'Bed 1' in pedidos[0].respuesta['error']
+    assert [(v.id_doctor, v.id_cama) for v in VisitaEmergencia.query.all()] == [(1, 2)]
+    assert admission.metrics()['fallbacks'] == 1
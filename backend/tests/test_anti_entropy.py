@@ -0,0 +1,193 @@
+"""
+Pruebas de la anti-entropía (anti_entropy.py): árbol de Merkle incremental
+igual al construido desde cero, reparación de sólo las cubetas distintas
+contra el líder y presupuesto de bytes por ronda.
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import models
+from anti_entropy import AntiEntropy, _Arbol, anti_entropy, cubeta, filas_locales, llave_fila, FANOUT
+from config import Config
+from models import db, Doctor, VisitaEmergencia
+from replication_log import fila_visita, replication_log
+
+HACE_UN_DIA = (datetime.utcnow() - timedelta(days=1)).replace(microsecond=0)
+
+
+class Lider:
+    def get_current_leader(self):
+        return 2
+
+
+@pytest.fixture(autouse=True)
+def limpiar():
+    anti_entropy.reset()
+    yield
+    anti_entropy.reset()
+    anti_entropy.bully_manager = None
+
+
+@pytest.fixture
+def lider_falso(monkeypatch):
+    """Nodo 2 como líder con las filas de `remoto` ({tabla: [filas]}); cuenta las filas que entrega"""
+    remoto = {'visitas': [], 'doctores': [], 'camas': []}
+    entregadas = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def _responder(self, payload):
+            cuerpo = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def _arbol(self, tabla):
+            return _Arbol({llave_fila(tabla, f): f for f in remoto[tabla]})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.endswith('/roots'):
+                return self._responder({'roots': {t: self._arbol(t).raiz() for t in remoto}})
+            args = {k: v[0] for k, v in parse_qs(url.query).items()}
+            arbol, nivel = self._arbol(args['table']), int(args['level'])
+            padres = [int(p) for p in args['parents'].split(',')] if nivel == 2 else [0]
+            self._responder({'children': {str(p): arbol.hijos(nivel, p) for p in padres}})
+
+        def do_POST(self):
+            pedido = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            filas = [f for f in remoto[pedido['table']]
+                     if cubeta(llave_fila(pedido['table'], f)) in pedido['buckets']]
+            entregadas.extend(filas)
+            self._responder({'rows': filas})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(models, 'get_leader_flask_url', lambda bully: (2, f'http://127.0.0.1:{server.server_address[1]}'))
+    anti_entropy.bully_manager = Lider()
+    yield remoto, entregadas
+    server.shutdown()
+    server.server_close()
+
+
+def _visita(folio, estado='activa', id_doctor=1):
+    cerrada = estado != 'activa'
+    return VisitaEmergencia(folio=folio, id_paciente=1, id_doctor=id_doctor, id_cama=1, id_trabajador=1, id_sala=1,
+                            sintomas='Dolor', estado=estado, diagnostico='Gastritis' if cerrada else None,
+                            timestamp=HACE_UN_DIA, fecha_cierre=HACE_UN_DIA + timedelta(hours=1) if cerrada else None)
+
+
+def _copia(tabla):
+    return [dict(f) for f in filas_locales(tabla).values()]
+
+
+def test_incremental_tree_matches_full_rebuild(seeded):
+    db.session.add_all([_visita(f'F{i}') for i in range(40)])
+    db.session.commit()
+    raices = anti_entropy.raices()
+
+    visita = VisitaEmergencia.query.filter_by(folio='F7').one()
+    visita.estado, visita.diagnostico, visita.fecha_cierre = 'completada', 'Gripe', datetime.utcnow()
+    db.session.delete(VisitaEmergencia.query.filter_by(folio='F8').one())
+    db.session.add(_visita('F40'))
+    db.session.get(Doctor, 2).disponible = False
+    db.session.commit()
+
+    nuevas = anti_entropy.raices()
+    assert nuevas['visitas'] != raices['visitas'] and nuevas['doctores'] != raices['doctores']
+    assert nuevas['camas'] == raices['camas']
+    assert nuevas == AntiEntropy().raices()
+
+    # Las visitas que el archivo ya puede mover no cuentan
+    vieja = _visita('VIEJA', 'completada')
+    vieja.timestamp = vieja.fecha_cierre = datetime.utcnow() - timedelta(days=Config.ARCHIVE_AFTER_DAYS + 2)
+    db.session.add(vieja)
+    db.session.commit()
+    assert anti_entropy.raices() == nuevas
+
+
+def test_round_repairs_only_differing_buckets(seeded, lider_falso, monkeypatch):
+    remoto, entregadas = lider_falso
+    reenviados = []
+    monkeypatch.setattr(replication_log, 'reenviar', reenviados.extend)
+
+    db.session.add_all([_visita(f'F{i}') for i in range(200)])
+    db.session.add_all([_visita('ACTIVA'), _visita('CERRADA_AQUI', 'completada'), _visita('SOLO_AQUI')])
+    db.session.commit()
+    remoto['doctores'], remoto['camas'] = _copia('doctores'), _copia('camas')
+    remoto['visitas'] = [f for f in _copia('visitas') if f['folio'] != 'SOLO_AQUI']
+    for fila in remoto['visitas']:
+        if fila['folio'] == 'ACTIVA':
+            fila.update(estado='cancelada', diagnostico='Alta voluntaria', fecha_cierre=fila['timestamp'])
+        elif fila['folio'] == 'CERRADA_AQUI':
+            fila.update(estado='activa', diagnostico=None, fecha_cierre=None)
+    nueva = fila_visita(_visita('SOLO_EN_LIDER', id_doctor=2))
+    remoto['visitas'].append(nueva)
+    remoto['doctores'][1]['disponible'] = False
+    remoto['doctores'].append({'id_doctor': 99, 'disponible': True, 'activo': True})
+
+    ronda = anti_entropy.sincronizar()
+
+    assert not ronda['in_sync'] and not ronda['budget_exhausted']
+    assert ronda['tables']['camas']['in_sync']
+    assert 1 <= ronda['tables']['visitas']['differing_buckets'] <= 4
+    assert len(entregadas) < 30  # no las 205 visitas
+    assert VisitaEmergencia.query.filter_by(folio='ACTIVA').one().estado == 'cancelada'
+    assert VisitaEmergencia.query.filter_by(folio='SOLO_EN_LIDER').one().id_doctor == 2
+    assert db.session.get(Doctor, 2).disponible is False
+    assert sorted((tipo, datos['visitas'][0]['folio']) for tipo, datos in reenviados) == [
+        ('visita_cerrada', 'CERRADA_AQUI'), ('visita_creada', 'SOLO_AQUI')]
+    metricas = anti_entropy.metrics()
+    assert (metricas['rows_pulled'], metricas['rows_pushed'], metricas['rows_unresolved']) == (3, 2, 1)
+    assert metricas['bytes'] == ronda['bytes'] > 0
+
+    # Sólo quedan distintas las cubetas de lo reenviado (el líder falso no lo guarda)
+    ronda = anti_entropy.sincronizar()
+    assert ronda['tables']['visitas']['differing_buckets'] == len({cubeta('CERRADA_AQUI'), cubeta('SOLO_AQUI')})
+    assert anti_entropy.metrics()['rows_pulled'] == 3
+
+
+def test_round_stops_at_bandwidth_budget(seeded, lider_falso, monkeypatch):
+    remoto, entregadas = lider_falso
+    monkeypatch.setattr(Config, 'ANTI_ENTROPY_BUDGET_KB', 1)
+    db.session.add_all([_visita(f'F{i}') for i in range(50)])
+    db.session.commit()
+    remoto['doctores'], remoto['camas'] = _copia('doctores'), _copia('camas')
+    remoto['visitas'] = _copia('visitas')[:-FANOUT]
+
+    ronda = anti_entropy.sincronizar()
+
+    assert ronda['budget_exhausted'] and not ronda['in_sync']
+    assert ronda['tables']['visitas']['repaired_buckets'] == 0 and entregadas == []
+    assert anti_entropy.metrics()['budget_exhausted'] == 1
+    assert VisitaEmergencia.query.count() == 50
+
+
+def test_anti_entropy_endpoints(client):
+    db.session.add_all([_visita(f'F{i}') for i in range(5)])
+    db.session.commit()
+
+    raices = client.get('/api/cluster/anti-entropy/roots').json['roots']
+    assert raices == anti_entropy.raices()
+    hijos = client.get('/api/cluster/anti-entropy/tree', query_string={'table': 'visitas', 'level': 1}).json
+    assert len(hijos['children']['0']) == FANOUT
+    padre = cubeta('F3') // FANOUT
+    hojas = client.get('/api/cluster/anti-entropy/tree',
+                       query_string={'table': 'visitas', 'level': 2, 'parents': str(padre)}).json
+    assert hojas['children'][str(padre)][cubeta('F3') % FANOUT] == anti_entropy.arbol('visitas').hoja(cubeta('F3'))
+
+    filas = client.post('/api/cluster/anti-entropy/rows', json={'table': 'visitas', 'buckets': [cubeta('F3')]}).json
+    assert 'F3' in {f['folio'] for f in filas['rows']}
+    assert client.post('/api/cluster/anti-entropy/rows', json={'table': 'pacientes', 'buckets': [0]}).status_code == 400
+    estado = client.get('/api/cluster/anti-entropy').json
+    assert estado['local']['visitas']['rows'] == 5 and estado['rounds'] == 0
@@ -0,0 +1,112 @@
+"""
+Pruebas del archivo de visitas cerradas: movimiento por lotes a tablas
+mensuales, búsqueda por folio transparente y totales precalculados.
+"""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.serving import make_server
+
+import models
+
+from archive import archive_visits, folio_existe, get_totales_archivo, get_visita_por_folio, meses_archivados
+from models import db, VisitaEmergencia, get_all_cluster_stats, get_contadores_sala
+
+
+@pytest.fixture
+def historial(seeded):
+    """8 visitas viejas (ene/feb 2025) cerradas, 1 vieja activa y 1 completada reciente."""
+    viejas = [datetime(2025, 1, 10, 9, 0) + timedelta(days=7 * i) for i in range(8)]
+    for i, ts in enumerate(viejas):
+        db.session.add(VisitaEmergencia(
+            folio=f'1+1+1+{i + 1:03d}', id_paciente=i % 2 + 1, id_doctor=1, id_cama=1, id_trabajador=1,
+            id_sala=1, sintomas='Dolor', estado='cancelada' if i == 0 else 'completada',
+            timestamp=ts, fecha_cierre=ts + timedelta(hours=2)))
+    db.session.add(VisitaEmergencia(folio='1+2+1+100', id_paciente=1, id_doctor=2, id_cama=2, id_trabajador=1,
+                                    id_sala=1, sintomas='Fiebre', estado='activa', timestamp=viejas[0]))
+    db.session.add(VisitaEmergencia(folio='1+3+1+200', id_paciente=2, id_doctor=3, id_cama=3, id_trabajador=1,
+                                    id_sala=1, sintomas='Tos', estado='completada',
+                                    timestamp=datetime.utcnow() - timedelta(days=1),
+                                    fecha_cierre=datetime.utcnow()))
+    db.session.commit()
+    return seeded
+
+
+def test_archives_old_closed_visits_in_batches(historial):
+    assert archive_visits(dias=90, batch_size=3) == 8
+    db.session.expire_all()
+
+    restantes = {v.folio for v in VisitaEmergencia.query}
+    assert restantes == {'1+2+1+100', '1+3+1+200'}
+    assert meses_archivados() == ['202502', '202501']
+
+    # Los triggers de CONTADORES_SALA siguen describiendo la tabla caliente
+    contadores = get_contadores_sala(1)
+    assert contadores['visitas_activas'] == 1
+    assert contadores['visitas_completadas'] == 1
+
+    # Una segunda pasada no encuentra nada nuevo
+    assert archive_visits(dias=90) == 0
+
+
+def test_max_batches_is_incremental(historial):
+    assert archive_visits(dias=90, batch_size=3, max_batches=1) == 3
+    assert archive_visits(dias=90, batch_size=3) == 5
+    assert get_totales_archivo(1) == {'completada': 7, 'cancelada': 1, 'total': 8}
+
+
+def test_folio_lookup_falls_through_to_archive(historial):
+    archive_visits(dias=90)
+
+    visita, archivada = get_visita_por_folio('1+1+1+002')
+    assert archivada
+    assert visita.paciente_nombre == 'Ana Torres'
+    assert visita.timestamp == datetime(2025, 1, 17, 9, 0)
+    assert visita.to_dict()['doctor'] == 'Dr. Juan Pérez'
+
+    visita, archivada = get_visita_por_folio('1+2+1+100')
+    assert visita.estado == 'activa' and not archivada
+
+    assert get_visita_por_folio('no-existe') == (None, False)
+    assert folio_existe('1+1+1+001') and folio_existe('1+3+1+200')
+    assert not folio_existe('no-existe')
+
+
+def test_cluster_api_uses_archive(historial, client):
+    archive_visits(dias=90)
+
+    stats = client.get('/api/cluster/stats').get_json()
+    assert stats['visits']['completed'] == 1
+    assert stats['visits']['archived']['total'] == 8
+
+    resp = client.get('/api/cluster/visits/1+1+1+004')
+    assert resp.status_code == 200
+    assert resp.get_json()['visit']['archivada'] is True
+    assert client.get('/api/cluster/visits/9+9+9+999').status_code == 404
+
+    # Una réplica tardía de una visita ya archivada no se vuelve a insertar
+    resp = client.post('/api/cluster/replicate-visit', json={
+        'folio': '1+1+1+004', 'id_paciente': 2, 'id_doctor': 1, 'id_cama': 1, 'id_trabajador': 1,
+        'id_sala': 1, 'sintomas': 'Dolor', 'estado': 'completada'})
+    assert resp.get_json()['message'] == 'Visit already exists'
+    assert VisitaEmergencia.query.filter_by(folio='1+1+1+004').count() == 0
+
+
+def test_cluster_stats_keep_archived_visits(historial, client, monkeypatch):
+    """La misma app como nodo local (1) y como nodo remoto (2) por HTTP real"""
+    server = make_server('127.0.0.1', 0, client.application, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(models, 'otros_nodos', lambda bully: [(2, f'http://127.0.0.1:{server.server_port}')])
+    try:
+        antes = get_all_cluster_stats(None)
+        archive_visits(dias=90)
+        despues = get_all_cluster_stats(None)
+    finally:
+        server.shutdown()
+
+    assert [n['status'] for n in despues['nodes']] == ['local', 'online']
+    assert antes['total_visits_completed'] == despues['total_visits_completed'] == 2 * 8
+    assert antes['total_visits_active'] == despues['total_visits_active'] == 2 * 1
+    assert antes['total_visits_archived'] == 0
+    assert despues['total_visits_archived'] == 2 * 8
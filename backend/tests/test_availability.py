@@ -0,0 +1,105 @@
+"""
+Pruebas del índice en memoria de disponibilidad (availability.py).
+
+Tras cada commit el índice debe coincidir con lo que diría la BD.
+"""
+from datetime import datetime
+
+from availability import availability
+from models import db, Doctor, Cama, get_doctores_disponibles, get_camas_disponibles
+
+
+def libres_en_bd(id_sala):
+    doctores = [d.id_doctor for d in Doctor.query.filter_by(id_sala=id_sala, disponible=True, activo=True)
+                .order_by(Doctor.id_doctor)]
+    camas = [c.id_cama for c in Cama.query.filter_by(id_sala=id_sala, ocupada=False).order_by(Cama.id_cama)]
+    return doctores, camas
+
+
+def libres_en_indice(id_sala):
+    return ([d.id_doctor for d in get_doctores_disponibles(id_sala=id_sala)],
+            [c.id_cama for c in get_camas_disponibles(id_sala=id_sala)])
+
+
+def test_loaded_at_startup(seeded):
+    availability.load()
+    assert libres_en_indice(1) == libres_en_bd(1) == ([1, 2, 3], [1, 2, 3, 4])
+    assert availability.count_doctores(1) == 3
+    assert availability.count_camas(1) == 4
+    assert availability.count_doctores(1, especialidad='Cardiología') == 2
+    assert availability.especialidades(1) == ['Cardiología', 'Pediatría']
+
+
+def test_pick_returns_free_resources(seeded):
+    doctor = availability.pick_doctor(1, especialidad='Pediatría')
+    assert (doctor.id_doctor, doctor.nombre) == (2, 'Dra. María García')
+    assert availability.pick_cama(1).id_cama in {1, 2, 3, 4}
+    assert availability.pick_doctor(1, excluir={1, 2, 3}) is None
+    assert availability.pick_doctor(99) is None
+    assert availability.pick_cama(99) is None
+
+
+def test_commit_updates_index(seeded):
+    db.session.get(Doctor, 1).disponible = False
+    db.session.get(Cama, 2).ocupada = True
+    db.session.add(Doctor(id_doctor=4, nombre='Dr. Nuevo', especialidad='Pediatría', id_sala=1))
+    db.session.add(Cama(id_cama=5, numero=5, id_sala=1))
+    db.session.flush()
+    # Antes del commit el índice no cambia
+    assert availability.is_doctor_disponible(1)
+    db.session.commit()
+
+    assert libres_en_indice(1) == libres_en_bd(1) == ([2, 3, 4], [1, 3, 4, 5])
+    assert availability.count_doctores(1, especialidad='Pediatría') == 2
+    assert not availability.is_cama_disponible(2)
+
+
+def test_rollback_discards_changes(seeded):
+    db.session.get(Doctor, 1).disponible = False
+    db.session.flush()
+    db.session.rollback()
+    assert availability.is_doctor_disponible(1)
+    assert libres_en_indice(1) == libres_en_bd(1)
+
+
+def test_deactivate_move_and_delete(seeded):
+    db.session.get(Doctor, 1).activo = False
+    db.session.get(Doctor, 2).id_sala = 2
+    db.session.delete(db.session.get(Cama, 4))
+    db.session.commit()
+
+    assert libres_en_indice(1) == libres_en_bd(1) == ([3], [1, 2, 3])
+    assert libres_en_indice(2) == libres_en_bd(2) == ([2], [])
+    assert availability.count_doctores(1, especialidad='Pediatría') == 0
+
+
+def test_release_after_close(seeded):
+    doctor = db.session.get(Doctor, 3)
+    doctor.disponible = False
+    db.session.commit()
+    assert 3 not in libres_en_indice(1)[0]
+
+    doctor.disponible = True
+    db.session.commit()
+    assert libres_en_indice(1) == libres_en_bd(1)
+    assert availability.count_doctores(1, especialidad='Cardiología') == 2
+
+
+def test_replicated_visit_occupies_resources(client):
+    response = client.post('/api/cluster/replicate-visit', json={
+        'folio': '1+2+1+001', 'id_paciente': 1, 'id_doctor': 2, 'id_cama': 3, 'id_trabajador': 1,
+        'id_sala': 1, 'sintomas': 'Fiebre', 'estado': 'activa',
+        'timestamp': datetime.utcnow().isoformat()
+    })
+    assert response.status_code == 201
+    assert not availability.is_doctor_disponible(2)
+    assert not availability.is_cama_disponible(3)
+    assert libres_en_indice(1) == libres_en_bd(1)
+
+
+def test_listing_all_salas(seeded):
+    db.session.add(Doctor(id_doctor=10, nombre='Dr. Sala 2', especialidad='Cardiología', id_sala=2))
+    db.session.commit()
+    assert [d.id_doctor for d in get_doctores_disponibles()] == [1, 2, 3, 10]
+    assert [d.id_doctor for d in get_doctores_disponibles(especialidad='Cardiología')] == [1, 3, 10]
+    assert len(get_camas_disponibles()) == 4
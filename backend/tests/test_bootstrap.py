@@ -0,0 +1,124 @@
+"""
+Pruebas del arranque desde un snapshot del líder (bootstrap.py): copia
+completa con el seq del log, reintento de trozos corruptos y que una
+descarga inválida no toque la BD local.
+"""
+import threading
+from datetime import datetime
+
+import pytest
+import requests
+from flask import Flask
+from werkzeug.serving import make_server
+
+import bootstrap as bootstrap_mod
+from bootstrap import bd_vacia, bootstrap, bootstrap_si_hace_falta, snapshots
+from config import Config
+from migrations import run_migrations
+from models import db, EntradaReplicacion, Paciente, Sala, VisitaEmergencia
+from replication_log import replication_log
+
+
+@pytest.fixture
+def lider(tmp_path, monkeypatch):
+    """Nodo 2 con 30 visitas y 12 entradas del log, servido por HTTP; yields su URL"""
+    monkeypatch.setattr(Config, 'BOOTSTRAP_CHUNK_KB', 4)  # varios trozos aun con una BD chica
+    app = Flask('lider')
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'emergency_sala2.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        run_migrations(db.engine)
+        db.session.add(Sala(id_sala=2, numero=2, ip_address='localhost', puerto=5556))
+        db.session.add(Paciente(id_paciente=1, nombre='José Hernández', curp='HEMJ800101HDFRRS01'))
+        db.session.add_all([VisitaEmergencia(folio=f'2+1+1+{i:04d}', id_paciente=1, id_doctor=1, id_cama=1,
+                                             id_trabajador=1, id_sala=2, sintomas='x' * 200, estado='activa',
+                                             timestamp=datetime.utcnow()) for i in range(30)])
+        db.session.add_all([EntradaReplicacion(seq=i, tipo='visita_creada', datos='{}', id_origen=2, id_lider=2)
+                            for i in range(1, 13)])
+        db.session.commit()
+        db.session.remove()
+
+    from routes.cluster_api import cluster_api_bp
+    app.register_blueprint(cluster_api_bp)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_bootstrap_copies_leader_database_and_log_position(seeded, lider):
+    seeded.extensions['snapshot_cache'] = object()
+    assert bd_vacia()
+
+    resumen = bootstrap(seeded, 2, lider)
+
+    assert resumen['chunks'] > 1 and resumen['seq'] == 12
+    assert VisitaEmergencia.query.count() == 30
+    assert {s.id_sala for s in Sala.query} == {2}
+    assert replication_log.ultimo_seq() == 12
+    assert 'snapshot_cache' not in seeded.extensions
+    assert not bd_vacia()
+    assert snapshots._snapshots == {}  # borrado en el líder al terminar
+    # La BD sigue en WAL para el engine de lectura
+    assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+
+
+def test_corrupted_chunk_is_retried(seeded, lider, monkeypatch):
+    original = requests.Session.get
+    corrompidos = []
+
+    def get(self, url, **kwargs):
+        r = original(self, url, **kwargs)
+        if url.endswith('/1') and not corrompidos:
+            corrompidos.append(url)
+            r._content = b'\0' + r.content[1:]
+        return r
+
+    monkeypatch.setattr(requests.Session, 'get', get)
+
+    assert bootstrap(seeded, 2, lider)['seq'] == 12
+    assert len(corrompidos) == 1
+    assert VisitaEmergencia.query.count() == 30
+
+
+def test_persistently_corrupted_chunk_leaves_local_database_untouched(seeded, lider, monkeypatch):
+    original = requests.Session.get
+
+    def get(self, url, **kwargs):
+        r = original(self, url, **kwargs)
+        if url.endswith('/0'):
+            r._content = r.content[:-1] + b'!'
+        return r
+
+    monkeypatch.setattr(requests.Session, 'get', get)
+
+    with pytest.raises(RuntimeError, match='Trozo 0'):
+        bootstrap(seeded, 2, lider)
+    assert {s.id_sala for s in Sala.query} == {1}
+    assert VisitaEmergencia.query.count() == 0
+
+
+def test_startup_bootstrap_only_for_empty_database_with_another_leader(seeded, monkeypatch):
+    llamadas = []
+    monkeypatch.setattr(bootstrap_mod, 'bootstrap', lambda app, lider, url: llamadas.append(lider) or {})
+    monkeypatch.setattr('models.get_leader_flask_url', lambda bully: (2, 'http://lider'))
+
+    class Bully:
+        def __init__(self, lider):
+            self.lider = lider
+
+        def get_current_leader(self):
+            return self.lider
+
+    assert bootstrap_si_hace_falta(seeded, Bully(Config.NODE_ID)) is None
+    assert bootstrap_si_hace_falta(seeded, Bully(2)) == {}
+    assert llamadas == [2]
+
+    db.session.add(EntradaReplicacion(seq=1, tipo='visita_creada', datos='{}', id_origen=2, id_lider=2))
+    db.session.commit()
+    assert bootstrap_si_hace_falta(seeded, Bully(2)) is None
+    assert llamadas == [2]
@@ -0,0 +1,155 @@
+"""
+Pruebas de los circuit breakers por nodo de cluster_client: apertura tras
+fallas seguidas, falla inmediata con el circuito abierto, prueba en
+half_open y eventos de actividad de Bully.
+"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from bully import BullyNode
+from cluster_client import (CLOSED, HALF_OPEN, MAX_WORKERS, OPEN, breakers, request_node, scatter_gather,
+                            watch_bully)
+from config import Config
+
+
+@pytest.fixture(autouse=True)
+def breaker_config(monkeypatch):
+    monkeypatch.setattr(Config, 'BREAKER_FAILURE_THRESHOLD', 3)
+    monkeypatch.setattr(Config, 'BREAKER_RESET_TIMEOUT', 0.2)
+    monkeypatch.setattr(Config, 'CLUSTER_QUERY_DEADLINE', 0.5)
+
+
+def _puerto_cerrado():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return f'http://127.0.0.1:{s.getsockname()[1]}'
+
+
+@pytest.fixture
+def nodo():
+    """Servidor cuyo código de respuesta se controla con estado['status']"""
+    estado = {'status': 500}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            payload = json.dumps({'ok': True}).encode()
+            self.send_response(estado['status'])
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    estado['url'] = f'http://127.0.0.1:{server.server_address[1]}'
+    yield estado
+    server.shutdown()
+    server.server_close()
+
+
+def test_opens_after_consecutive_failures_and_fails_fast():
+    url = _puerto_cerrado()
+    for _ in range(3):
+        assert request_node(2, url, '/api/cluster/health').status == 'offline'
+    assert breakers.state(2) == OPEN
+
+    inicio = time.monotonic()
+    respuesta, = scatter_gather([(2, url)], '/api/cluster/health')
+    assert respuesta.status == 'circuit_open'
+    assert time.monotonic() - inicio < 0.01
+
+    # Pasada la espera se permite UNA prueba; si falla se vuelve a abrir
+    time.sleep(0.25)
+    assert request_node(2, url, '/api/cluster/health').status == 'offline'
+    assert breakers.state(2) == OPEN
+    assert [(t['from'], t['to']) for t in breakers.snapshot()['transitions']] == [
+        (CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, OPEN)]
+
+
+def test_half_open_probe_closes_on_recovery(nodo):
+    for _ in range(3):
+        assert request_node(2, nodo['url'], '/x').status == 'error'
+    assert breakers.state(2) == OPEN
+
+    nodo['status'] = 200
+    time.sleep(0.25)
+    assert breakers.allow(2)          # la prueba
+    assert not breakers.allow(2)      # nadie más mientras la prueba está en curso
+    breakers.record(2, True)
+    assert breakers.state(2) == CLOSED
+    assert request_node(2, nodo['url'], '/x').ok
+
+
+def test_client_errors_do_not_open_circuit(nodo):
+    nodo['status'] = 404
+    for _ in range(5):
+        assert request_node(2, nodo['url'], '/x').status == 'error'
+    assert breakers.state(2) == CLOSED
+
+
+def test_requests_queued_behind_a_busy_pool_do_not_count(nodo):
+    """Peticiones que nunca salieron del pool compartido no abren el circuito de un nodo sano"""
+    nodo['status'] = 200
+    liberar = threading.Event()
+
+    class Lento(BaseHTTPRequestHandler):
+        def do_GET(self):
+            liberar.wait(5)
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    lento = ThreadingHTTPServer(('127.0.0.1', 0), Lento)
+    lento.daemon_threads = True
+    threading.Thread(target=lento.serve_forever, daemon=True).start()
+    ocupados = [(100 + i, f'http://127.0.0.1:{lento.server_address[1]}') for i in range(MAX_WORKERS)]
+    relleno = threading.Thread(target=scatter_gather, args=(ocupados, '/lento'), kwargs={'deadline': 3})
+    relleno.start()
+    try:
+        time.sleep(0.2)
+        for _ in range(4):
+            respuesta = request_node(2, nodo['url'], '/api/cluster/health', timeout=0.1)
+            assert respuesta.status == 'timeout' and 'pool ocupado' in respuesta.error
+        assert breakers.state(2) == CLOSED
+        assert {n['node_id']: n['failures'] for n in breakers.snapshot()['nodes']}[2] == 0
+    finally:
+        liberar.set()
+        relleno.join()
+        lento.shutdown()
+        lento.server_close()
+    assert request_node(2, nodo['url'], '/api/cluster/health').ok
+
+
+def test_bully_liveness_events_feed_breakers():
+    bully = BullyNode(node_id=1, cluster_nodes={1: ('127.0.0.1', 0, 0), 2: ('127.0.0.1', 0, 0)},
+                      tcp_port=0, udp_port=0)
+    watch_bully(bully)
+
+    bully._on_node_lost(2)
+    assert breakers.state(2) == OPEN
+    assert request_node(2, 'http://127.0.0.1:1', '/x').status == 'circuit_open'
+
+    # Un heartbeat del nodo permite probarlo sin esperar BREAKER_RESET_TIMEOUT
+    bully.add_node(2, '127.0.0.1', 0, 0)
+    bully._update_node_activity(2)
+    assert breakers.state(2) == HALF_OPEN
+
+
+def test_breakers_endpoint(client):
+    breakers.on_node_event('lost', 3)
+    data = client.get('/api/cluster/breakers').get_json()
+    assert [(n['node_id'], n['state']) for n in data['nodes']] == [(3, OPEN)]
+    assert data['transitions'][-1]['reason'] == 'nodo perdido (discovery)'
+    assert client.get('/api/cluster/stats').get_json()['breakers'][0]['state'] == OPEN
@@ -0,0 +1,109 @@
+"""
+Pruebas de las consultas scatter-gather al cluster: plazo global, estado por
+nodo y resultados parciales con nodos lentos, caídos o con error.
+"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import models
+from cluster_client import scatter_gather
+from config import Config
+from models import get_all_cluster_doctors, get_all_cluster_stats
+
+STATS = {'doctors': {'available': 2, 'total': 3}, 'beds': {'available': 4, 'total': 5},
+         'visits': {'active': 1, 'completed': 7, 'archived': {'completada': 0, 'cancelada': 0, 'total': 0}}}
+RESOURCES = {'node_id': 2, 'epoch': 'e2', 'version': 1, 'beds': [],
+             'doctors': [{'id_doctor': 99, 'nombre': 'Dr. Remoto', 'especialidad': 'General', 'disponible': True,
+                          'activo': True, 'id_sala': 2}]}
+
+
+def _servidor(espera=0.0, status=200):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(espera)
+            if self.path.startswith('/api/cluster/snapshot'):
+                body = {'stats': STATS}
+            elif self.path.startswith('/api/cluster/resources'):
+                body = RESOURCES
+            else:
+                body = {'doctors': [{'id_doctor': 99, 'nombre': 'Dr. Remoto', 'query': self.path}]}
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _puerto_cerrado():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def nodos():
+    """2: responde, 3: lento (1.5 s), 4: HTTP 500, 5: caído"""
+    servidores = {2: _servidor(), 3: _servidor(espera=1.5), 4: _servidor(status=500)}
+    urls = {node_id: f'http://127.0.0.1:{s.server_address[1]}' for node_id, s in servidores.items()}
+    urls[5] = f'http://127.0.0.1:{_puerto_cerrado()}'
+    yield urls
+    for s in servidores.values():
+        s.shutdown()
+        s.server_close()
+
+
+def test_deadline_and_status_per_node(nodos):
+    inicio = time.monotonic()
+    respuestas = scatter_gather(list(nodos.items()), '/api/cluster/doctors', {'activo': 'true'}, deadline=0.5)
+    assert time.monotonic() - inicio < 1.0
+
+    estados = {r.node_id: r.status for r in respuestas}
+    assert estados == {2: 'online', 3: 'timeout', 4: 'error', 5: 'offline'}
+    assert respuestas[0].data['doctors'][0]['query'] == '/api/cluster/doctors?activo=true'
+    assert respuestas[2].to_dict()['error'] == 'HTTP 500'
+
+
+def test_no_nodes_no_requests():
+    assert scatter_gather([], '/api/cluster/doctors') == []
+
+
+class _Bully:
+    def __init__(self, nodos):
+        self.cluster_nodes = {node_id: ('127.0.0.1', 0, 0) for node_id in [1, *nodos]}
+
+
+@pytest.fixture
+def cluster(seeded, nodos, monkeypatch):
+    monkeypatch.setattr(models, 'get_node_flask_url', lambda node_id, host='localhost': nodos[node_id])
+    monkeypatch.setattr(Config, 'CLUSTER_QUERY_DEADLINE', 0.5)
+    return _Bully(nodos)
+
+
+def test_cluster_helpers_return_partial_results(cluster):
+    inicio = time.monotonic()
+    doctores = get_all_cluster_doctors(cluster)
+    assert time.monotonic() - inicio < 1.0
+
+    assert sorted(d['source'] for d in doctores) == ['local'] * 3 + ['node_2']
+    assert doctores.parcial
+    assert {n['node_id']: n['status'] for n in doctores.nodos} == {2: 'online', 3: 'timeout', 4: 'error',
+                                                                  5: 'offline'}
+
+    stats = get_all_cluster_stats(cluster)
+    assert stats['partial']
+    assert [n['status'] for n in stats['nodes']] == ['local', 'online', 'timeout', 'error', 'offline']
+    assert stats['total_doctors'] == 3 + 3
@@ -0,0 +1,139 @@
+"""
+Pruebas de las consultas con filtros, proyección y agregados resueltos en
+cada nodo (cluster_query.py y POST /api/cluster/query).
+"""
+import json
+import socket
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import models
+from cluster_query import QueryError, merge_results, parse_spec, query_cluster, run_spec
+from models import db, Cama, Doctor, Sala, VisitaEmergencia
+
+
+def test_parse_spec_rejects_anything_outside_whitelist():
+    for spec in ({'resource': 'usuarios'},
+                 {'resource': ['doctors']},
+                 {'resource': 'doctors', 'fields': ['password']},
+                 {'resource': 'doctors', 'where': {'nombre; DROP TABLE DOCTORES': 1}},
+                 {'resource': 'doctors', 'where': {'nombre': {'regexp': '.*'}}},
+                 {'resource': 'doctors', 'where': {'nombre': {'in': 'abc'}}},
+                 {'resource': 'doctors', 'where': {'nombre': ['a']}},
+                 {'resource': 'doctors', 'aggregate': 'sum'},
+                 {'resource': 'doctors', 'limit': 0},
+                 {'resource': 'doctors', 'order_by': 'nombre'},
+                 {'resource': 'visits', 'where': {'timestamp': {'gt': 'ayer'}}}):
+        with pytest.raises(QueryError):
+            parse_spec(spec)
+
+
+def test_run_spec_filters_projects_and_aggregates(seeded):
+    spec = parse_spec({'resource': 'doctors', 'where': {'especialidad': 'Cardiología'},
+                       'fields': ['id_doctor', 'sala_numero']})
+    assert run_spec(spec) == [{'id_doctor': 1, 'sala_numero': 1}, {'id_doctor': 3, 'sala_numero': 1}]
+
+    # Los valores van como parámetros, nunca como SQL
+    assert run_spec(parse_spec({'resource': 'doctors', 'where': {'nombre': "x' OR '1'='1"}})) == []
+    assert [d['id_doctor'] for d in run_spec(parse_spec(
+        {'resource': 'doctors', 'where': {'nombre': {'contains': 'ía'}}}))] == [2]
+
+    assert run_spec(parse_spec({'resource': 'doctors', 'group_by': ['especialidad']})) == [
+        {'especialidad': 'Cardiología', 'count': 2}, {'especialidad': 'Pediatría', 'count': 1}]
+    assert run_spec(parse_spec({'resource': 'beds', 'where': {'ocupada': False}, 'aggregate': 'count'})) == [
+        {'count': 4}]
+
+    cama = db.session.get(Cama, 2)
+    cama.ocupada, cama.id_paciente = True, 1
+    db.session.add(VisitaEmergencia(folio='1+1+1+001', id_paciente=1, id_doctor=1, id_cama=2, id_trabajador=1,
+                                    id_sala=1, sintomas='Fiebre', estado='activa',
+                                    timestamp=datetime(2024, 5, 1, 10, 30)))
+    db.session.commit()
+    assert run_spec(parse_spec({'resource': 'beds', 'where': {'ocupada': True},
+                                'fields': ['numero', 'paciente_nombre']})) == [
+        {'numero': 2, 'paciente_nombre': 'José Hernández'}]
+    assert run_spec(parse_spec({'resource': 'visits', 'where': {'timestamp': {'ge': '2024-05-01T10:00:00'}},
+                                'fields': ['folio', 'doctor_nombre', 'timestamp']})) == [
+        {'folio': '1+1+1+001', 'doctor_nombre': 'Dr. Juan Pérez', 'timestamp': '2024-05-01T10:30:00'}]
+
+
+def test_query_endpoint(client):
+    db.session.add(Sala(id_sala=2, numero=2, ip_address='localhost', puerto=5556))
+    db.session.add(Doctor(id_doctor=10, nombre='Dr. Otro', especialidad='Cardiología', id_sala=2))
+    db.session.commit()
+
+    resp = client.post('/api/cluster/query', json={'resource': 'doctors', 'where': {'especialidad': 'Cardiología'},
+                                                   'fields': ['id_doctor']})
+    assert resp.status_code == 200
+    assert resp.get_json()['rows'] == [{'id_doctor': 1}, {'id_doctor': 3}]  # sólo la sala del nodo
+
+    resp = client.post('/api/cluster/query', json={'resource': 'doctors', 'fields': ['password']})
+    assert resp.status_code == 400
+    assert 'password' in resp.get_json()['error']
+
+
+def test_merge_results():
+    spec = parse_spec({'resource': 'doctors', 'group_by': ['especialidad']})
+    assert merge_results(spec, [[{'especialidad': 'Cardiología', 'count': 2}],
+                                [{'especialidad': None, 'count': 1}, {'especialidad': 'Cardiología', 'count': 3}]]) == [
+        {'especialidad': 'Cardiología', 'count': 5}, {'especialidad': None, 'count': 1}]
+    assert merge_results(parse_spec({'resource': 'beds', 'aggregate': 'count'}),
+                         [[{'count': 4}], [{'count': 6}]]) == [{'count': 10}]
+    assert len(merge_results(parse_spec({'resource': 'beds', 'limit': 3}), [[{'id': 1}, {'id': 2}],
+                                                                             [{'id': 3}, {'id': 4}]])) == 3
+
+
+@pytest.fixture
+def nodo2():
+    """Nodo 2 falso: responde /api/cluster/query con un doctor y guarda la especificación recibida"""
+    recibidas = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            recibidas.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            payload = json.dumps({'node_id': 2, 'count': 1, 'rows': [
+                {'id_doctor': 20, 'nombre': 'Dr. Remoto', 'id_sala': 2}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', recibidas
+    server.shutdown()
+    server.server_close()
+
+
+def test_query_cluster_pushes_spec_to_nodes(seeded, monkeypatch, nodo2):
+    # Copia local (posiblemente vieja) de la sala 2
+    db.session.add(Sala(id_sala=2, numero=2, ip_address='localhost', puerto=5556))
+    db.session.add(Doctor(id_doctor=10, nombre='Dr. Copia Local', especialidad='Cardiología', id_sala=2))
+    db.session.commit()
+    spec = {'resource': 'doctors', 'where': {'especialidad': 'Cardiología', 'disponible': True},
+            'fields': ['id_doctor', 'nombre', 'id_sala']}
+
+    url, recibidas = nodo2
+    monkeypatch.setattr(models, 'otros_nodos', lambda bully: [(2, url)])
+    resultado = query_cluster(None, spec)
+    assert recibidas == [{**spec, 'where': {'especialidad': {'eq': 'Cardiología'}, 'disponible': {'eq': True}},
+                          'group_by': [], 'aggregate': None, 'limit': 10000}]
+    assert [(d['id_doctor'], d['source']) for d in resultado] == [(1, 'local'), (3, 'local'), (20, 'node_2')]
+    assert not resultado.parcial
+
+    # Nodo caído: su sala sale de la BD local
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        cerrado = f'http://127.0.0.1:{s.getsockname()[1]}'
+    monkeypatch.setattr(models, 'otros_nodos', lambda bully: [(2, cerrado)])
+    resultado = query_cluster(None, spec)
+    assert [d['id_doctor'] for d in resultado] == [1, 3, 10]
+    assert resultado.parcial
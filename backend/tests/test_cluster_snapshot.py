@@ -0,0 +1,89 @@
+"""
+Pruebas del snapshot por nodo (/api/cluster/snapshot): versión de cambios
+mantenida por triggers, ETag / If-None-Match y peticiones condicionales del
+cliente scatter-gather.
+"""
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from cluster_client import scatter_gather
+from models import db, Cama, Doctor, Sala, TrabajadorSocial, VisitaEmergencia, get_version_sala
+
+
+def test_version_bumps_on_sala_changes(seeded):
+    version = get_version_sala(1)
+    assert version > 0
+
+    db.session.get(Doctor, 1).disponible = False
+    db.session.commit()
+    assert get_version_sala(1) > version
+
+    # Otra sala no cambia la versión de la sala 1
+    version = get_version_sala(1)
+    db.session.add(Sala(id_sala=2, numero=2, ip_address='localhost', puerto=5556))
+    db.session.add(Cama(id_cama=50, numero=1, id_sala=2))
+    db.session.commit()
+    assert get_version_sala(1) == version
+    assert get_version_sala(2) == 1
+
+    db.session.add(VisitaEmergencia(folio='1+1+1+001', id_paciente=1, id_doctor=1, id_cama=1, id_trabajador=1,
+                                    id_sala=1, sintomas='Fiebre', estado='activa'))
+    db.session.commit()
+    version = get_version_sala(1)
+
+    # El snapshot sólo cuenta visitas por estado: el diagnóstico no lo cambia
+    visita = VisitaEmergencia.query.filter_by(folio='1+1+1+001').one()
+    visita.diagnostico = 'Gripe'
+    db.session.commit()
+    assert get_version_sala(1) == version
+    visita.estado = 'completada'
+    db.session.commit()
+    assert get_version_sala(1) > version
+
+
+def test_snapshot_etag_and_304(client):
+    resp = client.get('/api/cluster/snapshot')
+    assert resp.status_code == 200
+    etag = resp.headers['ETag']
+    data = resp.get_json()
+    assert [d['id_doctor'] for d in data['doctors']] == [1, 2, 3]
+    assert len(data['beds']) == 4
+    assert [t['id_trabajador'] for t in data['social_workers']] == [1]
+    assert data['stats']['doctors'] == {'total': 3, 'available': 3}
+
+    resp = client.get('/api/cluster/snapshot', headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+    assert resp.data == b''
+    assert resp.headers['ETag'] == etag
+
+    db.session.add(TrabajadorSocial(id_trabajador=2, nombre='Luis Ruiz', id_sala=1))
+    db.session.commit()
+    resp = client.get('/api/cluster/snapshot', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != etag
+    assert len(resp.get_json()['social_workers']) == 2
+
+
+@pytest.fixture
+def nodo(client, seeded):
+    """La app de prueba servida por HTTP real, como nodo remoto 2"""
+    server = make_server('127.0.0.1', 0, seeded, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield [(2, f'http://127.0.0.1:{server.server_port}')]
+    server.shutdown()
+
+
+def test_conditional_requests_reuse_parsed_snapshot(nodo):
+    primera, = scatter_gather(nodo, '/api/cluster/snapshot', conditional=True)
+    segunda, = scatter_gather(nodo, '/api/cluster/snapshot', conditional=True)
+    assert primera.ok and not primera.not_modified
+    assert segunda.ok and segunda.not_modified
+    assert segunda.data is primera.data
+
+    db.session.get(Cama, 2).ocupada = True
+    db.session.commit()
+    tercera, = scatter_gather(nodo, '/api/cluster/snapshot', conditional=True)
+    assert not tercera.not_modified
+    assert tercera.data['stats']['beds'] == {'total': 4, 'available': 3}
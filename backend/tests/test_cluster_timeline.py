@@ -0,0 +1,136 @@
+"""
+Pruebas de la línea de tiempo de visitas del cluster (cluster_timeline.py):
+merge de K vías entre salas, paginación con cursor global y páginas pedidas
+sólo a los nodos que siguen compitiendo.
+"""
+import json
+import socket
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import cluster_timeline
+from cluster_timeline import get_cluster_timeline
+from models import db, Sala, VisitaEmergencia, VISITAS_ORDEN
+from pagination import CursorError, decode_cursor, encode_cursor
+
+INICIO = datetime(2024, 5, 1, 8, 0)
+
+
+def _fila(id_sala, id_visita, minutos):
+    return {'id_visita': id_visita, 'folio': f'{id_sala}-{id_visita}', 'id_sala': id_sala, 'estado': 'activa',
+            'paciente_nombre': 'P', 'doctor_nombre': 'D',
+            'timestamp': (INICIO + timedelta(minutes=minutos)).isoformat()}
+
+
+@pytest.fixture
+def nodos_falsos():
+    """Crea nodos que sirven /api/cluster/visits paginado desde una lista en memoria"""
+    servidores = []
+
+    def crear(id_sala, filas):
+        filas = sorted(filas, key=lambda f: (f['timestamp'], f['id_visita']), reverse=True)
+        pedidas = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                args = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                limit = int(args.get('limit', 50))
+                pagina = filas
+                if 'cursor' in args:
+                    ts, id_visita = decode_cursor(args['cursor'], VISITAS_ORDEN)
+                    pagina = [f for f in filas
+                              if (datetime.fromisoformat(f['timestamp']), f['id_visita']) < (ts, id_visita)]
+                pedidas.append(limit)
+                siguiente = None
+                if len(pagina) > limit:
+                    ultima = pagina[limit - 1]
+                    siguiente = encode_cursor((ultima['timestamp'], ultima['id_visita']))
+                payload = json.dumps({'node_id': id_sala, 'count': min(limit, len(pagina)),
+                                      'next_cursor': siguiente, 'visits': pagina[:limit]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servidores.append(server)
+        return (id_sala, f'http://127.0.0.1:{server.server_address[1]}'), pedidas
+
+    yield crear
+    for server in servidores:
+        server.shutdown()
+        server.server_close()
+
+
+def _visitas_locales(id_sala, minutos):
+    db.session.add_all([VisitaEmergencia(folio=f'L{id_sala}-{m}', id_paciente=1, id_doctor=1, id_cama=1,
+                                         id_trabajador=1, id_sala=id_sala, estado='activa',
+                                         timestamp=INICIO + timedelta(minutes=m)) for m in minutos])
+    db.session.commit()
+
+
+def _todas_las_paginas(limit):
+    filas, cursor = [], None
+    while True:
+        page = get_cluster_timeline(None, limit=limit, cursor=cursor)
+        filas += page
+        cursor = page.next_cursor
+        if cursor is None:
+            return filas
+
+
+def test_merges_salas_in_global_order_across_pages(seeded, monkeypatch, nodos_falsos):
+    _visitas_locales(1, [0, 5, 10, 30])
+    nodo2, _ = nodos_falsos(2, [_fila(2, i, m) for i, m in enumerate([1, 5, 12, 30, 31], start=100)])
+    nodo3, _ = nodos_falsos(3, [_fila(3, i, m) for i, m in enumerate([2, 5, 29, 40], start=1)])
+    monkeypatch.setattr(cluster_timeline, 'otros_nodos', lambda bully: [nodo2, nodo3])
+
+    filas = _todas_las_paginas(limit=4)
+    llaves = [(f['timestamp'], f['id_sala'], f['id_visita']) for f in filas]
+    assert llaves == sorted(llaves, reverse=True)
+    assert len(filas) == 13
+    # Mismo timestamp en las tres salas: desempata id_sala (mayor primero)
+    assert [f['id_sala'] for f in filas if f['timestamp'].endswith('08:05:00')] == [3, 2, 1]
+    assert {f['source'] for f in filas} == {'local', 'node_2', 'node_3'}
+
+    with pytest.raises(CursorError):
+        get_cluster_timeline(None, cursor='no-es-un-cursor')
+
+
+def test_fetches_more_pages_only_from_competitive_nodes(seeded, monkeypatch, nodos_falsos):
+    nodo2, pedidas2 = nodos_falsos(2, [_fila(2, i, 1000 + i) for i in range(1, 200)])  # las más recientes
+    nodo3, pedidas3 = nodos_falsos(3, [_fila(3, i, i) for i in range(1, 200)])
+    monkeypatch.setattr(cluster_timeline, 'otros_nodos', lambda bully: [nodo2, nodo3])
+
+    page = get_cluster_timeline(None, limit=30)
+    assert [f['id_sala'] for f in page] == [2] * 30
+    assert len(pedidas3) == 1          # la sala 3 nunca compite: sólo su primera página
+    assert len(pedidas2) > 1           # la sala 2 se siguió pidiendo, de a lo que faltaba
+    assert page.filas_leidas <= 2 * 30  # O(K) y no N×K
+    assert not page.parcial
+
+
+def test_unreachable_node_falls_back_to_local_copy(seeded, monkeypatch, nodos_falsos):
+    db.session.add(Sala(id_sala=2, numero=2, ip_address='localhost', puerto=5556))
+    db.session.commit()
+    _visitas_locales(1, [0, 10])
+    _visitas_locales(2, [5, 15])
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        cerrado = f'http://127.0.0.1:{s.getsockname()[1]}'
+    monkeypatch.setattr(cluster_timeline, 'otros_nodos', lambda bully: [(2, cerrado)])
+
+    page = get_cluster_timeline(None, limit=10)
+    assert [(f['id_sala'], f['source']) for f in page] == [(2, 'local'), (1, 'local'), (2, 'local'), (1, 'local')]
+    assert page.parcial
+    assert page.next_cursor is None
@@ -0,0 +1,72 @@
+"""
+Pruebas de la codificación compacta de /api/cluster/*: conversión a
+columnas, negociación de contenido (Accept / Accept-Encoding) y decodificación
+transparente en cluster_client.
+"""
+import gzip
+import json
+import threading
+
+from werkzeug.serving import make_server
+
+import codec
+from cluster_client import scatter_gather
+from models import db, Cama
+
+
+def test_columns_roundtrip():
+    payload = {
+        'node_id': 1,
+        'beds': [{'id_cama': 1, 'ocupada': False, 'paciente_nombre': None},
+                 {'id_cama': 2, 'ocupada': True, 'paciente_nombre': 'José'}],
+        'vacia': [],
+        'mezclada': [{'a': 1}, {'b': 2}],
+        'stats': {'total': 2}
+    }
+    columnas = codec.to_columns(payload)
+    assert columnas['beds'] == {'__columns__': ['id_cama', 'ocupada', 'paciente_nombre'],
+                                'values': [[1, 2], [False, True], [None, 'José']]}
+    assert columnas['mezclada'] == payload['mezclada']
+
+    body = codec.encode(payload, columnar=True)
+    assert codec.decode(body, codec.COLUMNAR) == payload
+    assert codec.decode(codec.encode(payload), 'application/json') == payload
+
+
+def _camas(n):
+    db.session.add_all([Cama(id_cama=i, numero=i, id_sala=1) for i in range(5, 5 + n)])
+    db.session.commit()
+
+
+def test_negotiation(client):
+    _camas(100)
+
+    plano = client.get('/api/cluster/beds')
+    assert plano.mimetype == 'application/json'
+    assert 'Content-Encoding' not in plano.headers
+
+    resp = client.get('/api/cluster/beds', headers={'Accept': codec.ACCEPT, 'Accept-Encoding': 'gzip'})
+    assert resp.mimetype == codec.COLUMNAR
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert set(resp.vary) >= {'Accept', 'Accept-Encoding'}
+    body = gzip.decompress(resp.data)
+    assert len(resp.data) < len(body) < len(plano.data)
+    assert codec.decode(body, resp.mimetype) == plano.get_json()
+
+    # Respuestas chicas no se comprimen
+    resp = client.get('/api/cluster/social-workers', headers={'Accept': codec.ACCEPT, 'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in resp.headers
+    assert json.loads(resp.data)['social_workers']['__columns__'][0] == 'id_trabajador'
+
+
+def test_client_decodes_transparently(client, seeded):
+    _camas(100)
+    server = make_server('127.0.0.1', 0, seeded, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        respuesta, = scatter_gather([(2, f'http://127.0.0.1:{server.server_port}')], '/api/cluster/beds')
+    finally:
+        server.shutdown()
+    assert respuesta.ok
+    assert respuesta.data == client.get('/api/cluster/beds').get_json()
+    assert len(respuesta.data['beds']) == 104
@@ -0,0 +1,117 @@
+"""
+Pruebas del asignador de consecutivos por bloques (consecutivos.py).
+
+Lo importante: nunca se repite un consecutivo para (sala, día), aun con
+rollbacks, reinicios del proceso o varios hilos creando visitas.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from consecutivos import ConsecutivoAllocator, allocator
+from models import db, Consecutivo, VisitaEmergencia
+
+
+def nueva_visita(id_paciente=1, id_doctor=1):
+    visita = VisitaEmergencia(id_paciente=id_paciente, id_doctor=id_doctor, id_cama=1, id_trabajador=1,
+                              id_sala=1, sintomas='Dolor', estado='activa')
+    db.session.add(visita)
+    return visita
+
+
+def techo(id_sala=1):
+    return Consecutivo.query.filter_by(id_sala=id_sala, fecha=datetime.utcnow().date()).one().consecutivo
+
+
+def consecutivo(folio):
+    return int(folio.rsplit('+', 1)[1])
+
+
+def test_folio_format_and_block_reservation(seeded):
+    reservas = allocator.reservas
+    folios = []
+    for i in range(5):
+        visita = nueva_visita(id_paciente=i % 2 + 1, id_doctor=2)
+        db.session.commit()
+        folios.append(visita.folio)
+
+    assert folios == ['1+2+1+001', '2+2+1+002', '1+2+1+003', '2+2+1+004', '1+2+1+005']
+    # Un solo UPDATE a CONSECUTIVOS para las 5 visitas
+    assert allocator.reservas == reservas + 1
+    assert techo() == allocator.block_size
+
+
+def test_several_visits_in_one_transaction(seeded):
+    visitas = [nueva_visita() for _ in range(3)]
+    db.session.commit()
+    assert [consecutivo(v.folio) for v in visitas] == [1, 2, 3]
+
+
+def test_rollback_discards_tentative_block(seeded):
+    nueva_visita()
+    db.session.flush()
+    db.session.rollback()
+    assert Consecutivo.query.count() == 0
+
+    visita = nueva_visita()
+    db.session.commit()
+    assert consecutivo(visita.folio) == 1
+
+
+def test_restart_skips_reserved_range(seeded):
+    nueva_visita()
+    db.session.commit()
+    # Simula una caída: el resto del bloque en memoria se pierde
+    allocator.reset()
+    visita = nueva_visita()
+    db.session.commit()
+    assert consecutivo(visita.folio) == allocator.block_size + 1
+
+
+def test_two_processes_never_overlap(seeded):
+    otro = ConsecutivoAllocator(block_size=3)   # otro proceso sobre la misma BD
+    numeros = []
+    for _ in range(4):
+        numeros.append(allocator.next(db.session(), db.session.connection(), 1))
+        numeros.append(otro.next(db.session(), db.session.connection(), 1))
+        db.session.commit()
+    assert len(set(numeros)) == len(numeros)
+
+
+def test_day_rollover_starts_new_sequence(seeded):
+    hoy = datetime.utcnow().date()
+    manana = hoy + timedelta(days=1)
+    assert allocator.next(db.session(), db.session.connection(), 1, hoy) == 1
+    assert allocator.next(db.session(), db.session.connection(), 1, manana) == 1
+    db.session.commit()
+    assert allocator.next(db.session(), db.session.connection(), 1, manana) == 2
+    db.session.commit()
+    assert {(c.fecha, c.consecutivo) for c in Consecutivo.query} == {
+        (hoy, allocator.block_size), (manana, allocator.block_size)}
+
+
+def test_concurrent_creators_get_unique_folios(seeded):
+    errores = []
+
+    def crear(n):
+        with seeded.app_context():
+            try:
+                for _ in range(n):
+                    nueva_visita()
+                    db.session.commit()
+            except Exception as e:  # pragma: no cover - se reporta abajo
+                errores.append(e)
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+    hilos = [threading.Thread(target=crear, args=(30,)) for _ in range(4)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert not errores
+    numeros = [consecutivo(folio) for (folio,) in db.session.query(VisitaEmergencia.folio)]
+    assert len(numeros) == 120
+    assert len(set(numeros)) == 120
+    assert max(numeros) <= techo()
@@ -0,0 +1,123 @@
+"""
+Pruebas de los contadores materializados (CONTADORES_SALA).
+
+Después de cada escritura los contadores deben coincidir con los COUNT(*)
+calculados sobre las tablas fuente.
+"""
+from datetime import datetime, timedelta
+
+from migrations import rebuild_counters
+from models import (db, ContadorSala, Doctor, Cama, VisitaEmergencia,
+                    get_contadores_sala, get_metricas_dashboard)
+
+
+def counts_from_source(id_sala):
+    """Los mismos números calculados con COUNT(*) (como antes de materializar)."""
+    hoy = datetime.utcnow().date()
+    visitas = VisitaEmergencia.query.filter_by(id_sala=id_sala)
+    return {
+        'id_sala': id_sala,
+        'visitas_activas': visitas.filter_by(estado='activa').count(),
+        'visitas_completadas': visitas.filter_by(estado='completada').count(),
+        'visitas_hoy': visitas.filter(db.func.date(VisitaEmergencia.timestamp) == hoy.isoformat()).count(),
+        'doctores_disponibles': Doctor.query.filter_by(id_sala=id_sala, disponible=True, activo=True).count(),
+        'doctores_total': Doctor.query.filter_by(id_sala=id_sala, activo=True).count(),
+        'camas_disponibles': Cama.query.filter_by(id_sala=id_sala, ocupada=False).count(),
+        'camas_total': Cama.query.filter_by(id_sala=id_sala).count(),
+    }
+
+
+def crear_visita(id_doctor=1, id_cama=1, id_sala=1, timestamp=None):
+    # Folio explícito: aquí sólo interesan los contadores, no la asignación de folios
+    visita = VisitaEmergencia(folio=f'1+{id_doctor}+{id_sala}+{id_cama:03d}', id_paciente=1, id_doctor=id_doctor, id_cama=id_cama, id_trabajador=1,
+                              id_sala=id_sala, sintomas='Dolor', estado='activa',
+                              timestamp=timestamp or datetime.utcnow())
+    db.session.get(Doctor, id_doctor).disponible = False
+    db.session.get(Cama, id_cama).ocupada = True
+    db.session.add(visita)
+    db.session.commit()
+    return visita
+
+
+def test_counters_initialized_from_seed(seeded):
+    assert get_contadores_sala(1) == counts_from_source(1)
+    assert get_contadores_sala(1)['doctores_disponibles'] == 3
+    assert get_contadores_sala(1)['camas_total'] == 4
+
+
+def test_counters_follow_visit_lifecycle(seeded):
+    visita = crear_visita()
+    assert get_contadores_sala(1) == counts_from_source(1)
+    assert get_contadores_sala(1)['visitas_activas'] == 1
+    assert get_contadores_sala(1)['visitas_hoy'] == 1
+
+    visita.estado = 'completada'
+    visita.fecha_cierre = datetime.utcnow()
+    visita.doctor.disponible = True
+    visita.cama.ocupada = False
+    db.session.commit()
+
+    contadores = get_contadores_sala(1)
+    assert contadores == counts_from_source(1)
+    assert (contadores['visitas_activas'], contadores['visitas_completadas']) == (0, 1)
+    assert contadores['camas_disponibles'] == 4
+
+
+def test_old_visits_do_not_count_as_today(seeded):
+    crear_visita(timestamp=datetime.utcnow() - timedelta(days=3))
+    assert get_contadores_sala(1)['visitas_hoy'] == 0
+    assert get_contadores_sala(1)['visitas_activas'] == 1
+
+
+def test_counters_follow_raw_sql_and_deletes(seeded):
+    crear_visita()
+    conn = db.session.connection()
+    conn.exec_driver_sql('INSERT INTO DOCTORES (nombre, id_sala, disponible, activo) VALUES (?, 2, 1, 1)',
+                         ('Dr. Nuevo',))
+    conn.exec_driver_sql('UPDATE DOCTORES SET activo = 0 WHERE id_doctor = 3')
+    conn.exec_driver_sql('DELETE FROM VISITAS_EMERGENCIA')
+    conn.exec_driver_sql('DELETE FROM CAMAS WHERE id_cama = 4')
+    db.session.commit()
+
+    assert get_contadores_sala(1) == counts_from_source(1)
+    assert get_contadores_sala(2) == counts_from_source(2)
+
+
+def test_rollback_leaves_counters_untouched(seeded):
+    antes = get_contadores_sala(1)
+    db.session.get(Doctor, 1).disponible = False
+    db.session.flush()
+    db.session.rollback()
+    assert get_contadores_sala(1) == antes
+
+
+def test_repair_rebuilds_drifted_counters(seeded):
+    crear_visita()
+    db.session.connection().exec_driver_sql('UPDATE CONTADORES_SALA SET visitas_activas = 99, camas_total = 0')
+    db.session.commit()
+    assert get_contadores_sala(1) != counts_from_source(1)
+
+    rebuild_counters(db.session.connection())
+    db.session.commit()
+    assert get_contadores_sala(1) == counts_from_source(1)
+
+
+def test_unknown_sala_reads_as_zero(app):
+    assert get_contadores_sala(42)['visitas_activas'] == 0
+    assert db.session.get(ContadorSala, 42) is None
+
+
+def test_metricas_dashboard_matches_counts(seeded):
+    crear_visita()
+    crear_visita(id_doctor=2, id_cama=2, timestamp=datetime.utcnow() - timedelta(days=2))
+
+    metricas = get_metricas_dashboard(id_sala=1)
+    assert metricas == {
+        'visitas_activas': 2,
+        'doctores_disponibles': 1,
+        'camas_disponibles': 2,
+        'visitas_hoy': 1,
+        'visitas_activas_sala': 2,
+        'doctores_sala': 1,
+        'camas_sala': 2,
+    }
@@ -0,0 +1,89 @@
+"""
+Pruebas del generador de datos sintéticos (scripts/generate_dataset.py):
+reproducibilidad, unicidad de CURP/folio y consistencia de los datos
+derivados reconstruidos tras la carga masiva.
+"""
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from generate_dataset import Dataset, load, main  # noqa: E402
+
+HASTA = datetime(2026, 3, 1, 14, 30)
+
+
+def _dataset(seed=7):
+    return Dataset(seed, salas=2, doctores=4, camas=6, trabajadores=1, pacientes=300, visitas=3000, anios=1,
+                   hasta=HASTA)
+
+
+@pytest.fixture
+def cargada(tmp_path):
+    path = str(tmp_path / 'emergency_sala1.db')
+    conteos = load(path, _dataset(), log=lambda *_: None)
+    conn = sqlite3.connect(path)
+    yield conteos, conn
+    conn.close()
+
+
+def test_same_seed_same_data():
+    a, b = _dataset(), _dataset()
+    assert a.pacientes() == b.pacientes()
+    assert a.visitas(a.doctores(), a.camas(), a.trabajadores()) == b.visitas(b.doctores(), b.camas(), b.trabajadores())
+
+
+def test_rows_are_unique_and_chronological(cargada):
+    conteos, conn = cargada
+    assert conteos['visitas'] == 3000
+    assert conn.execute('SELECT count(DISTINCT folio) FROM VISITAS_EMERGENCIA').fetchone()[0] == 3000
+    assert conn.execute('SELECT count(DISTINCT curp), min(length(curp)) FROM PACIENTES').fetchone() == (300, 18)
+
+    timestamps = [ts for ts, in conn.execute('SELECT timestamp FROM VISITAS_EMERGENCIA ORDER BY id_visita')]
+    assert timestamps == sorted(timestamps)
+    assert all(len(ts) == 26 for ts in timestamps)  # formato del ORM, con microsegundos
+    assert timestamps[-1] < HASTA.isoformat(' ')
+
+
+def test_derived_data_is_rebuilt(cargada):
+    conteos, conn = cargada
+    assert conn.execute('PRAGMA foreign_key_check').fetchall() == []
+
+    # Visitas activas ocupan doctores y camas distintos, y los contadores lo reflejan
+    activas = conn.execute("SELECT count(*), count(DISTINCT id_doctor), count(DISTINCT id_cama) "
+                           "FROM VISITAS_EMERGENCIA WHERE estado = 'activa'").fetchone()
+    assert activas == (conteos['activas'],) * 3
+    assert conn.execute('SELECT sum(visitas_activas), sum(visitas_completadas), sum(camas_disponibles) '
+                        'FROM CONTADORES_SALA').fetchone() == (
+        conteos['activas'],
+        conn.execute("SELECT count(*) FROM VISITAS_EMERGENCIA WHERE estado = 'completada'").fetchone()[0],
+        12 - conteos['activas'])
+
+    # El consecutivo guardado es el mayor usado ese día en esa sala
+    assert conn.execute("""
+        SELECT count(*) FROM CONSECUTIVOS c WHERE c.consecutivo != (
+            SELECT max(CAST(substr(folio, length(folio) - 2) AS INTEGER)) FROM VISITAS_EMERGENCIA v
+            WHERE v.id_sala = c.id_sala AND date(v.timestamp) = c.fecha)
+    """).fetchone()[0] == 0
+
+    # Índices y FTS5 reconstruidos
+    indices = {n for n, in conn.execute("SELECT name FROM sqlite_master WHERE name LIKE 'ix_visitas_%'")}
+    assert 'ix_visitas_timestamp' in indices
+    conn.execute("INSERT INTO VISITAS_FTS (VISITAS_FTS, rank) VALUES ('integrity-check', 1)")
+    assert conn.execute("SELECT count(*) FROM VISITAS_FTS WHERE VISITAS_FTS MATCH 'fiebre'").fetchone()[0] > 0
+
+
+def test_cli_copies_to_every_target_and_refuses_overwrite(tmp_path):
+    destinos = [str(tmp_path / f'emergency_sala{n}.db') for n in (1, 2)]
+    argv = ['--db', *destinos, '--visitas', '500', '--salas', '2', '--anios', '1', '--hasta', '2026-03-01']
+    assert main(argv) == 0
+    with open(destinos[0], 'rb') as a, open(destinos[1], 'rb') as b:
+        assert a.read() == b.read()
+
+    with pytest.raises(SystemExit):
+        main(argv)
+    assert main(argv + ['--force']) == 0
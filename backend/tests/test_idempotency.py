@@ -0,0 +1,84 @@
+"""
+Pruebas de las llaves de idempotencia (idempotency.py): un reintento de
+create-visit no crea otra visita ni ocupa otra cama, las llaves sobreviven
+al LRU en la tabla IDEMPOTENCIA y vencen con IDEMPOTENCY_TTL.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import Config
+from idempotency import idempotency
+from models import db, Cama, ClaveIdempotencia, Doctor, VisitaEmergencia
+
+VISITA = {'id_paciente': 1, 'id_doctor': 1, 'id_cama': 1, 'id_trabajador': 1, 'id_sala': 1, 'sintomas': 'Fiebre'}
+
+
+@pytest.fixture(autouse=True)
+def limpiar():
+    idempotency.reset()
+    yield
+    idempotency.reset()
+
+
+def test_retried_create_visit_is_answered_without_creating_another(client):
+    primera = client.post('/api/cluster/create-visit', json={**VISITA, 'idempotency_key': 'k1'})
+    assert primera.status_code == 201 and 'idempotent_replay' not in primera.json
+
+    # El doctor y la cama ya están ocupados: sin la llave el reintento sería un 409
+    repetida = client.post('/api/cluster/create-visit', json={**VISITA, 'idempotency_key': 'k1'})
+    assert repetida.status_code == 201 and repetida.json['idempotent_replay']
+    assert repetida.json['folio'] == primera.json['folio']
+    assert repetida.json['visita'] == primera.json['visita']
+
+    # También con la cabecera, aunque el cuerpo pida otro doctor y otra cama
+    otra = {**VISITA, 'id_doctor': 2, 'id_cama': 2}
+    repetida = client.post('/api/cluster/create-visit', json=otra, headers={'Idempotency-Key': 'k1'})
+    assert repetida.json['folio'] == primera.json['folio']
+    assert VisitaEmergencia.query.count() == 1
+    assert db.session.get(Doctor, 2).disponible and not db.session.get(Cama, 2).ocupada
+    assert idempotency.metrics()['memory_hits'] == 2
+
+    # Otra llave es otra operación
+    nueva = client.post('/api/cluster/create-visit', json={**otra, 'idempotency_key': 'k2'})
+    assert nueva.status_code == 201 and nueva.json['folio'] != primera.json['folio']
+    assert VisitaEmergencia.query.count() == 2
+
+
+def test_failed_request_does_not_consume_key(client):
+    db.session.get(Doctor, 1).disponible = False
+    db.session.commit()
+    assert client.post('/api/cluster/create-visit', json={**VISITA, 'idempotency_key': 'k1'}).status_code == 409
+
+    r = client.post('/api/cluster/create-visit', json={**VISITA, 'id_doctor': 2, 'idempotency_key': 'k1'})
+    assert r.status_code == 201 and 'idempotent_replay' not in r.json
+    assert client.post('/api/cluster/create-visit', json={**VISITA, 'idempotency_key': ''}).status_code == 400
+    assert client.post('/api/cluster/create-visit', json={**VISITA, 'idempotency_key': 'x' * 101}).status_code == 400
+
+
+def test_keys_survive_lru_eviction_and_expire_with_ttl(client, monkeypatch):
+    monkeypatch.setattr(Config, 'IDEMPOTENCY_CACHE_SIZE', 2)
+    for i in range(3):
+        visita = {**VISITA, 'id_doctor': i % 3 + 1, 'id_cama': i + 1, 'folio': f'F{i}',
+                  'estado': 'activa', 'idempotency_key': f'r{i}'}
+        assert client.post('/api/cluster/replicate-visit', json=visita).status_code == 201
+    assert idempotency.metrics()['cached'] == 2
+
+    # r0 salió del LRU: se contesta desde la tabla y vuelve a memoria
+    r = client.post('/api/cluster/replicate-visit', json={'folio': 'F0', 'idempotency_key': 'r0'})
+    assert r.status_code == 201 and r.json['idempotent_replay']
+    assert idempotency.metrics()['db_hits'] == 1
+    client.post('/api/cluster/replicate-visit', json={'folio': 'F0', 'idempotency_key': 'r0'})
+    assert idempotency.metrics()['memory_hits'] == 1
+
+    # Una llave vencida ya no se contesta y se borra al guardar la siguiente
+    idempotency.reset()
+    db.session.query(ClaveIdempotencia).filter_by(llave='r1').update(
+        {'creado': datetime.utcnow() - timedelta(seconds=Config.IDEMPOTENCY_TTL + 1)})
+    db.session.commit()
+    assert idempotency.buscar('r1') is None
+    assert idempotency.buscar('r2') is not None
+    visita = {**VISITA, 'id_cama': 4, 'folio': 'F3', 'estado': 'activa', 'idempotency_key': 'r3'}
+    client.post('/api/cluster/replicate-visit', json=visita)
+    assert db.session.get(ClaveIdempotencia, 'r1') is None
+    assert idempotency.metrics()['purged'] == 1
@@ -0,0 +1,110 @@
+"""
+Pruebas de la paginación por llave (keyset): cursores opacos, recorrido
+completo sin duplicados ni huecos y uso del índice en páginas profundas.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, VisitaEmergencia, Paciente, VISITAS_ORDEN, get_visitas_page, visitas_resumen_query
+from pagination import CursorError, decode_cursor, encode_cursor, fetch_page, seek
+
+
+@pytest.fixture
+def visitas(seeded):
+    """25 visitas de la sala 1; cada 3 comparten timestamp (desempate por id_visita)."""
+    base = datetime(2025, 1, 1, 8, 0)
+    for i in range(25):
+        db.session.add(VisitaEmergencia(
+            folio=f'1+1+1+{i + 1:03d}', id_paciente=i % 2 + 1, id_doctor=i % 3 + 1, id_cama=i % 4 + 1,
+            id_trabajador=1, id_sala=1, sintomas='Dolor', estado='activa' if i % 5 else 'completada',
+            timestamp=base + timedelta(minutes=i // 3)))
+    db.session.commit()
+    return seeded
+
+
+def recorrer(fn, **kwargs):
+    """Sigue next_cursor hasta el final; retorna la lista de páginas"""
+    paginas, cursor = [], None
+    while True:
+        page = fn(cursor=cursor, **kwargs)
+        paginas.append(page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            return paginas
+
+
+def test_cursor_roundtrip():
+    ts = datetime(2025, 3, 4, 5, 6, 7, 891011)
+    cursor = encode_cursor((ts, 42))
+    assert '=' not in cursor
+    assert decode_cursor(cursor, (VisitaEmergencia.timestamp, VisitaEmergencia.id_visita)) == [ts, 42]
+
+
+@pytest.mark.parametrize('cursor', ['no-es-base64!!', encode_cursor((1,)), 'bnVsbA', encode_cursor(('ayer', 1))])
+def test_invalid_cursor(cursor):
+    with pytest.raises(CursorError):
+        decode_cursor(cursor, (VisitaEmergencia.timestamp, VisitaEmergencia.id_visita))
+
+
+def test_visit_pages_cover_everything_once(visitas):
+    paginas = recorrer(get_visitas_page, limit=4)
+
+    assert [len(p) for p in paginas] == [4, 4, 4, 4, 4, 4, 1]
+    ids = [v.id_visita for p in paginas for v in p]
+    esperado = [v.id_visita for v in VisitaEmergencia.query.order_by(
+        VisitaEmergencia.timestamp.desc(), VisitaEmergencia.id_visita.desc())]
+    assert ids == esperado
+
+
+def test_visit_pages_with_filter(visitas):
+    paginas = recorrer(get_visitas_page, estado='completada', limit=2)
+    folios = [v.folio for p in paginas for v in p]
+    assert folios == ['1+1+1+021', '1+1+1+016', '1+1+1+011', '1+1+1+006', '1+1+1+001']
+
+
+def test_exact_multiple_has_no_empty_page(visitas):
+    page = get_visitas_page(limit=25)
+    assert len(page) == 25
+    assert page.next_cursor is None
+
+
+def test_orm_query_pages(seeded):
+    db.session.add_all([Paciente(id_paciente=i, nombre=f'Paciente {i}') for i in range(3, 12)])
+    db.session.commit()
+
+    paginas = recorrer(lambda cursor: fetch_page(Paciente.query, (Paciente.id_paciente,),
+                                                 key=lambda p: (p.id_paciente,), cursor=cursor, limit=5))
+    assert [[p.id_paciente for p in pagina] for pagina in paginas] == [[1, 2, 3, 4, 5], [6, 7, 8, 9, 10], [11]]
+
+
+def test_deep_page_uses_index(visitas):
+    # La página siguiente debe ser una búsqueda por rango en el índice, sin ordenar en memoria
+    cursor = get_visitas_page(limit=10).next_cursor
+    stmt = seek(visitas_resumen_query().where(VisitaEmergencia.id_sala == 1), VISITAS_ORDEN,
+                cursor, descending=True).limit(10)
+    compiled = stmt.compile(db.engine, compile_kwargs={'literal_binds': True})
+    plan = ' | '.join(row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {compiled}')))
+
+    assert 'SEARCH VISITAS_EMERGENCIA USING INDEX ix_visitas_sala_timestamp' in plan, plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_cluster_visits_endpoint_pages(visitas, client):
+    primera = client.get('/api/cluster/visits?limit=10').get_json()
+    assert primera['count'] == 10
+    assert primera['next_cursor']
+
+    segunda = client.get(f"/api/cluster/visits?limit=10&cursor={primera['next_cursor']}").get_json()
+    ids = {v['id_visita'] for v in primera['visits']} | {v['id_visita'] for v in segunda['visits']}
+    assert len(ids) == 20
+
+
+def test_cluster_endpoints_reject_bad_cursor(client):
+    assert client.get('/api/cluster/visits?cursor=xyz').status_code == 400
+    assert client.get('/api/cluster/patients?cursor=xyz').status_code == 400
+
+    pacientes = client.get('/api/cluster/patients?limit=1').get_json()
+    assert pacientes['count'] == 1
+    assert client.get(f"/api/cluster/patients?cursor={pacientes['next_cursor']}").get_json()['patients'][0][
+        'id_paciente'] == 2
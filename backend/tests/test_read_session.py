@@ -0,0 +1,68 @@
+"""
+Pruebas de la separación de sesiones: engine de solo lectura (WAL, mode=ro,
+query_only) para lecturas y peticiones GET, engine de escritura para el resto.
+"""
+import pytest
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+from db_utils import count_queries, read_session
+from models import db, Doctor, Paciente, VisitaEmergencia
+
+
+@pytest.fixture
+def lectura(seeded):
+    return current_app.extensions['engine_lectura']
+
+
+def test_read_session_uses_read_only_engine(lectura):
+    assert db.session.get_bind() is db.engine
+    with read_session() as sesion:
+        assert sesion is db.session
+        assert db.session.get_bind() is lectura
+        assert Paciente.query.count() == 2
+        with read_session() as anidada:
+            assert anidada is sesion
+    assert db.session.get_bind() is db.engine
+    assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+
+
+def test_read_session_rejects_writes(lectura):
+    with read_session():
+        db.session.get(Doctor, 1).disponible = False
+        with pytest.raises(OperationalError, match='readonly'):
+            db.session.flush()
+    assert db.session.get(Doctor, 1).disponible
+
+
+def test_reads_see_commits_and_do_not_block_writer(lectura):
+    # Una transacción de lectura abierta no impide confirmar escrituras (WAL)
+    with lectura.connect() as conn:
+        conn.exec_driver_sql('BEGIN')
+        assert conn.exec_driver_sql('SELECT count(*) FROM PACIENTES').scalar() == 2
+
+        db.session.add(Paciente(id_paciente=3, nombre='Luis Díaz', curp='DIAL950303HDFZSS03'))
+        db.session.commit()
+
+        # La lectura en curso conserva su instantánea
+        assert conn.exec_driver_sql('SELECT count(*) FROM PACIENTES').scalar() == 2
+        conn.exec_driver_sql('COMMIT')
+
+    with read_session():
+        assert Paciente.query.count() == 3
+
+
+def test_get_requests_read_from_read_engine(lectura, client):
+    with count_queries(lectura) as lecturas, count_queries(db.engine) as escrituras:
+        assert client.get('/api/cluster/doctors').status_code == 200
+    assert lecturas.count > 0
+    assert escrituras.count == 0
+
+    # Las escrituras (POST) siguen yendo al engine normal
+    with count_queries(lectura) as lecturas:
+        resp = client.post('/api/cluster/replicate-visit', json={
+            'folio': '1+1+1+001', 'id_paciente': 1, 'id_doctor': 1, 'id_cama': 1, 'id_trabajador': 1,
+            'id_sala': 1, 'sintomas': 'Dolor', 'estado': 'activa'})
+    assert resp.status_code in (200, 201)
+    assert lecturas.count == 0
+    assert VisitaEmergencia.query.filter_by(folio='1+1+1+001').count() == 1
@@ -0,0 +1,166 @@
+"""
+Pruebas de la replicación asíncrona del líder (replication.py): el nodo lento
+no frena la creación de visitas, envíos en paralelo por nodo y reintentos.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import cluster_client
+import models
+import replication
+from config import Config
+from replication import replicator
+from replication_log import replication_log
+
+
+class LiderLocal:
+    """Bully mínimo: este nodo (1) es el líder"""
+
+    def get_current_leader(self):
+        return 1
+
+
+@pytest.fixture(autouse=True)
+def detener_replicator():
+    yield
+    replication_log.stop()
+    replicator.stop()
+
+
+@pytest.fixture
+def seguidores():
+    """Crea nodos falsos que aceptan POSTs de replicación con una demora dada"""
+    servidores = []
+
+    def crear(node_id, demora=0.0, fallas=0):
+        recibidos = []
+        estado = {'fallas': fallas}
+        lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                cuerpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                time.sleep(demora)
+                entradas = cuerpo['entries'] if 'entries' in cuerpo else [cuerpo]
+                with lock:
+                    fallar = estado['fallas'] > 0
+                    estado['fallas'] -= 1
+                    if not fallar:
+                        recibidos.extend(entradas)
+                payload = json.dumps({'success': not fallar,
+                                      'results': [{'success': True} for _ in entradas]}).encode()
+                self.send_response(500 if fallar else 201)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servidores.append(server)
+        return (node_id, f'http://127.0.0.1:{server.server_address[1]}'), recibidos
+
+    yield crear
+    for server in servidores:
+        server.shutdown()
+        server.server_close()
+
+
+def _esperar(condicion, timeout=5):
+    limite = time.monotonic() + timeout
+    while not condicion():
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+
+
+def test_leader_answers_after_quorum_without_waiting_slow_node(client, monkeypatch, seguidores):
+    rapido, recibidos_rapido = seguidores(2)
+    lento, recibidos_lento = seguidores(3, demora=0.6)
+    monkeypatch.setattr(models, 'otros_nodos', lambda bully: [rapido, lento])
+    monkeypatch.setattr(Config, 'REPLICATION_QUORUM', 1)
+    replication_log.start(client.application, LiderLocal())
+
+    inicio = time.monotonic()
+    r = client.post('/api/cluster/create-visit', json={'id_paciente': 1, 'id_doctor': 1, 'id_cama': 1,
+                                                       'id_trabajador': 1, 'id_sala': 1, 'sintomas': 'Fiebre'})
+    assert time.monotonic() - inicio < 0.5
+    assert r.status_code == 201
+    assert r.json['replication'] == {'success_count': 1, 'failed_nodes': [], 'pending_nodes': [3], 'total_nodes': 2}
+    assert [e['datos']['visitas'][0]['folio'] for e in recibidos_rapido] == [r.json['folio']]
+
+    # El nodo lento la recibe en segundo plano
+    _esperar(lambda: {m['node_id']: m['acked'] for m in replicator.metrics()}.get(3) == 1)
+    assert len(recibidos_lento) == 1
+    metricas = {m['node_id']: m for m in client.get('/api/cluster/replication').json['followers']}
+    assert metricas[3]['queued'] == 0 and metricas[3]['in_flight'] == 0
+
+
+def test_entries_to_one_node_are_pipelined(monkeypatch, seguidores):
+    nodo, recibidos = seguidores(2, demora=0.2)
+    monkeypatch.setattr(models, 'otros_nodos', lambda bully: [nodo])
+    monkeypatch.setattr(Config, 'REPLICATION_WINDOW', 4)
+
+    inicio = time.monotonic()
+    envios = [replicator.submit(None, '/api/cluster/replicate-visit', {'folio': f'F{i}'}) for i in range(8)]
+    assert all(envio.wait(1, timeout=3) for envio in envios)
+    assert time.monotonic() - inicio < 1.0  # 8 × 0.2 s serían 1.6 s en serie
+    assert sorted(v['folio'] for v in recibidos) == [f'F{i}' for i in range(8)]
+
+
+def test_replication_does_not_use_the_shared_client_pool(monkeypatch, seguidores):
+    """Las colas envían desde sus propios hilos: las consultas no esperan detrás de ellas"""
+    lentos = [seguidores(node_id, demora=0.3) for node_id in (2, 3, 4)]
+    monkeypatch.setattr(models, 'otros_nodos', lambda bully: [nodo for nodo, _ in lentos])
+    monkeypatch.setattr(Config, 'REPLICATION_WINDOW', 4)
+    _, executor = cluster_client._cliente()
+    ocupados = []
+    original = executor.submit
+    monkeypatch.setattr(executor, 'submit', lambda *a, **kw: ocupados.append(a[0]) or original(*a, **kw))
+
+    envios = [replicator.submit(None, '/api/cluster/replicate-visit', {'folio': f'F{i}'}) for i in range(8)]
+    time.sleep(0.1)  # 12 peticiones de replicación en vuelo
+    rapido, _ = seguidores(5)
+    inicio = time.monotonic()
+    assert cluster_client.request_node(*rapido, '/api/cluster/replicate-visit', method='POST',
+                                       json={'folio': 'X'}, timeout=1).ok
+    assert time.monotonic() - inicio < 0.2
+    assert all(envio.wait(3, timeout=3) for envio in envios)
+    assert len(ocupados) == 1  # sólo la consulta pasó por el pool compartido
+
+
+def test_failed_sends_are_retried_then_dropped(monkeypatch, seguidores):
+    monkeypatch.setattr(replication, 'RETRY_BACKOFF', 0.01)
+    monkeypatch.setattr(Config, 'REPLICATION_MAX_RETRIES', 3)
+    intermitente, recibidos = seguidores(2, fallas=2)
+    caido, _ = seguidores(3, fallas=10)
+    monkeypatch.setattr(models, 'otros_nodos', lambda bully: [intermitente, caido])
+
+    envio = replicator.submit(None, '/api/cluster/replicate-visit', {'folio': 'F1'})
+    assert envio.wait(2, timeout=3) is False
+    assert envio.resultado() == {'success_count': 1, 'failed_nodes': [3], 'pending_nodes': [], 'total_nodes': 2}
+    assert len(recibidos) == 1
+    metricas = {m['node_id']: m for m in replicator.metrics()}
+    assert (metricas[2]['retries'], metricas[2]['dropped']) == (2, 0)
+    assert (metricas[3]['retries'], metricas[3]['dropped']) == (2, 1)
+
+
+def test_queued_batch_entries_travel_together(monkeypatch, seguidores):
+    nodo, recibidos = seguidores(2, demora=0.1)
+    monkeypatch.setattr(models, 'otros_nodos', lambda bully: [nodo])
+    monkeypatch.setattr(Config, 'REPLICATION_WINDOW', 1)
+    monkeypatch.setattr(Config, 'REPLICATION_BATCH_SIZE', 8)
+
+    envios = [replicator.submit(None, '/api/cluster/replicate-batch', {'seq': i}, lote=True) for i in range(20)]
+    assert all(envio.wait(1, timeout=3) for envio in envios)
+    assert [e['seq'] for e in recibidos] == list(range(20))
+    metricas = replicator.metrics()[0]
+    assert metricas['sent'] == 20 and metricas['acked'] == 20
+    assert metricas['requests'] <= 4  # 1 + lotes de a 8 con lo que se juntó mientras tanto
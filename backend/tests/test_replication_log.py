@@ -0,0 +1,235 @@
+"""
+Pruebas del log de replicación (replication_log.py): captura en el líder,
+aplicación en orden con puesta al día ante huecos, reenvío de cambios de un
+seguidor y retraso por seguidor.
+"""
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from sqlalchemy import event
+
+import models
+from config import Config
+from models import db, Cama, Doctor, EntradaReplicacion, VisitaEmergencia
+from replication import replicator
+from replication_log import replication_log
+
+
+class Lider:
+    def __init__(self, node_id):
+        self.node_id = node_id
+
+    def get_current_leader(self):
+        return self.node_id
+
+
+@pytest.fixture(autouse=True)
+def detener():
+    yield
+    replication_log.stop()
+    replicator.stop()
+
+
+@pytest.fixture
+def lider_falso(monkeypatch):
+    """Nodo 2 como líder: sirve `entradas` en GET /replication/log y guarda los POST"""
+    entradas, recibidos = [], []
+
+    class Handler(BaseHTTPRequestHandler):
+        def _responder(self, payload, status=200):
+            cuerpo = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def do_GET(self):
+            args = {k: int(v[0]) for k, v in parse_qs(urlparse(self.path).query).items()}
+            pagina = [e for e in entradas if e['seq'] > args['after']][:args['limit']]
+            self._responder({'node_id': 2, 'last_seq': len(entradas), 'entries': pagina})
+
+        def do_POST(self):
+            recibidos.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            self._responder({'success': True, 'seq': len(entradas) + len(recibidos)}, 201)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(models, 'get_leader_flask_url', lambda bully: (2, f'http://127.0.0.1:{server.server_address[1]}'))
+    monkeypatch.setattr(models, 'otros_nodos', lambda bully: [])
+    yield entradas, recibidos
+    server.shutdown()
+    server.server_close()
+
+
+def _entrada(seq, tipo, estado, doctor_libre, cama_libre):
+    visita = {'folio': 'R+1', 'id_paciente': 1, 'id_doctor': 1, 'id_cama': 1, 'id_trabajador': 1, 'id_sala': 1,
+              'sintomas': 'Dolor', 'diagnostico': None if estado == 'activa' else 'Gastritis', 'estado': estado,
+              'timestamp': '2024-05-01T08:00:00', 'fecha_cierre': None if estado == 'activa' else '2024-05-01T09:00:00'}
+    return {'seq': seq, 'tipo': tipo, 'id_origen': 2, 'id_lider': 2, 'timestamp': datetime.utcnow().isoformat(),
+            'datos': {'visitas': [visita],
+                      'doctores': [{'id_doctor': 1, 'disponible': doctor_libre, 'activo': True}],
+                      'camas': [{'id_cama': 1, 'ocupada': not cama_libre, 'id_paciente': None if cama_libre else 1}]}}
+
+
+def test_leader_logs_create_and_close_in_sequence(seeded, monkeypatch):
+    monkeypatch.setattr(models, 'otros_nodos', lambda bully: [])
+    replication_log.start(seeded, Lider(1))
+
+    visita = VisitaEmergencia(id_paciente=1, id_doctor=2, id_cama=3, id_trabajador=1, id_sala=1,
+                              sintomas='Tos', estado='activa')
+    doctor, cama = db.session.get(Doctor, 2), db.session.get(Cama, 3)
+    doctor.disponible, cama.ocupada, cama.id_paciente = False, True, 1
+    db.session.add(visita)
+    db.session.commit()
+
+    visita.estado, visita.diagnostico, visita.fecha_cierre = 'completada', 'Gripe', datetime.utcnow()
+    doctor.disponible, cama.ocupada, cama.id_paciente = True, False, None
+    db.session.commit()
+
+    log = [e.to_dict() for e in EntradaReplicacion.query.order_by(EntradaReplicacion.seq)]
+    assert [(e['seq'], e['tipo']) for e in log] == [(1, 'visita_creada'), (2, 'visita_cerrada')]
+    assert log[1]['datos']['visitas'][0]['folio'] == visita.folio
+    assert log[1]['datos']['doctores'] == [{'id_doctor': 2, 'disponible': True, 'activo': True}]
+    assert log[1]['datos']['camas'] == [{'id_cama': 3, 'ocupada': False, 'id_paciente': None}]
+
+
+def test_follower_fills_gap_from_leader_then_applies_in_order(client, monkeypatch, lider_falso):
+    entradas, _ = lider_falso
+    entradas += [_entrada(1, 'visita_creada', 'activa', False, False),
+                 _entrada(2, 'visita_cerrada', 'completada', True, True)]
+    monkeypatch.setattr(Config, 'REPLICATION_GAP_WAIT', 0.05)
+    replication_log.bully_manager = Lider(2)
+
+    # Llega la 3 (reasignación) sin haber recibido la 1 ni la 2
+    tercera = _entrada(3, 'visita_reasignada', 'completada', True, True)
+    tercera['datos']['visitas'][0]['id_doctor'] = 2
+    r = client.post('/api/cluster/replication/apply', json=tercera)
+    assert r.status_code == 200 and r.json['applied_seq'] == 3
+
+    visita = VisitaEmergencia.query.filter_by(folio='R+1').one()
+    assert (visita.estado, visita.diagnostico, visita.id_doctor) == ('completada', 'Gastritis', 2)
+    assert db.session.get(Doctor, 1).disponible and not db.session.get(Cama, 1).ocupada
+    assert [e.seq for e in EntradaReplicacion.query.order_by(EntradaReplicacion.seq)] == [1, 2, 3]
+
+    # Un reenvío de algo ya aplicado es un ack sin cambios
+    r = client.post('/api/cluster/replication/apply', json=entradas[0])
+    assert r.status_code == 200 and r.json['applied_seq'] == 3
+
+
+def _del_lider(id_lider, entrada):
+    return {**entrada, 'id_lider': id_lider}
+
+
+def _log():
+    return [(e.seq, e.id_lider) for e in EntradaReplicacion.query.order_by(EntradaReplicacion.seq)]
+
+
+def test_follower_ahead_of_new_leader_truncates_and_reforwards(client, lider_falso):
+    entradas, _ = lider_falso
+    viejas = [_del_lider(3, _entrada(1, 'visita_creada', 'activa', False, False)),
+              _del_lider(3, _entrada(2, 'visita_cerrada', 'completada', True, True)),
+              _del_lider(3, _entrada(3, 'visita_reasignada', 'completada', True, True))]
+    replication_log.recibir(viejas)  # del líder anterior (3)
+    entradas += viejas[:2]  # el nuevo líder (2) sólo alcanzó a recibir hasta la 2
+    replication_log.bully_manager = Lider(2)
+
+    assert replication_log.ponerse_al_dia() == 0
+    assert _log() == [(1, 3), (2, 3)]
+    assert replication_log.pendientes() == 1  # el cambio de la 3 vuelve al líder
+
+    # El líder lo registra con su propio seq 3 y el seguidor lo aplica
+    entradas.append(_entrada(3, 'visita_reasignada', 'completada', True, True))
+    assert replication_log.ponerse_al_dia() == 1
+    assert _log() == [(1, 3), (2, 3), (3, 2)]
+
+
+def test_pushed_entries_are_verified_across_leader_changes(client, lider_falso):
+    entradas, _ = lider_falso
+    viejas = [_del_lider(3, _entrada(1, 'visita_creada', 'activa', False, False)),
+              _del_lider(3, _entrada(2, 'visita_cerrada', 'completada', True, True))]
+    replication_log.recibir(viejas)
+    nueva = _entrada(3, 'visita_reasignada', 'completada', True, True)
+    entradas += viejas + [nueva]
+    replication_log.bully_manager = Lider(2)
+
+    # Primera entrada del líder 2: se verifica el log contra él y se aplica
+    r = client.post('/api/cluster/replication/apply', json=nueva)
+    assert r.status_code == 200 and r.json['applied_seq'] == 3
+    assert _log() == [(1, 3), (2, 3), (3, 2)] and replication_log.pendientes() == 0
+
+    # El líder depuesto (3) todavía empuja su propia entrada 3: no es un duplicado
+    depuesta = _del_lider(3, _entrada(3, 'visita_actualizada', 'activa', False, False))
+    r = client.post('/api/cluster/replicate-batch', json={'entries': [depuesta]})
+    assert r.json['results'] == [{'seq': 3, 'status': 'conflict', 'success': False}]
+    assert _log() == [(1, 3), (2, 3), (3, 2)]
+    assert VisitaEmergencia.query.filter_by(folio='R+1').one().estado == 'completada'
+
+
+def test_follower_forwards_local_changes_to_leader(seeded, lider_falso):
+    _, recibidos = lider_falso
+    replication_log.start(seeded, Lider(2))
+
+    db.session.get(Doctor, 3).disponible = False
+    db.session.commit()
+
+    limite = time.monotonic() + 5
+    while not recibidos:
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+    assert recibidos == [{'tipo': 'recursos', 'id_origen': 1, 'datos': {
+        'visitas': [], 'doctores': [{'id_doctor': 3, 'disponible': False, 'activo': True}], 'camas': []}}]
+    assert EntradaReplicacion.query.count() == 0  # el seq lo asigna el líder
+
+
+def test_leader_reports_lag_per_follower(client, monkeypatch):
+    monkeypatch.setattr(models, 'otros_nodos', lambda bully: [(2, 'http://127.0.0.1:1'), (3, 'http://127.0.0.1:1')])
+    monkeypatch.setattr(Config, 'REPLICATION_MAX_RETRIES', 1)
+    replication_log.start(client.application, Lider(1))
+    for i in range(1, 4):
+        db.session.get(Doctor, 1).disponible = i % 2 == 0
+        db.session.commit()
+
+    client.get('/api/cluster/replication/log', query_string={'after': 1, 'node_id': 2})
+    r = client.get('/api/cluster/replication').json
+    assert r['log'] == {'last_seq': 3, 'leader': 1}
+    lag = {f['node_id']: f for f in r['lag']}
+    assert lag[2]['applied_seq'] == 1 and lag[2]['lag_entries'] == 2 and lag[2]['lag_seconds'] >= 0
+    assert lag[3]['applied_seq'] is None
+
+
+def test_replicate_batch_applies_in_one_transaction_with_per_entry_results(client, monkeypatch):
+    monkeypatch.setattr(Config, 'REPLICATION_GAP_WAIT', 0.05)
+    commits = []
+
+    def contar(session):
+        commits.append(session)
+
+    event.listen(db.session, 'after_commit', contar)
+
+    primera = _entrada(1, 'visita_creada', 'activa', False, False)
+    segunda = _entrada(2, 'visita_cerrada', 'completada', True, True)
+    quinta = _entrada(5, 'recursos', 'completada', False, True)
+    r = client.post('/api/cluster/replicate-batch', json={'entries': [primera, segunda, quinta]})
+    assert r.status_code == 200
+    assert r.json['applied_seq'] == 2
+    assert [(x['seq'], x['status'], x['success']) for x in r.json['results']] == [
+        (1, 'applied', True), (2, 'applied', True), (5, 'gap', False)]
+    assert len(commits) == 1
+    visita = VisitaEmergencia.query.filter_by(folio='R+1').one()
+    assert visita.estado == 'completada' and db.session.get(Doctor, 1).disponible
+
+    # Reenviar el mismo lote no cambia nada
+    r = client.post('/api/cluster/replicate-batch', json={'entries': [primera, segunda]})
+    assert [x['status'] for x in r.json['results']] == ['duplicate', 'duplicate']
+    assert VisitaEmergencia.query.count() == 1
+    event.remove(db.session, 'after_commit', contar)
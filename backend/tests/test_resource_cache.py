@@ -0,0 +1,156 @@
+"""
+Pruebas de la caché de recursos del cluster: versión local por commit, deltas
+(duplicados, huecos, epoch nuevo), endpoints y consultas sin fan-out.
+"""
+import time
+
+import pytest
+
+import cluster_client
+import models
+from cluster_client import RespuestaNodo
+from config import Config
+from models import db, Doctor, Cama, Sala, get_all_cluster_beds, get_all_cluster_doctors
+from resource_cache import digest, resource_cache
+
+
+def _doctor(id_doctor, disponible=True, id_sala=2):
+    return {'id_doctor': id_doctor, 'nombre': f'Dr. {id_doctor}', 'especialidad': 'General',
+            'disponible': disponible, 'activo': True, 'id_sala': id_sala}
+
+
+def _cama(id_cama, ocupada=False, id_sala=2):
+    return {'id_cama': id_cama, 'numero': id_cama, 'ocupada': ocupada, 'id_sala': id_sala,
+            'id_paciente': None, 'paciente_nombre': None}
+
+
+SNAPSHOT_2 = {'node_id': 2, 'epoch': 'e2', 'version': 5,
+              'doctors': [_doctor(20), _doctor(21, disponible=False)], 'beds': [_cama(20), _cama(21, True)]}
+
+
+def _delta(from_version, version, epoch='e2', doctors=(), beds=(), removed_doctors=()):
+    return {'node_id': 2, 'epoch': epoch, 'from_version': from_version, 'version': version,
+            'doctors': list(doctors), 'beds': list(beds),
+            'removed': {'doctors': list(removed_doctors), 'beds': []}}
+
+
+@pytest.fixture(autouse=True)
+def limpiar_cache():
+    resource_cache.reset()
+    yield
+    resource_cache.stop()
+    resource_cache.reset()
+
+
+def test_version_bumps_only_on_local_commits(seeded):
+    version = resource_cache.version
+    db.session.get(Doctor, 1).disponible = False
+    db.session.commit()
+    assert resource_cache.version == version + 1
+
+    # Sala de otro nodo: no es de este dueño
+    db.session.add(Sala(id_sala=2, numero=2, ip_address='localhost', puerto=5556))
+    db.session.add(Cama(id_cama=50, numero=1, id_sala=2))
+    db.session.commit()
+    assert resource_cache.version == version + 1
+
+    db.session.get(Cama, 1).ocupada = True
+    db.session.flush()
+    db.session.rollback()
+    assert resource_cache.version == version + 1
+
+
+def test_deltas_apply_in_order_and_gaps_mark_stale():
+    resource_cache.apply_snapshot(SNAPSHOT_2)
+
+    assert resource_cache.apply_delta(_delta(6, 6, doctors=[_doctor(21)], removed_doctors=[20])) == 'applied'
+    assert resource_cache.apply_delta(_delta(6, 6)) == 'duplicate'
+    salas = resource_cache.metrics()['salas']
+    assert salas[2]['version'] == 6 and salas[2]['doctors'] == 1 and not salas[2]['stale']
+
+    # Faltan las versiones 7-8: la réplica deja de usarse
+    assert resource_cache.apply_delta(_delta(9, 9, beds=[_cama(22)])) == 'gap'
+    assert resource_cache.metrics()['salas'][2]['stale']
+
+    # Un epoch nuevo (el dueño reinició) requiere snapshot completo
+    resource_cache.apply_snapshot(SNAPSHOT_2)
+    assert resource_cache.apply_delta(_delta(1, 1, epoch='otro')) == 'unknown'
+    assert resource_cache.metrics()['gaps'] == 1
+
+
+def test_resource_endpoints(client):
+    snapshot = client.get('/api/cluster/resources').get_json()
+    assert snapshot['node_id'] == Config.NODE_ID
+    assert [d['id_doctor'] for d in snapshot['doctors']] == [1, 2, 3]
+    assert len(snapshot['beds']) == 4
+    assert snapshot['digest'] == digest(snapshot['doctors'], snapshot['beds'])
+
+    resumen = client.get('/api/cluster/resources/digest').get_json()
+    assert resumen == {k: snapshot[k] for k in ('node_id', 'epoch', 'version', 'digest')}
+
+    resource_cache.apply_snapshot(SNAPSHOT_2)
+    resp = client.post('/api/cluster/resources/delta', json=_delta(6, 6, beds=[_cama(20, True)]))
+    assert resp.get_json()['status'] == 'applied'
+    assert client.post('/api/cluster/resources/delta', json={'node_id': 2}).status_code == 400
+
+    stats = client.get('/api/cluster/stats').get_json()
+    assert stats['resource_cache']['salas']['2']['version'] == 6
+
+
+class _Bully:
+    cluster_nodes = {1: ('127.0.0.1', 0, 0), 2: ('127.0.0.1', 0, 0)}
+
+
+@pytest.fixture
+def cluster(seeded, monkeypatch):
+    """Nodo 2 simulado: registra cada petición y responde su snapshot"""
+    llamadas = []
+
+    def scatter_gather(nodos, path, params=None, deadline=None, method='GET', json=None):
+        llamadas.append((path, method, json))
+        return [RespuestaNodo(node_id, 'online', data=dict(SNAPSHOT_2) if path == '/api/cluster/resources'
+                              else {'status': 'applied'}) for node_id, _ in nodos]
+
+    monkeypatch.setattr(cluster_client, 'scatter_gather', scatter_gather)
+    monkeypatch.setattr(models, 'get_node_flask_url', lambda node_id, host='localhost': f'http://nodo{node_id}')
+    monkeypatch.setattr(Config, 'RESOURCE_DIGEST_INTERVAL', 0)
+    resource_cache.start(seeded, _Bully())
+    return llamadas
+
+
+def test_warm_cache_answers_without_fan_out(cluster):
+    doctores = get_all_cluster_doctors(_Bully(), disponible=True)
+    assert [n['status'] for n in doctores.nodos] == ['online']
+    assert len(cluster) == 1
+
+    doctores = get_all_cluster_doctors(_Bully(), disponible=True)
+    camas = get_all_cluster_beds(_Bully(), ocupada=False)
+    assert len(cluster) == 1
+    assert [n['status'] for n in doctores.nodos] == ['cached'] and not doctores.parcial
+    assert sorted((d['id_doctor'], d['source']) for d in doctores) == [
+        (1, 'local'), (2, 'local'), (3, 'local'), (20, 'node_2')]
+    assert [c['id_cama'] for c in camas if c['source'] == 'node_2'] == [20]
+
+    get_all_cluster_doctors(_Bully(), fresh=True)
+    assert len(cluster) == 2
+
+    metricas = resource_cache.metrics()
+    assert (metricas['hits'], metricas['misses']) == (2, 2)
+    assert metricas['hit_rate'] == 0.5
+
+
+def test_local_commit_pushes_delta(cluster):
+    db.session.get(Doctor, 2).disponible = False
+    db.session.get(Cama, 3).ocupada = True
+    db.session.commit()
+
+    fin = time.monotonic() + 2
+    while not any(path == '/api/cluster/resources/delta' for path, _, _ in cluster) and time.monotonic() < fin:
+        time.sleep(0.01)
+    (_, method, delta), = [c for c in cluster if c[0] == '/api/cluster/resources/delta']
+    assert method == 'POST'
+    assert (delta['from_version'], delta['version']) == (resource_cache.version,) * 2
+    assert delta['doctors'] == [{**_doctor(2, disponible=False, id_sala=1), 'nombre': 'Dra. María García',
+                                 'especialidad': 'Pediatría'}]
+    assert [c['id_cama'] for c in delta['beds']] == [3] and delta['beds'][0]['ocupada']
+    assert delta['removed'] == {'doctors': [], 'beds': []}
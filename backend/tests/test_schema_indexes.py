@@ -0,0 +1,144 @@
+"""
+Pruebas de índices y migraciones del esquema.
+
+Las consultas "calientes" se verifican con EXPLAIN QUERY PLAN: si alguna vuelve
+a recorrer la tabla completa (SCAN) o a ordenar en un B-tree temporal, la
+prueba falla.
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+from migrations import MIGRATIONS, SCHEMA_VERSION, get_schema_version, run_migrations, upgrade_database
+from models import db, Doctor, Cama, Consecutivo, VisitaEmergencia, visitas_resumen_query
+
+
+def query_plan(query):
+    """Retorna las líneas 'detail' de EXPLAIN QUERY PLAN para una Query/Select."""
+    stmt = getattr(query, 'statement', query)
+    sql = str(stmt.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+    return [row[3] for row in rows]
+
+
+def assert_uses_index(query, sorted_by_index=False):
+    plan = query_plan(query)
+    # Con LIMIT, recorrer un índice en orden se detiene en N filas: no es full scan
+    limited = getattr(query, '_limit_clause', None) is not None
+    scans = [line for line in plan if line.startswith('SCAN')
+             and 'COVERING INDEX' not in line
+             and not (limited and 'USING INDEX' in line)]
+    assert not scans, f'Full scan en plan: {plan}'
+    if sorted_by_index:
+        assert not any('TEMP B-TREE' in line for line in plan), f'Ordenamiento temporal en plan: {plan}'
+
+
+HACE_24H = datetime(2025, 1, 1) - timedelta(hours=24)
+
+HOT_QUERIES = {
+    'visitas_activas': lambda: VisitaEmergencia.query.filter_by(estado='activa')
+        .order_by(VisitaEmergencia.timestamp.desc()),
+    'visitas_activas_sala': lambda: VisitaEmergencia.query.filter_by(estado='activa', id_sala=1)
+        .order_by(VisitaEmergencia.timestamp.desc()),
+    'visitas_activas_doctor': lambda: VisitaEmergencia.query.filter_by(estado='activa', id_doctor=1),
+    'cluster_visits': lambda: VisitaEmergencia.query.filter_by(id_sala=1)
+        .order_by(VisitaEmergencia.timestamp.desc()).limit(50),
+    'cluster_visits_estado': lambda: VisitaEmergencia.query.filter_by(id_sala=1, estado='completada')
+        .order_by(VisitaEmergencia.timestamp.desc()).limit(50),
+    'ultimas_visitas': lambda: VisitaEmergencia.query.order_by(VisitaEmergencia.timestamp.desc()).limit(10),
+    'visitas_por_hora': lambda: VisitaEmergencia.query.filter(VisitaEmergencia.timestamp >= HACE_24H),
+    'visitas_paciente': lambda: VisitaEmergencia.query.filter_by(id_paciente=1)
+        .order_by(VisitaEmergencia.timestamp.desc()),
+    'monitor_completadas': lambda: VisitaEmergencia.query.filter(
+        VisitaEmergencia.id_sala == 1,
+        VisitaEmergencia.estado == 'completada',
+        VisitaEmergencia.fecha_cierre >= HACE_24H),
+    'doctores_disponibles': lambda: Doctor.query.filter_by(id_sala=1, disponible=True, activo=True),
+    'camas_libres': lambda: Cama.query.filter_by(id_sala=1, ocupada=False),
+    'consecutivo_hoy': lambda: Consecutivo.query.filter_by(id_sala=1, fecha=HACE_24H.date()),
+    'resumen_activas_sala': lambda: visitas_resumen_query()
+        .where(VisitaEmergencia.estado == 'activa', VisitaEmergencia.id_sala == 1)
+        .order_by(VisitaEmergencia.timestamp.desc()),
+    'resumen_ultimas': lambda: visitas_resumen_query().order_by(VisitaEmergencia.timestamp.desc()).limit(10),
+}
+
+SORTED_QUERIES = {'visitas_activas', 'visitas_activas_sala', 'cluster_visits',
+                  'cluster_visits_estado', 'ultimas_visitas', 'visitas_paciente',
+                  'resumen_activas_sala', 'resumen_ultimas'}
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_queries_use_indexes(app, name):
+    assert_uses_index(HOT_QUERIES[name](), sorted_by_index=name in SORTED_QUERIES)
+
+
+@pytest.mark.parametrize('filters', [
+    {'id_sala': 1, 'estado': 'activa'},
+    {'id_sala': 1, 'estado': 'completada'},
+])
+def test_stats_counts_use_indexes(app, filters):
+    query = db.session.query(db.func.count()).select_from(VisitaEmergencia).filter_by(**filters)
+    assert_uses_index(query)
+
+
+def test_fresh_database_is_at_latest_version(app):
+    with db.engine.connect() as conn:
+        assert get_schema_version(conn) == SCHEMA_VERSION
+    assert run_migrations(db.engine) == []
+
+
+def _legacy_database(path):
+    """BD creada como lo hacía db.create_all() antes de declarar índices."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE "SALAS" (id_sala INTEGER PRIMARY KEY, numero INTEGER NOT NULL,
+            ip_address VARCHAR(50), puerto INTEGER, es_maestro BOOLEAN, activa BOOLEAN);
+        CREATE TABLE "DOCTORES" (id_doctor INTEGER PRIMARY KEY, nombre VARCHAR(200) NOT NULL,
+            especialidad VARCHAR(100), id_sala INTEGER NOT NULL, disponible BOOLEAN, activo BOOLEAN);
+        CREATE TABLE "CAMAS" (id_cama INTEGER PRIMARY KEY, numero INTEGER NOT NULL,
+            id_sala INTEGER NOT NULL, ocupada BOOLEAN, id_paciente INTEGER);
+        CREATE TABLE "VISITAS_EMERGENCIA" (id_visita INTEGER PRIMARY KEY, folio VARCHAR(50) UNIQUE,
+            id_paciente INTEGER NOT NULL, id_doctor INTEGER NOT NULL, id_cama INTEGER NOT NULL,
+            id_trabajador INTEGER NOT NULL, id_sala INTEGER NOT NULL, sintomas TEXT,
+            diagnostico TEXT, estado VARCHAR(20), timestamp DATETIME, fecha_cierre DATETIME);
+        CREATE TABLE "CONSECUTIVOS" (id INTEGER PRIMARY KEY, id_sala INTEGER NOT NULL,
+            fecha DATE NOT NULL, consecutivo INTEGER);
+        INSERT INTO CONSECUTIVOS (id_sala, fecha, consecutivo) VALUES (1, '2025-01-01', 4);
+        INSERT INTO CONSECUTIVOS (id_sala, fecha, consecutivo) VALUES (1, '2025-01-01', 7);
+        INSERT INTO CONSECUTIVOS (id_sala, fecha, consecutivo) VALUES (2, '2025-01-01', 2);
+    """)
+    conn.commit()
+    conn.close()
+
+
+def test_upgrade_legacy_database_in_place(tmp_path):
+    path = str(tmp_path / 'emergency_sala9.db')
+    _legacy_database(path)
+
+    assert upgrade_database(path) == [version for version, _, _ in MIGRATIONS]
+
+    conn = sqlite3.connect(path)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'ix_visitas_estado', 'ix_doctores_disponible', 'ix_camas_estado',
+            'ux_consecutivos_sala_fecha'} <= indexes
+    # Duplicados de consecutivo fusionados conservando el mayor
+    assert conn.execute('SELECT id_sala, consecutivo FROM CONSECUTIVOS ORDER BY id_sala').fetchall() == [(1, 7), (2, 2)]
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    # Columna de concurrencia optimista agregada a tablas existentes
+    for tabla in ('DOCTORES', 'CAMAS'):
+        assert 'version' in {row[1] for row in conn.execute(f'PRAGMA table_info("{tabla}")')}
+    conn.close()
+
+    # Idempotente
+    assert upgrade_database(path) == []
+
+
+def test_run_migrations_skips_applied_versions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'x.db'}")
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    assert run_migrations(engine) == []
+    engine.dispose()
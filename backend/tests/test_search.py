@@ -0,0 +1,104 @@
+"""
+Pruebas de la búsqueda de texto completo (FTS5): prefijos, acentos, CURP y
+folio, y sincronización del índice por triggers.
+"""
+import pytest
+
+import search
+from migrations import rebuild_search_index
+from models import db, VisitaEmergencia, Paciente
+from search import buscar_pacientes, buscar_visitas, fts_query
+
+
+@pytest.fixture
+def visitas(seeded):
+    db.session.add_all([
+        VisitaEmergencia(folio='1+1+1+001', id_paciente=1, id_doctor=1, id_cama=1, id_trabajador=1, id_sala=1,
+                         sintomas='Dolor torácico agudo', estado='activa'),
+        VisitaEmergencia(folio='2+2+1+002', id_paciente=2, id_doctor=2, id_cama=2, id_trabajador=1, id_sala=1,
+                         sintomas='Fiebre', diagnostico='Infección respiratoria', estado='completada'),
+    ])
+    db.session.commit()
+    return seeded
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('', None),
+    ('  ', None),
+    ('jose', '"jose"*'),
+    ('José  her', '"José"* "her"*'),
+    ('1+1+1', '"1+1+1"*'),
+    ('"; DROP TABLE x --', '"DROP"* "TABLE"* "x"*'),
+])
+def test_fts_query(texto, esperado):
+    assert fts_query(texto) == esperado
+
+
+@pytest.mark.parametrize('texto, nombres', [
+    ('jose', ['José Hernández']),
+    ('JOSÉ HERN', ['José Hernández']),
+    ('torres', ['Ana Torres']),
+    ('toaa90', ['Ana Torres']),
+    ('ose', []),
+])
+def test_buscar_pacientes(seeded, texto, nombres):
+    assert [p.nombre for p in buscar_pacientes(texto)] == nombres
+
+
+def test_buscar_pacientes_excludes_inactive(seeded):
+    db.session.get(Paciente, 2).activo = 0
+    db.session.commit()
+    assert buscar_pacientes('ana') == []
+    assert [p.nombre for p in buscar_pacientes('ana', solo_activos=False)] == ['Ana Torres']
+
+
+@pytest.mark.parametrize('texto, folios', [
+    ('toracico', ['1+1+1+001']),               # síntomas, sin acento
+    ('infeccion resp', ['2+2+1+002']),         # diagnóstico
+    ('2+2', ['2+2+1+002']),                    # prefijo de folio
+    ('hernandez', ['1+1+1+001']),              # nombre del paciente
+    ('maria garcia', ['2+2+1+002']),           # nombre del doctor
+    ('dolor fiebre', []),                      # todas las palabras deben coincidir
+])
+def test_buscar_visitas(visitas, texto, folios):
+    assert [v.folio for v in buscar_visitas(texto)] == folios
+
+
+def test_buscar_visitas_filters(visitas):
+    assert buscar_visitas('fiebre', estado='activa') == []
+    assert buscar_visitas('fiebre', id_sala=2) == []
+    assert len(buscar_visitas('fiebre', estado='completada', id_sala=1)) == 1
+
+
+def test_index_follows_writes(visitas):
+    paciente = db.session.get(Paciente, 1)
+    paciente.nombre = 'Pepe Pérez'
+    visita = VisitaEmergencia.query.filter_by(folio='2+2+1+002').one()
+    db.session.delete(visita)
+    db.session.commit()
+
+    assert buscar_pacientes('jose') == []
+    assert [p.id_paciente for p in buscar_pacientes('perez')] == [1]
+    assert buscar_visitas('fiebre') == []
+
+    # SQL crudo también queda indexado (triggers, no eventos del ORM)
+    db.session.connection().exec_driver_sql(
+        "UPDATE VISITAS_EMERGENCIA SET diagnostico = 'Neumonía' WHERE folio = '1+1+1+001'")
+    assert [v.folio for v in buscar_visitas('neumonia')] == ['1+1+1+001']
+
+
+def test_rebuild_matches_triggers(visitas):
+    antes = [v.folio for v in buscar_visitas('1')]
+    rebuild_search_index(db.session.connection())
+    assert [v.folio for v in buscar_visitas('1')] == antes
+    # integrity-check con rank=1 compara el índice contra la tabla de contenido (falla si difieren)
+    conn = db.session.connection()
+    conn.exec_driver_sql("INSERT INTO VISITAS_FTS (VISITAS_FTS, rank) VALUES ('integrity-check', 1)")
+    conn.exec_driver_sql("INSERT INTO PACIENTES_FTS (PACIENTES_FTS, rank) VALUES ('integrity-check', 1)")
+
+
+def test_both_plans_return_the_same(visitas, monkeypatch):
+    textos = ['toracico', 'hernandez', '2+2', 'maria', 'a']
+    pocos = [[v.folio for v in buscar_visitas(t)] for t in textos]
+    monkeypatch.setattr(search, 'MUCHOS_CANDIDATOS', -1)
+    assert [[v.folio for v in buscar_visitas(t)] for t in textos] == pocos
@@ -0,0 +1,101 @@
+"""
+Pruebas de concurrencia de create-visit sin lock global: columnas version en
+doctores y camas, 409 sólo cuando dos visitas compiten por el mismo recurso
+y nunca un doctor o una cama en dos visitas activas.
+"""
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import event
+
+from models import db, Cama, Doctor, VisitaEmergencia
+
+RECURSOS = 12
+
+
+@pytest.fixture
+def client_recursos(client):
+    """Cliente con RECURSOS doctores y camas en la sala 1"""
+    db.session.add_all([Doctor(id_doctor=i, nombre=f'Dr. {i}', especialidad='General', id_sala=1)
+                        for i in range(4, RECURSOS + 1)])
+    db.session.add_all([Cama(id_cama=i, numero=i, id_sala=1) for i in range(5, RECURSOS + 1)])
+    db.session.commit()
+    return client
+
+
+def _crear(client, id_doctor, id_cama, barrera=None):
+    if barrera is not None:
+        barrera.wait()
+    r = client.post('/api/cluster/create-visit', json={'id_paciente': 1, 'id_doctor': id_doctor, 'id_cama': id_cama,
+                                                       'id_trabajador': 1, 'id_sala': 1, 'sintomas': 'Dolor'})
+    return r.status_code, r.json
+
+
+def _activas():
+    return VisitaEmergencia.query.filter_by(estado='activa').all()
+
+
+def test_same_resources_only_one_wins(client_recursos):
+    hilos = 12
+    barrera = threading.Barrier(hilos)
+    with ThreadPoolExecutor(hilos) as pool:
+        resultados = list(pool.map(lambda _: _crear(client_recursos, 1, 1, barrera), range(hilos)))
+
+    assert Counter(status for status, _ in resultados) == {201: 1, 409: hilos - 1}
+    assert len(_activas()) == 1
+    db.session.expire_all()
+    doctor, cama = db.session.get(Doctor, 1), db.session.get(Cama, 1)
+    assert not doctor.disponible and cama.ocupada and doctor.version == 2 and cama.version == 2
+
+
+def test_distinct_resources_proceed_in_parallel(client_recursos):
+    hilos = RECURSOS
+    barrera = threading.Barrier(hilos)
+    with ThreadPoolExecutor(hilos) as pool:
+        resultados = list(pool.map(lambda i: _crear(client_recursos, i, i, barrera), range(1, hilos + 1)))
+
+    assert [status for status, _ in resultados] == [201] * hilos
+    assert len({r['folio'] for _, r in resultados}) == hilos
+
+
+def test_stress_never_double_allocates(client_recursos):
+    azar = random.Random(7)
+    pares = [(azar.randint(1, RECURSOS), azar.randint(1, RECURSOS)) for _ in range(120)]
+    with ThreadPoolExecutor(16) as pool:
+        resultados = list(pool.map(lambda par: _crear(client_recursos, *par), pares))
+
+    assert {status for status, _ in resultados} <= {201, 409}
+    activas = _activas()
+    assert len(activas) == sum(status == 201 for status, _ in resultados)
+    assert len({v.id_doctor for v in activas}) == len(activas)
+    assert len({v.id_cama for v in activas}) == len(activas)
+    db.session.expire_all()
+    ocupados = {v.id_doctor for v in activas}
+    assert {d.id_doctor for d in Doctor.query.filter_by(disponible=False)} == ocupados
+    assert {c.id_cama for c in Cama.query.filter_by(ocupada=True)} == {v.id_cama for v in activas}
+
+
+def test_stale_version_is_a_conflict(client_recursos):
+    """Otra transacción ocupa la cama entre la validación y el flush"""
+    session_cls = type(db.session())
+    hecho = []
+
+    def ocupar_cama(session, flush_context, instances):
+        if not hecho:
+            hecho.append(True)
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('UPDATE CAMAS SET ocupada = 1, version = version + 1 WHERE id_cama = 2')
+
+    event.listen(session_cls, 'before_flush', ocupar_cama)
+    try:
+        status, respuesta = _crear(client_recursos, 2, 2)
+    finally:
+        event.remove(session_cls, 'before_flush', ocupar_cama)
+
+    assert status == 409 and 'just assigned' in respuesta['error']
+    assert _activas() == []
+    db.session.expire_all()
+    assert db.session.get(Doctor, 2).disponible and db.session.get(Doctor, 2).version == 1
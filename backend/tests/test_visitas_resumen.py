@@ -0,0 +1,91 @@
+"""
+Pruebas del camino de lectura proyectado (VisitaResumen) y de la carga
+anticipada de relaciones: los listados deben costar una sola consulta.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from db_utils import assert_max_queries, count_queries
+from models import db, VisitaEmergencia, get_visitas_activas, get_visitas_resumen, with_relaciones
+
+
+@pytest.fixture
+def visitas(seeded):
+    """6 visitas: pacientes y doctores alternados, 2 completadas."""
+    base = datetime(2025, 1, 1, 8, 0)
+    for i in range(6):
+        db.session.add(VisitaEmergencia(
+            folio=f'{i % 2 + 1}+{i % 3 + 1}+1+{i + 1:03d}', id_paciente=i % 2 + 1, id_doctor=i % 3 + 1,
+            id_cama=i % 4 + 1, id_trabajador=1, id_sala=1, sintomas=f'Síntoma {i}',
+            estado='completada' if i < 2 else 'activa', timestamp=base + timedelta(minutes=i)))
+    db.session.commit()
+    db.session.expire_all()
+    return seeded
+
+
+def test_resumen_matches_orm_to_dict(visitas):
+    esperado = [v.to_dict() for v in VisitaEmergencia.query.order_by(VisitaEmergencia.timestamp.desc())]
+    db.session.expire_all()
+
+    with assert_max_queries(1):
+        resumen = [v.to_dict() for v in get_visitas_resumen()]
+
+    assert resumen == esperado
+    assert resumen[0]['paciente'] == 'Ana Torres'
+    assert resumen[0]['sala'] == 1
+
+
+@pytest.mark.parametrize('filtros, folios', [
+    ({'estado': 'activa', 'limit': 2}, ['2+3+1+006', '1+2+1+005']),
+    ({'estado': 'completada'}, ['2+2+1+002', '1+1+1+001']),
+    ({'id_doctor': 1}, ['2+1+1+004', '1+1+1+001']),
+    ({'id_paciente': 2, 'estado': 'activa'}, ['2+3+1+006', '2+1+1+004']),
+    ({'id_sala': 2}, []),
+])
+def test_resumen_filters(visitas, filtros, folios):
+    assert [v.folio for v in get_visitas_resumen(**filtros)] == folios
+
+
+def test_resumen_without_related_rows(visitas):
+    # Un paciente que no existe localmente no debe perder la visita (LEFT JOIN)
+    db.session.connection().exec_driver_sql('UPDATE VISITAS_EMERGENCIA SET id_paciente = 99 WHERE folio = ?',
+                                            ('1+1+1+001',))
+    visita = next(v for v in get_visitas_resumen() if v.folio == '1+1+1+001')
+    assert visita.paciente_nombre is None
+    assert visita.to_dict()['doctor'] == 'Dr. Juan Pérez'
+
+
+def test_eager_loaded_orm_lists(visitas):
+    with assert_max_queries(1):
+        activas = get_visitas_activas()
+        nombres = [(v.paciente.nombre, v.doctor.nombre, v.cama.numero, v.sala.numero) for v in activas]
+    assert len(nombres) == 4
+
+    db.session.expire_all()
+    with count_queries() as queries:
+        for v in VisitaEmergencia.query.all():
+            v.to_dict()
+    # Sin carga anticipada: 1 + N lazy loads (el identity map evita repetir los mismos objetos)
+    assert queries.count > 1
+
+    db.session.expire_all()
+    with assert_max_queries(1):
+        for v in with_relaciones(VisitaEmergencia.query).all():
+            v.to_dict()
+
+
+def test_cluster_visits_endpoint_single_query(client, visitas):
+    db.session.expire_all()
+    with assert_max_queries(1):
+        response = client.get('/api/cluster/visits?estado=activa&limit=3')
+    data = response.get_json()
+    assert data['count'] == 3
+    assert data['visits'][0]['paciente_nombre'] == 'Ana Torres'
+    assert data['visits'][0]['cama_numero'] == 2
+
+
+def test_assert_max_queries_reports_sql(visitas):
+    with pytest.raises(AssertionError, match='VISITAS_EMERGENCIA'):
+        with assert_max_queries(0):
+            get_visitas_resumen()
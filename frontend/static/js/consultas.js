@@ -0,0 +1,95 @@
+// JavaScript para la búsqueda de la vista de consultas globales
+
+document.addEventListener('DOMContentLoaded', function() {
+    const input = document.getElementById('busqueda-input');
+    if (!input) {
+        return;
+    }
+
+    // Esperar a que el usuario deje de escribir antes de consultar
+    let timer = null;
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(() => buscar(input.value.trim()), 250);
+    });
+});
+
+// Consultar /api/buscar (índice FTS5) y mostrar pacientes y visitas
+function buscar(texto) {
+    const resultados = document.getElementById('busqueda-resultados');
+
+    if (!texto) {
+        resultados.innerHTML = '';
+        return;
+    }
+
+    fetch(`/api/buscar?q=${encodeURIComponent(texto)}&limit=20`)
+        .then(response => response.json())
+        .then(data => {
+            resultados.innerHTML = '';
+
+            if (data.error) {
+                resultados.appendChild(mensaje(`Error: ${data.error}`, 'text-danger'));
+                return;
+            }
+            if (!data.pacientes.length && !data.visitas.length) {
+                resultados.appendChild(mensaje('Sin resultados', 'text-muted'));
+                return;
+            }
+
+            if (data.pacientes.length) {
+                resultados.appendChild(tabla(
+                    `Pacientes (${data.pacientes.length})`,
+                    ['ID', 'Nombre', 'Edad', 'CURP'],
+                    data.pacientes.map(p => [p.id_paciente, p.nombre, p.edad, p.curp])
+                ));
+            }
+            if (data.visitas.length) {
+                resultados.appendChild(tabla(
+                    `Visitas (${data.visitas.length})`,
+                    ['Folio', 'Paciente', 'Doctor', 'Síntomas', 'Estado', 'Fecha'],
+                    data.visitas.map(v => [v.folio, v.paciente, v.doctor, v.sintomas, v.estado,
+                                           v.timestamp ? new Date(v.timestamp).toLocaleString() : ''])
+                ));
+            }
+        })
+        .catch(error => console.error('Error en búsqueda:', error));
+}
+
+function mensaje(texto, clase) {
+    const p = document.createElement('p');
+    p.className = `mb-0 ${clase}`;
+    p.textContent = texto;
+    return p;
+}
+
+// Construir la tabla con textContent (los datos nunca se interpretan como HTML)
+function tabla(titulo, columnas, filas) {
+    const contenedor = document.createElement('div');
+    contenedor.className = 'table-responsive mb-2';
+
+    const h6 = document.createElement('h6');
+    h6.textContent = titulo;
+    contenedor.appendChild(h6);
+
+    const table = document.createElement('table');
+    table.className = 'table table-sm table-striped table-hover';
+
+    const header = table.createTHead().insertRow();
+    columnas.forEach(c => {
+        const th = document.createElement('th');
+        th.textContent = c;
+        header.appendChild(th);
+    });
+
+    const body = table.createTBody();
+    filas.forEach(fila => {
+        const tr = body.insertRow();
+        fila.forEach(valor => {
+            tr.insertCell().textContent = valor ?? '-';
+        });
+    });
+
+    contenedor.appendChild(table);
+    return contenedor;
+}